@@ -12,7 +12,9 @@ import datetime
 import numpy as N
 from pencil.files.npfile import npfile
 
-VERSION='v0.2'
+VERSION='v0.3'
+TS_CHUNK_ROWS=1024        # rows of the time series per chunk
+VAR_CHUNK_BYTES=2**20     # maximum size of a chunk of a VAR snapshot (one variable, several z planes)
 
 
 def datestring():
@@ -33,11 +35,36 @@ def read_cut_line(data,prec):
     if line.startswith('#'):
         line=data.readline()    # would be cleaner with a while loop, but I assumed that you never have two successive comment lines
     if prec=='d':
-        line=map(N.float64,line.strip().split())
+        line=list(map(N.float64,line.strip().split()))
     else:
-        line=map(N.float32,line.strip().split())
+        line=list(map(N.float32,line.strip().split()))
     return line    
 
+def header_columns(line):
+    ''' Return the column names of a header line of time_series.dat'''
+    return line.replace("-"," ").strip("#\n").split()
+
+def read_block(lines,nbcol):
+    ''' Convert the data lines of one header block of time_series.dat to an array of nbcol
+        columns, lines of another width or with invalid numbers are skipped'''
+    if nbcol==0:
+        return N.zeros((0,0))
+    tokens=' '.join(lines).split()
+    if len(tokens)==len(lines)*nbcol:
+        try:
+            return N.array(tokens,dtype=N.float64).reshape(-1,nbcol)
+        except ValueError:
+            pass
+    rows=[]
+    for line in lines:
+        try:
+            row=N.array(line.split(),dtype=N.float64)
+        except ValueError:
+            continue
+        if len(row)==nbcol:
+            rows.append(row)
+    return N.array(rows).reshape(-1,nbcol)
+
 class param_file:
     def __init__(self,datafile="data/params.log",trailing=True,precision='d'):
         '''open the file datafile (defaults to params.log in data dir)
@@ -140,9 +167,9 @@ class param_file:
                     var[i]=True
                 elif var[i].startswith('('):  # array (assume all arrays in param are float.... should be checked)
                     if self.precision=='d':
-                        var[i]=map(N.float64,var[i][1:-1].split(';'))
+                        var[i]=list(map(N.float64,var[i][1:-1].split(';')))
                     else:
-                        var[i]=map(N.float32,var[i][1:-1].split(';'))
+                        var[i]=list(map(N.float32,var[i][1:-1].split(';')))
                 else:              # float
                     if self.precision=='d':
                         var[i]=N.float64(var[i])
@@ -162,8 +189,17 @@ class h5file:
         self.nbslices: number of variables recorded in slices
         self.noatime: only set the access date when set to false (avoids modification of the
                        datafile when only accessed) 
+        self.compression: compression filter of the time series, slices and VAR datasets
+
+        The time series and the slices are converted incrementally: the byte offset up to
+        which each native file has been read is stored with the datasets, and sync() only
+        reads and appends the records written since then.
+        The file can be read in place of the data directory by pencilnew.read.var, slices
+        and ts, e.g. pencilnew.read.var(datadir='data.hdf5',var_file='VAR3'), which return
+        lazy views of the HDF5 datasets.
         '''
-    def __init__(self,workdir=None,datafile="data.hdf5", force_create=False, force_single=False, noatime=False):
+    def __init__(self,workdir=None,datafile="data.hdf5", force_create=False, force_single=False, noatime=False,
+                 compression=None, compression_opts=None, varfiles=None):
         '''Create a hdf5 file from pencil code data.
 
             If the HDF file already exists, it will not be automatically updated if
@@ -188,6 +224,13 @@ class h5file:
             If the given datafile exists, it will be open and all parameters will be set from it.
             If you specify at the same time, the workdir, be aware that it may leads some conflicts if
             you give a different working dir than previously recorded,
+
+            compression: compression filter of the data sets at creation, e.g. 'gzip' or 'lzf'
+            (default None). compression_opts: options of the filter, e.g. the gzip level.
+            The filter of an existing file is recovered from the file.
+
+            varfiles: VAR snapshots to convert at creation, e.g. 'all', 'var.dat' or ['VAR0','VAR1'].
+            Default None, only the time series and the slices are converted.
             '''
         if os.path.exists(datafile) and force_create==False:
             mode='a'
@@ -205,10 +248,12 @@ class h5file:
             self.f.attrs['name']='PencilCode'      # Setup datafile informations
             self.f.attrs['ver']=VERSION
             self.f.attrs['WorkDir']=os.path.abspath(workdir)
+            self.f.attrs['compression']=str(compression)
+            if compression_opts!=None:
+                self.f.attrs['compression_opts']=compression_opts
             self.__set_tree()
             self.set_param(force_single)
-            self.__last_timeslice=0
-            self.set_data()
+            self.set_data(varfiles=varfiles)
         else:            # Open an existing file and setup the class members. No modif made here.
             if self.f.attrs.get('name','none') != 'PencilCode':
                 #print "Warning! Probably not a pencil code hdf5 file!!!" # Python 2
@@ -230,10 +275,7 @@ class h5file:
                 print("Last modified on: " + self.f.attrs.get('dateM','Unset!'))
                 print("Last accessed on: " + self.f.attrs.get('dateA','Unset!'))
                 self.__set_tree()
-                try:
-                    self.__last_timeslice=self.data['slices_time'].shape[0]
-                except KeyError:
-                    self.__last_timeslice=0
+                self.precision=self.f.attrs.get('precision','d')
         self.__creating=False
         self.flush()
     def __del__(self):
@@ -253,6 +295,11 @@ class h5file:
         ''' Change Access time '''
         if self.noatime  == False:
             self.f.attrs['dateA']=datestring()
+    def __filters(self):
+        ''' Keyword arguments of create_dataset for the compression of the data sets '''
+        if self.compression==None:
+            return {}
+        return {'compression':self.compression,'compression_opts':self.compression_opts,'shuffle':True}
     def __set_tree(self):
         ''' Setup/Check the tree structure of the file'''
         self.param=self.f.require_group('param')  # Setup param group
@@ -260,11 +307,17 @@ class h5file:
         self.param.require_group('init')            #Read parameters from params.log file
         self.param.require_group('run')
         self.param.require_group('index')        # Read parameters from index.pro file
+        self.param.require_group('read')         # Parameters as read by pencilnew.read
         self.data=self.f.require_group('data')     #Setup the data group
+        self.data.require_group('var')           # VAR snapshots
         self.etc=self.f.require_group('etc')    #Setup the notes group
         self.etc.require_group('ext')
+        self.compression=self.f.attrs.get('compression','None')
+        if self.compression=='None':
+            self.compression=None
+        self.compression_opts=self.f.attrs.get('compression_opts',None)
         try:
-            dt=h5py.new_vlen(str)
+            dt=h5py.special_dtype(vlen=str)
             self.notes=self.etc.require_dataset('notes',(1,),dtype=dt,maxshape=(None,))
         except TypeError:     # additional notes already inserted
             self.notes=self.etc['notes']
@@ -288,6 +341,7 @@ class h5file:
             else:
                 precision = 'f'
             self.precision=precision    
+            self.f.attrs['file_precision']=precision
             nghostx,nghosty,nghostz = tuple(map(int,fpar.readline().split()))
             nprocx,nprocy,nprocz,iprocz_slowest = tuple(map(int,fpar.readline().split()))
             nproc=nprocx*nprocy*nprocz
@@ -496,55 +550,82 @@ class h5file:
             #print "Done." # Python 2
             print("Done.")
     def __read_timeseries(self,override):
-        ''' Read time_series.dat file and write corresponding data
+        ''' Read the lines appended to time_series.dat since the last call and write them
+            The byte offset after the last complete line read is stored with the dataset,
+            only the part of the file beyond it is read. The dataset is chunked in slabs of
+            TS_CHUNK_ROWS rows.
+            The file is split into blocks at the header lines, the columns of each block are
+            matched by name. Columns added by a later header are appended to the dataset and
+            are zero in the rows before. The columns of the last block are stored with the
+            dataset, for the lines appended to it.
             Should only be called by set_data'''
         if self.__updating:
             #print "Reading time_series.dat...", # Python 2
             print("Reading time_series.dat...")
-            fdat=open(os.path.join(self.datadir,'time_series.dat'),'r')
-            columns=fdat.readline().replace("-"," ").strip("#\n").split()
-            nbcol=len(columns)
-            if self.__creating:
-                try:
-                    self.data.create_dataset('time_series_names',data=columns)
-                except ValueError:
-                    del self.data['time_series_names']
-                    self.data.create_dataset('time_series_names',data=columns)
-                try:    
-                    self.data.create_dataset('time_series',(1,nbcol),dtype=self.precision,maxshape=(None,nbcol))
-                except ValueError:
-                    del self.data['time_series_names']
-                    self.data.create_dataset('time_series',(1,nbcol),dtype=self.precision,maxshape=(None,nbcol))
-            else:
-                try:
-                    self.data['time_series_names'][...]=columns
-                except TypeError:
-                    #print "Number of data in time_series seems to have changed !" # Python 2
+            fdat=open(os.path.join(self.datadir,'time_series.dat'),'rb')
+            columns=header_columns(fdat.readline().decode())
+            fdat.seek(0,2)
+            size=fdat.tell()
+            if 'time_series' in self.data and not (self.__creating or override):
+                ts=self.data['time_series']
+                names=list(self.data['time_series_names'].asstr()[...])
+                if 'offset' not in ts.attrs or 'columns' not in ts.attrs:     # older file version
+                    override=True
+                elif names[:len(columns)] != columns or int(ts.attrs['offset'])>size:
                     print("Number of data in time_series seems to have changed !")
-                    del self.data['time_series_names']
-                    del self.data['time_series']
-                    self.data.create_dataset('time_series_names',data=columns)
-                    self.data.create_dataset('time_series',(1,nbcol),dtype=self.precision,maxshape=(None,nbcol))
-            line=read_cut_line(fdat,self.precision)
-            line_max=self.data['time_series'].shape[0]
-            line_num=0
-            while len(line)==nbcol:
-                if line_num<line_max:
-                    if self.__creating or override:
-                        self.data['time_series'][line_num][...]=line
-                else:
-                    append(self.data['time_series'],line)
-                line=read_cut_line(fdat,self.precision)
-                line_num+=1
+                    override=True
+            if self.__creating or override or 'time_series' not in self.data:
+                for name in ('time_series_names','time_series'):
+                    if name in self.data:
+                        del self.data[name]
+                self.data.create_dataset('time_series_names',(0,),dtype=h5py.special_dtype(vlen=str),maxshape=(None,))
+                self.data.create_dataset('time_series',(0,0),dtype=self.precision,maxshape=(None,None),
+                                         chunks=(TS_CHUNK_ROWS,max(len(columns),1)),**self.__filters())
+                self.data['time_series'].attrs['offset']=0
+                self.data['time_series'].attrs['columns']=N.array([],dtype=h5py.special_dtype(vlen=str))
+            ts=self.data['time_series']
+            offset=int(ts.attrs['offset'])
+            fdat.seek(offset)
+            text=fdat.read()
             fdat.close()
+            end=text.rfind(b'\n')+1     # an incomplete last line is read at the next sync
+            block_columns=[str(name) for name in ts.attrs['columns']]
+            blocks=[(block_columns,[])]
+            for line in text[:end].decode().splitlines():
+                if line.lstrip().startswith('#'):
+                    if line.lstrip().startswith('#--'):
+                        block_columns=header_columns(line)
+                        blocks.append((block_columns,[]))
+                elif line.strip()!='':
+                    blocks[-1][1].append(line)
+            names=list(self.data['time_series_names'].asstr()[...])
+            for block_columns,lines in blocks:
+                for name in block_columns:
+                    if name not in names:
+                        names.append(name)
+            if len(names)>self.data['time_series_names'].shape[0]:
+                self.data['time_series_names'].resize((len(names),))
+                self.data['time_series_names'][...]=names
+                ts.resize((ts.shape[0],len(names)))
+            for block_columns,lines in blocks:
+                rows=read_block(lines,len(block_columns))
+                if len(rows)>0:
+                    nb=ts.shape[0]
+                    ts.resize((nb+len(rows),len(names)))
+                    full=N.zeros((len(rows),len(names)))
+                    full[:,[names.index(name) for name in block_columns]]=rows
+                    ts[nb:]=full
+            ts.attrs['offset']=offset+end
+            ts.attrs['columns']=N.array(block_columns,dtype=h5py.special_dtype(vlen=str))
             #print "Done." # Python 2
             print("Done.")
     def __read_slices(self,override):
         ''' Read all the slices and organize them in the hdf5 file
         I assume that format is native, and not an oldfile format (that I suppose to be outadated)
+        Only the records appended since the last call are read, see __read_slice.
          Should only be called by set_data
         '''
-        if self.__updating:thon
+        if self.__updating:
             #print "Reading slices:", # Python 2
             print("Reading slices:")
             fvid=open(os.path.join(self.workdir,'video.in'),'r')
@@ -555,57 +636,47 @@ class h5file:
                     break
                 names+=[tmp]
             fvid.close()
-            try:
-                self.data.create_dataset('slices_names',data=names)
-            except ValueError:
-                try:
-                    self.data['slices_names'][...]=names
-                except TypeError:
+            if 'slices_names' in self.data:
+                if list(self.data['slices_names'].asstr()[...]) != names:
                     if self.__creating==False:
                         #print "Warning: Number of slices seems to have changed from last time !" # Python 2
                         print("Warning: Number of slices seems to have changed from last time !")
-                    del self.data['slices_names']
-                    self.data.create_dataset('slices_names',data=names)
+                    override=True
+                del self.data['slices_names']
+            self.data.create_dataset('slices_names',data=names,dtype=h5py.special_dtype(vlen=str))
+            if override:
+                for extension in ('time','xy','xy2','xz','yz'):
+                    if 'slices_'+extension in self.data:
+                        del self.data['slices_'+extension]
             self.nbslices=len(names)
-            createtime=True
-            for i in range(self.nbslices):
-                for j in range(self.param['dim/nproc'][0]):
-                    createtime=self.__read_slice(override,timeslice=createtime,field=i,extension='xy',proc=j)
-                    createtime=self.__read_slice(override,timeslice=createtime,field=i,extension='xy2',proc=j)
-                    createtime=self.__read_slice(override,timeslice=createtime,field=i,extension='xz',proc=j)
-                    createtime=self.__read_slice(override,timeslice=createtime,field=i,extension='yz',proc=j)
-                    #print # Python 2
-                    print()
+            for extension in ('xy','xy2','xz','yz'):
+                for i in range(self.nbslices):
+                    for j in range(self.param['dim/nproc'][0]):
+                        self.__read_slice(field=i,name=names[i],extension=extension,proc=j)
                 #print # Python 2
                 print()
-            self.__last_timeslice=self.data['slices_time'].shape[0]
             #print "All done." # Python 2
             print("All done.")
-    def __read_slice(self,override,timeslice=False,field=0, extension='xz',proc=-1,format='native',oldfile=False):
+    def __read_slice(self,field=0,name='',extension='xz',proc=-1,format='native',oldfile=False):
         """
-        read one 2D slice files and write the array of (nslices,vsize,hsize) in '/data/slices'.
-        As all timeslices should be identical, only the first one is to be stocked in a common array
-        for all slices. By default, it is not stocked. Set timeslice to True for updating it (erase it if present)
+        read the new records of one 2D slice file and write them in the array of
+        (nslices,nbslices,vsize,hsize) in '/data/slices_'+extension.
+        The byte offset up to which the file has been read is stored as attribute
+        of this array, the new records are read at once from there.
+        The array is chunked by planes (1,1,vsize,hsize), so that the series of one
+        variable or one time slice can be read without touching the other ones.
+        As all timeslices should be identical, the times are stocked in a common array
+        '/data/slices_time' for all slices, by the first file reaching a given time slice.
         Should only called by __read_slices.
         """
-        #print self.data['slices_names'][field]+"; "+extension+"; proc"+str(proc)+" ...", # Python 2
-        print(self.data['slices_names'][field]+"; "+extension+"; proc"+str(proc)+" ...")
-        if timeslice:
-            if self.data.listnames().count('slices_time')>0:
-                del(self.data['slices_time'])
-            t=self.data.create_dataset('slices_time',(1,),dtype=self.precision,maxshape=(None,))
         if proc < 0:
             #print "Please provide the proc number." # Python 2
             print("Please provide the proc number.")
-            return timeslice  
-        filename = os.path.join(self.datadir,'proc'+str(proc),'slice_'+self.data['slices_names'][field]+'.'+extension)
-        try:
-            infile = npfile(filename,endian=format)
-        except IOError:   # Current slice not present for this proc
-#            print "Bad file "+filename
-            return timeslice
+            return
+        filename = os.path.join(self.datadir,'proc'+str(proc),'slice_'+name+'.'+extension)
+        if not os.path.exists(filename):   # Current slice not present for this proc
+            return
         # set up slice plane
-        newly=True  # If the slices have been previously been created, it will be set to False
         if (extension == 'xy' or extension == 'xy2'):
             hsize = self.param['dim/nx'][0]  # global dimensions
             vsize = self.param['dim/ny'][0]
@@ -630,36 +701,90 @@ class h5file:
         else:
             #print "Bad slice name "+extension # Python 2
             print("Bad slice name "+extension)
-            return timeslice
-        if self.data.listnames().count('slices_'+extension)==0:
-            slices=self.data.create_dataset('slices_'+extension,(1,self.nbslices,vsize,hsize),dtype=self.precision,maxshape=(None,self.nbslices,vsize,hsize))
-        else:
-            slices=self.data['slices_'+extension]
-        act_slice=slices.shape[0]-1
-        islice = 0
+            return
+        if 'slices_time' not in self.data:
+            self.data.create_dataset('slices_time',(0,),dtype=self.precision,maxshape=(None,),chunks=(TS_CHUNK_ROWS,))
+        t=self.data['slices_time']
+        if 'slices_'+extension not in self.data:
+            self.data.create_dataset('slices_'+extension,(0,self.nbslices,vsize,hsize),dtype=self.precision,
+                                     maxshape=(None,self.nbslices,vsize,hsize),chunks=(1,1,vsize,hsize),**self.__filters())
+        slices=self.data['slices_'+extension]
+        # Each record holds the slice, the time and, for new files, the slice position,
+        # enclosed by the Fortran record markers.
         if oldfile:
-            cutoff=-1
+            n_extra=1
         else:
-            cutoff=-2
-        while 1:  
-            try:  # read one time slice
-                raw_data = infile.fort_read(self.precision)
-            except ValueError:
-                break
-            except TypeError:
-                break
-            # add the new time to the time datase, and the slice at its position
-            if timeslice: 
-                if islice==0:
-                    t[0]=raw_data[cutoff:][0]
-                else:
-                    append(t,raw_data[cutoff:][0])
-            if islice>act_slice:
-                slices.resize((islice+1,self.nbslices,vsize,hsize))
-            if override or islice>=self.__last_timeslice:
-                slices[islice,field,offv:offv+vsizep,offh:offh+hsizep] = raw_data[:cutoff].reshape(vsizep,hsizep)
-            islice += 1
-        return False
+            n_extra=2
+        prec=self.f.attrs.get('file_precision',self.precision)
+        if format!='native':
+            endian={'big':'>','little':'<'}.get(format,format)
+            prec=endian+prec
+        else:
+            endian='='
+        record=N.dtype([('head',endian+'i4'),('data',prec,(vsizep,hsizep)),('extra',prec,(n_extra,)),('tail',endian+'i4')])
+        key='offset_'+name+'_proc'+str(proc)
+        offset=int(slices.attrs.get(key,0))
+        nrec=(os.path.getsize(filename)-offset)//record.itemsize
+        if nrec<=0:
+            return
+        #print self.data['slices_names'][field]+"; "+extension+"; proc"+str(proc)+" ...", # Python 2
+        print(name+"; "+extension+"; proc"+str(proc)+" ...")
+        infile=open(filename,'rb')
+        infile.seek(offset)
+        raw_data=N.fromfile(infile,dtype=record,count=nrec)
+        infile.close()
+        first=offset//record.itemsize
+        last=first+nrec
+        if last>t.shape[0]:
+            nb=t.shape[0]
+            t.resize((last,))
+            t[nb:]=raw_data['extra'][nb-first:,0]
+        if last>slices.shape[0]:
+            slices.resize((last,self.nbslices,vsize,hsize))
+        slices[first:last,field,offv:offv+vsizep,offh:offh+hsizep] = raw_data['data']
+        slices.attrs[key]=offset+nrec*record.itemsize
+    def __read_readers(self):
+        ''' Store the dimensions, parameters and variable indices as read by pencilnew.read
+            in the attributes of /param/read/dim, param and index, so that pencilnew.read
+            can take this file in place of the data directory. String arrays are stored as
+            datasets of these groups.
+            Should only be called by set_param'''
+        if self.__updating:
+            try:
+                import pencilnew as pcn
+                readers=(('dim',pcn.read.dim(self.datadir)),
+                         ('param',pcn.read.param(datadir=self.datadir,quiet=True)),
+                         ('index',pcn.read.index(datadir=self.datadir)))
+            except (ImportError,IOError,ValueError):
+                print("Warning: cannot read the data directory with pencilnew, the file will not be readable by pencilnew.read")
+                return
+            for name,obj in readers:
+                if name in self.param['read']:
+                    del self.param['read/'+name]
+                group=self.param['read'].create_group(name)
+                for key,value in obj.__dict__.items():
+                    if isinstance(value,(list,tuple,N.ndarray)) and len(value)>0 and N.asarray(value).dtype.kind=='U':
+                        # string arrays like bcx or inituu as variable-length string datasets
+                        group.create_dataset(key,data=N.asarray(value,dtype=object),dtype=h5py.special_dtype(vlen=str))
+                        continue
+                    try:
+                        group.attrs[key]=value
+                    except (TypeError,ValueError):
+                        print("Warning: cannot store "+name+"."+key)
+    def __read_vars(self,varfiles,override):
+        ''' Write the VAR snapshots given by varfiles which are not yet in the file
+            Should only be called by set_data'''
+        if varfiles==None:
+            return
+        if varfiles=='all':
+            names=os.listdir(os.path.join(self.datadir,'proc0'))
+            varfiles=[name for name in names if name.startswith('VAR') and name[3:].isdigit()]
+            varfiles.sort(key=lambda name: int(name[3:]))
+        elif isinstance(varfiles,str):
+            varfiles=[varfiles]
+        for varfile in varfiles:
+            if override or varfile not in self.data['var']:
+                self.add_var(varfile)
     def close(self):
         ''' close the file'''
         self.f.close()
@@ -702,19 +827,54 @@ class h5file:
             self.f.attrs['precision']=self.precision
         self.__read_param()
         self.__read_index()
+        self.__read_readers()
         self.__modified()
         self.__updating=False
-    def set_data(self, override=False):
+    def set_data(self, override=False, varfiles=None):
         ''' Create or Update data
-        By default, only write the new data
-        Rewrite all data over old ones by setting override to True'''
+        By default, only write the new data, i.e. the time series lines and slice records
+        appended since the last update and the VAR snapshots not yet in the file.
+        Rewrite all data over old ones by setting override to True
+        varfiles: VAR snapshots to write, e.g. 'all', 'VAR3' or ['VAR0','var.dat']'''
         self.__updating=True
         self.__read_timeseries(override)
         self.__read_slices(override)
+        self.__read_vars(varfiles,override)
         self.__modified()
         self.__updating=False
-    def sync(self):
-        ''' Synchronization with data files'''
+    def sync(self, varfiles=None):
+        ''' Synchronization with data files
+        Only the new records of the time series and slices are read.
+        varfiles: VAR snapshots to add if not yet present, e.g. 'all' '''
         self.set_param()
-        self.set_data()
+        self.set_data(varfiles=varfiles)
+    def add_var(self,varfile='var.dat'):
+        ''' Write the VAR snapshot varfile, including the ghost zones, in '/data/var/'+varfile
+        An existing snapshot of this name is overwritten.
+        The array f of shape (nvar,mz,my,mx) is chunked with one variable and
+        a few z planes (up to VAR_CHUNK_BYTES) per chunk, so that single variables
+        and planes are read without touching the rest of the snapshot.
+        The snapshot is read and written one variable at a time.'''
+        import pencilnew as pcn
+        #print "Reading "+varfile+"...", # Python 2
+        print("Reading "+varfile+"...")
+        var=pcn.read.var(var_file=varfile,datadir=self.datadir,trimall=False,trim_all=False,quiet=True,lazy=True)
+        group=self.data['var']
+        if varfile in group:
+            del group[varfile]
+        snap=group.create_group(varfile)
+        shape=var.f.shape
+        plane=int(N.prod(shape[2:]))*N.dtype(self.precision).itemsize
+        nplanes=max(1,min(shape[1],VAR_CHUNK_BYTES//plane))
+        f=snap.create_dataset('f',shape,dtype=self.precision,chunks=(1,nplanes)+tuple(shape[2:]),**self.__filters())
+        for i in range(shape[0]):
+            f[i]=var.f[i]
+        for coord in ('x','y','z'):
+            snap.create_dataset(coord,data=getattr(var,coord))
+        for key in ('t','dx','dy','dz','deltay'):
+            if hasattr(var,key):
+                snap.attrs[key]=getattr(var,key)
+        self.__modified()
+        #print "Done." # Python 2
+        print("Done.")
 
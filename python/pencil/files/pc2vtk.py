@@ -6,12 +6,12 @@
 
 import pencil as pc
 import numpy as np
-import struct
 
 # Convert var files into vtk format
 def pc2vtk(varfile = 'var.dat', datadir = 'data/', proc = -1,
            variables = ['rho','uu','bb'], magic = [], b_ext = False,
-           destination = 'work', quiet = True):
+           destination = 'work', quiet = True, file_format = 'vtk',
+           compression = None, n_proc = 1):
     """
     Convert data from PencilCode format to vtk.
 
@@ -19,7 +19,8 @@ def pc2vtk(varfile = 'var.dat', datadir = 'data/', proc = -1,
     
       pc2vtk(varfile = 'var.dat', datadir = 'data/', proc = -1,
            variables = ['rho','uu','bb'], magic = [],
-           destination = 'work.vtk')
+           destination = 'work', file_format = 'vtk', compression = None,
+           n_proc = 1)
     
     Read *varfile* and convert its content into vtk format. Write the result
     in *destination*.
@@ -45,279 +46,34 @@ def pc2vtk(varfile = 'var.dat', datadir = 'data/', proc = -1,
         Add the external magnetic field.
         
       *destination*:
-        Destination file.
+        Destination file without extension.
         
       *quiet*:
         Keep quiet when reading the var files.
-    """
 
-    # this should correct for the case the user type only one variable
-    if (len(magic) > 0):
-        if (len(magic[0]) == 1):
-            magic = [magic]
+      *file_format*: [ 'vtk', 'vti', 'pvti' ]
+        Legacy binary vtk, XML image data or XML image data with one
+        piece for each processor of the run.
 
-    # make sure magic is set when writing 'vort' or 'bb'
-    try:
-        index = variables.index('vort')
-        magic.append('vort')
-    except:
-        pass      
-    try:
-        index = variables.index('bb')
-        magic.append('bb')
-    except:
-        pass
-    try:
-        index = variables.index('b_mag')
-        magic.append('bb')
-    except:
-        pass
-    try:
-        index = variables.index('jj')
-        magic.append('jj')
-    except:
-        pass
-    try:
-        index = variables.index('j_mag')
-        magic.append('jj')
-    except:
-        pass
+      *compression*: [ None, 'zlib', 'lz4' ]
+        Compression of the appended data in XML files.
 
-    # reading pc variables and setting dimensions
-    var = pc.read_var(varfile = varfile, datadir = datadir, proc = proc,
-                    magic = magic, trimall = True, quiet = quiet)
-                    
-    grid = pc.read_grid(datadir = datadir, proc = proc, trim = True, quiet = True)
-    
-    params = pc.read_param(param2 = True, quiet = True)
-    B_ext = np.array(params.b_ext)    
-    # add external magnetic field
-    if (b_ext == True):
-        var.bb[0,...] += B_ext[0]
-        var.bb[1,...] += B_ext[1]
-        var.bb[2,...] += B_ext[2]
-       
-    dimx = len(grid.x)
-    dimy = len(grid.y)
-    dimz = len(grid.z)
-    dim = dimx * dimy * dimz
-    dx = (np.max(grid.x) - np.min(grid.x))/(dimx-1)
-    dy = (np.max(grid.y) - np.min(grid.y))/(dimy-1)
-    dz = (np.max(grid.z) - np.min(grid.z))/(dimz-1)
-    
-    fd = open(destination + '.vtk', 'wb')
-    fd.write('# vtk DataFile Version 2.0\n'.encode('utf-8'))
-    fd.write('VAR files\n'.encode('utf-8'))
-    fd.write('BINARY\n'.encode('utf-8'))
-    fd.write('DATASET STRUCTURED_POINTS\n'.encode('utf-8'))
-    fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(dimx, dimy, dimz).encode('utf-8'))
-    fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(grid.x[0], grid.y[0], grid.z[0]).encode('utf-8'))
-    fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(dx, dy, dz).encode('utf-8'))
-    fd.write('POINT_DATA {0:9}\n'.format(dim).encode('utf-8'))
-    
-    # this should correct for the case the user type only one variable
-    if (len(variables) > 0):
-        if (len(variables[0]) == 1):
-            variables = [variables]
-      
-    try:
-        index = variables.index('rho')
-        print('writing rho')
-        fd.write('SCALARS rho float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.rho[k,j,i]))
-    except:
-        pass
-    
-    try:
-        index = variables.index('lnrho')
-        print('writing lnrho')
-        fd.write('SCALARS lnrho float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.lnrho[k,j,i]))
-    except:
-        pass
-                
-    try:
-        index = variables.index('uu')
-        print('writing uu')
-        fd.write('VECTORS vfield float\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.uu[0,k,j,i]))
-                    fd.write(struct.pack(">f", var.uu[1,k,j,i]))
-                    fd.write(struct.pack(">f", var.uu[2,k,j,i]))
-    except:
-        pass
-    
-    try:
-        index = variables.index('bb')
-        print('writing bb')
-        fd.write('VECTORS bfield float\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.bb[0,k,j,i]))
-                    fd.write(struct.pack(">f", var.bb[1,k,j,i]))
-                    fd.write(struct.pack(">f", var.bb[2,k,j,i]))
-    except:
-        pass
-    
-    try:
-        index = variables.index('b_mag')
-        b_mag = np.sqrt(pc.dot2(var.bb))
-        print('writing b_mag')
-        fd.write('SCALARS b_mag float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", b_mag[k,j,i]))
-    except:
-        pass
-    
-    try:
-        index = variables.index('jj')
-        print('writing jj')
-        fd.write('VECTORS jfield float\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.jj[0,k,j,i]))
-                    fd.write(struct.pack(">f", var.jj[1,k,j,i]))
-                    fd.write(struct.pack(">f", var.jj[2,k,j,i]))
-    except:
-        pass
-        
-    try:
-        index = variables.index('j_mag')
-        j_mag = np.sqrt(pc.dot2(var.jj))
-        print('writing j_mag')
-        fd.write('SCALARS j_mag float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", j_mag[k,j,i]))
-    except:
-        pass
-    
-    try:
-        index = variables.index('aa')
-        print('writing aa')
-        fd.write('VECTORS afield float\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.aa[0,k,j,i]))
-                    fd.write(struct.pack(">f", var.aa[1,k,j,i]))
-                    fd.write(struct.pack(">f", var.aa[2,k,j,i]))
-    except:
-        pass
-    
-    try:
-        index = variables.index('ab')
-        ab = pc.dot(var.aa, var.bb)
-        print('writing ab')
-        fd.write('SCALARS ab float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", ab[k,j,i]))
-    except:
-        pass
-    
-    try:
-        index = variables.index('TT')
-        print('writing TT')
-        fd.write('SCALARS TT float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.TT[k,j,i]))
-    except:
-        pass
-
-    try:
-        index = variables.index('lnTT')
-        print('writing lnTT')
-        fd.write('SCALARS lnTT float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.lnTT[k,j,i]))
-    except:
-        pass
-                    
-    try:
-        index = variables.index('cc')
-        print('writing cc')
-        fd.write('SCALARS cc float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.cc[k,j,i]))
-    except:
-        pass
-
-    try:
-        index = variables.index('lncc')
-        print('writing lncc')
-        fd.write('SCALARS lncc float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.lncc[k,j,i]))                    
-    except:
-        pass
-    
-    try:
-        index = variables.index('ss')
-        print('writing ss')
-        fd.write('SCALARS ss float\n'.encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.ss[k,j,i]))                    
-    except:
-        pass
-      
-    try:
-        index = variables.index('vort')
-        print('writing vort')
-        fd.write('VECTORS vorticity float\n'.encode('utf-8'))
-        for k in range(dimz):
-            for j in range(dimy):
-                for i in range(dimx):
-                    fd.write(struct.pack(">f", var.vort[0,k,j,i]))
-                    fd.write(struct.pack(">f", var.vort[1,k,j,i]))
-                    fd.write(struct.pack(">f", var.vort[2,k,j,i]))
-    except:
-        pass
+      *n_proc*:
+        Number of pieces written in parallel for 'pvti'.
+    """
 
-    del(var)
-    
-    fd.close()
+    fields, origin, spacing, procs = _read_var_fields(varfile, datadir, proc,
+                                                      variables, magic, b_ext, quiet)
+    _write_structured(destination, fields, origin, spacing, 'VAR files',
+                      file_format, compression, procs, n_proc)
 
 
 
 # Convert var files into vtk format and make video
 def pc2vtk_vid(ti = 0, tf = 1, datadir = 'data/', proc = -1,
            variables = ['rho','uu','bb'], magic = [], b_ext = False,
-           destination = 'animation', quiet = True):
+           destination = 'animation', quiet = True, file_format = 'vtk',
+           compression = None, n_proc = 1):
     """
     Convert data from PencilCode format to vtk.
 
@@ -325,7 +81,8 @@ def pc2vtk_vid(ti = 0, tf = 1, datadir = 'data/', proc = -1,
     
       pc2vtk(ti = 0, tf = 1, datadir = 'data/', proc = -1,
            variables = ['rho','uu','bb'], magic = [],
-           destination = 'animation')
+           destination = 'animation', file_format = 'vtk',
+           compression = None, n_proc = 1)
     
     Read *varfile* and convert its content into vtk format. Write the result
     in *destination*.
@@ -354,10 +111,38 @@ def pc2vtk_vid(ti = 0, tf = 1, datadir = 'data/', proc = -1,
         Add the external magnetic field.
         
       *destination*:
-        Destination files without '.vtk' extension. 
+        Destination files without extension.
         
       *quiet*:
         Keep quiet when reading the var files.
+
+      *file_format*: [ 'vtk', 'vti', 'pvti' ]
+        Legacy binary vtk, XML image data or XML image data with one
+        piece for each processor of the run.
+
+      *compression*: [ None, 'zlib', 'lz4' ]
+        Compression of the appended data in XML files.
+
+      *n_proc*:
+        Number of pieces written in parallel for 'pvti'.
+    """
+
+    for i in range(ti,tf+1):
+        varfile = 'VAR' + str(i)
+        fields, origin, spacing, procs = _read_var_fields(varfile, datadir, proc,
+                                                          variables, magic, b_ext, quiet)
+        _write_structured(destination + str(i), fields, origin, spacing,
+                          'density + magnetic field', file_format, compression,
+                          procs, n_proc)
+
+
+
+# Read a var file and return the fields to be written.
+def _read_var_fields(varfile, datadir, proc, variables, magic, b_ext, quiet):
+    """
+    Read *varfile* and return the list of (name, data) of the *variables*
+    in the order of the vtk files, the origin, the spacing and the
+    processor layout.
     """
 
     # this should correct for the case the user type only one variable
@@ -368,267 +153,382 @@ def pc2vtk_vid(ti = 0, tf = 1, datadir = 'data/', proc = -1,
     if (len(magic) > 0):
         if (len(magic[0]) == 1):
             magic = [magic]
-        
+    magic = list(magic)
+
     # make sure magic is set when writing 'vort' or 'bb'
-    try:
-        index = variables.index('vort')
+    if 'vort' in variables:
         magic.append('vort')
-    except:
-        pass      
-    try:
-        index = variables.index('bb')
+    if ('bb' in variables) or ('b_mag' in variables) or ('ab' in variables):
         magic.append('bb')
-    except:
-        pass
-    try:
-        index = variables.index('b_mag')
-        magic.append('bb')
-    except:
-        pass
-    try:
-        index = variables.index('jj')
-        magic.append('jj')
-    except:
-        pass
-    try:
-        index = variables.index('j_mag')
+    if ('jj' in variables) or ('j_mag' in variables):
         magic.append('jj')
-    except:
-        pass
 
-    for i in range(ti,tf+1):
-        varfile = 'VAR' + str(i)
-        # reading pc variables and setting dimensions
-        var = pc.read_var(varfile = varfile, datadir = datadir, proc = proc,
-                        magic = magic, trimall = True, quiet = quiet)
-                        
-        grid = pc.read_grid(datadir = datadir, proc = proc, trim = True, quiet = True)
-        
-        params = pc.read_param(param2 = True, quiet = True)
-        B_ext = np.array(params.b_ext)    
-        # add external magnetic field
-        if (b_ext == True):
-            var.bb[0,...] += B_ext[0]
-            var.bb[1,...] += B_ext[1]
-            var.bb[2,...] += B_ext[2]
-            
-        dimx = len(grid.x)
-        dimy = len(grid.y)
-        dimz = len(grid.z)
-        dim = dimx * dimy * dimz
-        dx = (np.max(grid.x) - np.min(grid.x))/(dimx-1)
-        dy = (np.max(grid.y) - np.min(grid.y))/(dimy-1)
-        dz = (np.max(grid.z) - np.min(grid.z))/(dimz-1)
-        
-        #fd = open(destination + "{0:1.0f}".format(var.t*1e5) + '.vtk', 'wb')
-        fd = open(destination + str(i) + '.vtk', 'wb')
-        fd.write('# vtk DataFile Version 2.0\n'.encode('utf-8'))
-        fd.write('density + magnetic field\n'.encode('utf-8'))
-        fd.write('BINARY\n'.encode('utf-8'))
-        fd.write('DATASET STRUCTURED_POINTS\n'.encode('utf-8'))
-        fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(dimx, dimy, dimz).encode('utf-8'))
-        fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(grid.x[0], grid.y[0], grid.z[0]).encode('utf-8'))
-        fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(dx, dy, dz).encode('utf-8'))
-        fd.write('POINT_DATA {0:9}\n'.format(dim).encode('utf-8'))
-              
-        try:
-            index = variables.index('rho')
-            print('writing rho')
-            fd.write('SCALARS rho float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.rho[k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('lnrho')
-            print('writing lnrho')
-            fd.write('SCALARS lnrho float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.lnrho[k,j,i]))
-        except:
-            pass
+    # reading pc variables and setting dimensions
+    var = pc.read_var(varfile = varfile, datadir = datadir, proc = proc,
+                    magic = magic, trimall = True, quiet = quiet)
                     
-        try:
-            index = variables.index('uu')
-            print('writing uu')
-            fd.write('VECTORS vfield float\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.uu[0,k,j,i]))
-                        fd.write(struct.pack(">f", var.uu[1,k,j,i]))
-                        fd.write(struct.pack(">f", var.uu[2,k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('bb')
-            print('writing bb')
-            fd.write('VECTORS bfield float\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.bb[0,k,j,i]))
-                        fd.write(struct.pack(">f", var.bb[1,k,j,i]))
-                        fd.write(struct.pack(">f", var.bb[2,k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('b_mag')
-            b_mag = np.sqrt(pc.dot2(var.bb))
-            print('writing b_mag')
-            fd.write('SCALARS b_mag float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", b_mag[k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('jj')
-            print('writing jj')
-            fd.write('VECTORS jfield float\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.jj[0,k,j,i]))
-                        fd.write(struct.pack(">f", var.jj[1,k,j,i]))
-                        fd.write(struct.pack(">f", var.jj[2,k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('j_mag')
-            j_mag = np.sqrt(pc.dot2(var.jj))
-            print('writing j_mag')
-            fd.write('SCALARS j_mag float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", j_mag[k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('aa')
-            print('writing aa')
-            fd.write('VECTORS afield float\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.aa[0,k,j,i]))
-                        fd.write(struct.pack(">f", var.aa[1,k,j,i]))
-                        fd.write(struct.pack(">f", var.aa[2,k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('ab')
-            ab = pc.dot(var.aa, var.bb)
-            print('writing ab')
-            fd.write('SCALARS ab float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", ab[k,j,i]))
-        except:
-            pass
-        
-        try:
-            index = variables.index('TT')
-            print('writing TT')
-            fd.write('SCALARS TT float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.TT[k,j,i]))
-        except:
-            pass
+    grid = pc.read_grid(datadir = datadir, proc = proc, trim = True, quiet = True)
+    dim = pc.read_dim(datadir = datadir, proc = proc)
+    
+    params = pc.read_param(param2 = True, quiet = True)
+    B_ext = np.array(params.b_ext)    
+    # add external magnetic field
+    if (b_ext == True):
+        var.bb[0,...] += B_ext[0]
+        var.bb[1,...] += B_ext[1]
+        var.bb[2,...] += B_ext[2]
 
-        try:
-            index = variables.index('lnTT')
-            print('writing lnTT')
-            fd.write('SCALARS lnTT float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.lnTT[k,j,i]))
-        except:
-            pass
+    origin = (grid.x[0], grid.y[0], grid.z[0])
+    spacing = tuple((np.max(q) - np.min(q))/max(len(q)-1, 1)
+                    for q in [grid.x, grid.y, grid.z])
+    if proc < 0:
+        procs = (dim.nprocx, dim.nprocy, dim.nprocz)
+    else:
+        procs = (1, 1, 1)
 
+    # vtk names of the variables, vector fields are [3, nz, ny, nx] arrays
+    fields = []
+    for variable in _var_names:
+        if variable not in variables:
+            continue
         try:
-            index = variables.index('cc')
-            print('writing cc')
-            fd.write('SCALARS cc float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.cc[k,j,i]))
+            if variable == 'b_mag':
+                data = np.sqrt(pc.dot2(var.bb))
+            elif variable == 'j_mag':
+                data = np.sqrt(pc.dot2(var.jj))
+            elif variable == 'ab':
+                data = pc.dot(var.aa, var.bb)
+            else:
+                data = getattr(var, variable)
         except:
-            pass
+            continue
+        print('writing ' + variable)
+        fields.append((_vtk_names.get(variable, variable), data))
 
-        try:
-            index = variables.index('lncc')
-            print('writing lncc')
-            fd.write('SCALARS lncc float\n'.encode('utf-8'))
-            fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.lncc[k,j,i]))                    
-        except:
-            pass
-        
-        try:
-            index = variables.index('ss')
-            print('writing ss')
-            fd.write('SCALARS ss float\n'.encode('utf-8'))
+    del(var)
+    return fields, origin, spacing, procs
+
+
+# Variables which can be written from var files and the names of the vector
+# fields in the vtk files.
+_var_names = ['rho', 'lnrho', 'uu', 'bb', 'b_mag', 'jj', 'j_mag', 'aa', 'ab',
+              'TT', 'lnTT', 'cc', 'lncc', 'ss', 'vort']
+_vtk_names = {'uu': 'vfield', 'bb': 'bfield', 'jj': 'jfield', 'aa': 'afield',
+              'vort': 'vorticity'}
+
+
+
+# Write fields into a vtk file of the given format.
+def _write_structured(destination, fields, origin, spacing, title, file_format,
+                      compression, procs=(1, 1, 1), n_proc=1):
+    """
+    Write the fields in *file_format* into *destination* plus extension.
+    """
+
+    if file_format == 'vtk':
+        write_vtk(destination + '.vtk', fields, origin, spacing, title = title)
+    elif file_format == 'vti':
+        write_vti(destination + '.vti', fields, origin, spacing,
+                  compression = compression)
+    elif file_format == 'pvti':
+        write_pvti(destination, fields, origin, spacing, procs = procs,
+                   compression = compression, n_proc = n_proc)
+    else:
+        print("error: unknown file format '{0}'".format(file_format))
+        raise ValueError
+
+
+
+# Write fields into a legacy binary vtk file.
+def write_vtk(destination, fields, origin, spacing, title = 'VAR files'):
+    """
+    Write fields into a legacy binary vtk file of structured points.
+
+    call signature::
+
+      write_vtk(destination, fields, origin, spacing, title = 'VAR files')
+
+    Keyword arguments:
+
+      *destination*:
+        Destination file.
+
+      *fields*:
+        List of (name, data) with scalar data of shape [nz, ny, nx] and
+        vector data of shape [3, nz, ny, nx].
+
+      *origin*:
+        Coordinates of the first point.
+
+      *spacing*:
+        Grid spacing in x, y and z.
+
+      *title*:
+        Title in the file header.
+    """
+
+    dimz, dimy, dimx = np.shape(fields[0][1])[-3:]
+
+    fd = open(destination, 'wb')
+    fd.write('# vtk DataFile Version 2.0\n'.encode('utf-8'))
+    fd.write((title + '\n').encode('utf-8'))
+    fd.write('BINARY\n'.encode('utf-8'))
+    fd.write('DATASET STRUCTURED_POINTS\n'.encode('utf-8'))
+    fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(dimx, dimy, dimz).encode('utf-8'))
+    fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(*[float(o) for o in origin]).encode('utf-8'))
+    fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(*[float(d) for d in spacing]).encode('utf-8'))
+    fd.write('POINT_DATA {0:9}\n'.format(dimx*dimy*dimz).encode('utf-8'))
+
+    # Write each field with a single byte swapping copy.
+    for name, data in fields:
+        data = np.asarray(data)
+        if data.ndim == 4:
+            fd.write(('VECTORS ' + name + ' float\n').encode('utf-8'))
+            fd.flush()
+            np.moveaxis(data, 0, -1).astype('>f4', order = 'C').tofile(fd)
+        else:
+            fd.write(('SCALARS ' + name + ' float\n').encode('utf-8'))
             fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.ss[k,j,i]))                    
-        except:
-            pass
+            fd.flush()
+            data.astype('>f4', order = 'C').tofile(fd)
+
+    fd.close()
+
+
+
+# Write fields into an XML vtk image data file.
+def write_vti(destination, fields, origin, spacing, compression = None,
+              extent = None, whole_extent = None):
+    """
+    Write fields into an XML vtk image data file with appended binary data.
+
+    call signature::
+
+      write_vti(destination, fields, origin, spacing, compression = None,
+                extent = None, whole_extent = None)
+
+    Keyword arguments:
+
+      *destination*:
+        Destination file.
+
+      *fields*:
+        List of (name, data) with scalar data of shape [nz, ny, nx] and
+        vector data of shape [3, nz, ny, nx].
+
+      *origin*:
+        Coordinates of the point with index 0.
+
+      *spacing*:
+        Grid spacing in x, y and z.
+
+      *compression*: [ None, 'zlib', 'lz4' ]
+        Compression of the appended data.
+
+      *extent*:
+        Index range [x0, x1, y0, y1, z0, z1] of this piece.
+        Defaults to the whole data.
+
+      *whole_extent*:
+        Index range of the whole data set. Defaults to extent.
+    """
+
+    dimz, dimy, dimx = np.shape(fields[0][1])[-3:]
+    if extent is None:
+        extent = [0, dimx-1, 0, dimy-1, 0, dimz-1]
+    if whole_extent is None:
+        whole_extent = extent
+    compressor, arrays = _appended_arrays(fields, compression)
+
+    xml = '<?xml version="1.0"?>\n'
+    xml += '<VTKFile type="ImageData" version="1.0" byte_order="LittleEndian" header_type="UInt64"'
+    if compressor:
+        xml += ' compressor="{0}"'.format(compressor)
+    xml += '>\n'
+    xml += '  <ImageData WholeExtent="{0}" Origin="{1}" Spacing="{2}">\n'.format(
+           _join(whole_extent), _join(origin), _join(spacing))
+    xml += '    <Piece Extent="{0}">\n'.format(_join(extent))
+    xml += '      <PointData{0}>\n'.format(_attributes(arrays))
+    offset = 0
+    for name, n_comp, header, blocks in arrays:
+        xml += '        <DataArray type="Float32" Name="{0}" NumberOfComponents="{1}" ' \
+               'format="appended" offset="{2}"/>\n'.format(name, n_comp, offset)
+        offset += header.nbytes + sum([memoryview(block).nbytes for block in blocks])
+    xml += '      </PointData>\n'
+    xml += '    </Piece>\n'
+    xml += '  </ImageData>\n'
+    xml += '  <AppendedData encoding="raw">\n'
+
+    fd = open(destination, 'wb')
+    fd.write((xml + '_').encode('utf-8'))
+    for name, n_comp, header, blocks in arrays:
+        fd.write(header)
+        for block in blocks:
+            fd.write(block)
+    fd.write('\n  </AppendedData>\n</VTKFile>\n'.encode('utf-8'))
+    fd.close()
+
+
 
+# Write fields into XML vtk image data pieces and their parallel header.
+def write_pvti(destination, fields, origin, spacing, procs = (1, 1, 1),
+               compression = None, n_proc = 1):
+    """
+    Write fields into one XML image data piece per processor and a
+    parallel image data file *destination*.pvti which collects them.
+    The pieces are called *destination*_<piece>.vti.
+
+    call signature::
+
+      write_pvti(destination, fields, origin, spacing, procs = (1, 1, 1),
+                 compression = None, n_proc = 1)
+
+    Keyword arguments:
+
+      *destination*:
+        Destination files without extension.
+
+      *fields*:
+        List of (name, data) with scalar data of shape [nz, ny, nx] and
+        vector data of shape [3, nz, ny, nx].
+
+      *origin*:
+        Coordinates of the first point.
+
+      *spacing*:
+        Grid spacing in x, y and z.
+
+      *procs*:
+        Number of pieces in x, y and z, e.g. nprocx, nprocy, nprocz.
+
+      *compression*: [ None, 'zlib', 'lz4' ]
+        Compression of the appended data.
+
+      *n_proc*:
+        Number of pieces written in parallel.
+    """
+
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    dimz, dimy, dimx = np.shape(fields[0][1])[-3:]
+    whole_extent = [0, dimx-1, 0, dimy-1, 0, dimz-1]
+
+    # Neighbouring pieces share one layer of points.
+    edges = []
+    for n, n_pieces in zip([dimx, dimy, dimz], procs):
+        n_pieces = max(min(int(n_pieces), n-1), 1)
+        edges.append(np.round(np.linspace(0, n-1, n_pieces+1)).astype(int))
+    extents = []
+    for iz in range(len(edges[2])-1):
+        for iy in range(len(edges[1])-1):
+            for ix in range(len(edges[0])-1):
+                extents.append([edges[0][ix], edges[0][ix+1], edges[1][iy],
+                                edges[1][iy+1], edges[2][iz], edges[2][iz+1]])
+
+    def write_piece(i_piece):
+        e = extents[i_piece]
+        piece = [(name, np.asarray(data)[..., e[4]:e[5]+1, e[2]:e[3]+1, e[0]:e[1]+1])
+                 for name, data in fields]
+        write_vti(destination + '_{0}.vti'.format(i_piece), piece, origin,
+                  spacing, compression = compression, extent = e,
+                  whole_extent = whole_extent)
+
+    with ThreadPoolExecutor(max_workers = n_proc) as executor:
+        list(executor.map(write_piece, range(len(extents))))
+
+    arrays = [(name, 3 if np.ndim(data) == 4 else 1, None, None)
+              for name, data in fields]
+    xml = '<?xml version="1.0"?>\n'
+    xml += '<VTKFile type="PImageData" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+    xml += '  <PImageData WholeExtent="{0}" GhostLevel="0" Origin="{1}" Spacing="{2}">\n'.format(
+           _join(whole_extent), _join(origin), _join(spacing))
+    xml += '    <PPointData{0}>\n'.format(_attributes(arrays))
+    for name, n_comp, header, blocks in arrays:
+        xml += '      <PDataArray type="Float32" Name="{0}" NumberOfComponents="{1}"/>\n'.format(name, n_comp)
+    xml += '    </PPointData>\n'
+    for i_piece, e in enumerate(extents):
+        xml += '    <Piece Extent="{0}" Source="{1}"/>\n'.format(
+               _join(e), os.path.basename(destination) + '_{0}.vti'.format(i_piece))
+    xml += '  </PImageData>\n'
+    xml += '</VTKFile>\n'
+
+    fd = open(destination + '.pvti', 'w')
+    fd.write(xml)
+    fd.close()
+
+
+
+# Convert the fields into the blocks of appended XML data.
+def _appended_arrays(fields, compression, block_size = 2**20):
+    """
+    Return the vtk compressor name and a list of (name, components, header,
+    blocks) for each field.
+    """
+
+    if compression is None:
+        compressor = ''
+    elif compression == 'zlib':
+        import zlib
+        compressor = 'vtkZLibDataCompressor'
+        compress = zlib.compress
+    elif compression == 'lz4':
         try:
-            index = variables.index('vort')
-            print('writing vort')
-            fd.write('VECTORS vorticity float\n'.encode('utf-8'))
-            for k in range(dimz):
-                for j in range(dimy):
-                    for i in range(dimx):
-                        fd.write(struct.pack(">f", var.vort[0,k,j,i]))
-                        fd.write(struct.pack(">f", var.vort[1,k,j,i]))
-                        fd.write(struct.pack(">f", var.vort[2,k,j,i]))
-        except:
-            pass
-      
-        del(var)
-        
-        fd.close()
+            import lz4.block
+        except ImportError:
+            print("error: lz4 compression needs the lz4 library")
+            raise ValueError
+        compressor = 'vtkLZ4DataCompressor'
+        compress = lambda block: lz4.block.compress(block, store_size = False)
+    else:
+        print("error: unknown compression '{0}'".format(compression))
+        raise ValueError
+
+    arrays = []
+    for name, data in fields:
+        data = np.asarray(data)
+        n_comp = 1
+        if data.ndim == 4:
+            n_comp = 3
+            data = np.moveaxis(data, 0, -1)
+        data = np.ascontiguousarray(data, dtype = '<f4')
+        if compression is None:
+            header = np.array([data.nbytes], dtype = '<u8')
+            blocks = [data]
+        else:
+            raw = memoryview(data).cast('B')
+            blocks = [compress(raw[i:i+block_size]) for i in range(0, len(raw), block_size)]
+            last = len(raw) - (len(blocks)-1)*block_size
+            header = np.array([len(blocks), block_size, last] + [len(block) for block in blocks],
+                              dtype = '<u8')
+        arrays.append((name, n_comp, header, blocks))
+    return compressor, arrays
+
+
+def _join(values):
+    return ' '.join([str(v) for v in values])
+
+
+def _attributes(arrays):
+    """
+    Return the attributes naming the active scalars and vectors.
+    """
+
+    attributes = ''
+    scalars = [a[0] for a in arrays if a[1] == 1]
+    vectors = [a[0] for a in arrays if a[1] == 3]
+    if scalars:
+        attributes += ' Scalars="{0}"'.format(scalars[0])
+    if vectors:
+        attributes += ' Vectors="{0}"'.format(vectors[0])
+    return attributes
 
 
 
 # Convert PencilCode slices to vtk.
 def slices2vtk(variables = ['rho'], extensions = ['xy', 'xy2', 'xz', 'yz'],
            datadir = 'data/', destination = 'slices', proc = -1,
-           format = 'native'):
+           format = 'native', file_format = 'vtk', compression = None):
     """
     Convert slices from PencilCode format to vtk.
 
@@ -636,7 +536,7 @@ def slices2vtk(variables = ['rho'], extensions = ['xy', 'xy2', 'xz', 'yz'],
     
       slices2vtk(variables = ['rho'], extensions = ['xy', 'xy2', 'xz', 'yz'],
            datadir = 'data/', destination = 'slices', proc = -1,
-           format = 'native'):
+           format = 'native', file_format = 'vtk', compression = None):
     
     Read slice files specified by *variables* and convert
     them into vtk format for the specified extensions.
@@ -663,6 +563,12 @@ def slices2vtk(variables = ['rho'], extensions = ['xy', 'xy2', 'xz', 'yz'],
       
       *format*:
         Endian, one of little, big, or native (default)
+
+      *file_format*: [ 'vtk', 'vti' ]
+        Legacy binary vtk or XML image data.
+
+      *compression*: [ None, 'zlib', 'lz4' ]
+        Compression of the appended data in XML files.
        
     """
 
@@ -713,51 +619,36 @@ def slices2vtk(variables = ['rho'], extensions = ['xy', 'xy2', 'xz', 'yz'],
                 z0 = grid.z[int(len(grid.z)/2)]
 
             for i in range(slices.shape[0]):
-                # open the destination file for writing
-                fd = open(destination + '_' + field + '_' + ext + '_' + str(i) + '.vtk', 'wb')
-
-                # write the header
-                fd.write('# vtk DataFile Version 2.0\n')
-                fd.write(field + '_' + ext + '\n')
-                fd.write('BINARY\n') 
-                fd.write('DATASET STRUCTURED_POINTS\n')
                 if ext[0:2] == 'xy':
                     x0 = grid.x[0]; y0 = grid.y[0]
-                    fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(dim_p, dim_q, 1))
-                    fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(x0, y0, z0))
-                    fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(grid.dx, grid.dy, 1.))
+                    data = slices[i].reshape(1, dim_q, dim_p)
+                    spacing = (grid.dx, grid.dy, 1.)
                 elif ext[0:2] == 'xz':
                     x0 = grid.x[0]; z0 = grid.z[0]
-                    fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(dim_p, 1, dim_q))
-                    fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(x0, y0, z0))
-                    fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(grid.dx, 1., grid.dy))
+                    data = slices[i].reshape(dim_q, 1, dim_p)
+                    spacing = (grid.dx, 1., grid.dy)
                 elif ext[0:2] == 'yz':
                     y0 = grid.y[0]; z0 = grid.z[0]
-                    fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(1, dim_p, dim_q))
-                    fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(x0, y0, z0))
-                    fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(1., grid.dy, grid.dy))                                        
-                fd.write('POINT_DATA {0:9}\n'.format(dim_p * dim_q))
-        
-                fd.write('SCALARS ' + field + '_' + ext + ' float\n')
-                fd.write('LOOKUP_TABLE default\n')        
-                for j in range(dim_q):
-                    for k in range(dim_p):
-                            fd.write(struct.pack(">f", slices[i,j,k]))
-                                
-                fd.close()
+                    data = slices[i].reshape(dim_q, dim_p, 1)
+                    spacing = (1., grid.dy, grid.dy)
+                _write_structured(destination + '_' + field + '_' + ext + '_' + str(i),
+                                  [(field + '_' + ext, data)], (x0, y0, z0), spacing,
+                                  field + '_' + ext, file_format, compression)
 
 
 
 # Convert PencilCode average file to vtk.
 def aver2vtk(varfile = 'xyaverages.dat', datadir = 'data/',
-            destination = 'xyaverages', quiet = 1):
+            destination = 'xyaverages', quiet = 1, file_format = 'vtk',
+            compression = None):
     """
     Convert average data from PencilCode format to vtk.
 
     call signature::
     
       aver2vtk(varfile = 'xyaverages.dat', datadir = 'data/',
-            destination = 'xyaverages', quiet = 1):
+            destination = 'xyaverages', quiet = 1, file_format = 'vtk',
+            compression = None):
 
     Read the average file specified in *varfile* and convert the data
     into vtk format.
@@ -773,7 +664,13 @@ def aver2vtk(varfile = 'xyaverages.dat', datadir = 'data/',
         Directory where the data is stored.
        
       *destination*:
-        Destination file.
+        Destination file without extension.
+
+      *file_format*: [ 'vtk', 'vti' ]
+        Legacy binary vtk or XML image data.
+
+      *compression*: [ None, 'zlib', 'lz4' ]
+        Compression of the appended data in XML files.
                
     """
 
@@ -800,44 +697,31 @@ def aver2vtk(varfile = 'xyaverages.dat', datadir = 'data/',
         print("aver2vtk: ERROR: cannot determine average file\n")
         print("aver2vtk: The name of the file has to be either xyaver.dat, xzaver.dat or yzaver.dat\n")
         return -1
-    keys = aver.__dict__.keys()
+    keys = list(aver.__dict__.keys())
     t = aver.t
     keys.remove('t')
-    
-    # open the destination file
-    fd = open(destination + '.vtk', 'wb')
-    
-    fd.write('# vtk DataFile Version 2.0\n'.encode('utf-8'))
-    fd.write(varfile[0:2] + 'averages\n'.encode('utf-8'))
-    fd.write('BINARY\n'.encode('utf-8'))
-    fd.write('DATASET STRUCTURED_POINTS\n'.encode('utf-8'))
-    fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(len(t), line_len, 1).encode('utf-8'))
-    fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(float(t[0]), l0, 0.).encode('utf-8'))
-    fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(t[1]-t[0], dl, 1.).encode('utf-8'))
-    fd.write('POINT_DATA {0:9}\n'.format(len(t) * line_len))
-                
-    # run through all variables
-    for var in keys:
-        fd.write(('SCALARS ' + var + ' float\n').encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        for j in range(line_len):
-            for i in range(len(t)):
-                    fd.write(struct.pack(">f", aver.__dict__[var][i,j]))
-                                
-    fd.close()
+
+    # the time runs along x and the averaged direction along y
+    fields = [(var, aver.__dict__[var][:, :line_len].T.reshape(1, line_len, len(t)))
+              for var in keys]
+    _write_structured(destination, fields, (float(t[0]), l0, 0.),
+                      (t[1]-t[0], dl, 1.), varfile[0:2] + 'averages',
+                      file_format, compression)
 
 
 
 # Convert PencilCode power spectra to vtk.
 def power2vtk(powerfiles = ['power_mag.dat'],
-            datadir = 'data/', destination = 'power', thickness = 1):
+            datadir = 'data/', destination = 'power', thickness = 1,
+            file_format = 'vtk', compression = None):
     """
     Convert power spectra from PencilCode format to vtk.
 
     call signature::
     
       power2vtk(powerfiles = ['power_mag.dat'],
-            datadir = 'data/', destination = 'power.vtk', thickness = 1):
+            datadir = 'data/', destination = 'power', thickness = 1,
+            file_format = 'vtk', compression = None):
     
     Read the power spectra stored in the power*.dat files
     and convert them into vtk format.
@@ -858,6 +742,12 @@ def power2vtk(powerfiles = ['power_mag.dat'],
         Dimension in z-direction. Setting it 2 will create n*m*2 dimensional
         array of data. This is useful in Paraview for visualizing the spectrum
         in 3 dimensions. Note that this will simply double the amount of data.
+
+      *file_format*: [ 'vtk', 'vti' ]
+        Legacy binary vtk or XML image data.
+
+      *compression*: [ None, 'zlib', 'lz4' ]
+        Compression of the appended data in XML files.
                
     """
 
@@ -874,42 +764,20 @@ def power2vtk(powerfiles = ['power_mag.dat'],
     # leave dk to 1 now, will fix this later
     dk = 1.
     
-    # open the destination file
-    fd = open(destination + '.vtk', 'wb')
-    
     # read the first power spectrum
     t, power = pc.read_power(datadir + powerfiles[0])
-    
-    fd.write('# vtk DataFile Version 2.0\n'.encode('utf-8'))
-    fd.write('power spectra\n'.encode('utf-8'))
-    fd.write('BINARY\n'.encode('utf-8'))
-    fd.write('DATASET STRUCTURED_POINTS\n'.encode('utf-8'))
-    if (thickness == 1):
-        fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(len(t), power.shape[1], 1).encode('utf-8'))
-    else:
-        fd.write('DIMENSIONS {0:9} {1:9} {2:9}\n'.format(len(t), power.shape[1], 2).encode('utf-8'))
-    fd.write('ORIGIN {0:8.12} {1:8.12} {2:8.12}\n'.format(float(t[0]), k0, 0.).encode('utf-8'))
-    fd.write('SPACING {0:8.12} {1:8.12} {2:8.12}\n'.format(t[1]-t[0], dk, 1.).encode('utf-8'))
+
+    # the time runs along x and the wave number along y
     if (thickness == 1):
-        fd.write('POINT_DATA {0:9}\n'.format(power.shape[0] * power.shape[1]).encode('utf-8'))
+        n_thick = 1
     else:
-        fd.write('POINT_DATA {0:9}\n'.format(power.shape[0] * power.shape[1] * 2).encode('utf-8'))
-    
+        n_thick = 2
+    fields = []
     for powfile in powerfiles:
         # read the power spectrum
         t, power = pc.read_power(datadir + powfile)
+        fields.append((powfile[:-4], np.array([power.T]*n_thick)))
 
-        fd.write(('SCALARS ' + powfile[:-4] + ' float\n').encode('utf-8'))
-        fd.write('LOOKUP_TABLE default\n'.encode('utf-8'))
-        
-        if (thickness == 1):
-            for j in range(power.shape[1]):
-                for i in range(len(t)):
-                        fd.write(struct.pack(">f", power[i,j]))
-        else:
-            for k in [1,2]:
-                for j in range(power.shape[1]):
-                    for i in range(len(t)):
-                            fd.write(struct.pack(">f", power[i,j]))
-                                
-    fd.close()
+    _write_structured(destination, fields, (float(t[0]), k0, 0.),
+                      (t[1]-t[0], dk, 1.), 'power spectra', file_format,
+                      compression)
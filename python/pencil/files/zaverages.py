@@ -42,10 +42,60 @@ class ZAverage():
 
     self.__read_deltay = read_deltay
 
+    # Locate the outputs with the record index shared with
+    # pencilnew.read.aver, cached in <filename>.idx.npz.
+    self.__index = None
+    self.__record = 0
+    if record_length == 4:
+      try:
+        from pencilnew.read.averages import aver_record_index
+        self.__index = aver_record_index(datadir+'/'+filename,
+                                         {'S': 'f', 'D': 'd'}[dim.precision],
+                                         deltay=read_deltay)
+      except ImportError:
+        pass
+
+
+  def __len__(self):
+
+    if self.__index is None: raise TypeError('ZAverage without record index')
+    return len(self.__index['t'])
+
+
+  def __getitem__(self, i):
+    from numpy import fromfile
+
+    if self.__index is None: raise TypeError('ZAverage without record index')
+    index = self.__index
+    if i < 0: i += len(index['t'])
+    if i < 0 or i >= len(index['t']): raise IndexError(i)
+
+    file = self.__file
+    file.seek(index['data_offset'][i])
+    data = fromfile(file, dtype=self.__dtype, count=self.__count).reshape(self.__shape, order='F')
+
+    zaver = zaverage()
+    zaver.t = index['t'][i]
+    if self.__read_deltay:
+      file.seek(index['deltay_offset'][i])
+      zaver.deltay = fromfile(file, dtype=self.__dtype, count=1)[0]
+    for j in range(len(self.__varnames)):
+      setattr(zaver, self.__varnames[j], data[:,:,j])
+
+    return zaver
+
 
   def next(self):
     from numpy import fromfile
 
+    if self.__index is not None:
+      if self.__record >= len(self.__index['t']): raise StopIteration
+      zaver = self[self.__record]
+      self.__record += 1
+      self.t = zaver.t
+      if self.__read_deltay: self.deltay = zaver.deltay
+      return zaver
+
     file = self.__file
     dtype = self.__dtype
     shape = self.__shape
@@ -74,6 +124,8 @@ class ZAverage():
 
     return zaver
 
+  __next__ = next
+
   def __iter__(self):
 
     return self
@@ -8,7 +8,7 @@
 # Author:
 # J. Aarnes (jorgenaarnes@gmail.com)
 #
-def twonorm_accuracy(simulations, field='ux', strip=0, varfile='ogvar.dat',direction='x',noerr=True):
+def twonorm_accuracy(simulations, field='ux', strip=0, varfile='ogvar.dat',direction='x',noerr=True,n_proc=1):
     """
     Assessment of accuracy of simulation:
     Computes the two-norm error of all available simulation, where the simulation
@@ -47,83 +47,21 @@ def twonorm_accuracy(simulations, field='ux', strip=0, varfile='ogvar.dat',direc
       set to false if you want to return an array of maximum error along strip, in 
       addition to the two-norm
 
+    *n_proc*:
+      number of simulations read concurrently, see accuracy_fields
+
+    The fields are read once by accuracy_fields and cached, so calling this
+    routine for several strips does not read the simulations again.
+
     Returns
       array of two-norms where the larges array is used as base 
     """
 
-    import numpy as np
-    import os as os
-    from pencilnew import read
-    from pencilnew import sim
-
-    # Find directories to include in accuracy assessment
-    sims = []
-    for simulation in simulations:
-        sims.append(sim.get(simulation,quiet=True))
-
-    # Sort runs by size of grid spacing
-    if(direction=='x' or direction=='r'):
-        sims = sim.sort(sims,'dx',reverse=True)
-    elif(direction=='y' or direction=='th'):
-        sims = sim.sort(sims,'dy',reverse=True)
-
-    # From this point we only need the varfile to compute accuracy
-    # Need to update dim to ogdim for reading of ogvar to be done
-    # correctly from simulation object
-    for i,thissim in enumerate(sims):
-        sims[i].dim = read.ogdim(datadir=thissim.datadir)
-        sims[i] = read.ogvar(sim=thissim,trimall=True)
-
-    # Check that increase in size is correct for use in two-norm calculation
-    nsims = len(sims)
-    nx_min = sims[0].r.size
-    ny_min = sims[0].th.size
-    for thissim in sims:
-        if((thissim.r.size-1)%(nx_min-1) != 0):
-            print('ERROR: Incorrect size in r-dir')
-            print('sims.r',thissim.r.size)
-            return False
-
-        if(thissim.th.size%ny_min != 0):
-            print('ERROR: Incorrect size in th-dir')
-            return False
-
-    # Now we are sure that first coordinate of r and th are the same for all runs
-    # Can compute the two-norms for increasing sizes. Use largest size as normalization of error
-    twonorms = np.zeros(nsims-1)
-    maxerrs = np.zeros(nsims-1)
-    if(direction=='x' or direction=='r'):
-        dh = sims[0].dx
-        n2_factor = int(dh/sims[-1].dx)
-    elif(direction=='y' or direction=='th'):
-        dh = sims[0].dy
-        n2_factor = int(dh/sims[-1].dy)
-
-    attribute = getattr(sims[-1],field)
-    if(field=='ux' or field=='uy'):
-        u2 = attribute[0::n2_factor,0::n2_factor]
-    else:
-        u2 = attribute[0,0::n2_factor,0::n2_factor]
-
-    strip=int(strip)
-    i = 0
-    for thissim in sims[:-1]:
-        if(direction=='x' or direction=='r'):
-            n2_factor = int(dh/thissim.dx)
-        elif(direction=='y' or direction=='th'):
-            n2_factor = int(dh/thissim.dy)
-        attribute = getattr(thissim,field)
-        if(field=='ux' or field=='uy'):
-            u1 = attribute[0::n2_factor,0::n2_factor]
-        else:
-            u1 = attribute[0,0::n2_factor,0::n2_factor]
-        if(direction=='x' or direction=='r'):
-           twonorms[i] = (twonorm(u1[:,strip],u2[:,strip],dh))
-           maxerrs[i] = (maxerror(u1[:,strip],u2[:,strip]))
-        elif(direction=='y' or direction=='th'):
-           twonorms[i] = (twonorm(u1[strip,:],u2[strip,:],dh))
-           maxerrs[i] = (maxerror(u1[strip,:],u2[strip,:]))
-        i = i + 1
+    fields = accuracy_fields(simulations, field=field, varfile=varfile, n_proc=n_proc)
+    result = _twonorm_strips(fields, [int(strip)], direction)
+    if result is False:
+        return False
+    twonorms, maxerrs = result[0][0], result[1][0]
 
     print('Two-norm computed for field:',field,', along strip:',strip)
     if(direction=='x'):
@@ -140,7 +78,7 @@ def twonorm_accuracy(simulations, field='ux', strip=0, varfile='ogvar.dat',direc
     else:
         return twonorms
 
-def order_accuracy(simulations=[], nstrips=0, twonorm_arr= [], field='ux', varfile='ogvar.dat',direction='x'):
+def order_accuracy(simulations=[], nstrips=0, twonorm_arr=[], field='ux', varfile='ogvar.dat',direction='x',n_proc=1):
     """
     Compute an estimate of the order of accuracy, using two-norms where 
     the finest grid is used as reference solution u_0.
@@ -170,34 +108,34 @@ def order_accuracy(simulations=[], nstrips=0, twonorm_arr= [], field='ux', varfi
 
     *direction*:
       compute two-norm along 'x' or 'y' direction
+
+    *n_proc*:
+      number of simulations read concurrently, see accuracy_fields
     """
     import numpy as np
 
-    if(twonorm_arr == []):
+    if(len(twonorm_arr) == 0):
         twonorm_arr = twonorm_array(simulations=simulations,nstrips=nstrips,field=field,
-                                    varfile=varfile,direction=direction)
+                                    varfile=varfile,direction=direction,n_proc=n_proc)
 
+    twonorm_arr = np.asarray(twonorm_arr)
     if(twonorm_arr[0,0]==0):
         print('Remove twonorms for strip=0, as these are zero for surface point velocity')
         twonorm_arr = twonorm_arr[1:,:]
 
-    nstrips, ntwonorms = twonorm_arr.shape
-    p_arr = np.empty([nstrips,ntwonorms-1])
-    
-    for i in range(ntwonorms-1):
-        p_arr[:,i] = np.log(twonorm_arr[:,i]/twonorm_arr[:,i+1])/np.log(2)
+    p_arr = np.log(twonorm_arr[:,:-1]/twonorm_arr[:,1:])/np.log(2)
 
     return p_arr
 
-    
-    return p_arr
 
-
-def twonorm_array(simulations, nstrips, field='ux', varfile='ogvar.dat',direction='x'):
+def twonorm_array(simulations, nstrips, field='ux', varfile='ogvar.dat',direction='x',noerr=True,n_proc=1):
     """
     Compute twonorm_accuracy along the selected direction, for a number of 'strips'.
     See twonorm_accuracy for details.
 
+    Each simulation is read once, and the two-norms of all strips are computed
+    in one pass over the stacked fields.
+
     call signature:
         twonorm_array(simulations,nstrips)
 
@@ -219,16 +157,129 @@ def twonorm_array(simulations, nstrips, field='ux', varfile='ogvar.dat',directio
 
     *direction*:
       compute two-norm along 'x' or 'y' direction
+
+    *noerr*:
+      set to false if you want to return the array of maximum errors along the
+      strips, in addition to the two-norms
+
+    *n_proc*:
+      number of simulations read concurrently, see accuracy_fields
+
+    Returns
+      array of two-norms of shape [nstrips, len(simulations)-1]
     """
-    import numpy as np
 
-    tn_arr = np.empty([nstrips,len(simulations)-1])
-    for i in range(nstrips):
-        tn_arr[i,:] = (twonorm_accuracy(simulations=simulations,field=field,
-                                        strip=i,varfile=varfile,direction=direction))
+    fields = accuracy_fields(simulations, field=field, varfile=varfile, n_proc=n_proc)
+    result = _twonorm_strips(fields, range(nstrips), direction)
+    if result is False:
+        return False
+    tn_arr, maxerr_arr = result
+
+    if not noerr:
+        return tn_arr, maxerr_arr
+    else:
+        return tn_arr
+
+
+def accuracy_study(simulations, nstrips, field='ux', varfile='ogvar.dat', directions=('x','y'), n_proc=1):
+    """
+    Compute the two-norms and orders of accuracy of a grid refinement study
+    along all strips, for each of the directions. The simulations are read
+    only once, for the variables needed by field.
+
+    call signature:
+        accuracy_study(simulations,nstrips)
+
+    Keyword arguments:
+
+    *simulations*
+      array of simulation names to be included in the computations
+
+    *nstrips*
+      number of strips along each direction
+
+    *field*
+      variable used in accuracy assessment
 
-    return tn_arr
+    *varfile*:
+      name of varfile to read from each sim
 
+    *directions*:
+      sequence of directions 'x'/'r' or 'y'/'th' along which the two-norms
+      are computed
+
+    *n_proc*:
+      number of simulations read concurrently, see accuracy_fields
+
+    Returns
+      dictionary with one entry (twonorms, p) for each direction, where
+      twonorms is the array returned by twonorm_array and p the array
+      returned by order_accuracy
+    """
+
+    fields = accuracy_fields(simulations, field=field, varfile=varfile, n_proc=n_proc)
+    study = {}
+    for direction in directions:
+        result = _twonorm_strips(fields, range(nstrips), direction)
+        if result is False:
+            return False
+        study[direction] = (result[0], order_accuracy(twonorm_arr=result[0]))
+
+    return study
+
+
+def accuracy_fields(simulations, field='ux', varfile='ogvar.dat', n_proc=1, cache=True):
+    """
+    Read the field used in the accuracy assessment from each simulation.
+    Only the variables needed are read, i.e. ur and uth for the cartesian
+    velocities ux and uy, and only at the first z index. The fields are
+    cached until the varfile of a simulation changes.
+
+    call signature:
+        accuracy_fields(simulations)
+
+    Keyword arguments:
+
+    *simulations*
+      array of simulation names or simulation objects
+
+    *field*
+      variable used in accuracy assessment, e.g. 'ux', 'uy', 'ur', 'uth'
+      or any variable of the index file
+
+    *varfile*:
+      name of varfile to read from each sim
+
+    *n_proc*:
+      number of simulations read concurrently
+
+    *cache*:
+      set to false to read the simulations even if they are cached
+
+    Returns
+      list of fields, one for each simulation, with the attributes r, th,
+      dx, dy and u, where u is the field of shape [th.size, r.size]
+      (th.size+1 for ux and uy, where the first theta point is repeated)
+    """
+
+    from pencilnew import sim
+
+    datadirs = []
+    for simulation in simulations:
+        if isinstance(simulation, str):
+            simulation = sim.get(simulation,quiet=True)
+        datadirs.append(simulation.datadir)
+
+    if n_proc > 1 and len(datadirs) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=n_proc) as executor:
+            n = len(datadirs)
+            fields = list(executor.map(_cached_field, datadirs, [field]*n,
+                                       [varfile]*n, [cache]*n))
+    else:
+        fields = [_cached_field(datadir, field, varfile, cache) for datadir in datadirs]
+
+    return fields
 
 
 def twonorm(u1,u2,dx):
@@ -253,3 +304,144 @@ def maxerror(u1,u2):
     diff = abs(diff)
 
     return max(diff)
+
+
+## fields read by accuracy_fields, keyed by (datadir, varfile, field)
+_FIELD_CACHE = {}
+
+
+class _AccuracyField(object):
+    """
+    Field of one simulation used in the accuracy assessment.
+    """
+
+    def __init__(self, r, th, dx, dy, u):
+        self.r = r
+        self.th = th
+        self.dx = dx
+        self.dy = dy
+        self.u = u
+
+
+def _cached_field(datadir, field, varfile, cache=True):
+    """
+    Return the field of datadir from the cache, or read it if the
+    varfile has been modified since it was cached.
+    """
+
+    import os
+    from glob import glob
+
+    datadir = os.path.realpath(os.path.expanduser(datadir))
+    files = sorted(glob(os.path.join(datadir, 'proc*', varfile)) +
+                   glob(os.path.join(datadir, 'allprocs', varfile+'*')))
+    stamp = tuple((f, os.path.getmtime(f)) for f in files)
+
+    key = (datadir, varfile, field)
+    if cache and key in _FIELD_CACHE and _FIELD_CACHE[key][0] == stamp:
+        return _FIELD_CACHE[key][1]
+
+    result = _read_field(datadir, field, varfile)
+    if cache:
+        _FIELD_CACHE[key] = (stamp, result)
+    return result
+
+
+def _read_field(datadir, field, varfile):
+    """
+    Read the plane at the first z index of field from the varfile in
+    datadir, transforming ur and uth to ux and uy like read.ogvar does.
+    """
+
+    import numpy as np
+    from pencilnew import read
+    from pencilnew.read.ogvar import ogDataCube
+
+    # The data cube is lazy, so only the variables indexed below are read.
+    var = ogDataCube()
+    var.read(var_file=varfile, datadir=datadir, trimall=True, lazy=True)
+    index = read.index(datadir=datadir)
+
+    def plane(ivar):
+        if var.f.ndim == 4:
+            return np.asarray(var.f[ivar-1, 0], dtype=np.float64)
+        return np.asarray(var.f[ivar-1], dtype=np.float64)
+
+    r, th = var.x, var.y
+    if field == 'ux' or field == 'uy':
+        ur = plane(index.ux)
+        uth = plane(index.uy)
+        cos = np.cos(th)[:, np.newaxis]
+        sin = np.sin(th)[:, np.newaxis]
+        if field == 'ux':
+            u = ur*cos - uth*sin
+        else:
+            u = ur*sin + uth*cos
+        u = np.concatenate([u, u[:1]])
+    elif field == 'ur':
+        u = plane(index.ux)
+    elif field == 'uth':
+        u = plane(index.uy)
+    elif hasattr(index, field):
+        u = plane(getattr(index, field))
+    else:
+        print('ERROR: Field '+field+' not found in '+datadir)
+        raise ValueError
+
+    return _AccuracyField(r, th, var.dx, var.dy, u)
+
+
+def _twonorm_strips(fields, strips, direction):
+    """
+    Compute the two-norms and maximum errors of the fields along the
+    strips, using the finest field as reference. Returns the arrays of
+    shape [len(strips), len(fields)-1], or False if the grids do not match.
+    """
+
+    import numpy as np
+
+    if(direction=='x' or direction=='r'):
+        spacing = 'dx'
+    elif(direction=='y' or direction=='th'):
+        spacing = 'dy'
+    else:
+        print('ERROR: Unknown direction '+str(direction))
+        raise ValueError
+
+    # Sort runs by size of grid spacing
+    fields = sorted(fields, key=lambda f: getattr(f, spacing), reverse=True)
+
+    # Check that increase in size is correct for use in two-norm calculation
+    nx_min = fields[0].r.size
+    ny_min = fields[0].th.size
+    for thisfield in fields:
+        if((thisfield.r.size-1)%(nx_min-1) != 0):
+            print('ERROR: Incorrect size in r-dir')
+            print('sims.r',thisfield.r.size)
+            return False
+
+        if(thisfield.th.size%ny_min != 0):
+            print('ERROR: Incorrect size in th-dir')
+            return False
+
+    # The fields are restricted to the coarsest grid and stacked, so the
+    # two-norms of all strips and runs are computed at once.
+    dh = getattr(fields[0], spacing)
+    def coarsen(thisfield):
+        n2_factor = int(round(dh/getattr(thisfield, spacing)))
+        return thisfield.u[0::n2_factor,0::n2_factor]
+
+    u2 = coarsen(fields[-1])
+    strips = np.asarray(strips, dtype=int)
+    diff = np.array([coarsen(thisfield) for thisfield in fields[:-1]]) - u2
+    if(spacing=='dx'):
+        diff = diff[:,:,strips]
+        axis = 1
+    else:
+        diff = diff[:,strips,:]
+        axis = 2
+
+    twonorms = np.sqrt(dh*np.sum(diff**2, axis=axis)).T
+    maxerrs = np.abs(diff).max(axis=axis).T
+
+    return twonorms, maxerrs
@@ -1,6 +1,7 @@
-def part_to_grid(xp, yp, zp=False, quantity=False, Nbins=[1024,1024,1024], sim=False, extent=False, fill_gaps=False):
+def part_to_grid(xp, yp, zp=False, quantity=False, Nbins=[1024,1024,1024], sim=False, extent=False, fill_gaps=False,
+                 scheme='ngp', periodic=None):
     """Bins quantity based on position data xp and yp to 1024^2 bins like a histrogram.
-    This method is not using TSC.
+    By default this method is not using TSC, but the nearest grid point.
 
     Args:
         - xp, yp:       array of x and y positions
@@ -11,6 +12,8 @@ def part_to_grid(xp, yp, zp=False, quantity=False, Nbins=[1024,1024,1024], sim=F
         - extent:       [[xmin, xmax],[ymin, ymax]] or set false and instead give a sim
                         set extent manually e.g. if you want to include ghost zones
         - fill_gaps     interpolate empty grid cells
+        - scheme:       particle weights 'ngp', 'cic' or 'tsc', see deposit_particles
+        - periodic:     list of periodic directions, if None use lperi of the sim parameters
 
     Returns: arr, xgrid, ygrid
         - arr:          2d array with binned values
@@ -25,58 +28,252 @@ def part_to_grid(xp, yp, zp=False, quantity=False, Nbins=[1024,1024,1024], sim=F
     from pencilnew import get_sim
     from pencilnew.calc import fill_gaps_in_grid
 
-    if not xp.shape == yp.shape and yp.shape == xp.shape and yp.shape == zp.shape:
+    if type(zp) == type(False) and zp == False:
+        positions = [xp, yp]
+    else:
+        positions = [xp, yp, zp]
+    if not all([np.shape(pos) == np.shape(xp) for pos in positions]):
         print('! ERROR: Shape of xp, yp, zp and quantity needs to be equal!')
 
     if extent == False and sim == False:
         sim = get_sim()
 
-    if quantity == False:
-        quantity = xp/xp
+    if type(quantity) == type(False):
+        quantity = None
 
     if extent == False:
         grid = sim.grid
-        if type(zp) == type(False) and zp == False:
-            extent = [[grid.x[0]-grid.dx/2, grid.x[-1]+grid.dx/2],
-                      [grid.y[0]-grid.dy/2, grid.y[-1]+grid.dy/2]]
+        extent = [[grid.x[0]-grid.dx/2, grid.x[-1]+grid.dx/2],
+                  [grid.y[0]-grid.dy/2, grid.y[-1]+grid.dy/2],
+                  [grid.z[0]-grid.dz/2, grid.z[-1]+grid.dz/2]][:len(positions)]
+
+    if periodic is None:
+        if sim != False and sim.param != False and 'lperi' in sim.param:
+            periodic = list(sim.param['lperi'])[:len(positions)]
         else:
-            extent = [[grid.x[0]-grid.dx/2, grid.x[-1]+grid.dx/2],
-                      [grid.y[0]-grid.dy/2, grid.y[-1]+grid.dy/2],
-                      [grid.z[0]-grid.dz/2, grid.z[-1]+grid.dz/2]]
+            periodic = False
 
+    grids = []
+    for i in range(len(positions)):
+        edges = np.linspace(extent[i][0], extent[i][1], num=Nbins[i]+1)
+        grids.append((edges[:-1]+edges[1:])/2)
 
-    if type(zp) == type(False) and zp == False:
-        arr = np.zeros((2, Nbins[0], Nbins[1]))
+    # Mean of the quantity in each bin, nan for empty bins.
+    weight = deposit_particles(positions, grids, scheme=scheme, periodic=periodic)
+    if quantity is None:
+        arr = np.where(weight > 0, 1., np.nan)
     else:
-        arr = np.zeros((3, Nbins[0], Nbins[1], Nbins[2]))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            arr = deposit_particles(positions, grids, quantity=quantity, scheme=scheme,
+                                    periodic=periodic)/weight
+        arr[weight == 0] = np.nan
 
-    arr[:] = np.NAN
-    xgrid = (np.linspace(extent[0][0], extent[0][1], num=Nbins[0]+1)[:-1]+np.linspace(extent[0][0], extent[0][1], num=Nbins[0]+1)[1:])/2
-    ygrid = (np.linspace(extent[1][0], extent[1][1], num=Nbins[1]+1)[:-1]+np.linspace(extent[1][0], extent[1][1], num=Nbins[1]+1)[1:])/2
-    if type(zp) == type(False) and zp == False:
-        for x, y, q in zip(xp, yp, quantity):
-            idx = np.argmin(np.abs(x-xgrid))
-            idy = np.argmin(np.abs(y-ygrid))
-            if np.isnan(arr[0, idx, idy]): arr[0, idx, idy] = 0; arr[1, idx, idy] = 0
-            arr[0, idx, idy] += q
-            arr[1, idx, idy] += 1
+    if fill_gaps == True: arr = fill_gaps_in_grid(arr, key=np.nan)
+
+    return (arr,) + tuple(grids)
 
-    else:
-        zgrid = (np.linspace(extent[2][0], extent[2][1], num=Nbins[2]+1)[:-1]+np.linspace(extent[2][0], extent[2][1], num=Nbins[2]+1)[1:])/2
-        for x, y, z, q in zip(xp, yp, zp, quantity):
-            idx = np.argmin(np.abs(x-xgrid))
-            idy = np.argmin(np.abs(y-ygrid))
-            idz = np.argmin(np.abs(z-zgrid))
-            if np.isnan(arr[0, idx, idy, idz]): arr[0, idx, idy, idz] = 0; arr[1, idx, idy, idz] = 0
-            arr[0, idx, idy, idz] += q
-            arr[1, idx, idy, idz] += 1
 
+def deposit_particles(positions, grids, quantity=None, scheme='tsc', periodic=False,
+                      chunk_size=2**20):
+    """
+    Deposit particles on a grid with nearest grid point (NGP), cloud in
+    cell (CIC) or triangular shaped cloud (TSC) weights.
 
-    arr = arr[0]/arr[1]
+    call signature:
 
-    if fill_gaps == True: arr = fill_gaps_in_grid(arr, key=np.NAN)
+    deposit_particles(positions, grids, quantity=None, scheme='tsc',
+                      periodic=False, chunk_size=2**20)
 
-    if type(zp) == type(False) and zp == False:
-        return arr, xgrid, ygrid
+    Keyword arguments:
+
+    *positions*:
+      List of the particle position arrays, one for each direction,
+      e.g. [xp, yp, zp].
+
+    *grids*:
+      List of the grid point coordinates, one for each direction.
+      Equidistant grids are indexed arithmetically, other grids with
+      np.searchsorted. Directions with a single grid point take the whole
+      weight.
+
+    *quantity*:
+      Quantity carried by each particle. If None count the particles.
+
+    *scheme*:
+      'ngp', 'cic' or 'tsc', or a list with one scheme for each direction.
+
+    *periodic*:
+      True, False or a list with one entry for each direction. Weights
+      beyond the grid wrap around in periodic directions and are added to
+      the outermost grid points otherwise.
+
+    *chunk_size*:
+      Number of particles deposited at once. This limits the memory needed
+      for particle numbers which exceed the memory several times.
+
+    Returns the deposited array of shape [len(grids[0]), len(grids[1]), ...].
+    """
+
+    import numpy as np
+
+    grids, scheme, periodic = _check_deposit_args(grids, scheme, periodic)
+    shape = tuple(len(grid) for grid in grids)
+
+    n_par = len(positions[0])
+    result = np.zeros(np.prod(shape))
+    for start in range(0, n_par, chunk_size):
+        stop = min(start+chunk_size, n_par)
+        flat, weight = _particle_stencil(positions, grids, start, stop, scheme, periodic)
+        if quantity is not None:
+            weight *= np.asarray(quantity[start:stop], dtype=np.float64)[:, np.newaxis]
+        result += np.bincount(flat.ravel(), weight.ravel(), minlength=result.size)
+
+    return result.reshape(shape)
+
+
+def interpolate_to_particles(positions, grids, field, scheme='tsc', periodic=False,
+                             chunk_size=2**20):
+    """
+    Interpolate a field to the particle positions with nearest grid point
+    (NGP), cloud in cell (CIC) or triangular shaped cloud (TSC) weights.
+    This is the inverse of deposit_particles.
+
+    call signature:
+
+    interpolate_to_particles(positions, grids, field, scheme='tsc',
+                             periodic=False, chunk_size=2**20)
+
+    Keyword arguments:
+
+    *positions*:
+      List of the particle position arrays, one for each direction.
+
+    *grids*:
+      List of the grid point coordinates, one for each direction.
+      If the field includes ghost zones, so must the grids. Then the
+      ghost zones take care of the periodic boundaries.
+
+    *field*:
+      Array whose last dimensions have the shape
+      [len(grids[0]), len(grids[1]), ...], e.g. var.uu of shape
+      [3, mz, my, mx] with the grids [z, y, x] and positions [zp, yp, xp].
+      Leading dimensions are kept.
+
+    *scheme*:
+      'ngp', 'cic' or 'tsc', or a list with one scheme for each direction.
+
+    *periodic*:
+      True, False or a list with one entry for each direction. Stencils
+      wrap around in periodic directions and use the outermost points
+      otherwise.
+
+    *chunk_size*:
+      Number of particles interpolated at once.
+
+    Returns the array of shape field.shape[:-len(grids)] + (n_par,).
+    """
+
+    import numpy as np
+
+    grids, scheme, periodic = _check_deposit_args(grids, scheme, periodic)
+    n_dims = len(grids)
+    lead = field.shape[:field.ndim-n_dims]
+    field = np.asarray(field).reshape(lead + (-1,))
+
+    n_par = len(positions[0])
+    result = np.zeros(lead + (n_par,))
+    for start in range(0, n_par, chunk_size):
+        stop = min(start+chunk_size, n_par)
+        flat, weight = _particle_stencil(positions, grids, start, stop, scheme, periodic)
+        result[..., start:stop] = np.sum(np.take(field, flat, axis=-1)*weight, axis=-1)
+
+    return result
+
+
+def _check_deposit_args(grids, scheme, periodic):
+    """
+    Return the grids as float arrays and the scheme and periodicity as
+    lists with one entry for each direction.
+    """
+
+    import numpy as np
+
+    n_dims = len(grids)
+    grids = [np.atleast_1d(np.asarray(grid, dtype=np.float64)) for grid in grids]
+    if isinstance(scheme, str):
+        scheme = [scheme]*n_dims
+    if np.isscalar(periodic):
+        periodic = [periodic]*n_dims
+    for s in scheme:
+        if s not in ['ngp', 'cic', 'tsc']:
+            print("error: invalid deposition scheme '{0}'".format(s))
+            raise ValueError
+    return grids, scheme, periodic
+
+
+def _particle_stencil(positions, grids, start, stop, scheme, periodic):
+    """
+    Return the flattened grid indices and weights of shape [N, points]
+    of the particles start to stop.
+    """
+
+    import numpy as np
+
+    shape = [len(grid) for grid in grids]
+    flat = np.zeros([stop-start, 1], dtype=np.int64)
+    weight = np.ones([stop-start, 1])
+    for axis in range(len(grids)):
+        xx = np.asarray(positions[axis][start:stop], dtype=np.float64)
+        idx, w = _deposit_stencil(_grid_index(xx, grids[axis]), shape[axis],
+                                  scheme[axis], periodic[axis])
+        flat = (flat[:, :, np.newaxis]*shape[axis] + idx[:, np.newaxis, :]).reshape(stop-start, -1)
+        weight = (weight[:, :, np.newaxis]*w[:, np.newaxis, :]).reshape(stop-start, -1)
+    return flat, weight
+
+
+def _grid_index(xx, grid):
+    """
+    Return the fractional grid index of the positions xx.
+    """
+
+    import numpy as np
+
+    if len(grid) == 1:
+        return np.zeros_like(xx)
+    dx = np.diff(grid)
+    if np.allclose(dx, dx[0], rtol=1e-6, atol=0):
+        return (xx - grid[0])/dx[0]
+    idx = np.clip(np.searchsorted(grid, xx) - 1, 0, len(grid)-2)
+    return idx + (xx - grid[idx])/dx[idx]
+
+
+def _deposit_stencil(s, n, scheme, periodic):
+    """
+    Return the grid indices and weights of shape [N, points] for the
+    fractional grid indices s.
+    """
+
+    import numpy as np
+
+    if n == 1:
+        return np.zeros([len(s), 1], dtype=np.int64), np.ones([len(s), 1])
+    if scheme == 'ngp':
+        i0 = np.floor(s+0.5)
+        offsets = [0]
+        weight = np.ones([len(s), 1])
+    elif scheme == 'cic':
+        i0 = np.floor(s)
+        d = s - i0
+        offsets = [0, 1]
+        weight = np.stack([1-d, d], axis=1)
+    else:
+        i0 = np.floor(s+0.5)
+        d = s - i0
+        offsets = [-1, 0, 1]
+        weight = np.stack([0.5*(0.5-d)**2, 0.75-d**2, 0.5*(0.5+d)**2], axis=1)
+    idx = i0.astype(np.int64)[:, np.newaxis] + np.array(offsets)
+    if periodic:
+        idx %= n
     else:
-        return arr, xgrid, ygrid, zgrid
+        np.clip(idx, 0, n-1, out=idx)
+    return idx, weight
@@ -2,11 +2,12 @@
 # Written by Simon Candelaresi (iomsn1@gmail.com)
 """
 Traces streamlines of a vector field from z0 to z1, similar to
-'streamlines.f90'.
+'streamlines.f90'. Stream traces a single seed, StreamBatch traces
+many seeds at once.
 """
 
 import numpy as np
-from ..math.interpolation import vec_int_no_var
+from ..math.interpolation import vec_int_no_var, vec_int_points
 
 
 class Stream(object):
@@ -197,3 +198,236 @@ class Stream(object):
         self.len = length
         self.stream_len = stream_len
         self.params = params
+
+
+class StreamBatch(object):
+    """
+    StreamBatch -- Holds many streamlines traced together.
+
+    The streamlines are stored in one packed array 'tracers' of shape
+    [sum(stream_len+1), 3]. Streamline i is tracers[offsets[i]:offsets[i+1]],
+    which is also returned by batch[i].
+    """
+
+    def __init__(self, field, params, seeds, interpolation='trilinear',
+                 integration='simple', h_min=2e-3, h_max=2e4, len_max=500,
+                 tol=1e-2, iter_max=1e3, layout='czyx'):
+        """
+        Traces the streamlines from all seeds together for the vector field
+        field. Each seed has its own adaptive step size and stops
+        independently. Gives the same streamlines as Stream.
+
+        call signature:
+
+          StreamBatch(field, params, seeds, interpolation='trilinear',
+                      integration='simple', h_min=2e-3, h_max=2e4,
+                      len_max=500, tol=1e-2, iter_max=1e3, layout='czyx'):
+
+        Keyword arguments:
+
+         *field*:
+            Vector field which is integrated over.
+
+         *params*:
+           Simulation and tracer parameters.
+
+         *seeds*:
+            Initial seeds of shape [N, 3].
+
+         *interpolation*:
+            Interpolation of the vector field.
+            'mean': Take the mean of the adjacent grid point.
+            'trilinear': Weigh the adjacent grid points according to their
+                         distance.
+            'tricubic', 'quintic': Higher order schemes of
+                                   math.interpolation.interpolate.
+
+         *integration*:
+            Integration method.
+            'simple': low order method.
+            'RK6': Runge-Kutta 6th order.
+
+         *h_min*:
+            Minimum step length for and underflow to occur.
+
+         *h_max*:
+            Parameter for the initial step length.
+
+         *len_max*:
+            Maximum length of the streamline. Integration will stop if
+            l >= len_max.
+
+         *tol*:
+            Tolerance for each integration step. Reduces the step length if
+            error >= tol.
+
+         *iter_max*:
+            Maximum number of iterations.
+
+         *layout*:
+            Memory layout of the field, 'czyx' for [3, nz, ny, nx] or
+            'zyxc' for the layout [nz, ny, nx, 3] of
+            math.interpolation.prepare_field, which is faster to
+            interpolate from.
+        """
+
+        seeds = np.atleast_2d(np.array(seeds, dtype='float64'))
+        n_seeds = seeds.shape[0]
+        iter_max = int(iter_max)
+        tol2 = tol**2
+
+        def vv(xx):
+            return vec_int_points(xx, field, params, interpolation,
+                                  layout=layout)
+
+        # Initialize the coefficient for the 6th order adaptive time step RK.
+        b = np.zeros((6, 5))
+        b[1, 0] = 0.2
+        b[2, 0] = 3/40.; b[2, 1] = 9/40.
+        b[3, 0] = 0.3; b[3, 1] = -0.9; b[3, 2] = 1.2
+        b[4, 0] = -11/54.; b[4, 1] = 2.5; b[4, 2] = -70/27.; b[4, 3] = 35/27.
+        b[5, 0] = 1631/55296.; b[5, 1] = 175/512.; b[5, 2] = 575/13824.
+        b[5, 3] = 44275/110592.; b[5, 4] = 253/4096.
+        c = np.array([37/378., 0, 250/621., 125/594., 0, 512/1771.])
+        cs = np.array([2825/27648., 0, 18575/48384., 13525/55296.,
+                       277/14336., 0.25])
+
+        xx = seeds.copy()
+        dh = np.ones(n_seeds)*np.sqrt(h_max*h_min) # Initial step size.
+        length = np.zeros(n_seeds)
+        stream_len = np.zeros(n_seeds, dtype=int)
+        outside = np.zeros(n_seeds, dtype=bool)
+        active = np.ones(n_seeds, dtype=bool)
+        n_underflow = 0
+
+        # Accepted points of all streamlines with their seed index.
+        point_seed = [np.arange(n_seeds)]
+        point_xx = [seeds.astype('float32')]
+
+        while True:
+            active &= ((length < len_max) & (stream_len < iter_max-1) &
+                       (~np.isnan(xx[:, 0])) & (~outside))
+            idx = np.flatnonzero(active)
+            if idx.size == 0:
+                break
+            x = xx[idx]
+            h = dh[idx]
+            hh = h[:, np.newaxis]
+
+            if integration == 'simple':
+                # (a) single step (midpoint method)
+                v0 = vv(x)
+                x_single = x + hh*vv(x + 0.5*hh*v0)
+                # (b) two steps with half stepsize
+                x_half = x + 0.5*hh*vv(x + 0.25*hh*v0)
+                x_new = x_half + 0.5*hh*vv(x_half + 0.25*hh*vv(x_half))
+                # (c) Check error (difference between methods).
+                reject = np.sum((x_single-x_new)**2, axis=1) > tol2
+                h = np.where(reject, 0.5*h, h)
+            else:
+                # Sum in the same order as Stream for identical rounding.
+                k = np.zeros((6,) + x.shape)
+                for stage in range(6):
+                    x_stage = x
+                    for i in range(stage):
+                        x_stage = x_stage + b[stage, i]*k[i]
+                    k[stage] = hh*vv(x_stage)
+                x_new = x
+                x_new_s = x
+                for i in range(6):
+                    x_new = x_new + c[i]*k[i]
+                    x_new_s = x_new_s + cs[i]*k[i]
+                delta2 = np.sum((x_new-x_new_s)**2, axis=1)
+                delta = np.sqrt(delta2)
+                reject = delta2 > tol2
+                with np.errstate(divide='ignore'):
+                    h = np.where(reject, h*(0.9*abs(tol/delta))**0.2, h)
+
+            underflow = reject & (abs(h) < h_min)
+            if underflow.any():
+                n_underflow += np.sum(underflow)
+                active[idx[underflow]] = False
+
+            accept = ~reject
+            acc = idx[accept]
+            length[acc] += np.sqrt(np.sum((x[accept]-x_new[accept])**2, axis=1))
+            xx[acc] = x_new[accept]
+            stream_len[acc] += 1
+            point_seed.append(acc)
+            point_xx.append(x_new[accept].astype('float32'))
+            h_acc = h[accept]
+            h_acc = np.where(abs(h_acc) < h_min, 2*h_acc, h_acc)
+            h_acc = np.where((h_acc > h_max) | np.isnan(h_acc), h_max, h_acc)
+            h[accept] = h_acc
+            # Check if this point lies outside the domain.
+            outside[acc] = self.__outside(xx[acc], params)
+            if integration != 'simple':
+                h = np.where((h > h_max) | (delta == 0) | np.isnan(h), h_max, h)
+            dh[idx] = h
+
+        if n_underflow > 0:
+            print("Error: step size underflow for {0} streamlines".format(n_underflow))
+
+        # Pack the points of each streamline contiguously.
+        point_seed = np.concatenate(point_seed)
+        order = np.argsort(point_seed, kind='mergesort')
+        self.tracers = np.concatenate(point_xx)[order]
+        self.offsets = np.zeros(n_seeds+1, dtype=int)
+        self.offsets[1:] = np.cumsum(stream_len+1)
+
+        # Linearly interpolate if the last point lies above.
+        top = params.Oz+params.Lz
+        last = self.offsets[1:]-1
+        above = np.flatnonzero(outside & (xx[:, 2] > top) & (stream_len > 0))
+        if above.size > 0:
+            p1 = self.tracers[last[above]]
+            p0 = self.tracers[last[above]-1]
+            weight = (top - p0[:, 2])/(p1[:, 2] - p0[:, 2])
+            self.tracers[last[above]] = weight[:, np.newaxis]*(p1 - p0) + p0
+
+        self.len = length
+        self.stream_len = stream_len
+        self.params = params
+
+
+    def __len__(self):
+        return len(self.stream_len)
+
+
+    def __getitem__(self, i):
+        """
+        Return the points of streamline i.
+        """
+
+        return self.tracers[self.offsets[i]:self.offsets[i+1]]
+
+
+    def end_points(self, shift=0):
+        """
+        Return the last points of all streamlines as array [N, 3].
+
+        call signature:
+
+          end_points(shift=0)
+
+        Keyword arguments:
+
+         *shift*:
+           Return the point shift positions before the last one instead,
+           but never one before the seed.
+        """
+
+        return self.tracers[np.maximum(self.offsets[1:]-1-shift,
+                                       self.offsets[:-1])]
+
+
+    def __outside(self, xx, params):
+        """
+        Check which points lie outside the domain.
+        """
+
+        return ((xx[:, 0] < params.Ox-params.dx) |
+                (xx[:, 0] > params.Ox+params.Lx+params.dx) |
+                (xx[:, 1] < params.Oy-params.dy) |
+                (xx[:, 1] > params.Oy+params.Ly+params.dy) |
+                (xx[:, 2] < params.Oz) | (xx[:, 2] > params.Oz+params.Lz))
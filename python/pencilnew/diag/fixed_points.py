@@ -7,7 +7,6 @@ Creates the fixed point values.
 #import numpy as np
 import pencil as pc
 import math as m
-import multiprocessing as mp
 import os
 try:
     import h5py
@@ -15,8 +14,206 @@ except:
     print('!! ERR in diag/fixed_points.py: Dependency of h5py not fullfilled.')
 from pencilnew.diag.tracers import TracersParameterClass
 from pencilnew.diag.tracers import Tracers
-from pencilnew.calc.streamlines import Stream
-from pencilnew.math.interpolation import vec_int
+from pencilnew.calc.streamlines import StreamBatch
+from pencilnew.math.interpolation import prepare_field, vec_int_points
+
+
+def _sub_fixed(arrays, start, stop, params):
+    """
+    Find the fixed points in the cells start to stop, counted along y
+    first, and write their Poincare index into the shared array.
+    Returns the fixed points and their signs.
+    """
+
+    import numpy as np
+
+    field = arrays['field']
+    x0 = arrays['x0']
+    y0 = arrays['y0']
+    x1 = arrays['x1']
+    y1 = arrays['y1']
+    poincare_array = arrays['poincare']
+    ny_cells = x0.shape[1]-1
+
+    fixed = []
+    fixed_sign = []
+    for idx in range(start, stop):
+        ix = idx//ny_cells
+        iy = idx%ny_cells
+
+        # Compute Poincare index around this cell (!= 0 for potential fixed point).
+        corners = ([ix, ix+1, ix+1, ix], [iy, iy, iy+1, iy+1])
+        diff = np.array([x1[corners] - x0[corners], y1[corners] - y0[corners]]).T
+        norm = np.sqrt(np.sum(diff**2, axis=1))
+        diff[norm != 0] /= norm[norm != 0, np.newaxis]
+        poincare = _poincare_index(field, params, x0[ix:ix+2, iy], y0[ix, iy:iy+2], diff)
+        poincare_array[ix, iy] = poincare
+
+        if abs(poincare) > 5: # Use 5 instead of 2*pi to account for rounding errors.
+            # Subsample to get starting point for iteration.
+            nt = 4
+            xmin = x0[ix, iy]
+            ymin = y0[ix, iy]
+            xmax = x0[ix+1, iy]
+            ymax = y0[ix, iy+1]
+            xx = np.zeros((nt**2, 3))
+            xx[:, 0] = np.repeat(xmin + np.arange(nt)/(nt-1.)*(xmax-xmin), nt)
+            xx[:, 1] = np.tile(ymin + np.arange(nt)/(nt-1.)*(ymax-ymin), nt)
+            xx[:, 2] = params.Oz
+            streams = StreamBatch(field, params, xx, h_min=params.h_min,
+                                  h_max=params.h_max, len_max=params.len_max,
+                                  tol=params.tol,
+                                  interpolation=params.interpolation,
+                                  integration=params.integration,
+                                  layout='zyxc')
+            end_points = streams.end_points(shift=1)
+            diff2 = np.sum((end_points[:, :2] - xx[:, :2])**2, axis=1)
+            i_min = np.argmin(diff2)
+
+            # Get fixed point from this starting position using Newton's method.
+            point = xx[i_min, :2].copy()
+            fixed_point = _null_point(point, field, params)
+
+            # Check if fixed point lies inside the cell.
+            if ((fixed_point[0] < x0[ix, iy]) or
+                (fixed_point[0] > x0[ix+1, iy]) or
+                (fixed_point[1] < y0[ix, iy]) or
+                (fixed_point[1] > y0[ix, iy+1])):
+                    pass
+            else:
+                fixed.append(fixed_point)
+                fixed_sign.append(np.sign(poincare))
+
+    return fixed, fixed_sign
+
+
+def _poincare_index(field, params, sx, sy, diff):
+    """
+    Find the Poincare index of this grid cell.
+    """
+
+    poincare = 0
+    poincare += _edge(field, params, [sx[0], sx[1]], [sy[0], sy[0]],
+                      diff[0, :], diff[1, :], 0)
+    poincare += _edge(field, params, [sx[1], sx[1]], [sy[0], sy[1]],
+                      diff[1, :], diff[2, :], 0)
+    poincare += _edge(field, params, [sx[1], sx[0]], [sy[1], sy[1]],
+                      diff[2, :], diff[3, :], 0)
+    poincare += _edge(field, params, [sx[0], sx[0]], [sy[1], sy[0]],
+                      diff[3, :], diff[0, :], 0)
+    return poincare
+
+
+def _edge(field, params, sx, sy, diff1, diff2, rec):
+    """
+    Compute rotation along one edge.
+    """
+
+    import numpy as np
+
+    phiMin = np.pi/8.
+    dtot = m.atan2(diff1[0]*diff2[1] - diff2[0]*diff1[1],
+                   diff1[0]*diff2[0] + diff1[1]*diff2[1])
+    if (abs(dtot) > phiMin) and (rec < 4):
+        xm = 0.5*(sx[0]+sx[1])
+        ym = 0.5*(sy[0]+sy[1])
+
+        # Trace the intermediate field line.
+        stream = StreamBatch(field, params, np.array([[xm, ym, params.Oz]]),
+                             h_min=params.h_min, h_max=params.h_max,
+                             len_max=params.len_max, tol=params.tol,
+                             interpolation=params.interpolation,
+                             integration=params.integration,
+                             layout='zyxc')
+        stream_x0 = stream.tracers[0, 0]
+        stream_y0 = stream.tracers[0, 1]
+        stream_x1, stream_y1 = stream.end_points(shift=1)[0, :2]
+
+        diffm = np.array([stream_x1 - stream_x0, stream_y1 - stream_y0])
+        if sum(diffm**2) != 0:
+            diffm = diffm/np.sqrt(sum(diffm**2))
+        dtot = _edge(field, params, [sx[0], xm], [sy[0], ym], diff1, diffm, rec+1) + \
+               _edge(field, params, [xm, sx[1]], [ym, sy[1]], diffm, diff2, rec+1)
+    return dtot
+
+
+def _null_point(point, field, params):
+    """
+    Find the null point of the mapping, i.e. fixed point, using Newton's
+    method.
+    """
+
+    import numpy as np
+
+    dl = min(params.dx, params.dy)/100.
+    it = 0
+    # Tracers used to find the fixed point.
+    tracers_null = np.zeros((5, 4))
+    while True:
+        # Trace field lines at original point and for Jacobian.
+        # (second order seems to be enough)
+        xx = np.zeros((5, 3))
+        xx[0, :] = np.array([point[0], point[1], params.Oz])
+        xx[1, :] = np.array([point[0]-dl, point[1], params.Oz])
+        xx[2, :] = np.array([point[0]+dl, point[1], params.Oz])
+        xx[3, :] = np.array([point[0], point[1]-dl, params.Oz])
+        xx[4, :] = np.array([point[0], point[1]+dl, params.Oz])
+        streams = StreamBatch(field, params, xx, h_min=params.h_min,
+                              h_max=params.h_max, len_max=params.len_max,
+                              tol=params.tol,
+                              interpolation=params.interpolation,
+                              integration=params.integration,
+                              layout='zyxc')
+        tracers_null[:, :2] = xx[:, :2]
+        tracers_null[:, 2:] = streams.end_points(shift=1)[:, 0:2]
+
+        # Check function convergence.
+        ff = np.zeros(2)
+        ff[0] = tracers_null[0, 2] - tracers_null[0, 0]
+        ff[1] = tracers_null[0, 3] - tracers_null[0, 1]
+        if sum(abs(ff)) <= 1e-3*min(params.dx, params.dy):
+            fixed_point = np.array([point[0], point[1]])
+            break
+
+        # Compute the Jacobian.
+        fjac = np.zeros((2, 2))
+        fjac[0, 0] = ((tracers_null[2, 2] - tracers_null[2, 0]) -
+                      (tracers_null[1, 2] - tracers_null[1, 0]))/2./dl
+        fjac[0, 1] = ((tracers_null[4, 2] - tracers_null[4, 0]) -
+                      (tracers_null[3, 2] - tracers_null[3, 0]))/2./dl
+        fjac[1, 0] = ((tracers_null[2, 3] - tracers_null[2, 1]) -
+                      (tracers_null[1, 3] - tracers_null[1, 1]))/2./dl
+        fjac[1, 1] = ((tracers_null[4, 3] - tracers_null[4, 1]) -
+                      (tracers_null[3, 3] - tracers_null[3, 1]))/2./dl
+
+        # Invert the Jacobian.
+        fjin = np.zeros((2, 2))
+        det = fjac[0, 0]*fjac[1, 1] - fjac[0, 1]*fjac[1, 0]
+        if abs(det) < dl:
+            fixed_point = point
+            break
+        fjin[0, 0] = fjac[1, 1]
+        fjin[1, 1] = fjac[0, 0]
+        fjin[0, 1] = -fjac[0, 1]
+        fjin[1, 0] = -fjac[1, 0]
+        fjin = fjin/det
+        dpoint = np.zeros(2)
+        dpoint[0] = -fjin[0, 0]*ff[0] - fjin[0, 1]*ff[1]
+        dpoint[1] = -fjin[1, 0]*ff[0] - fjin[1, 1]*ff[1]
+        point += dpoint
+
+        # Check root convergence.
+        if sum(abs(dpoint)) < 1e-3*min(params.dx, params.dy):
+            fixed_point = point
+            break
+
+        if it > 20:
+            fixed_point = point
+            break
+
+        it += 1
+
+    return fixed_point
 
 
 class FixedPoint(object):
@@ -94,6 +291,8 @@ class FixedPoint(object):
            'mean': takes the mean of the adjacent grid point.
            'trilinear': weights the adjacent grid points according to
                         their distance.
+           'tricubic', 'quintic': higher order schemes of
+                                  math.interpolation.interpolate.
 
          *trace_sub*:
            Number of sub-grid cells for the seeds for the initial mapping.
@@ -107,7 +306,8 @@ class FixedPoint(object):
            Quantities to be integrated along the streamlines.
 
          *n_proc*:
-           Number of cores for multi core computation.
+           Number of cores for multi core computation. The worker processes
+           are kept alive for all time indices from ti to tf.
 
          *tracer_file_name*
            Name of the tracer file to be read.
@@ -116,234 +316,7 @@ class FixedPoint(object):
 
 
         import numpy as np
-
-        # Return the fixed points for a subset of the domain.
-        def __sub_fixed(queue, ix0, iy0, field, tracers, tidx, var, i_proc):
-            diff = np.zeros((4, 2))
-            fixed = []
-            fixed_sign = []
-            fidx = 0
-            poincare_array = np.zeros((tracers.x0[i_proc::self.params.n_proc].shape[0],
-                                       tracers.x0.shape[1]))
-
-            for ix in ix0[i_proc::self.params.n_proc]:
-                for iy in iy0:
-                    # Compute Poincare index around this cell (!= 0 for potential fixed point).
-                    diff[0, :] = np.array([tracers.x1[ix, iy, tidx] - tracers.x0[ix, iy, tidx],
-                                           tracers.y1[ix, iy, tidx] - tracers.y0[ix, iy, tidx]])
-                    diff[1, :] = np.array([tracers.x1[ix+1, iy, tidx] - tracers.x0[ix+1, iy, tidx],
-                                           tracers.y1[ix+1, iy, tidx] - tracers.y0[ix+1, iy, tidx]])
-                    diff[2, :] = np.array([tracers.x1[ix+1, iy+1, tidx] - tracers.x0[ix+1, iy+1, tidx],
-                                           tracers.y1[ix+1, iy+1, tidx] - tracers.y0[ix+1, iy+1, tidx]])
-                    diff[3, :] = np.array([tracers.x1[ix, iy+1, tidx] - tracers.x0[ix, iy+1, tidx],
-                                           tracers.y1[ix, iy+1, tidx] - tracers.y0[ix, iy+1, tidx]])
-                    if sum(np.sum(diff**2, axis=1) != 0):
-                        diff = np.swapaxes(np.swapaxes(diff, 0, 1) /
-                               np.sqrt(np.sum(diff**2, axis=1)), 0, 1)
-                    poincare = __poincare_index(field, tracers.x0[ix:ix+2, iy, tidx],
-                                                tracers.y0[ix, iy:iy+2, tidx], diff)
-                    poincare_array[ix/n_proc, iy] = poincare
-
-                    if abs(poincare) > 5: # Use 5 instead of 2*pi to account for rounding errors.
-                        # Subsample to get starting point for iteration.
-                        nt = 4
-                        xmin = tracers.x0[ix, iy, tidx]
-                        ymin = tracers.y0[ix, iy, tidx]
-                        xmax = tracers.x0[ix+1, iy, tidx]
-                        ymax = tracers.y0[ix, iy+1, tidx]
-                        xx = np.zeros((nt**2, 3))
-                        tracers_part = np.zeros((nt**2, 5))
-                        i1 = 0
-                        for j1 in range(nt):
-                            for k1 in range(nt):
-                                xx[i1, 0] = xmin + j1/(nt-1.)*(xmax-xmin)
-                                xx[i1, 1] = ymin + k1/(nt-1.)*(ymax-ymin)
-                                xx[i1, 2] = self.params.Oz
-                                i1 += 1
-                        for it1 in range(nt**2):
-                            stream = Stream(field, self.params,
-                                            h_min=self.params.h_min,
-                                            h_max=self.params.h_max,
-                                            len_max=self.params.len_max,
-                                            tol=self.params.tol,
-                                            interpolation=self.params.interpolation,
-                                            integration=self.params.integration,
-                                            xx=xx[it1, :])
-                            tracers_part[it1, 0:2] = xx[it1, 0:2]
-                            tracers_part[it1, 2:] = stream.tracers[stream.stream_len-1, :]
-                        min2 = 1e6
-                        minx = xmin
-                        miny = ymin
-                        i1 = 0
-                        for j1 in range(nt):
-                            for k1 in range(nt):
-                                diff2 = (tracers_part[i1+k1*nt, 2] - \
-                                         tracers_part[i1+k1*nt, 0])**2 + \
-                                        (tracers_part[i1+k1*nt, 3] - \
-                                         tracers_part[i1+k1*nt, 1])**2
-                                if diff2 < min2:
-                                    min2 = diff2
-                                    minx = xmin + j1/(nt-1.)*(xmax - xmin)
-                                    miny = ymin + k1/(nt-1.)*(ymax - ymin)
-                                it1 += 1
-
-                        # Get fixed point from this starting position using Newton's method.
-                        point = np.array([minx, miny])
-                        fixed_point = __null_point(point, var)
-
-                        # Check if fixed point lies inside the cell.
-                        if ((fixed_point[0] < tracers.x0[ix, iy, tidx]) or
-                            (fixed_point[0] > tracers.x0[ix+1, iy, tidx]) or
-                            (fixed_point[1] < tracers.y0[ix, iy, tidx]) or
-                            (fixed_point[1] > tracers.y0[ix, iy+1, tidx])):
-                                pass
-                        else:
-                            fixed.append(fixed_point)
-                            fixed_sign.append(np.sign(poincare))
-                            fidx += np.sign(poincare)
-
-            queue.put((i_proc, fixed, fixed_sign, fidx, poincare_array))
-
-
-        # Find the Poincare index of this grid cell.
-        def __poincare_index(field, sx, sy, diff):
-            poincare = 0
-            poincare += __edge(field, [sx[0], sx[1]], [sy[0], sy[0]],
-                               diff[0, :], diff[1, :], 0)
-            poincare += __edge(field, [sx[1], sx[1]], [sy[0], sy[1]],
-                               diff[1, :], diff[2, :], 0)
-            poincare += __edge(field, [sx[1], sx[0]], [sy[1], sy[1]],
-                               diff[2, :], diff[3, :], 0)
-            poincare += __edge(field, [sx[0], sx[0]], [sy[1], sy[0]],
-                               diff[3, :], diff[0, :], 0)
-            return poincare
-
-
-        # Compute rotation along one edge.
-        def __edge(field, sx, sy, diff1, diff2, rec):
-            phiMin = np.pi/8.
-            dtot = m.atan2(diff1[0]*diff2[1] - diff2[0]*diff1[1],
-                           diff1[0]*diff2[0] + diff1[1]*diff2[1])
-            if (abs(dtot) > phiMin) and (rec < 4):
-                xm = 0.5*(sx[0]+sx[1])
-                ym = 0.5*(sy[0]+sy[1])
-
-                # Trace the intermediate field line.
-                stream = Stream(field, self.params, h_min=self.params.h_min,
-                                h_max=self.params.h_max,
-                                len_max=self.params.len_max,
-                                tol=self.params.tol,
-                                interpolation=self.params.interpolation,
-                                integration=self.params.integration,
-                                xx=np.array([xm, ym, self.params.Oz]))
-                stream_x0 = stream.tracers[0, 0]
-                stream_y0 = stream.tracers[0, 1]
-                stream_x1 = stream.tracers[stream.stream_len-1, 0]
-                stream_y1 = stream.tracers[stream.stream_len-1, 1]
-                stream_z1 = stream.tracers[stream.stream_len-1, 2]
-
-                # Discard any streamline which does not converge or hits the boundary.
-#                if ((stream.len >= len_max) or
-#                (stream_z1 < self.params.Oz+self.params.Lz-10*self.params.dz)):
-#                    dtot = 0.
-                if False:
-                    pass
-                else:
-                    diffm = np.array([stream_x1 - stream_x0, stream_y1 - stream_y0])
-                    if sum(diffm**2) != 0:
-                        diffm = diffm/np.sqrt(sum(diffm**2))
-                    dtot = __edge(field, [sx[0], xm], [sy[0], ym], diff1, diffm, rec+1) + \
-                           __edge(field, [xm, sx[1]], [ym, sy[1]], diffm, diff2, rec+1)
-            return dtot
-
-
-        # Finds the null point of the mapping, i.e. fixed point, using Newton's method.
-        def __null_point(point, var):
-            dl = np.min(var.dx, var.dy)/100.
-            it = 0
-            # Tracers used to find the fixed point.
-            tracers_null = np.zeros((5, 4))
-            while True:
-                # Trace field lines at original point and for Jacobian.
-                # (second order seems to be enough)
-                xx = np.zeros((5, 3))
-                xx[0, :] = np.array([point[0], point[1], self.params.Oz])
-                xx[1, :] = np.array([point[0]-dl, point[1], self.params.Oz])
-                xx[2, :] = np.array([point[0]+dl, point[1], self.params.Oz])
-                xx[3, :] = np.array([point[0], point[1]-dl, self.params.Oz])
-                xx[4, :] = np.array([point[0], point[1]+dl, self.params.Oz])
-                for it1 in range(5):
-                    stream = Stream(field, self.params, h_min=self.params.h_min,
-                                    h_max=self.params.h_max, len_max=self.params.len_max,
-                                    tol=self.params.tol, interpolation=self.params.interpolation,
-                                    integration=self.params.integration, xx=xx[it1, :])
-                    tracers_null[it1, :2] = xx[it1, :2]
-                    tracers_null[it1, 2:] = stream.tracers[stream.stream_len-1, 0:2]
-
-                # Check function convergence.
-                ff = np.zeros(2)
-                ff[0] = tracers_null[0, 2] - tracers_null[0, 0]
-                ff[1] = tracers_null[0, 3] - tracers_null[0, 1]
-                if sum(abs(ff)) <= 1e-3*np.min(self.params.dx, self.params.dy):
-                    fixed_point = np.array([point[0], point[1]])
-                    break
-
-                # Compute the Jacobian.
-                fjac = np.zeros((2, 2))
-                fjac[0, 0] = ((tracers_null[2, 2] - tracers_null[2, 0]) -
-                              (tracers_null[1, 2] - tracers_null[1, 0]))/2./dl
-                fjac[0, 1] = ((tracers_null[4, 2] - tracers_null[4, 0]) -
-                              (tracers_null[3, 2] - tracers_null[3, 0]))/2./dl
-                fjac[1, 0] = ((tracers_null[2, 3] - tracers_null[2, 1]) -
-                              (tracers_null[1, 3] - tracers_null[1, 1]))/2./dl
-                fjac[1, 1] = ((tracers_null[4, 3] - tracers_null[4, 1]) -
-                              (tracers_null[3, 3] - tracers_null[3, 1]))/2./dl
-
-                # Invert the Jacobian.
-                fjin = np.zeros((2, 2))
-                det = fjac[0, 0]*fjac[1, 1] - fjac[0, 1]*fjac[1, 0]
-                if abs(det) < dl:
-                    fixed_point = point
-                    break
-                fjin[0, 0] = fjac[1, 1]
-                fjin[1, 1] = fjac[0, 0]
-                fjin[0, 1] = -fjac[0, 1]
-                fjin[1, 0] = -fjac[1, 0]
-                fjin = fjin/det
-                dpoint = np.zeros(2)
-                dpoint[0] = -fjin[0, 0]*ff[0] - fjin[0, 1]*ff[1]
-                dpoint[1] = -fjin[1, 0]*ff[0] - fjin[1, 1]*ff[1]
-                point += dpoint
-
-                # Check root convergence.
-                if sum(abs(dpoint)) < 1e-3*np.min(self.params.dx, self.params.dy):
-                    fixed_point = point
-                    break
-
-                if it > 20:
-                    fixed_point = point
-                    break
-
-                it += 1
-
-            return fixed_point
-
-
-        # Find the fixed point using Newton's method, starting at previous fixed point.
-        def __sub_fixed_series(queue, t_idx, field, var, i_proc):
-            fixed = []
-            fixed_sign = []
-            for i, point in enumerate(self.fixed_points[t_idx-1][i_proc::self.params.n_proc]):
-                fixed_tentative = __null_point(point, var)
-                # Check if the fixed point lies outside the domain.
-                if fixed_tentative[0] >= self.params.Ox and \
-                fixed_tentative[1] >= self.params.Oy and \
-                fixed_tentative[0] <= self.params.Ox+self.params.Lx and \
-                fixed_tentative[1] <= self.params.Oy+self.params.Ly:
-                    fixed.append(fixed_tentative)
-                    fixed_sign.append(self.fixed_sign[t_idx-1][i_proc+i*n_proc])
-            queue.put((i_proc, fixed, fixed_sign))
-
+        from .shared_pool import SharedPool
 
         # Discard fixed points which are too close to each other.
         def __discard_close_fixed_points(fixed, fixed_sign, var):
@@ -378,7 +351,6 @@ class FixedPoint(object):
         if not(np.isscalar(n_proc)) or (n_proc%1 != 0):
             print("error: invalid processor number")
             return -1
-        queue = mp.Queue()
 
         # Write the tracing parameters.
         self.params = TracersParameterClass()
@@ -459,51 +431,46 @@ class FixedPoint(object):
         self.tracers = tracers
 
         # Set some default values.
-        self.t = np.zeros((tf-ti+1)*series + (1-series))
-        self.fidx = np.zeros((tf-ti+1)*series + (1-series))
+        self.fidx = np.zeros(n_times)
         self.poincare = np.zeros([int(trace_sub*dim.nx),
                                   int(trace_sub*dim.ny), n_times])
-        ix0 = range(0, int(self.params.nx*trace_sub)-1)
-        iy0 = range(0, int(self.params.ny*trace_sub)-1)
-
-        # Start the parallelized fixed point finding.
-        for tidx in range(n_times):
-            if tidx > 0:
-                var = pc.read_var(varfile='VAR'+str(tidx+ti), datadir=datadir,
-                                  magic=magic, quiet=True, trimall=True)
-                field = getattr(var, trace_field)
-                self.t[tidx] = var.t
-
-            proc = []
-            sub_data = []
-            fixed = []
-            fixed_sign = []
-            for i_proc in range(n_proc):
-                proc.append(mp.Process(target=__sub_fixed,
-                                       args=(queue, ix0, iy0, field, self.tracers,
-                                             tidx, var, i_proc)))
-            for i_proc in range(n_proc):
-                proc[i_proc].start()
-            for i_proc in range(n_proc):
-                sub_data.append(queue.get())
-            for i_proc in range(n_proc):
-                proc[i_proc].join()
-            for i_proc in range(n_proc):
-                # Extract the data from the single cores. Mind the order.
-                sub_proc = sub_data[i_proc][0]
-                fixed.extend(sub_data[i_proc][1])
-                fixed_sign.extend(sub_data[i_proc][2])
-                self.fidx[tidx] += sub_data[i_proc][3]
-                self.poincare[sub_proc::n_proc, :, tidx] = sub_data[i_proc][4]
-            for i_proc in range(n_proc):
-                proc[i_proc].terminate()
-
-            # Discard fixed points which lie too close to each other.
-            fixed, fixed_sign = __discard_close_fixed_points(np.array(fixed),
-                                                             np.array(fixed_sign),
-                                                             var)
-            self.fixed_points.append(np.array(fixed))
-            self.fixed_sign.append(np.array(fixed_sign))
+        n_cells = (self.poincare.shape[0]-1)*(self.poincare.shape[1]-1)
+
+        # Start the parallelized fixed point finding. The workers are kept
+        # for all times and the cells are handed out in dynamic chunks.
+        # Each worker writes the Poincare index of its cells into the
+        # shared poincare array.
+        with SharedPool(n_proc) as pool:
+            for tidx in range(n_times):
+                if tidx > 0:
+                    var = pc.read_var(varfile='VAR'+str(tidx+ti), datadir=datadir,
+                                      magic=magic, quiet=True, trimall=True)
+                    field = getattr(var, trace_field)
+                    self.t[tidx] = var.t
+
+                # The workers interpolate from the field in the layout
+                # [nz, ny, nx, 3], which is prepared once per time.
+                pool.share('field', prepare_field(field))
+                for name in ['x0', 'y0', 'x1', 'y1']:
+                    pool.share(name, getattr(self.tracers, name)[..., tidx])
+                poincare = pool.zeros('poincare', self.poincare.shape[:2])
+                sub_data = pool.map(_sub_fixed, n_cells, args=(self.params,))
+                self.poincare[..., tidx] = poincare
+                del(poincare)
+
+                fixed = []
+                fixed_sign = []
+                for sub_fixed, sub_sign in sub_data:
+                    fixed.extend(sub_fixed)
+                    fixed_sign.extend(sub_sign)
+                self.fidx[tidx] = np.sum(fixed_sign)
+
+                # Discard fixed points which lie too close to each other.
+                fixed, fixed_sign = __discard_close_fixed_points(np.array(fixed),
+                                                                 np.array(fixed_sign),
+                                                                 var)
+                self.fixed_points.append(np.array(fixed))
+                self.fixed_sign.append(np.array(fixed_sign))
 
         # Compute the traced quantities along the fixed point streamlines.
         if any(np.array(self.params.int_q) == 'curly_A') or \
@@ -513,32 +480,37 @@ class FixedPoint(object):
                     self.curly_A.append([])
                 if any(np.array(self.params.int_q) == 'ee'):
                     self.ee.append([])
-                for fixed in self.fixed_points[t_idx]:
-                    # Trace the stream line.
-                    xx = np.array([fixed[0], fixed[1], self.params.Oz])
-                    stream = Stream(field, self.params,
-                                    h_min=self.params.h_min,
-                                    h_max=self.params.h_max,
-                                    len_max=self.params.len_max,
-                                    tol=self.params.tol,
-                                    interpolation=self.params.interpolation,
-                                    integration=self.params.integration,
-                                    xx=xx)
-                    # Do the field line integration.
-                    if any(np.array(self.params.int_q) == 'curly_A'):
-                        curly_A = 0
-                        for l in range(stream.stream_len-1):
-                            aaInt = vec_int((stream.tracers[l+1] + stream.tracers[l])/2,
-                                             var, var.aa, interpolation=self.params.interpolation)
-                            curly_A += np.dot(aaInt, (stream.tracers[l+1] - stream.tracers[l]))
-                        self.curly_A[-1].append(curly_A)
-                    if any(np.array(self.params.int_q) == 'ee'):
-                        ee_p = 0
-                        for l in range(stream.stream_len-1):
-                            eeInt = vec_int((stream.tracers[l+1] + stream.tracers[l])/2,
-                                             var, ee, interpolation=self.params.interpolation)
-                            ee_p += np.dot(eeInt, (stream.tracers[l+1] - stream.tracers[l]))
-                        self.ee[-1].append(ee_p)
+                # Trace the stream lines of all fixed points together.
+                n_fixed = len(self.fixed_points[t_idx])
+                xx = np.zeros((n_fixed, 3))
+                xx[:, 2] = self.params.Oz
+                if n_fixed > 0:
+                    xx[:, :2] = self.fixed_points[t_idx][:, :2]
+                streams = StreamBatch(field, self.params, xx,
+                                      h_min=self.params.h_min,
+                                      h_max=self.params.h_max,
+                                      len_max=self.params.len_max,
+                                      tol=self.params.tol,
+                                      interpolation=self.params.interpolation,
+                                      integration=self.params.integration)
+                # Do the field line integration, omitting the last segment
+                # of each line.
+                segment = np.ones(len(streams.tracers), dtype=bool)
+                segment[np.maximum(streams.offsets[1:]-2, streams.offsets[:-1])] = False
+                segment[streams.offsets[1:]-1] = False
+                seed_idx = np.repeat(np.arange(n_fixed), streams.stream_len+1)[segment]
+                mid = (streams.tracers[1:] + streams.tracers[:-1])[segment[:-1]]/2
+                dl = (streams.tracers[1:] - streams.tracers[:-1])[segment[:-1]]
+                if any(np.array(self.params.int_q) == 'curly_A'):
+                    aa_int = vec_int_points(mid, var.aa, self.params,
+                                            interpolation=self.params.interpolation)
+                    self.curly_A[-1] = np.bincount(seed_idx, np.sum(aa_int*dl, axis=1),
+                                                   minlength=n_fixed)
+                if any(np.array(self.params.int_q) == 'ee'):
+                    ee_int = vec_int_points(mid, ee, self.params,
+                                            interpolation=self.params.interpolation)
+                    self.ee[-1] = np.bincount(seed_idx, np.sum(ee_int*dl, axis=1),
+                                              minlength=n_fixed)
                 if any(np.array(self.params.int_q) == 'curly_A'):
                     self.curly_A[-1] = np.array(self.curly_A[-1])
                 if any(np.array(self.params.int_q) == 'ee'):
@@ -3,8 +3,8 @@ def diffusion(directions=['x'], trange=[0, -1], sim='.', OVERWRITE=False, quiet=
               use_existing_pstalk_sav=False):
     """
     Calculate particle diffusion via stalked particles: PSTALK
-    Therefore, it read PSTALK files from Pencil Code using IDL by
-    using the IDL<->Python Bridge. It may be activated manually!
+    Therefore, it reads the PSTALK files of Pencil Code natively via
+    pencilnew.read.pstalk, which caches them in sim.datadir/pc/pstalk.h5.
 
     Generated DiffusionData object will be stored in:
         sim.pc_datadir/particle/diffusion/<direction>_<t_start>:<t_end>
@@ -112,7 +112,7 @@ class DiffusionData(object):
             print('## Calculating particle diffusion for "'+sim.name+'" in "'+sim.path+'"')
 
             print('## reading particle stalker file..')
-            pstalk = read_pstalk(sim=sim, use_existing_pstalk_sav=use_existing_pstalk_sav, tmin=trange[0], tmax=trange[1])
+            pstalk = read_pstalk(sim=sim, use_existing_pstalk_sav=use_existing_pstalk_sav, tmin=trange[0], tmax=trange[1], quiet=quiet)
             grid = sim.grid
             dim = sim.dim
 
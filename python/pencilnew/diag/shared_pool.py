@@ -0,0 +1,212 @@
+# shared_pool.py
+# Written by Simon Candelaresi (iomsn1@gmail.com)
+"""
+Persistent pool of worker processes which read their input arrays from
+shared memory and write their results into shared arrays.
+"""
+
+import numpy as np
+
+# Arrays attached by a worker process, by name of the shared memory block.
+_attached = {}
+
+
+def _attach(specs):
+    """
+    Return the arrays described by specs, attaching new shared memory
+    blocks and closing the ones which are not used anymore.
+    """
+
+    from multiprocessing import shared_memory
+
+    blocks = set(block for block, shape, dtype in specs.values())
+    for block in list(_attached.keys()):
+        if block not in blocks:
+            shm = _attached.pop(block)[0]
+            try:
+                shm.close()
+            except BufferError:
+                pass
+
+    arrays = dict()
+    for name, (block, shape, dtype) in specs.items():
+        if block not in _attached:
+            try:
+                shm = shared_memory.SharedMemory(name=block, track=False)
+            except TypeError:
+                # Python < 3.13. The workers share the resource tracker of
+                # the parent process, which unlinks the block.
+                shm = shared_memory.SharedMemory(name=block)
+            _attached[block] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+        arrays[name] = _attached[block][1]
+    return arrays
+
+
+def _run_chunk(function, specs, start, stop, args):
+    """
+    Call function on one chunk inside a worker process.
+    """
+
+    return function(_attach(specs), start, stop, *args)
+
+
+class SharedPool(object):
+    """
+    SharedPool -- pool of worker processes which is kept alive over many
+    calls, e.g. for all time steps of a series. The arrays are placed in
+    shared memory once per call instead of being pickled for every worker.
+    """
+
+    def __init__(self, n_proc=1):
+        """
+        Start the worker processes.
+
+        call signature:
+
+        SharedPool(n_proc=1)
+
+        Keyword arguments:
+
+        *n_proc*:
+          Number of worker processes. For n_proc = 1 everything is
+          computed in the calling process.
+        """
+
+        self.n_proc = n_proc
+        self.arrays = dict()
+        self.__blocks = dict()
+        self.__executor = None
+        if n_proc > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self.__executor = ProcessPoolExecutor(max_workers=n_proc)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def zeros(self, name, shape, dtype=np.float64):
+        """
+        Return a zeroed array which is shared with the workers under the
+        given name. The shared memory block is reused if an array with
+        this name, shape and type exists already.
+
+        call signature:
+
+        zeros(name, shape, dtype=np.float64)
+        """
+
+        from multiprocessing import shared_memory
+
+        shape = tuple(int(n) for n in np.atleast_1d(shape))
+        dtype = np.dtype(dtype)
+        array = self.arrays.get(name)
+        if array is not None and array.shape == shape and array.dtype == dtype:
+            array[...] = 0
+            return array
+
+        self.__free(name)
+        if self.__executor is None:
+            array = np.zeros(shape, dtype=dtype)
+        else:
+            size = max(int(np.prod(shape))*dtype.itemsize, 1)
+            block = shared_memory.SharedMemory(create=True, size=size)
+            self.__blocks[name] = block
+            array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            array[...] = 0
+        self.arrays[name] = array
+        return array
+
+
+    def share(self, name, array):
+        """
+        Copy the array into shared memory under the given name and return
+        the shared copy.
+
+        call signature:
+
+        share(name, array)
+        """
+
+        array = np.asarray(array)
+        shared = self.zeros(name, array.shape, array.dtype)
+        shared[...] = array
+        return shared
+
+
+    def map(self, function, n_items, args=(), chunk_size=None):
+        """
+        Call function(arrays, start, stop, *args) for chunks [start, stop)
+        of range(n_items), where arrays is the dictionary of the shared
+        arrays. The chunks are handed out to the workers as they become
+        free. Returns the list of the return values in chunk order.
+
+        call signature:
+
+        map(function, n_items, args=(), chunk_size=None)
+
+        Keyword arguments:
+
+        *function*:
+          Module level function, so it can be sent to the workers.
+
+        *n_items*:
+          Number of work items.
+
+        *args*:
+          Further arguments of the function.
+
+        *chunk_size*:
+          Number of items per chunk. If None use about 16 chunks per
+          worker.
+        """
+
+        if chunk_size is None:
+            chunk_size = -(-n_items//(16*self.n_proc))
+        chunk_size = max(int(chunk_size), 1)
+        chunks = [(start, min(start+chunk_size, n_items))
+                  for start in range(0, n_items, chunk_size)]
+
+        if self.__executor is None:
+            return [function(self.arrays, start, stop, *args)
+                    for start, stop in chunks]
+
+        specs = dict((name, (self.__blocks[name].name, array.shape, array.dtype.str))
+                     for name, array in self.arrays.items())
+        futures = [self.__executor.submit(_run_chunk, function, specs,
+                                          start, stop, args)
+                   for start, stop in chunks]
+        return [future.result() for future in futures]
+
+
+    def close(self):
+        """
+        Stop the workers and free the shared memory.
+        """
+
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        for name in list(self.arrays.keys()):
+            self.__free(name)
+
+
+    def __free(self, name):
+        """
+        Free the shared memory block of the named array.
+        """
+
+        self.arrays.pop(name, None)
+        block = self.__blocks.pop(name, None)
+        if block is not None:
+            try:
+                block.close()
+            except BufferError:
+                # Views of the array are still in use. The memory is
+                # released together with them.
+                pass
+            block.unlink()
@@ -12,9 +12,8 @@ try:
     import h5py
 except:
     print("Warning: no h5py library found.")
-import multiprocessing as mp
-from ..calc.streamlines import Stream
-from ..math.interpolation import vec_int
+from ..calc.streamlines import StreamBatch
+from ..math.interpolation import prepare_field, vec_int_points
 
 
 class Tracers(object):
@@ -85,6 +84,8 @@ class Tracers(object):
           'mean': takes the mean of the adjacent grid point.
           'trilinear': weights the adjacent grid points according to
           their distance.
+          'tricubic', 'quintic': higher order schemes of
+          math.interpolation.interpolate.
 
         *trace_sub*:
           Number of sub-grid cells for the seeds.
@@ -111,66 +112,12 @@ class Tracers(object):
           Directory where the data is stored.
 
         *n_proc*:
-          Number of cores for multi core computation.
+          Number of cores for multi core computation. The worker processes
+          are kept alive for all time indices from ti to tf.
         """
 
         import numpy as np
-
-        # Return the tracers for the specified starting locations.
-        def __sub_tracers(queue, var, field, t_idx, i_proc, n_proc):
-            xx = np.zeros([(self.x0.shape[0]+n_proc-1-i_proc)/n_proc,
-                            self.x0.shape[1], 3])
-            xx[:, :, 0] = self.x0[i_proc:self.x0.shape[0]:n_proc, :, t_idx].copy()
-            xx[:, :, 1] = self.y0[i_proc:self.x0.shape[0]:n_proc, :, t_idx].copy()
-            xx[:, :, 2] = self.z1[i_proc:self.x0.shape[0]:n_proc, :, t_idx].copy()
-            # Initialize the local arrays for this core.
-            sub_x1 = np.zeros(xx[:, :, 0].shape)
-            sub_y1 = np.zeros(xx[:, :, 0].shape)
-            sub_z1 = np.zeros(xx[:, :, 0].shape)
-            sub_l = np.zeros(xx[:, :, 0].shape)
-            sub_curly_A = np.zeros(xx[:, :, 0].shape)
-            sub_ee = np.zeros(xx[:, :, 0].shape)
-            sub_mapping = np.zeros([xx[:, :, 0].shape[0], xx[:, :, 0].shape[1], 3])
-            for ix in range(i_proc, self.x0.shape[0], n_proc):
-                for iy in range(self.x0.shape[1]):
-                    stream = Stream(field, self.params, interpolation=interpolation,
-                                    h_min=h_min, h_max=h_max, len_max=len_max, tol=tol,
-                                    iter_max=iter_max, xx=xx[int(ix/n_proc), iy, :])
-                    sub_x1[int(ix/n_proc), iy] = stream.tracers[stream.stream_len, 0]
-                    sub_y1[int(ix/n_proc), iy] = stream.tracers[stream.stream_len, 1]
-                    sub_z1[int(ix/n_proc), iy] = stream.tracers[stream.stream_len, 2]
-                    sub_l[int(ix/n_proc), iy] = stream.len
-                    if any(np.array(self.params.int_q) == 'curly_A'):
-                        for l in range(stream.stream_len):
-                            aaInt = vec_int((stream.tracers[l+1] + stream.tracers[l])/2,
-                                             var, aa, interpolation=self.params.interpolation)
-                            sub_curly_A[int(ix/n_proc), iy] += \
-                                np.dot(aaInt, (stream.tracers[l+1] - stream.tracers[l]))
-                    if any(np.array(self.params.int_q) == 'ee'):
-                        for l in range(stream.stream_len):
-                            eeInt = vec_int((stream.tracers[l+1] + stream.tracers[l])/2,
-                                             var, ee, interpolation=self.params.interpolation)
-                            sub_ee[int(ix/n_proc), iy] += \
-                                np.dot(eeInt, (stream.tracers[l+1] - stream.tracers[l]))
-
-                    # Create the color mapping.
-                    if (sub_z1[int(ix/n_proc), iy] > self.params.Oz+self.params.Lz-self.params.dz*4):
-                        if (self.x0[ix, iy, t_idx] - sub_x1[int(ix/n_proc), iy]) > 0:
-                            if (self.y0[ix, iy, t_idx] - sub_y1[int(ix/n_proc), iy]) > 0:
-                                sub_mapping[int(ix/n_proc), iy, :] = [0, 1, 0]
-                            else:
-                                sub_mapping[int(ix/n_proc), iy, :] = [1, 1, 0]
-                        else:
-                            if (self.y0[ix, iy, t_idx] - sub_y1[int(ix/n_proc), iy]) > 0:
-                                sub_mapping[int(ix/n_proc), iy, :] = [0, 0, 1]
-                            else:
-                                sub_mapping[int(ix/n_proc), iy, :] = [1, 0, 0]
-                    else:
-                        sub_mapping[int(ix/n_proc), iy, :] = [1, 1, 1]
-
-            queue.put((i_proc, sub_x1, sub_y1, sub_z1, sub_l, sub_mapping,
-                       sub_curly_A, sub_ee))
-
+        from .shared_pool import SharedPool
 
         # Write the tracing parameters.
         self.params.trace_field = trace_field
@@ -178,6 +125,7 @@ class Tracers(object):
         self.params.h_max = h_max
         self.params.len_max = len_max
         self.params.tol = tol
+        self.params.iter_max = iter_max
         self.params.interpolation = interpolation
         self.params.trace_sub = trace_sub
         self.params.int_q = int_q
@@ -192,7 +140,6 @@ class Tracers(object):
         if not(np.isscalar(n_proc)) or (n_proc%1 != 0):
             print("error: invalid processor number")
             return -1
-        queue = mp.Queue()
 
         # Convert int_q string into list.
         if not isinstance(int_q, list):
@@ -236,71 +183,81 @@ class Tracers(object):
                                  nTimes, 3])
         self.t = np.zeros(nTimes)
 
-        for t_idx in range(ti, tf+1):
-            if series:
-                varfile = 'VAR' + str(t_idx)
-
-            # Read the data.
-            var = pc.read_var(varfile=varfile, datadir=datadir, magic=magic,
-                              quiet=True, trimall=True)
-            grid = pc.read_grid(datadir=datadir, quiet=True, trim=True)
-            param2 = pc.read_param(datadir=datadir, param2=True, quiet=True)
-            self.t[t_idx] = var.t
-
-            # Extract the requested vector trace_field.
-            field = getattr(var, trace_field)
-            if any(np.array(int_q) == 'curly_A'):
-                aa = var.aa
-            if any(np.array(int_q) == 'ee'):
-                ee = var.jj*param2.eta - pc.cross(var.uu, var.bb)
-
-            # Get the simulation parameters.
-            self.params.dx = var.dx
-            self.params.dy = var.dy
-            self.params.dz = var.dz
-            self.params.Ox = var.x[0]
-            self.params.Oy = var.y[0]
-            self.params.Oz = var.z[0]
-            self.params.Lx = grid.Lx
-            self.params.Ly = grid.Ly
-            self.params.Lz = grid.Lz
-            self.params.nx = dim.nx
-            self.params.ny = dim.ny
-            self.params.nz = dim.nz
-
-            # Initialize the tracers.
-            for ix in range(int(trace_sub*dim.nx)):
-                for iy in range(int(trace_sub*dim.ny)):
-                    self.x0[ix, iy, t_idx] = grid.x[0] + grid.dx/trace_sub*ix
-                    self.x1[ix, iy, t_idx] = self.x0[ix, iy, t_idx].copy()
-                    self.y0[ix, iy, t_idx] = grid.y[0] + grid.dy/trace_sub*iy
-                    self.y1[ix, iy, t_idx] = self.y0[ix, iy, t_idx].copy()
-                    self.z1[ix, iy, t_idx] = grid.z[0]
-
-            proc = []
-            sub_data = []
-            for i_proc in range(n_proc):
-                proc.append(mp.Process(target=__sub_tracers, args=(queue, var, field, t_idx, i_proc, n_proc)))
-            for i_proc in range(n_proc):
-                proc[i_proc].start()
-            for i_proc in range(n_proc):
-                sub_data.append(queue.get())
-            for i_proc in range(n_proc):
-                proc[i_proc].join()
-            for i_proc in range(n_proc):
-                # Extract the data from the single cores. Mind the order.
-                sub_proc = sub_data[i_proc][0]
-                self.x1[sub_proc::n_proc, :, t_idx] = sub_data[i_proc][1]
-                self.y1[sub_proc::n_proc, :, t_idx] = sub_data[i_proc][2]
-                self.z1[sub_proc::n_proc, :, t_idx] = sub_data[i_proc][3]
-                self.l[sub_proc::n_proc, :, t_idx] = sub_data[i_proc][4]
-                self.mapping[sub_proc::n_proc, :, t_idx, :] = sub_data[i_proc][5]
+        # The workers are kept alive for the whole time series. Each time the
+        # fields are copied into shared memory and the tracers are written
+        # into a shared result array of shape [n_seeds, 6] holding
+        # x1, y1, z1, l, curly_A and ee.
+        shape = self.x0.shape[:2]
+        n_seeds = self.x0[..., 0].size
+        with SharedPool(n_proc) as pool:
+            for t_idx in range(nTimes):
+                if series:
+                    varfile = 'VAR' + str(ti+t_idx)
+
+                # Read the data.
+                var = pc.read_var(varfile=varfile, datadir=datadir, magic=magic,
+                                  quiet=True, trimall=True)
+                grid = pc.read_grid(datadir=datadir, quiet=True, trim=True)
+                param2 = pc.read_param(datadir=datadir, param2=True, quiet=True)
+                self.t[t_idx] = var.t
+
+                # Extract the requested vector trace_field. The fields are
+                # shared in the layout [nz, ny, nx, 3], which is faster to
+                # interpolate from.
+                pool.share('field', prepare_field(getattr(var, trace_field)))
                 if any(np.array(int_q) == 'curly_A'):
-                    self.curly_A[sub_proc::n_proc, :, t_idx] = sub_data[i_proc][6]
+                    pool.share('aa', prepare_field(var.aa))
                 if any(np.array(int_q) == 'ee'):
-                    self.ee[sub_proc::n_proc, :, t_idx] = sub_data[i_proc][7]
-            for i_proc in range(n_proc):
-                proc[i_proc].terminate()
+                    pool.share('ee', prepare_field(var.jj*param2.eta -
+                                                   pc.cross(var.uu, var.bb)))
+
+                # Get the simulation parameters.
+                self.params.dx = var.dx
+                self.params.dy = var.dy
+                self.params.dz = var.dz
+                self.params.Ox = var.x[0]
+                self.params.Oy = var.y[0]
+                self.params.Oz = var.z[0]
+                self.params.Lx = grid.Lx
+                self.params.Ly = grid.Ly
+                self.params.Lz = grid.Lz
+                self.params.nx = dim.nx
+                self.params.ny = dim.ny
+                self.params.nz = dim.nz
+
+                # Initialize the tracers.
+                self.x0[..., t_idx], self.y0[..., t_idx] = \
+                    np.meshgrid(grid.x[0] + grid.dx/trace_sub*np.arange(shape[0]),
+                                grid.y[0] + grid.dy/trace_sub*np.arange(shape[1]),
+                                indexing='ij')
+                seeds = pool.zeros('seeds', [n_seeds, 3])
+                seeds[:, 0] = self.x0[..., t_idx].ravel()
+                seeds[:, 1] = self.y0[..., t_idx].ravel()
+                seeds[:, 2] = grid.z[0]
+
+                # Trace the streamlines in dynamically assigned chunks.
+                result = pool.zeros('result', [n_seeds, 6])
+                pool.map(_trace_chunk, n_seeds, args=(self.params,))
+                self.x1[..., t_idx] = result[:, 0].reshape(shape)
+                self.y1[..., t_idx] = result[:, 1].reshape(shape)
+                self.z1[..., t_idx] = result[:, 2].reshape(shape)
+                self.l[..., t_idx] = result[:, 3].reshape(shape)
+                if any(np.array(int_q) == 'curly_A'):
+                    self.curly_A[..., t_idx] = result[:, 4].reshape(shape)
+                if any(np.array(int_q) == 'ee'):
+                    self.ee[..., t_idx] = result[:, 5].reshape(shape)
+                del(seeds, result)
+
+                # Create the color mapping.
+                mapping = np.ones(shape + (3,))
+                top = self.z1[..., t_idx] > self.params.Oz+self.params.Lz-self.params.dz*4
+                right = (self.x0[..., t_idx] - self.x1[..., t_idx]) > 0
+                up = (self.y0[..., t_idx] - self.y1[..., t_idx]) > 0
+                mapping[top & right & up] = [0, 1, 0]
+                mapping[top & right & ~up] = [1, 1, 0]
+                mapping[top & ~right & up] = [0, 0, 1]
+                mapping[top & ~right & ~up] = [1, 0, 0]
+                self.mapping[:, :, t_idx, :] = mapping
 
 
     def write(self, datadir='./data', destination='tracers.hdf5'):
@@ -534,6 +491,41 @@ class Tracers(object):
 #        os.remove(fname)
 
 
+def _trace_chunk(arrays, start, stop, params):
+    """
+    Trace the streamlines of the seeds start to stop and write the end
+    points, lengths and integrated quantities into the shared result.
+    """
+
+    import numpy as np
+
+    streams = StreamBatch(arrays['field'], params, arrays['seeds'][start:stop],
+                          interpolation=params.interpolation,
+                          integration=params.integration, h_min=params.h_min,
+                          h_max=params.h_max, len_max=params.len_max,
+                          tol=params.tol, iter_max=params.iter_max,
+                          layout='zyxc')
+    result = arrays['result']
+    result[start:stop, :3] = streams.end_points()
+    result[start:stop, 3] = streams.len
+
+    # Integrate the quantities along the streamlines using the
+    # midpoints of all segments at once.
+    if ('aa' in arrays) or ('ee' in arrays):
+        segment = np.ones(len(streams.tracers), dtype=bool)
+        segment[streams.offsets[1:]-1] = False
+        seed_idx = np.repeat(np.arange(len(streams)), streams.stream_len+1)[segment]
+        mid = (streams.tracers[1:] + streams.tracers[:-1])[segment[:-1]]/2
+        dl = (streams.tracers[1:] - streams.tracers[:-1])[segment[:-1]]
+        for column, quantity in ((4, 'aa'), (5, 'ee')):
+            if quantity in arrays:
+                q_int = vec_int_points(mid, arrays[quantity], params,
+                                       interpolation=params.interpolation,
+                                       layout='zyxc')
+                result[start:stop, column] = np.bincount(seed_idx, np.sum(q_int*dl, axis=1),
+                                                         minlength=len(streams))
+
+
 # Class containing simulation and tracing parameters.
 class TracersParameterClass(object):
     """
@@ -24,6 +24,9 @@ from .dill_load import dill_load as load
 from .dill_save import dill_save as save
 from .dill_exists import dill_exists as exists
 
+# binary columnar store for array-heavy objects, used by save/load/exists
+from .array_store import store_save, store_load, store_exists
+
 # pkl im-/exporter
 from .pkl_load import pkl_load #as load
 from .pkl_save import pkl_save #as save
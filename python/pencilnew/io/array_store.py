@@ -0,0 +1,189 @@
+## objects whose NumPy arrays take at least this many bytes are saved by pencilnew.io.save into the store
+ARRAY_STORE_MIN_BYTES = 2**20
+
+
+def store_save(obj, name, folder='pc', format='npy'):
+    """This scripts saves an object with its NumPy arrays stored one by one, so that they
+    are written and read at disk speed and can be loaded partly or memory mapped.
+
+    The NumPy arrays among the items of a dictionary, the attributes of an object or the
+    object itself if it is an array, are written as separate .npy files into the folder
+    <name>.store (format='npy') or as datasets into the HDF5 file <name>.h5 (format='hdf5').
+    The rest of the object is pickled and a manifest.json lists the arrays.
+
+    Args:
+        obj:        object you want to save, e.g. a dictionary of arrays or a class instance
+        name:       name of the store, '.store' or '.h5' will be added automatically
+        folder:     folder of the store
+        format:     'npy' or 'hdf5'
+    """
+    from pencilnew.io.mkdir import mkdir
+    from os.path import join
+    import json
+    import numpy as np
+
+    if format not in ['npy', 'hdf5']:
+        print('!! ERROR: Unknown store format '+str(format)+', use npy or hdf5!')
+        raise ValueError
+
+    mkdir(folder)        ## prepare folder
+    name = store_name(name)
+    store_remove(name, folder)
+
+    kind, arrays, rest = _split_arrays(obj)
+    manifest = {'version': 1, 'kind': kind, 'arrays': []}
+    for i, (key, array) in enumerate(arrays):
+        manifest['arrays'].append({'key': key, 'file': 'array_'+str(i)+'.npy',
+                                   'shape': list(array.shape), 'dtype': array.dtype.str})
+
+    if format == 'npy':
+        path = join(folder, name+'.store')
+        mkdir(path)
+        for entry, (key, array) in zip(manifest['arrays'], arrays):
+            np.save(join(path, entry['file']), array)
+        with open(join(path, 'object.pkl'), 'wb') as f:
+            f.write(_dumps(rest))
+        with open(join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+    else:
+        import h5py
+        with h5py.File(join(folder, name+'.h5'), 'w') as f:
+            for entry, (key, array) in zip(manifest['arrays'], arrays):
+                f.create_dataset('arrays/'+entry['file'], data=array)
+            f.create_dataset('object', data=np.void(_dumps(rest)))
+            f.attrs['manifest'] = json.dumps(manifest)
+
+    return True
+
+
+def store_load(name, folder='.', mmap_mode=None, keys=None):
+    """This scripts loads an object saved by store_save.
+
+    Args:
+        name:       name of the store
+        folder:     folder of the store
+        mmap_mode:  set to 'r' to memory map the .npy arrays instead of reading them,
+                    HDF5 arrays are then returned as h5py datasets
+        keys:       list of the array keys/attributes to load, default all. The other
+                    arrays are left out of the returned object.
+    """
+    from os.path import join, exists
+    import json
+    import numpy as np
+
+    name = store_name(name)
+    path = join(folder, name+'.store')
+    if exists(path):
+        with open(join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        with open(join(path, 'object.pkl'), 'rb') as f:
+            rest = _loads(f.read())
+        arrays = [(entry['key'], np.load(join(path, entry['file']), mmap_mode=mmap_mode))
+                  for entry in manifest['arrays'] if keys is None or entry['key'] in keys]
+    elif exists(join(folder, name+'.h5')):
+        import h5py
+        f = h5py.File(join(folder, name+'.h5'), 'r')
+        manifest = json.loads(f.attrs['manifest'])
+        rest = _loads(f['object'][()].tobytes())
+        arrays = []
+        for entry in manifest['arrays']:
+            if keys is None or entry['key'] in keys:
+                dataset = f['arrays/'+entry['file']]
+                arrays.append((entry['key'], dataset if mmap_mode else dataset[()]))
+        if not mmap_mode: f.close()
+    else:
+        print('!! ERROR: store_load couldnt find '+join(folder, name)+'.store or .h5')
+        return False
+
+    return _join_arrays(manifest['kind'], arrays, rest)
+
+
+def store_exists(name, folder='.'):
+    """Returns the path of the store name in folder, False if there is none."""
+    from os.path import join, exists
+
+    name = store_name(name)
+    for ext in ['.store', '.h5']:
+        if exists(join(folder, name+ext)): return join(folder, name+ext)
+    return False
+
+
+def store_remove(name, folder='.'):
+    """Removes the store name in folder, if existing."""
+    from os import remove
+    from os.path import join, exists, isdir
+    from shutil import rmtree
+
+    name = store_name(name)
+    for ext in ['.store', '.h5']:
+        path = join(folder, name+ext)
+        if isdir(path): rmtree(path)
+        elif exists(path): remove(path)
+
+
+def store_name(name):
+    """Strips the extension of the store and of a dill/pkl file from name."""
+    for ext in ['.store', '.h5', '.dill', '.pkl']:
+        if name.endswith(ext): return name[:-len(ext)]
+    return name
+
+
+def array_nbytes(obj):
+    """Returns the number of bytes of the NumPy arrays which store_save would store separately."""
+    kind, arrays, rest = _split_arrays(obj)
+    return sum([array.nbytes for key, array in arrays])
+
+
+def _split_arrays(obj):
+    """Splits obj into its kind, the list of (key, array) of its NumPy arrays and the rest
+    of the object, i.e. a shallow copy without the arrays."""
+    import numpy as np
+
+    def is_array(value):
+        return isinstance(value, np.ndarray) and value.dtype != object
+
+    if is_array(obj):
+        return 'array', [(None, np.asarray(obj))], None
+    if isinstance(obj, dict):
+        items = obj.items(); kind = 'dict'
+    elif hasattr(obj, '__dict__'):
+        items = obj.__dict__.items(); kind = 'object'
+    else:
+        return 'other', [], obj
+
+    arrays = [(key, np.asarray(value)) for key, value in items
+              if is_array(value) and isinstance(key, (str, int))]
+    array_keys = set([key for key, array in arrays])
+    rest_dict = dict([(key, value) for key, value in items if key not in array_keys])
+    rest = obj.__class__.__new__(obj.__class__)
+    if kind == 'dict': rest.update(rest_dict)
+    else: rest.__dict__.update(rest_dict)
+    return kind, arrays, rest
+
+
+def _join_arrays(kind, arrays, rest):
+    """Inverse of _split_arrays."""
+    if kind == 'array':
+        return arrays[0][1] if arrays else None
+    for key, array in arrays:
+        if kind == 'dict': rest[key] = array
+        else: setattr(rest, key, array)
+    return rest
+
+
+def _dumps(obj):
+    """Pickles obj with dill if available."""
+    try:
+        import dill as pickle
+    except ImportError:
+        import pickle
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(data):
+    """Unpickles data with dill if available."""
+    try:
+        import dill as pickle
+    except ImportError:
+        import pickle
+    return pickle.loads(data)
@@ -9,6 +9,7 @@ def dill_exists(name, folder=False, sim=False):
   """
 
   import pencilnew
+  from pencilnew.io.array_store import store_exists
   from os.path import join, exists
 
   if (not name.endswith('.dill')):	name = name+'.dill'
@@ -18,16 +19,16 @@ def dill_exists(name, folder=False, sim=False):
           folder = sim.pc_datadir
       else:
           # if folder is not defined try to find file at typical places
-          if exists(join('pc', name)):
+          if exists(join('pc', name)) or store_exists(name, 'pc'):
               folder = 'pc'
-          elif exists(join('data/pc', name)):
+          elif exists(join('data/pc', name)) or store_exists(name, 'data/pc'):
               folder = 'data/pc'
           else:
               return False
 
   file = join(folder, name)
-  try:							# check on existance
-    if not exists(file):
+  try:							# check on existance, also as array store
+    if not exists(file) and not store_exists(name, folder):
       return False
     return True
 
@@ -1,16 +1,19 @@
-def dill_load(name, folder=False, sim=False, quiet=True):
+def dill_load(name, folder=False, sim=False, quiet=True, mmap_mode=None):
     """This scripts loads an dill-file. It automatically checks known folders if no folder is specified.
+    Objects saved into the array store (<name>.store or <name>.h5, see pencilnew.io.store_save)
+    are loaded from there.
     Args:
         name:        Name of dill-file  (<name>.dill)
         folder:        Folder containing dill file
         sim:        Simulation for checking automatically folders for
+        mmap_mode:  set to 'r' to memory map the arrays of an array store instead of reading them
 
     Example:
        to read ".pc/sim.dill" use: dill_load('sim', '.pc')
        or simply dill_load('sim'), since dill_load checks for following folders automatically: '.pc', 'data/.pc'
     """
 
-    import dill
+    from pencilnew.io.array_store import store_load, store_exists
     from os.path import join, exists
 
     if folder=='pc' and name.startswith('pc/'): name=name[3:]
@@ -20,17 +23,15 @@ def dill_load(name, folder=False, sim=False, quiet=True):
     sim_path = '.'
     if sim: sim_path = sim.path
     if not folder:
-        if exists(join(sim_path, 'pc', name)):
-            folder = join(sim_path, 'pc')
-            if not quiet: print('~ Found '+name+' in '+folder)
-        elif exists(join(sim_path, 'data/pc', name)):
-            folder = join(sim_path, 'data/pc')
-            if not quiet: print('~ Found '+name+' in '+folder)
-        elif exists(join(sim_path, '.', name)):
-            folder = join(sim_path, '.')
-            if not quiet: print('~ Found '+name+' in '+folder)
-        else:
+        for folder in [join(sim_path, 'pc'), join(sim_path, 'data/pc'), join(sim_path, '.'), False]:
+            if folder and (exists(join(folder, name)) or store_exists(name, folder)): break
+        if not folder:
             print('!! ERROR: Couldnt find file '+name);        return False
+        if not quiet: print('~ Found '+name+' in '+folder)
+
+    if store_exists(name, folder) and not exists(join(folder, name)):
+        if not quiet: print(store_exists(name, folder))
+        return store_load(name, folder=folder, mmap_mode=mmap_mode)
 
     # open file
     filepath = join(folder, name)
@@ -40,6 +41,7 @@ def dill_load(name, folder=False, sim=False, quiet=True):
         if not exists(filepath) or not exists(join(sim_path, filepath)):
             print('!! ERROR: dill_load couldnt load '+filepath); return False
         # try:                                               # open file and return it
+        import dill
         with open(filepath, 'rb') as f:
             obj = dill.load(f)
         return obj
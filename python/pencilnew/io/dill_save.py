@@ -1,15 +1,20 @@
 
-def dill_save(obj, name, folder='pc'):
+def dill_save(obj, name, folder='pc', arrays=None):
     """This scripts saves any kind of object as a dill file in a folder.
 
     Args:
         obj:		object you want to save in an pkl file
         name:		name of pkl file, '.pkl' will be added automatically if missing
+        arrays:     how the NumPy arrays among the items/attributes of obj are saved:
+                      - 'npy':  as .npy files in the folder <name>.store, see store_save
+                      - 'hdf5': as datasets of the HDF5 file <name>.h5
+                      - False:  pickled together with obj into <name>.dill
+                      - None:   'npy' if they take more than ARRAY_STORE_MIN_BYTES, else False
     """
     from pencilnew.io.mkdir import mkdir
+    from pencilnew.io.array_store import store_save, store_remove, array_nbytes, ARRAY_STORE_MIN_BYTES
     from os import remove
     from os.path import join, exists
-    import dill
 
     mkdir(folder)        ## prepare folder
 
@@ -19,7 +24,14 @@ def dill_save(obj, name, folder='pc'):
     full_path = join(folder, name)
 
     if exists(full_path): remove(full_path)
+    store_remove(name, folder)
+
+    if arrays is None:
+        arrays = 'npy' if array_nbytes(obj) >= ARRAY_STORE_MIN_BYTES else False
+    if arrays:
+        return store_save(obj, name, folder=folder, format=arrays)
 
+    import dill
     with open(join(folder, name), 'wb') as f:
         dill.dump(obj, f)
 
@@ -1,11 +1,12 @@
 
-def pkl_save(obj, name, folder='.pc', ascii=True):
+def pkl_save(obj, name, folder='.pc', ascii=False):
     """This scripts saves any kind of object as a pkl file in folder.
 
     Args:
     obj:		object you want to save in an pkl file
     name:		name of pkl file, '.pkl' will be added automatically if missing
-    ascii:		if you dont want to save pkl file in ascii set this to false
+    ascii:		set this to true to save the pkl file in ascii (protocol 0) instead of binary
+    			for array-heavy objects rather use pencilnew.io.save or store_save
     """
     from pencilnew.io.mkdir import mkdir
     from os.path import join
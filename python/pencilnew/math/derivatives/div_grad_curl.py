@@ -7,53 +7,83 @@ Compute the divergence, gradient and curl.
 """
 
 
-def div(f, dx, dy, dz):
+def div(f, dx, dy, dz, out=None, chunk_size=None, grid=None,
+        coordinate_system='cartesian'):
     """
     Take divervenge of pencil code vector array f.
+    The result is written into out if given. The stencils are evaluated in
+    chunks of chunk_size z-planes.
+    If grid (from read.grid) is given, its dx_1, dx_tilde etc. are used for
+    non-equidistant grids and coordinate_system may be 'cylindrical' or
+    'spherical'.
     """
 
-    from pencilnew.math.derivatives.der import xder, yder, zder
+    from pencilnew.math.derivatives.stencil import fused_div
+    from pencilnew.math.derivatives.metric import metric_div
 
-    if (f.ndim != 4):
-        print("div: must have vector 4-D array f[mvar ,mz, my, mx] for divergence.")
+    if grid is not None:
+        return metric_div(f, grid, coordinate_system, out=out,
+                          chunk_size=chunk_size)
+    if coordinate_system != 'cartesian':
+        print("div: grid needed for the coordinate system '{0}'.".format(coordinate_system))
         raise ValueError
 
-    return xder(f[0, ...], dx) + yder(f[1, ...], dy) + zder(f[2, ...], dz)
+    return fused_div(f, dx, dy, dz, out=out, chunk_size=chunk_size)
 
 
-def grad(f, dx, dy, dz):
+def grad(f, dx, dy, dz, out=None, chunk_size=None, grid=None,
+         coordinate_system='cartesian'):
     """
-    Take the curl of a pencil code scalar array f.
+    Take the gradient of a pencil code scalar array f.
+    The result is written into out if given. The stencils are evaluated in
+    chunks of chunk_size z-planes.
+    If grid (from read.grid) is given, its dx_1, dx_tilde etc. are used for
+    non-equidistant grids and coordinate_system may be 'cylindrical' or
+    'spherical'.
     """
 
-    import numpy as np
-    from pencilnew.math.derivatives.der import xder, yder, zder
+    from pencilnew.math.derivatives.stencil import fused_grad
+    from pencilnew.math.derivatives.metric import metric_grad
 
-    if (f.ndim != 3):
-        print("grad: must have scalar 3-D array f[mz, my, mx] for gradient.")
+    if grid is not None:
+        return metric_grad(f, grid, coordinate_system, out=out,
+                           chunk_size=chunk_size)
+    if coordinate_system != 'cartesian':
+        print("grad: grid needed for the coordinate system '{0}'.".format(coordinate_system))
         raise ValueError
 
-    grad_value = np.empty((3,) + f.shape)
-    grad_value[0, ...] = xder(f, dx)
-    grad_value[1, ...] = yder(f, dy)
-    grad_value[2, ...] = zder(f, dz)
-
-    return grad_value
+    return fused_grad(f, dx, dy, dz, out=out, chunk_size=chunk_size)
 
 
-def curl(f, dx, dy, dz, x=None, y=None, run2D=False, coordinate_system='cartesian'):
+def curl(f, dx, dy, dz, x=None, y=None, run2D=False, coordinate_system='cartesian',
+         out=None, chunk_size=None, grid=None):
     """
     Take the curl of a pencil code vector array.
     The run2D parameter deals with pure 2-D snapshots (solved the (x,z)-plane pb).
+    In 3-D cartesian coordinates the result is written into out if given and
+    the stencils are evaluated in chunks of chunk_size z-planes.
+    If grid (from read.grid) is given, its dx_1, dx_tilde etc. are used for
+    non-equidistant grids and coordinate_system may be 'cylindrical' or
+    'spherical'.
     """
 
     import numpy as np
     from pencilnew.math.derivatives.der import xder, yder, zder
+    from pencilnew.math.derivatives.stencil import fused_curl
+    from pencilnew.math.derivatives.metric import metric_curl
 
     if (f.shape[0] != 3):
         print("curl: must have vector 4-D array f[3,mz,my,mx] for curl.")
         raise ValueError
 
+    if grid is not None and not run2D:
+        return metric_curl(f, grid, coordinate_system, out=out,
+                           chunk_size=chunk_size)
+
+    if coordinate_system == 'cartesian' and not run2D and f.ndim == 4 and \
+       dy != 0. and dz != 0.:
+        return fused_curl(f, dx, dy, dz, out=out, chunk_size=chunk_size)
+
     curl_value = np.empty_like(f)
     if (dy != 0. and dz != 0.):
         # 3-D case	
@@ -75,47 +105,52 @@ def curl(f, dx, dy, dz, x=None, y=None, run2D=False, coordinate_system='cartesia
     return curl_value
 
 
-def curl2(f, dx, dy, dz):
+def curl2(f, dx, dy, dz, out=None, chunk_size=None):
     """
     Take the double curl of a pencil code vector array f.
     CARTESIAN COORDINATES ONLY!!
+    The result is written into out if given. The stencils are evaluated in
+    chunks of chunk_size z-planes.
     """
 
-    import numpy as np
-    from pencilnew.math.derivatives.der import xder, yder, zder, xder2, yder2, zder2
-
-    if (f.ndim != 4 or f.shape[0] != 3):
-        print("curl2: must have vector 4-D array f[3,mz,my,mx] for curl2.")
-        raise ValueError
-
-    curl2_value = np.empty(f.shape)
-    curl2_value[0, ...] = xder(yder(f[1, ...], dy) + zder(f[2, ...], dz), dx) \
-                          -yder2(f[0, ...], dy) - zder2(f[0, ...], dz)
-    curl2_value[1, ...] = yder(xder(f[0, ...], dx) + zder(f[2, ...], dz), dy) \
-                          -xder2(f[1, ...], dx) - zder2(f[1, ...], dz)
-    curl2_value[2, ...] = zder(xder(f[0, ...], dx) + yder(f[1, ...], dy), dz) \
-                          -xder2(f[2, ...], dx) - yder2(f[2, ...], dy)
+    from pencilnew.math.derivatives.stencil import fused_curl2
 
-    return curl2
+    return fused_curl2(f, dx, dy, dz, out=out, chunk_size=chunk_size)
 
 
-def del2(f, dx, dy, dz):
+def del2(f, dx, dy, dz, out=None, chunk_size=None, grid=None,
+         coordinate_system='cartesian'):
     """
-    Calculate del6 (defined here as d^6/dx^6 + d^6/dy^6 + d^6/dz^6, rather
-    than del2^3) of a scalar f for hyperdiffusion.
+    Calculate the Laplacian of a scalar f, or of each component of a
+    vector f.
+    The result is written into out if given. The stencils are evaluated in
+    chunks of chunk_size z-planes.
+    If grid (from read.grid) is given, its dx_1, dx_tilde etc. are used for
+    non-equidistant grids and coordinate_system may be 'cylindrical' or
+    'spherical' (scalar f only).
     """
 
-    from pencilnew.math.derivatives.der import xder2, yder2, zder2
+    from pencilnew.math.derivatives.stencil import fused_del2
+    from pencilnew.math.derivatives.metric import metric_del2
+
+    if grid is not None:
+        return metric_del2(f, grid, coordinate_system, out=out,
+                           chunk_size=chunk_size)
+    if coordinate_system != 'cartesian':
+        print("del2: grid needed for the coordinate system '{0}'.".format(coordinate_system))
+        raise ValueError
 
-    return xder2(f, dx) + yder2(f, dy) + zder2(f, dz)
+    return fused_del2(f, dx, dy, dz, out=out, chunk_size=chunk_size)
 
 
-def del6(f, dx, dy, dz):
+def del6(f, dx, dy, dz, out=None, chunk_size=None):
     """
     Calculate del6 (defined here as d^6/dx^6 + d^6/dy^6 + d^6/dz^6, rather
     than del2^3) of a scalar f for hyperdiffusion.
+    The result is written into out if given. The stencils are evaluated in
+    chunks of chunk_size z-planes.
     """
 
-    from pencilnew.math.derivatives.der import xder6, yder6, zder6
+    from pencilnew.math.derivatives.stencil import fused_del6
 
-    return xder6(f, dx) + yder6(f, dy) + zder6(f, dz)
+    return fused_del6(f, dx, dy, dz, out=out, chunk_size=chunk_size)
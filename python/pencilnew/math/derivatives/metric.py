@@ -0,0 +1,442 @@
+# metric.py
+#
+# 6th order vector calculus operators on non-equidistant cartesian,
+# cylindrical and spherical grids, using the inverse grid spacings dx_1 and
+# their derivatives dx_tilde from read.grid.
+"""
+Grid metric and the operators grad, div, curl and del2 for non-equidistant
+and curvilinear grids. The metric factors (1/r, 1/sin(theta), cot(theta),
+...) are computed once per grid and coordinate system and cached. The
+operators are evaluated in chunks of z-planes over the full cube.
+"""
+
+import weakref
+
+_metric_cache = weakref.WeakKeyDictionary()
+
+
+def grid_metric(grid, coordinate_system='cartesian', shape=None):
+    """
+    Return the GridMetric of the grid, reusing the cached one if it exists.
+
+    call signature:
+
+    grid_metric(grid, coordinate_system='cartesian', shape=None)
+
+    Keyword arguments:
+
+    *grid*:
+      Grid object as returned by read.grid.
+
+    *coordinate_system*:
+      'cartesian', 'cylindrical' (r, phi, z) or 'spherical'
+      (r, theta, phi).
+
+    *shape*:
+      Shape [mz, my, mx] of the fields including ghost zones. If None, the
+      lengths of grid.x, grid.y and grid.z are used.
+    """
+
+    if shape is None:
+        shape = (len(grid.z), len(grid.y), len(grid.x))
+    key = (coordinate_system, tuple(shape))
+    try:
+        metrics = _metric_cache.setdefault(grid, {})
+    except TypeError:
+        return GridMetric(grid, coordinate_system, shape)
+    if key not in metrics:
+        metrics[key] = GridMetric(grid, coordinate_system, shape)
+    return metrics[key]
+
+
+class GridMetric(object):
+    """
+    GridMetric -- holds the inverse grid spacings and the metric factors
+    of a grid for fields of a given shape.
+    """
+
+    def __init__(self, grid, coordinate_system='cartesian', shape=None):
+        """
+        Compute the metric of the grid.
+
+        call signature:
+
+        GridMetric(grid, coordinate_system='cartesian', shape=None)
+
+        Keyword arguments:
+
+        *grid*:
+          Grid object as returned by read.grid, trimmed or not. If it has
+          no dx_1 or dx_tilde, they are computed from the coordinates to
+          second order only.
+
+        *coordinate_system*:
+          'cartesian', 'cylindrical' (r, phi, z) or 'spherical'
+          (r, theta, phi).
+
+        *shape*:
+          Shape [mz, my, mx] of the fields including ghost zones.
+        """
+
+        import numpy as np
+
+        if coordinate_system not in ('cartesian', 'cylindrical', 'spherical'):
+            print("GridMetric: unknown coordinate system '{0}'.".format(coordinate_system))
+            raise ValueError
+
+        if shape is None:
+            shape = (len(grid.z), len(grid.y), len(grid.x))
+        self.coordinate_system = coordinate_system
+        self.shape = tuple(shape)
+
+        # Coordinates and (d_1, d_tilde) in the order z, y, x. An entry of
+        # self.spacing is a scalar grid spacing for equidistant directions.
+        self.coords = []
+        self.spacing = []
+        for name, m in zip('zyx', self.shape):
+            coord = self.__extend(np.atleast_1d(np.asarray(getattr(grid, name),
+                                                           dtype=np.float64)), m)
+            d_1 = getattr(grid, 'd{0}_1'.format(name), None)
+            d_tilde = getattr(grid, 'd{0}_tilde'.format(name), None)
+            if np.size(d_1) == np.size(coord) or np.size(d_1) == m - 6:
+                d_1 = self.__extend(np.asarray(d_1, dtype=np.float64), m)
+            elif m > 1:
+                d_1 = 1./np.gradient(coord)
+            else:
+                d_1 = np.ones(1)
+            if np.size(d_tilde) == np.size(d_1) or np.size(d_tilde) == m - 6:
+                d_tilde = self.__extend(np.asarray(d_tilde, dtype=np.float64), m)
+            elif m > 1:
+                d_tilde = np.gradient(d_1)
+            else:
+                d_tilde = np.zeros(1)
+            self.coords.append(coord)
+            if m <= 6:
+                self.spacing.append(1.)
+            elif np.allclose(d_1, d_1[0], rtol=1e-12, atol=0):
+                self.spacing.append(1./d_1[0])
+            else:
+                self.spacing.append((d_1, d_tilde))
+
+        # Metric factors, shaped to broadcast against [mz, my, mx].
+        self.r1 = self.r1_2 = None
+        self.sin1th = self.cotth = None
+        if coordinate_system != 'cartesian':
+            r = self.coords[2]
+            self.r1 = np.zeros_like(r)
+            self.r1[r != 0] = 1./r[r != 0]
+            self.r1 = self.r1.reshape(1, 1, -1)
+            self.r1_2 = self.r1**2
+        if coordinate_system == 'spherical':
+            sinth = np.sin(self.coords[1])
+            self.sin1th = np.zeros_like(sinth)
+            self.sin1th[sinth != 0] = 1./sinth[sinth != 0]
+            self.cotth = np.cos(self.coords[1])*self.sin1th
+            self.sin1th = self.sin1th.reshape(1, -1, 1)
+            self.cotth = self.cotth.reshape(1, -1, 1)
+            self.r1_sin1th = self.r1*self.sin1th
+            self.r1_cotth = self.r1*self.cotth
+            self.r1_2_cotth = self.r1_2*self.cotth
+            self.r1_2_sin1th_2 = self.r1_sin1th**2
+
+
+    def __extend(self, array, m):
+        """
+        Extend an array of the physical domain into the ghost zones by
+        linear extrapolation.
+        """
+
+        import numpy as np
+
+        if array.size != m - 6 or m <= 6:
+            return array
+        if array.size == 1:
+            return np.repeat(array, m)
+        left = array[0] - (array[1] - array[0])*np.arange(3, 0, -1)
+        right = array[-1] + (array[-1] - array[-2])*np.arange(1, 4)
+        return np.concatenate((left, array, right))
+
+
+    def derivative(self, out, k0, src, s0, axis, order, tmp, fac=1.):
+        """
+        Add fac times the derivative along axis (0 for z, 1 for y, 2 for x)
+        of src to out, see stencil.add_derivative.
+        """
+
+        from pencilnew.math.derivatives.stencil import add_derivative
+
+        spacing = self.spacing[axis]
+        if isinstance(spacing, tuple):
+            add_derivative(out, k0, src, s0, self.shape[0], axis, order, 1.,
+                           tmp, fac=fac, metric=spacing)
+        else:
+            add_derivative(out, k0, src, s0, self.shape[0], axis, order,
+                           spacing, tmp, fac=fac)
+
+
+def _term_factor(metric, name, sign):
+    """
+    Return sign times the metric factor with the given name.
+    """
+
+    if name is None:
+        return sign
+    return sign*getattr(metric, name)
+
+
+def _metric_terms(f, metric, terms, out, chunk_size):
+    """
+    Evaluate a sum of terms chunk by chunk. Every term is a tuple
+    (out component, f component, axis, order, factor name, sign), where
+    order 0 stands for the factor times the field itself.
+    """
+
+    import numpy as np
+    from pencilnew.math.derivatives.stencil import chunk_planes
+
+    mz, my, mx = f.shape[1:]
+    nk = chunk_planes(f.shape, chunk_size)
+    tmp = np.empty(nk*my*mx, dtype=out.dtype)
+    factors = [_term_factor(metric, term[4], term[5]) for term in terms]
+    for k0 in range(0, mz, nk):
+        k1 = min(k0+nk, mz)
+        for (comp, src, axis, order, name, sign), fac in zip(terms, factors):
+            if order == 0:
+                if not np.isscalar(fac) and fac.shape[0] > 1:
+                    fac = fac[k0:k1]
+                work = tmp[:(k1-k0)*my*mx].reshape(k1-k0, my, mx)
+                np.multiply(f[src, k0:k1], fac, out=work)
+                out[comp, k0:k1] += work
+            else:
+                metric.derivative(out[comp, k0:k1], k0, f[src], 0, axis,
+                                  order, tmp, fac=fac)
+    return out
+
+
+# Terms (out component, f component, axis, order, factor, sign) of the
+# operators. The axis is 2 for x (r), 1 for y (phi or theta) and 0 for z
+# (z or phi).
+GRAD_TERMS = {
+    'cartesian': ((0, 0, 2, 1, None, 1.), (1, 0, 1, 1, None, 1.),
+                  (2, 0, 0, 1, None, 1.)),
+    'cylindrical': ((0, 0, 2, 1, None, 1.), (1, 0, 1, 1, 'r1', 1.),
+                    (2, 0, 0, 1, None, 1.)),
+    'spherical': ((0, 0, 2, 1, None, 1.), (1, 0, 1, 1, 'r1', 1.),
+                  (2, 0, 0, 1, 'r1_sin1th', 1.))}
+
+DIV_TERMS = {
+    'cartesian': ((0, 0, 2, 1, None, 1.), (0, 1, 1, 1, None, 1.),
+                  (0, 2, 0, 1, None, 1.)),
+    'cylindrical': ((0, 0, 2, 1, None, 1.), (0, 0, 2, 0, 'r1', 1.),
+                    (0, 1, 1, 1, 'r1', 1.), (0, 2, 0, 1, None, 1.)),
+    'spherical': ((0, 0, 2, 1, None, 1.), (0, 0, 2, 0, 'r1', 2.),
+                  (0, 1, 1, 1, 'r1', 1.), (0, 1, 1, 0, 'r1_cotth', 1.),
+                  (0, 2, 0, 1, 'r1_sin1th', 1.))}
+
+CURL_TERMS = {
+    'cartesian': ((0, 2, 1, 1, None, 1.), (0, 1, 0, 1, None, -1.),
+                  (1, 0, 0, 1, None, 1.), (1, 2, 2, 1, None, -1.),
+                  (2, 1, 2, 1, None, 1.), (2, 0, 1, 1, None, -1.)),
+    'cylindrical': ((0, 2, 1, 1, 'r1', 1.), (0, 1, 0, 1, None, -1.),
+                    (1, 0, 0, 1, None, 1.), (1, 2, 2, 1, None, -1.),
+                    (2, 1, 2, 1, None, 1.), (2, 1, 2, 0, 'r1', 1.),
+                    (2, 0, 1, 1, 'r1', -1.)),
+    'spherical': ((0, 2, 1, 1, 'r1', 1.), (0, 2, 1, 0, 'r1_cotth', 1.),
+                  (0, 1, 0, 1, 'r1_sin1th', -1.),
+                  (1, 0, 0, 1, 'r1_sin1th', 1.), (1, 2, 2, 1, None, -1.),
+                  (1, 2, 2, 0, 'r1', -1.),
+                  (2, 1, 2, 1, None, 1.), (2, 1, 2, 0, 'r1', 1.),
+                  (2, 0, 1, 1, 'r1', -1.))}
+
+DEL2_TERMS = {
+    'cartesian': ((0, 0, 2, 2, None, 1.), (0, 0, 1, 2, None, 1.),
+                  (0, 0, 0, 2, None, 1.)),
+    'cylindrical': ((0, 0, 2, 2, None, 1.), (0, 0, 2, 1, 'r1', 1.),
+                    (0, 0, 1, 2, 'r1_2', 1.), (0, 0, 0, 2, None, 1.)),
+    'spherical': ((0, 0, 2, 2, None, 1.), (0, 0, 2, 1, 'r1', 2.),
+                  (0, 0, 1, 2, 'r1_2', 1.), (0, 0, 1, 1, 'r1_2_cotth', 1.),
+                  (0, 0, 0, 2, 'r1_2_sin1th_2', 1.))}
+
+
+def _metric_prepare(f, grid, coordinate_system, out, shape, name):
+    """
+    Return the metric of the grid and the zeroed output array.
+    """
+
+    from pencilnew.math.derivatives.stencil import _prepare
+
+    if isinstance(grid, GridMetric):
+        metric = grid
+    else:
+        metric = grid_metric(grid, coordinate_system, f.shape[-3:])
+    if metric.shape != tuple(f.shape[-3:]):
+        print("{0}: grid metric for shape {1} given, but the field has shape {2}."
+              .format(name, metric.shape, f.shape[-3:]))
+        raise ValueError
+    return metric, _prepare(f, out, shape)
+
+
+def metric_grad(f, grid, coordinate_system='cartesian', out=None,
+                chunk_size=None):
+    """
+    Compute the gradient of the scalar field f[mz, my, mx] on a
+    non-equidistant or curvilinear grid.
+
+    call signature:
+
+    metric_grad(f, grid, coordinate_system='cartesian', out=None,
+                chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Scalar field including ghost zones.
+
+    *grid*:
+      Grid object from read.grid or a GridMetric.
+
+    *coordinate_system*:
+      'cartesian', 'cylindrical' or 'spherical'.
+
+    *out*:
+      Optional output array of shape [3, mz, my, mx].
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    if f.ndim != 3:
+        print("grad: must have scalar 3-D array f[mz, my, mx] for gradient.")
+        raise ValueError
+
+    metric, out = _metric_prepare(f, grid, coordinate_system, out,
+                                  (3,) + f.shape, 'grad')
+    return _metric_terms(f[None], metric, GRAD_TERMS[metric.coordinate_system],
+                         out, chunk_size)
+
+
+def metric_div(f, grid, coordinate_system='cartesian', out=None,
+               chunk_size=None):
+    """
+    Compute the divergence of the vector field f[3, mz, my, mx] on a
+    non-equidistant or curvilinear grid.
+
+    call signature:
+
+    metric_div(f, grid, coordinate_system='cartesian', out=None,
+               chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Vector field including ghost zones.
+
+    *grid*:
+      Grid object from read.grid or a GridMetric.
+
+    *coordinate_system*:
+      'cartesian', 'cylindrical' or 'spherical'.
+
+    *out*:
+      Optional output array of shape [mz, my, mx].
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    if f.ndim != 4 or f.shape[0] != 3:
+        print("div: must have vector 4-D array f[3, mz, my, mx] for divergence.")
+        raise ValueError
+
+    metric, out = _metric_prepare(f, grid, coordinate_system, out,
+                                  f.shape[1:], 'div')
+    _metric_terms(f, metric, DIV_TERMS[metric.coordinate_system], out[None],
+                  chunk_size)
+    return out
+
+
+def metric_curl(f, grid, coordinate_system='cartesian', out=None,
+                chunk_size=None):
+    """
+    Compute the curl of the vector field f[3, mz, my, mx] on a
+    non-equidistant or curvilinear grid.
+
+    call signature:
+
+    metric_curl(f, grid, coordinate_system='cartesian', out=None,
+                chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Vector field including ghost zones.
+
+    *grid*:
+      Grid object from read.grid or a GridMetric.
+
+    *coordinate_system*:
+      'cartesian', 'cylindrical' or 'spherical'.
+
+    *out*:
+      Optional output array of shape [3, mz, my, mx].
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    if f.ndim != 4 or f.shape[0] != 3:
+        print("curl: must have vector 4-D array f[3,mz,my,mx] for curl.")
+        raise ValueError
+
+    metric, out = _metric_prepare(f, grid, coordinate_system, out, f.shape,
+                                  'curl')
+    return _metric_terms(f, metric, CURL_TERMS[metric.coordinate_system],
+                         out, chunk_size)
+
+
+def metric_del2(f, grid, coordinate_system='cartesian', out=None,
+                chunk_size=None):
+    """
+    Compute the Laplacian of the scalar field f[mz, my, mx] on a
+    non-equidistant or curvilinear grid. In cartesian coordinates the
+    components of a vector field f[n, mz, my, mx] are also accepted.
+
+    call signature:
+
+    metric_del2(f, grid, coordinate_system='cartesian', out=None,
+                chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Scalar field including ghost zones.
+
+    *grid*:
+      Grid object from read.grid or a GridMetric.
+
+    *coordinate_system*:
+      'cartesian', 'cylindrical' or 'spherical'.
+
+    *out*:
+      Optional output array of the shape of f.
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    metric, out = _metric_prepare(f, grid, coordinate_system, out, f.shape,
+                                  'del2')
+    if f.ndim == 4 and metric.coordinate_system != 'cartesian':
+        print("del2: the vector Laplacian is only implemented for cartesian coordinates.")
+        raise ValueError
+    if f.ndim == 3:
+        _metric_terms(f[None], metric, DEL2_TERMS[metric.coordinate_system],
+                      out[None], chunk_size)
+    elif f.ndim == 4:
+        for comp in range(f.shape[0]):
+            _metric_terms(f[comp:comp+1], metric, DEL2_TERMS['cartesian'],
+                          out[comp:comp+1], chunk_size)
+    else:
+        print("del2: must have scalar 3-D or vector 4-D array f for del2.")
+        raise ValueError
+    return out
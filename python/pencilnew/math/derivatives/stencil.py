@@ -0,0 +1,549 @@
+# stencil.py
+#
+# Fused 6th order finite difference operators with ghost zones included
+# (pencil-code style). The operators write into caller provided buffers and
+# are evaluated in chunks of z-planes, so only chunk sized temporaries are
+# needed.
+"""
+Fused 6th order derivative operators (grad, div, curl, curl2, del2, del6).
+They give the same result as the single derivatives in
+der_6th_order_w_ghosts, i.e. zero in the ghost zones of the differentiated
+direction. Non-equidistant grids are handled with the metric argument of
+add_derivative, see metric.py.
+"""
+
+# Stencil coefficients (center, ((shift, coefficient), ...), symmetric,
+# normalization) for the derivatives of order 1, 2 and 6.
+STENCILS = {1: (0., ((1, 45.), (2, -9.), (3, 1.)), False, 60.),
+            2: (-490., ((1, 270.), (2, -27.), (3, 2.)), True, 180.),
+            6: (-20., ((1, 15.), (2, -6.), (3, 1.)), True, 1.)}
+
+# Default number of grid points in one chunk.
+CHUNK_POINTS = 2**18
+
+
+def chunk_planes(shape, chunk_size=None):
+    """
+    Return the number of z-planes in one chunk.
+
+    call signature:
+
+    chunk_planes(shape, chunk_size=None)
+
+    Keyword arguments:
+
+    *shape*:
+      Shape [..., mz, my, mx] of the field.
+
+    *chunk_size*:
+      Number of z-planes per chunk. If None, use chunks of about
+      CHUNK_POINTS grid points.
+    """
+
+    if chunk_size is None:
+        chunk_size = CHUNK_POINTS//max(shape[-1]*shape[-2], 1)
+    return int(min(max(chunk_size, 1), shape[-3]))
+
+
+def add_derivative(out, k0, src, s0, mz, axis, order, delta, tmp, fac=1.,
+                   metric=None):
+    """
+    Add fac times the derivative of src along axis to out.
+
+    call signature:
+
+    add_derivative(out, k0, src, s0, mz, axis, order, delta, tmp, fac=1.,
+                   metric=None)
+
+    Keyword arguments:
+
+    *out*:
+      Chunk [nk, my, mx] of the result, starting at the global z-plane k0.
+
+    *k0*:
+      Global index of the first z-plane of out.
+
+    *src*:
+      Scalar field [ns, my, mx] starting at the global z-plane s0. It must
+      contain the planes of out and, for axis=0, 3 more planes on each
+      side where available.
+
+    *s0*:
+      Global index of the first z-plane of src.
+
+    *mz*:
+      Global number of z-planes including ghost zones.
+
+    *axis*:
+      Direction of the derivative: 0 for z, 1 for y and 2 for x.
+
+    *order*:
+      Order of the derivative: 1, 2 or 6.
+
+    *delta*:
+      Grid spacing in this direction.
+
+    *tmp*:
+      Flat work array with at least out.size elements.
+
+    *fac*:
+      Factor for the derivative. A scalar or an array that broadcasts
+      against out.
+
+    *metric*:
+      Tuple (d_1, d_tilde) of the inverse grid spacing and its derivative
+      along axis, e.g. (dx_1, dx_tilde) from read.grid, for non-equidistant
+      grids. Their length is the number of grid points in this direction.
+      If given, delta is ignored.
+    """
+
+    import numpy as np
+
+    center, pairs, symmetric, norm = STENCILS[order]
+    nk = out.shape[0]
+
+    # Global index range of the points that are computed.
+    region = [slice(k0, k0+nk), slice(None), slice(None)]
+    if axis == 0:
+        # Interior z-planes of this chunk.
+        i0 = max(k0, 3)
+        i1 = min(k0+nk, mz-3)
+        if i1 <= i0:
+            return
+        target = out[i0-k0:i1-k0]
+        region[0] = slice(i0, i1)
+
+        def shifted(s):
+            return src[i0-s0+s:i1-s0+s]
+    else:
+        n = src.shape[axis]
+        if n <= 6:
+            return
+        src = src[k0-s0:k0-s0+nk]
+        index = [slice(None)]*3
+        index[axis] = slice(3, n-3)
+        target = out[tuple(index)]
+        region[axis] = slice(3, n-3)
+
+        def shifted(s):
+            index[axis] = slice(3+s, n-3+s)
+            return src[tuple(index)]
+
+    if not np.isscalar(fac):
+        fac = fac[tuple(sl if fac.shape[i] > 1 else slice(None)
+                        for i, sl in enumerate(region))]
+
+    work = tmp[:target.size].reshape(target.shape)
+    if metric is None:
+        _add_stencil(target, work, shifted, center, pairs, symmetric,
+                     fac/(norm*delta**order))
+        return
+
+    # Non-equidistant grid: stencil in index space times the metric terms.
+    shape = [1, 1, 1]
+    shape[axis] = -1
+    d_1 = np.asarray(metric[0])[region[axis]].reshape(shape)
+    scaled = np.zeros(target.shape, dtype=target.dtype)
+    _add_stencil(scaled, work, shifted, center, pairs, symmetric, 1./norm)
+    scaled *= fac*d_1**order
+    target += scaled
+    if order == 2 and metric[1] is not None:
+        d_tilde = np.asarray(metric[1])[region[axis]].reshape(shape)
+        center, pairs, symmetric, norm = STENCILS[1]
+        scaled[...] = 0
+        _add_stencil(scaled, work, shifted, center, pairs, symmetric, 1./norm)
+        scaled *= fac*d_1*d_tilde
+        target += scaled
+
+
+def _add_stencil(target, work, shifted, center, pairs, symmetric, fac):
+    """
+    Add the stencil sum times fac to target, using work as buffer.
+    """
+
+    import numpy as np
+
+    if center != 0:
+        np.multiply(shifted(0), center*fac, out=work)
+        target += work
+    for s, coeff in pairs:
+        if symmetric:
+            np.add(shifted(s), shifted(-s), out=work)
+        else:
+            np.subtract(shifted(s), shifted(-s), out=work)
+        work *= coeff*fac
+        target += work
+
+
+def _prepare(f, out, shape, dtype=None):
+    """
+    Return the zeroed output array and the dtype of the computation.
+    """
+
+    import numpy as np
+
+    if dtype is None:
+        dtype = f.dtype if f.dtype.kind == 'f' else np.float64
+    if out is None:
+        out = np.zeros(shape, dtype=dtype)
+    else:
+        if out.shape != shape:
+            print("out: array of shape {0} needed.".format(shape))
+            raise ValueError
+        out[...] = 0
+    return out
+
+
+def fused_grad(f, dx, dy, dz, out=None, chunk_size=None):
+    """
+    Compute the gradient of the scalar field f[mz, my, mx] in one pass.
+
+    call signature:
+
+    fused_grad(f, dx, dy, dz, out=None, chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Scalar field including ghost zones.
+
+    *dx, dy, dz*:
+      Grid spacings.
+
+    *out*:
+      Optional output array of shape [3, mz, my, mx].
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    import numpy as np
+
+    if f.ndim != 3:
+        print("grad: must have scalar 3-D array f[mz, my, mx] for gradient.")
+        raise ValueError
+
+    out = _prepare(f, out, (3,) + f.shape)
+    mz = f.shape[0]
+    nk = chunk_planes(f.shape, chunk_size)
+    tmp = np.empty(nk*f.shape[1]*f.shape[2], dtype=out.dtype)
+    for k0 in range(0, mz, nk):
+        k1 = min(k0+nk, mz)
+        for axis, delta in ((2, dx), (1, dy), (0, dz)):
+            add_derivative(out[2-axis, k0:k1], k0, f, 0, mz, axis, 1, delta, tmp)
+    return out
+
+
+def fused_div(f, dx, dy, dz, out=None, chunk_size=None):
+    """
+    Compute the divergence of the vector field f[3, mz, my, mx] in one pass.
+
+    call signature:
+
+    fused_div(f, dx, dy, dz, out=None, chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Vector field including ghost zones.
+
+    *dx, dy, dz*:
+      Grid spacings.
+
+    *out*:
+      Optional output array of shape [mz, my, mx].
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    import numpy as np
+
+    if f.ndim != 4:
+        print("div: must have vector 4-D array f[mvar ,mz, my, mx] for divergence.")
+        raise ValueError
+
+    out = _prepare(f, out, f.shape[1:])
+    mz = f.shape[1]
+    nk = chunk_planes(f.shape, chunk_size)
+    tmp = np.empty(nk*f.shape[2]*f.shape[3], dtype=out.dtype)
+    for k0 in range(0, mz, nk):
+        k1 = min(k0+nk, mz)
+        for axis, delta in ((2, dx), (1, dy), (0, dz)):
+            add_derivative(out[k0:k1], k0, f[2-axis], 0, mz, axis, 1, delta, tmp)
+    return out
+
+
+def fused_curl(f, dx, dy, dz, out=None, chunk_size=None):
+    """
+    Compute the curl of the vector field f[3, mz, my, mx] in one pass.
+
+    call signature:
+
+    fused_curl(f, dx, dy, dz, out=None, chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Vector field including ghost zones.
+
+    *dx, dy, dz*:
+      Grid spacings.
+
+    *out*:
+      Optional output array of shape [3, mz, my, mx].
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    import numpy as np
+
+    if f.ndim != 4 or f.shape[0] != 3:
+        print("curl: must have vector 4-D array f[3,mz,my,mx] for curl.")
+        raise ValueError
+
+    out = _prepare(f, out, f.shape)
+    mz = f.shape[1]
+    nk = chunk_planes(f.shape, chunk_size)
+    tmp = np.empty(nk*f.shape[2]*f.shape[3], dtype=out.dtype)
+    deltas = (dz, dy, dx)
+    # (component, derivative axis, differentiated component, sign)
+    terms = ((0, 1, 2, 1.), (0, 0, 1, -1.),
+             (1, 0, 0, 1.), (1, 2, 2, -1.),
+             (2, 2, 1, 1.), (2, 1, 0, -1.))
+    for k0 in range(0, mz, nk):
+        k1 = min(k0+nk, mz)
+        for comp, axis, src, sign in terms:
+            add_derivative(out[comp, k0:k1], k0, f[src], 0, mz, axis, 1,
+                           deltas[axis], tmp, fac=sign)
+    return out
+
+
+def fused_curl2(f, dx, dy, dz, out=None, chunk_size=None):
+    """
+    Compute the double curl, grad(div(f)) - del2(f), of the vector field
+    f[3, mz, my, mx] in one pass. Cartesian coordinates only.
+
+    call signature:
+
+    fused_curl2(f, dx, dy, dz, out=None, chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Vector field including ghost zones.
+
+    *dx, dy, dz*:
+      Grid spacings.
+
+    *out*:
+      Optional output array of shape [3, mz, my, mx].
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    import numpy as np
+
+    if f.ndim != 4 or f.shape[0] != 3:
+        print("curl2: must have vector 4-D array f[3,mz,my,mx] for curl2.")
+        raise ValueError
+
+    out = _prepare(f, out, f.shape)
+    mz, my, mx = f.shape[1:]
+    nk = chunk_planes(f.shape, chunk_size)
+    tmp = np.empty((nk+6)*my*mx, dtype=out.dtype)
+    inner = np.empty((nk+6, my, mx), dtype=out.dtype)
+    deltas = (dz, dy, dx)
+    for k0 in range(0, mz, nk):
+        k1 = min(k0+nk, mz)
+        for comp in range(3):
+            axis = 2 - comp
+            # Partial divergence without the own component. For the
+            # z-derivative it is needed on 3 more planes on each side.
+            if axis == 0:
+                s0 = max(k0-3, 0)
+                s1 = min(k1+3, mz)
+            else:
+                s0, s1 = k0, k1
+            block = inner[:s1-s0]
+            block[...] = 0
+            for other in range(3):
+                if other != comp:
+                    add_derivative(block, s0, f[other], 0, mz, 2-other, 1,
+                                   deltas[2-other], tmp)
+            add_derivative(out[comp, k0:k1], k0, block, s0, mz, axis, 1,
+                           deltas[axis], tmp)
+            for other_axis in range(3):
+                if other_axis != axis:
+                    add_derivative(out[comp, k0:k1], k0, f[comp], 0, mz,
+                                   other_axis, 2, deltas[other_axis], tmp,
+                                   fac=-1.)
+    return out
+
+
+def fused_del2(f, dx, dy, dz, out=None, chunk_size=None):
+    """
+    Compute the Laplacian of the scalar field f[mz, my, mx] or of each
+    component of the vector field f[n, mz, my, mx] in one pass.
+
+    call signature:
+
+    fused_del2(f, dx, dy, dz, out=None, chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Scalar or vector field including ghost zones.
+
+    *dx, dy, dz*:
+      Grid spacings.
+
+    *out*:
+      Optional output array of the shape of f.
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    return _fused_sum(f, (dx, dy, dz), 2, out, chunk_size)
+
+
+def fused_del6(f, dx, dy, dz, out=None, chunk_size=None):
+    """
+    Compute del6 (defined here as d^6/dx^6 + d^6/dy^6 + d^6/dz^6, rather
+    than del2^3) of the scalar or vector field f in one pass.
+
+    call signature:
+
+    fused_del6(f, dx, dy, dz, out=None, chunk_size=None)
+
+    Keyword arguments:
+
+    *f*:
+      Scalar or vector field including ghost zones.
+
+    *dx, dy, dz*:
+      Grid spacings.
+
+    *out*:
+      Optional output array of the shape of f.
+
+    *chunk_size*:
+      Number of z-planes processed together.
+    """
+
+    return _fused_sum(f, (dx, dy, dz), 6, out, chunk_size)
+
+
+def _fused_sum(f, deltas, order, out, chunk_size):
+    """
+    Sum of the derivatives of the given order in all three directions.
+    """
+
+    import numpy as np
+
+    if f.ndim != 3 and f.ndim != 4:
+        print("{0} dimension arrays not handled.".format(str(f.ndim)))
+        raise ValueError
+
+    out = _prepare(f, out, f.shape)
+    f4 = f.reshape((-1,) + f.shape[-3:])
+    out4 = out.reshape((-1,) + f.shape[-3:])
+    mz = f.shape[-3]
+    nk = chunk_planes(f.shape, chunk_size)
+    tmp = np.empty(nk*f.shape[-2]*f.shape[-1], dtype=out.dtype)
+    dx, dy, dz = deltas
+    for k0 in range(0, mz, nk):
+        k1 = min(k0+nk, mz)
+        for comp in range(f4.shape[0]):
+            for axis, delta in ((2, dx), (1, dy), (0, dz)):
+                add_derivative(out4[comp, k0:k1], k0, f4[comp], 0, mz, axis,
+                               order, delta, tmp)
+    return out
+
+
+def fused_slabs(operator, f, n_comp, components=slice(None), n_proc=1,
+                slab_size=None, trim=False, dtype=None):
+    """
+    Evaluate a derivative operator in z-slabs with 3 ghost planes of
+    overlap, using a pool of threads. Only one slab of the input per
+    thread is held in memory, so f may also be a read.var.LazyField.
+
+    call signature:
+
+    fused_slabs(operator, f, n_comp, components=slice(None), n_proc=1,
+                slab_size=None, trim=False, dtype=None)
+
+    Keyword arguments:
+
+    *operator*:
+      Function that takes a field [ncomp, nz, my, mx] and returns the
+      result [n_comp, nz, my, mx], e.g. lambda f: fused_curl(f, dx, dy, dz).
+      The result is taken from the planes at least 3 planes away from the
+      slab boundaries, so the operator must use 3 ghost planes at most.
+
+    *f*:
+      Field [ncomp, mz, my, mx] including ghost zones. Any object that
+      supports f[:, k0:k1] and has a shape, e.g. a LazyField.
+
+    *n_comp*:
+      Number of components of the result.
+
+    *components*:
+      Slice of the components of f the operator is applied to, e.g.
+      slice(index.ax-1, index.az).
+
+    *n_proc*:
+      Number of threads. NumPy releases the GIL during the stencil
+      operations, so the slabs are computed concurrently.
+
+    *slab_size*:
+      Number of z-planes per slab. If None, use 4 slabs per thread.
+
+    *trim*:
+      Return the result without ghost zones.
+
+    *dtype*:
+      Type of the result. If None, use the type of f.
+    """
+
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    mz, my, mx = f.shape[-3:]
+    if trim:
+        k_start, k_end = 3, mz-3
+        region = (slice(3, my-3), slice(3, mx-3))
+    else:
+        k_start, k_end = 0, mz
+        region = (slice(None), slice(None))
+    if slab_size is None:
+        slab_size = -(-(k_end-k_start)//(4*max(n_proc, 1)))
+    slab_size = max(slab_size, 1)
+    slabs = [(k0, min(k0+slab_size, k_end))
+             for k0 in range(k_start, k_end, slab_size)]
+    if dtype is None:
+        dtype = f.dtype if np.dtype(f.dtype).kind == 'f' else np.float64
+    out = np.zeros((n_comp, k_end-k_start, len(range(my)[region[0]]),
+                    len(range(mx)[region[1]])), dtype=dtype)
+
+    def __slab(bounds):
+        k0, k1 = bounds
+        s0 = max(k0-3, 0)
+        s1 = min(k1+3, mz)
+        result = operator(np.asarray(f[components, s0:s1]))
+        out[:, k0-k_start:k1-k_start] = \
+            result[:, k0-s0:k1-s0][(slice(None), slice(None)) + region]
+
+    if not slabs:
+        print("fused_slabs: no z-planes to compute.")
+        raise ValueError
+    if n_proc > 1 and len(slabs) > 1:
+        with ThreadPoolExecutor(max_workers=n_proc) as executor:
+            list(executor.map(__slab, slabs))
+    else:
+        for bounds in slabs:
+            __slab(bounds)
+    return out
@@ -159,3 +159,210 @@ def vec_int_no_var(xx, field, params, interpolation='trilinear'):
                  w3.reshape((1, 1, 2)))
         return np.sum(field[:, ii[0]:ii[1]+1, jj[0]:jj[1]+1, kk[0]:kk[1]+1]*weight,
                       axis=(1, 2, 3))/np.sum(weight)
+
+
+def vec_int_points(xx, field, params, interpolation='trilinear', grid=None,
+                   layout='czyx'):
+    """
+    Interpolates the field at many positions at once, without the need of
+    the full var object. Same result as vec_int_no_var for each position.
+    The interpolation is done by interpolate.
+
+    call signature:
+
+        vec_int_points(xx, field, params, interpolation='trilinear',
+                       grid=None, layout='czyx')
+
+    Keyword arguments:
+
+    *xx*:
+      Array of positions of shape [N, 3].
+
+    *field*:
+      Vector field to be interpolated of shape [3, nz, ny, nx], or
+      [nz, ny, nx, 3] for layout='zyxc'.
+
+    *params*:
+      Parameter object.
+
+    *interpolation*:
+      Interpolation of the vector field.
+      'mean': takes the mean of the adjacent grid point.
+      'trilinear': weights the adjacent grid points according to their distance.
+      'tricubic', 'quintic': see interpolate.
+
+    *grid*:
+      Object with the coordinate arrays x, y and z of the field, e.g. from
+      read.grid for non-equidistant grids. If None the equidistant grid
+      given by Ox, dx, nx, ... of params is used.
+
+    *layout*:
+      Memory layout of the field, see interpolate.
+
+    Returns the interpolated field of shape [N, 3].
+    """
+
+    if grid is None:
+        grid = _EquidistantGrid(params)
+    return interpolate(xx, field, grid, scheme=interpolation, layout=layout)
+
+
+class _EquidistantGrid(object):
+    """
+    Coordinate arrays of the equidistant grid described by params.
+    """
+
+    def __init__(self, params):
+        self.x = params.Ox + params.dx*np.arange(params.nx)
+        self.y = params.Oy + params.dy*np.arange(params.ny)
+        self.z = params.Oz + params.dz*np.arange(params.nz)
+
+
+def prepare_field(field):
+    """
+    Rearrange a field from the Pencil Code layout [ncomp, nz, ny, nx]
+    into the layout [nz, ny, nx, ncomp], in which all components of one grid
+    point are adjacent in memory. Do this once and pass layout='zyxc' to
+    interpolate for repeated interpolations of the same field.
+
+    call signature:
+
+        prepare_field(field)
+
+    Keyword arguments:
+
+    *field*:
+      Vector field of shape [ncomp, nz, ny, nx].
+    """
+
+    return np.ascontiguousarray(np.moveaxis(field, 0, -1))
+
+
+def interpolate(xyz, field, grid, scheme='trilinear', layout='czyx'):
+    """
+    Interpolates a scalar or vector field at many positions at once.
+    The grid may be non-equidistant.
+
+    call signature:
+
+        interpolate(xyz, field, grid, scheme='trilinear', layout='czyx')
+
+    Keyword arguments:
+
+    *xyz*:
+      Array of positions of shape [N, 3].
+
+    *field*:
+      Field to be interpolated. Its shape is [nz, ny, nx] for a scalar
+      field, [ncomp, nz, ny, nx] for layout='czyx' and [nz, ny, nx, ncomp]
+      for layout='zyxc'.
+
+    *grid*:
+      Object with the coordinate arrays x, y and z of the field,
+      e.g. from read.grid or read.var.
+
+    *scheme*:
+      Interpolation scheme.
+      'mean': Mean of the adjacent grid points.
+      'trilinear': Linear interpolation between the adjacent grid points.
+      'tricubic': Cubic Lagrange polynomial through 4 points per direction.
+      'quintic': 6th order Lagrange polynomial through 6 points per
+                 direction, as used in the Pencil Code.
+
+    *layout*:
+      Memory layout of a vector field.
+      'czyx': Pencil Code layout [ncomp, nz, ny, nx] as in read.var.
+      'zyxc': Layout [nz, ny, nx, ncomp] as returned by prepare_field.
+
+    Returns the interpolated field of shape [N, ncomp], or [N] for a
+    scalar field. Positions outside the grid are moved onto its boundary.
+    """
+
+    n_points = {'mean': 2, 'trilinear': 2, 'tricubic': 4, 'quintic': 6}
+    if scheme not in n_points:
+        print("error: unknown interpolation scheme {0}".format(scheme))
+        return -1
+
+    xyz = np.atleast_2d(xyz)
+    nan = np.isnan(xyz).any(axis=1)
+    scalar = (field.ndim == 3)
+    if scalar:
+        field = field[..., np.newaxis]
+        layout = 'zyxc'
+
+    # Stencil indices and Lagrange weights in each direction.
+    stencils = []
+    for pos, coord in ((xyz[:, 0], grid.x), (xyz[:, 1], grid.y),
+                       (xyz[:, 2], grid.z)):
+        pos = np.where(nan, coord[0], pos)
+        coord = np.asarray(coord, dtype='float64')
+        if scheme == 'mean':
+            stencils.append(_mean_stencil(pos, coord))
+        else:
+            stencils.append(_lagrange_stencil(pos, coord, n_points[scheme]))
+    (ii, wx), (jj, wy), (kk, wz) = stencils
+
+    # Sum over the stencil in x for every point in the y-z stencil. The
+    # field is indexed in place, so it is never copied or transposed.
+    if layout == 'zyxc':
+        result = np.zeros((xyz.shape[0], field.shape[-1]))
+    else:
+        result = np.zeros((field.shape[0], xyz.shape[0]))
+    for k in range(kk.shape[1]):
+        for j in range(jj.shape[1]):
+            weight = wz[:, k]*wy[:, j]
+            k_idx = kk[:, k, np.newaxis]
+            j_idx = jj[:, j, np.newaxis]
+            if layout == 'zyxc':
+                result += np.einsum('npc,np->nc', field[k_idx, j_idx, ii], wx)*weight[:, np.newaxis]
+            else:
+                result += np.einsum('cnp,np->cn', field[:, k_idx, j_idx, ii], wx)*weight
+    if layout != 'zyxc':
+        result = result.T
+
+    result[nan] = np.nan
+    if scalar:
+        return result[:, 0]
+    return result
+
+
+def _lagrange_stencil(pos, coord, n_points):
+    """
+    Find the stencil of n_points grid points around the positions and their
+    Lagrange interpolation weights.
+
+    Returns the indices and the weights, both of shape [N, n_points].
+    """
+
+    n = len(coord)
+    n_points = min(n_points, n)
+    if n_points == 1:
+        return np.zeros((len(pos), 1), dtype=int), np.ones((len(pos), 1))
+
+    pos = np.clip(pos, coord[0], coord[-1])
+    i0 = np.clip(np.searchsorted(coord, pos, side='right')-1, 0, n-2)
+    start = np.clip(i0-(n_points//2-1), 0, n-n_points)
+    idx = start[:, np.newaxis] + np.arange(n_points)
+    nodes = coord[idx]
+
+    weights = np.ones(idx.shape)
+    for m in range(n_points):
+        for l in range(n_points):
+            if l != m:
+                weights[:, m] *= (pos-nodes[:, l])/(nodes[:, m]-nodes[:, l])
+    return idx, weights
+
+
+def _mean_stencil(pos, coord):
+    """
+    Find the grid points below and above the positions, which coincide
+    for positions on the grid, and give them equal weights.
+
+    Returns the indices and the weights, both of shape [N, 2].
+    """
+
+    n = len(coord)
+    pos = np.clip(pos, coord[0], coord[-1])
+    i0 = np.clip(np.searchsorted(coord, pos, side='right')-1, 0, n-1)
+    i1 = np.where(coord[i0] < pos, np.minimum(i0+1, n-1), i0)
+    return np.stack([i0, i1], axis=1), np.full((len(pos), 2), 0.5)
@@ -12,9 +12,10 @@ from .index import index
 from .var import var
 from .slices import slices
 from .ts import ts
-from .averages import aver
+from .averages import aver, iter_aver
 from .ogdim import ogdim
 from .ogvar import ogvar
+from .metadata_cache import flush_metadata_cache, clear_metadata_cache
 del(averages)
 
 # idl workarounds
@@ -31,6 +31,388 @@ def aver(*args, **kwargs):
     return averages_tmp
 
 
+def iter_aver(plane='xy', datadir='data', var_names=None, tmin=None,
+              tmax=None, block_size=100):
+    """
+    Iterate through the xy, xz or yz averages in time without loading
+    the whole file.
+
+    call signature:
+
+    iter_aver(plane='xy', datadir='data', var_names=None, tmin=None,
+              tmax=None, block_size=100)
+
+    Keyword arguments:
+
+    *plane*:
+      The plane over which the averages were taken: 'xy', 'xz' or 'yz'.
+
+    *datadir*:
+      Directory where the data is stored.
+
+    *var_names*:
+      List of the averaged quantities to be read, default all.
+
+    *tmin*, *tmax*:
+      Time range to be read.
+
+    *block_size*:
+      Number of outputs read from the file at once.
+
+    Yields for each output the time and a dictionary with the averages.
+    """
+
+    import os
+
+    variables = _read_aver_in(datadir, plane + 'aver.in')
+    var_index = _aver_var_index(variables, var_names)
+    aver_file = Aver2DFile(os.path.join(datadir, plane + 'averages.dat'),
+                           plane, len(variables), datadir=datadir)
+    records = aver_file.select_records(tmin, tmax)
+    for i0 in range(0, len(records), block_size):
+        block = records[i0:i0+block_size]
+        raw_data = aver_file.read(block, var_index)
+        for i, record in enumerate(block):
+            yield aver_file.t[record], dict((variables[idx], raw_data[i, j])
+                                            for j, idx in enumerate(var_index))
+
+
+def _read_aver_in(datadir, in_file_name):
+    """
+    Read the names of the averaged quantities from e.g. xyaver.in,
+    which is located in the run directory.
+    """
+
+    import os
+
+    file_id = open(os.path.join(os.path.dirname(os.path.abspath(datadir)),
+                                in_file_name))
+    variables = [line.strip() for line in file_id.readlines() if line.strip()]
+    file_id.close()
+
+    return variables
+
+
+def _aver_var_index(variables, var_names):
+    """
+    Return the indices of var_names in the list of averaged quantities.
+    """
+
+    if var_names is None:
+        return list(range(len(variables)))
+    if not isinstance(var_names, list):
+        var_names = [var_names]
+    var_index = []
+    for var_name in var_names:
+        if var_name in variables:
+            var_index.append(variables.index(var_name))
+        else:
+            print("? WARNING: {0} is not among the averages {1}.".format(
+                  var_name, variables))
+
+    return var_index
+
+
+def aver_record_index(file_name, precision='f', deltay=False, cache=True):
+    """
+    Return the record index of an unformatted averages file, e.g. one
+    zaverages.dat or yaverages.dat, which consists of the Fortran records
+    1. t
+    2. data
+    3. deltay (only with shear)
+    for each output.
+
+    The index is cached next to the data in <file_name>.idx.npz and is
+    extended when the file has grown since the last indexing. It is
+    rebuilt when the first or last indexed output of the file differs
+    from the cached one, e.g. after a restart from scratch.
+
+    call signature:
+
+    aver_record_index(file_name, precision='f', deltay=False, cache=True)
+
+    Keyword arguments:
+
+    *file_name*:
+      Path to the averages file.
+
+    *precision*:
+      'f' for single and 'd' for double precision.
+
+    *deltay*:
+      Each output contains the deltay record.
+
+    *cache*:
+      Read and write the index file.
+
+    Returns a dictionary with the arrays 't', 't_offset', 'data_offset',
+    'data_len' and 'deltay_offset' (-1 if not present), where the offsets
+    are the byte positions of the record contents, and 'file_size', the
+    number of bytes indexed.
+    """
+
+    import numpy as np
+    import os
+
+    itemsize = np.dtype(precision).itemsize
+    index_name = file_name + '.idx.npz'
+    file_size = os.path.getsize(file_name)
+
+    index = dict(t=np.zeros(0, dtype=precision),
+                 t_offset=np.zeros(0, dtype=np.int64),
+                 data_offset=np.zeros(0, dtype=np.int64),
+                 data_len=np.zeros(0, dtype=np.int64),
+                 deltay_offset=np.zeros(0, dtype=np.int64),
+                 file_size=0)
+    if cache and os.path.exists(index_name):
+        try:
+            with np.load(index_name) as index_file:
+                cached = dict((key, index_file[key]) for key in index_file.files)
+            if 0 < cached['file_size'] <= file_size and \
+               _index_matches(file_name, cached, precision):
+                index = cached
+        except (IOError, ValueError, KeyError):
+            pass
+    if index['file_size'] == file_size:
+        return index
+
+    # Scan the record markers beyond the indexed part.
+    t_offset = []
+    data_offset = []
+    data_len = []
+    deltay_offset = []
+    pos = int(index['file_size'])
+    with open(file_name, 'rb') as file_id:
+        while pos + 8 + itemsize <= file_size:
+            file_id.seek(pos)
+            if np.fromfile(file_id, dtype=np.int32, count=1)[0] != itemsize:
+                break
+            t_pos = pos + 4
+            file_id.seek(t_pos + itemsize + 4)
+            head = np.fromfile(file_id, dtype=np.int32, count=1)
+            if len(head) == 0:
+                break
+            d_pos = t_pos + itemsize + 8
+            end = d_pos + int(head[0]) + 4
+            dy_pos = -1
+            if deltay:
+                dy_pos = end + 4
+                end += itemsize + 8
+            if end > file_size:
+                break
+            t_offset.append(t_pos)
+            data_offset.append(d_pos)
+            data_len.append(int(head[0]))
+            deltay_offset.append(dy_pos)
+            pos = end
+        t_new = np.zeros(len(t_offset), dtype=precision)
+        for i, offset in enumerate(t_offset):
+            file_id.seek(offset)
+            t_new[i] = np.fromfile(file_id, dtype=precision, count=1)[0]
+
+    index = dict(t=np.concatenate([index['t'], t_new]),
+                 t_offset=np.concatenate([index['t_offset'], t_offset]).astype(np.int64),
+                 data_offset=np.concatenate([index['data_offset'], data_offset]).astype(np.int64),
+                 data_len=np.concatenate([index['data_len'], data_len]).astype(np.int64),
+                 deltay_offset=np.concatenate([index['deltay_offset'], deltay_offset]).astype(np.int64),
+                 file_size=pos)
+    if cache:
+        try:
+            with open(index_name, 'wb') as index_file:
+                np.savez(index_file, **index)
+        except IOError:
+            pass
+
+    return index
+
+
+
+def _index_matches(file_name, index, precision):
+    """
+    Check that the record markers and times of the first and the last
+    output of a cached record index are still those of the file.
+    """
+
+    import numpy as np
+
+    itemsize = np.dtype(precision).itemsize
+    if len(index['t']) == 0:
+        return True
+    with open(file_name, 'rb') as file_id:
+        for i in (0, -1):
+            file_id.seek(int(index['t_offset'][i]) - 4)
+            marker = np.fromfile(file_id, dtype=np.int32, count=1)
+            t = np.fromfile(file_id, dtype=precision, count=1)
+            if len(marker) == 0 or len(t) == 0 or marker[0] != itemsize or \
+               t[0] != index['t'][i]:
+                return False
+            file_id.seek(int(index['data_offset'][i]) - 4)
+            marker = np.fromfile(file_id, dtype=np.int32, count=1)
+            if len(marker) == 0 or marker[0] != index['data_len'][i]:
+                return False
+
+    return True
+
+class Aver2DFile(object):
+    """
+    Aver2DFile -- random access to an xy/xz/yz averages file.
+
+    The ASCII files are written with the fixed Fortran formats
+    '(1pe12.5)' for the time and '(1p,8e14.5e3)' for the data, so every
+    output occupies the same number of bytes. The file is memory mapped
+    and the time and the requested values are converted directly from
+    their fixed-width fields, without touching the other outputs.
+    Files with other formatting are tokenized as a whole and binary
+    files (lwrite_avg1d_binary) are memory mapped as Fortran records.
+    """
+
+    def __init__(self, file_name, plane, n_vars, datadir='data'):
+        """
+        Index the file.
+
+        call signature:
+
+        Aver2DFile(file_name, plane, n_vars, datadir='data')
+
+        Keyword arguments:
+
+        *file_name*:
+          Path to the averages file.
+
+        *plane*:
+          The plane over which the averages were taken: 'xy', 'xz' or 'yz'.
+
+        *n_vars*:
+          Number of averaged quantities.
+
+        *datadir*:
+          Directory where the data is stored.
+        """
+
+        import numpy as np
+        import os
+        from pencilnew import read
+
+        dim = read.dim(datadir)
+        if plane == 'xy':
+            self.nw = dim.nz
+        if plane == 'xz':
+            self.nw = dim.ny
+        if plane == 'yz':
+            self.nw = dim.nx
+        if dim.precision == 'D':
+            self.precision = 'd'
+        else:
+            self.precision = 'f'
+        self.file_name = file_name
+        self.n_vars = n_vars
+        n_values = n_vars*self.nw
+
+        file_size = os.path.getsize(file_name)
+        with open(file_name, 'rb') as file_id:
+            head = file_id.read(8)
+        itemsize = np.dtype(self.precision).itemsize
+
+        if len(head) >= 4 and np.frombuffer(head[:4], dtype=np.int32)[0] == itemsize:
+            # Unformatted Fortran records.
+            self.mode = 'binary'
+            self.dtype = np.dtype([('t_head', np.int32), ('t', self.precision),
+                                   ('t_foot', np.int32), ('head', np.int32),
+                                   ('data', self.precision, (n_values,)),
+                                   ('foot', np.int32)])
+            n_times = file_size//self.dtype.itemsize
+            self.records = np.memmap(file_name, dtype=self.dtype, mode='r',
+                                     shape=(n_times,))
+            self.t = np.array(self.records['t'])
+            return
+
+        # Fixed-width ASCII records.
+        n_full, n_rest = divmod(n_values, 8)
+        record_len = 13 + n_full*113
+        if n_rest > 0:
+            record_len += n_rest*14 + 1
+        n_times = file_size//record_len
+        self.mode = 'ascii'
+        if n_times > 0:
+            raw = np.memmap(file_name, dtype=np.uint8, mode='r',
+                            shape=(n_times, record_len))
+            if raw[0, 12] == ord('\n') and raw[0, -1] == ord('\n') and \
+               raw[-1, 12] == ord('\n') and raw[-1, -1] == ord('\n'):
+                self.mode = 'fixed'
+                self.raw = raw
+                k = np.arange(n_values)
+                self.value_start = 13 + (k//8)*113 + (k%8)*14
+                self.t = self.__convert(raw[:, :12], 12).astype(np.float32)
+                return
+            del(raw)
+
+        # Free formatted ASCII, tokenize the whole file.
+        with open(file_name, 'r') as file_id:
+            tokens = file_id.read().split()
+        n_times = len(tokens)//(n_values+1)
+        data = np.array(tokens[:n_times*(n_values+1)], dtype=np.float64)
+        data = data.reshape(n_times, n_values+1)
+        self.t = data[:, 0].astype(np.float32)
+        self.data = data[:, 1:]
+
+
+    def __convert(self, fields, width):
+        """
+        Convert an array of fixed-width ASCII fields (uint8) to float.
+        """
+
+        import numpy as np
+
+        fields = np.ascontiguousarray(fields)
+        return fields.view('S{0}'.format(width)).reshape(
+            fields.shape[:-1]).astype(np.float64)
+
+
+    def select_records(self, tmin=None, tmax=None):
+        """
+        Return the indices of the outputs within the time range.
+        """
+
+        import numpy as np
+
+        records = np.arange(len(self.t))
+        if tmin is not None:
+            records = records[self.t[records] >= tmin]
+        if tmax is not None and tmax >= 0:
+            records = records[self.t[records] <= tmax]
+
+        return records
+
+
+    def read(self, records=None, var_index=None):
+        """
+        Read the averages of the given outputs and quantities.
+
+        Returns the data array [n_times, n_vars, nw].
+        """
+
+        import numpy as np
+
+        if records is None:
+            records = np.arange(len(self.t))
+        if var_index is None:
+            var_index = list(range(self.n_vars))
+        values = (np.array(var_index, dtype=np.int64)[:, np.newaxis]*self.nw +
+                  np.arange(self.nw)).ravel()
+
+        if self.mode == 'binary':
+            data = self.records['data'][records][:, values]
+        elif self.mode == 'fixed':
+            start = self.value_start[values]
+            fields = self.raw[np.asarray(records)[:, np.newaxis, np.newaxis],
+                              start[np.newaxis, :, np.newaxis] + np.arange(14)]
+            data = self.__convert(fields, 14)
+        else:
+            data = self.data[records][:, values]
+
+        return np.reshape(data, [len(records), len(var_index), self.nw])
+
+
 class Averages(object):
     """
     Averages -- holds Pencil Code averages data and methods.
@@ -46,13 +428,16 @@ class Averages(object):
         self.t = np.array([])
 
 
-    def read(self, plane_list=None, datadir='data', proc=-1):
+    def read(self, plane_list=None, datadir='data', proc=-1, var_names=None,
+             tmin=None, tmax=None, time_range=None, n_proc=1):
         """
         Read Pencil Code average data.
 
         call signature:
 
-        read(self, plane_list=['xy', 'xz', 'yz'], datadir='data'):
+        read(self, plane_list=['xy', 'xz', 'yz'], datadir='data', proc=-1,
+             var_names=None, tmin=None, tmax=None, time_range=None,
+             n_proc=1):
 
         Keyword arguments:
 
@@ -66,9 +451,23 @@ class Averages(object):
         *proc*:
           Processor to be read. If -1 read all and assemble to one array.
           Only affects the reading of 'yaverages.dat' and 'zaverages.dat'.
+
+        *var_names*:
+          List of the averaged quantities to be read, default all.
+
+        *tmin*, *tmax*:
+          Time range to be read, default all.
+
+        *time_range*:
+          Time range [tmin, tmax] to be read, alternative to tmin, tmax.
+
+        *n_proc*:
+          Number of threads assembling the processor files of the
+          'y' and 'z' averages.
         """
 
-        import os
+        if time_range is not None:
+            tmin, tmax = time_range
 
         # Initialize the planes list.
         if plane_list:
@@ -110,23 +509,21 @@ class Averages(object):
             ext_object = Foo()
 
             # Get the averaged quantities.
-            file_id = open(os.path.join(os.path.dirname(datadir), in_file_name))
-            variables = file_id.readlines()
-            file_id.close()
-            for i in range(sum(list(map(self.__equal_newline, variables)))):
-                variables.remove('\n')
+            variables = _read_aver_in(datadir, in_file_name)
             n_vars = len(variables)
 
+            var_index = _aver_var_index(variables, var_names)
             if plane == 'xy' or plane == 'xz' or plane == 'yz':
-                t, raw_data = self.__read_2d_aver(plane, datadir, aver_file_name, n_vars)
+                t, raw_data = self.__read_2d_aver(plane, datadir, aver_file_name,
+                                                  n_vars, var_index, tmin, tmax)
             if plane == 'y' or plane == 'z':
-                t, raw_data = self.__read_1d_aver(plane, datadir, aver_file_name, n_vars, proc)
+                t, raw_data = self.__read_1d_aver(plane, datadir, aver_file_name,
+                                                  n_vars, proc, var_index,
+                                                  tmin, tmax, n_proc)
 
             # Add the raw data to self.
-            var_idx = 0
-            for var in variables:
-                setattr(ext_object, var.strip(), raw_data[:, var_idx, ...])
-                var_idx += 1
+            for raw_idx, var_idx in enumerate(var_index):
+                setattr(ext_object, variables[var_idx], raw_data[:, raw_idx, ...])
 
             self.t = t
             setattr(self, plane, ext_object)
@@ -135,23 +532,20 @@ class Averages(object):
         del(ext_object)
 
 
-    def __equal_newline(self, line):
-        """
-        Determine if string is equal new line.
-        """
-
-        return line == '\n'
-
-
-    def __read_1d_aver(self, plane, datadir, aver_file_name, n_vars, proc):
+    def __read_1d_aver(self, plane, datadir, aver_file_name, n_vars, proc,
+                       var_index=None, tmin=None, tmax=None, n_proc=1):
         """
         Read the yaverages.dat, zaverages.dat.
         Return the raw data and the time array.
+
+        The outputs are located with the record index of each processor
+        file (see aver_record_index), so only the selected outputs and
+        quantities are read from the memory mapped files.
         """
 
         import os
         import numpy as np
-        from scipy.io import FortranFile
+        from concurrent.futures import ThreadPoolExecutor
         from pencilnew import read
 
         if proc < 0:
@@ -159,110 +553,115 @@ class Averages(object):
                                                    os.listdir(datadir)))
         else:
             proc_dirs = ['proc' + str(proc)]
+        # Only the root processors of the y or z beams write averages.
+        proc_dirs = [directory for directory in proc_dirs
+                     if os.path.exists(os.path.join(datadir, directory,
+                                                    aver_file_name))]
+        if var_index is None:
+            var_index = list(range(n_vars))
 
         dim = read.dim(datadir, proc)
-        if dim.precision=='S':
-            dtype = np.float32
-        if dim.precision=='D':
-            dtype = np.float64
-
-        # Prepare the raw data.
-        # This will be reformatted at the end.
-
-        raw_data = []
-        for directory in proc_dirs:
-            proc = int(directory[4:])
-            proc_dim = read.dim(datadir, proc)
-
-            # Read the data.
-            t = []
-            proc_data = []
-            file_id = FortranFile(os.path.join(datadir, directory, aver_file_name))
-            while True:
-                try:
-                    t.append(file_id.read_record(dtype=dtype)[0])
-                    proc_data.append(file_id.read_record(dtype=dtype))
-                except:
-                    # Finished reading.
-                    break
-            file_id.close()
-
-            # Reshape the proc data into [len(t), pnu, pnv].
+        if dim.precision == 'D':
+            precision = 'd'
+        else:
+            precision = 'f'
+        if plane == 'y':
+            nu = dim.nx
+            nv = dim.nz
+        if plane == 'z':
+            nu = dim.nx
+            nv = dim.ny
+
+        file_names = [os.path.join(datadir, directory, aver_file_name)
+                      for directory in proc_dirs]
+        proc_dims = [read.dim(datadir, int(directory[4:]))
+                     for directory in proc_dirs]
+        indices = [aver_record_index(file_name, precision)
+                   for file_name in file_names]
+
+        # Select the outputs from the times of the first processor.
+        n_times = min(len(index['t']) for index in indices)
+        t = indices[0]['t'][:n_times]
+        records = np.arange(n_times)
+        if tmin is not None:
+            records = records[t[records] >= tmin]
+        if tmax is not None and tmax >= 0:
+            records = records[t[records] <= tmax]
+
+        raw_data = np.zeros([len(records), len(var_index), nv, nu],
+                            dtype=precision)
+
+        def __read_proc(i_proc):
+            proc_dim = proc_dims[i_proc]
+            index = indices[i_proc]
             if plane == 'y':
                 pnu = proc_dim.nx
                 pnv = proc_dim.nz
-            if plane == 'z':
-                pnu = proc_dim.nx
-                pnv = proc_dim.ny
-            proc_data = np.array(proc_data)
-            print(proc_data.shape, len(t), n_vars, pnv, pnu)
-            proc_data = proc_data.reshape([len(t), n_vars, pnv, pnu])
-
-            # Add the proc_data (one proc) to the raw_data (all procs)
-            if plane == 'y':
-                nu = dim.nx
-                nv = dim.nz
                 idx_u = proc_dim.ipx*proc_dim.nx
                 idx_v = proc_dim.ipz*proc_dim.nz
             if plane == 'z':
-                nu = dim.nx
-                nv = dim.ny
+                pnu = proc_dim.nx
+                pnv = proc_dim.ny
                 idx_u = proc_dim.ipx*proc_dim.nx
                 idx_v = proc_dim.ipy*proc_dim.ny
-            if not isinstance(raw_data, np.ndarray):
-                # Initialize the raw_data array with the right dimensions.
-                raw_data = np.zeros([len(t), n_vars, nv, nu])
-            raw_data[:, :, idx_v:idx_v+pnv, idx_u:idx_u+pnu] = proc_data.copy()
+            if proc >= 0:
+                idx_u = idx_v = 0
+            shape = (n_vars, pnv, pnu)
+            if len(records) == 0:
+                return
+
+            data_offset = index['data_offset'][:n_times]
+            raw_file = np.memmap(file_names[i_proc], dtype=np.uint8, mode='r',
+                                 shape=(int(index['file_size']),))
+            stride = np.diff(data_offset)
+            if n_times < 2 or np.all(stride == stride[0]):
+                # Equidistant records: map all of them at once.
+                if n_times < 2:
+                    stride = [0]
+                proc_data = np.ndarray(shape=(n_times,) + shape,
+                                       dtype=precision, buffer=raw_file,
+                                       offset=int(data_offset[0]),
+                                       strides=(int(stride[0]),) +
+                                       tuple(np.array([pnv*pnu, pnu, 1]) *
+                                             np.dtype(precision).itemsize))
+                raw_data[:, :, idx_v:idx_v+pnv, idx_u:idx_u+pnu] = \
+                    proc_data[np.ix_(records, var_index)]
+            else:
+                for i, record in enumerate(records):
+                    proc_data = np.ndarray(shape=shape, dtype=precision,
+                                           buffer=raw_file,
+                                           offset=int(data_offset[record]))
+                    raw_data[i, :, idx_v:idx_v+pnv, idx_u:idx_u+pnu] = \
+                        proc_data[var_index]
+            del(raw_file)
+
+        if n_proc > 1:
+            with ThreadPoolExecutor(max_workers=n_proc) as executor:
+                list(executor.map(__read_proc, range(len(proc_dirs))))
+        else:
+            for i_proc in range(len(proc_dirs)):
+                __read_proc(i_proc)
 
-        t = np.array(t)
+        t = t[records]
         raw_data = np.swapaxes(raw_data, 2, 3)
 
         return t, raw_data
 
 
-    def __read_2d_aver(self, plane, datadir, aver_file_name, n_vars):
+    def __read_2d_aver(self, plane, datadir, aver_file_name, n_vars,
+                       var_index=None, tmin=None, tmax=None):
         """
-        Read the yaverages.dat, xzaverages.dat, yzaverages.dat
+        Read the xyaverages.dat, xzaverages.dat, yzaverages.dat
         Return the raw data and the time array.
         """
 
         import os
-        import numpy as np
-        from pencilnew import read
-
-        # Determine the structure of the xy/xz/yz averages.
-        if plane == 'xy':
-            nw = getattr(read.dim(), 'nz')
-        if plane == 'xz':
-            nw = getattr(read.dim(), 'ny')
-        if plane == 'yz':
-            nw = getattr(read.dim(), 'nx')
-        file_id = open(os.path.join(datadir, aver_file_name))
-        aver_lines = file_id.readlines()
-        file_id.close()
-        entry_length = int(np.ceil(nw*n_vars/8.))
-        n_times = int(len(aver_lines)/(1. + entry_length))
-
-        # Prepare the data arrays.
-        t = np.zeros(n_times, dtype=np.float32)
-        raw_data = np.zeros([n_times, n_vars*nw])
-
-        # Read the data
-        line_idx = 0
-        t_idx = -1
-        for current_line in aver_lines:
-            if line_idx % (entry_length+1) == 0:
-                t_idx += 1
-                t[t_idx] = np.float32(current_line)
-                raw_idx = 0
-            else:
-                raw_data[t_idx, raw_idx*8:(raw_idx*8+8)] = \
-                    list(map(np.float32, current_line.split()))
-                raw_idx += 1
-            line_idx += 1
 
-        # Restructure the raw data and add it to the Averages object.
-        raw_data = np.reshape(raw_data, [n_times, n_vars, nw])
+        aver_file = Aver2DFile(os.path.join(datadir, aver_file_name),
+                               plane, n_vars, datadir=datadir)
+        records = aver_file.select_records(tmin, tmax)
+        t = aver_file.t[records]
+        raw_data = aver_file.read(records, var_index)
 
         return t, raw_data
 
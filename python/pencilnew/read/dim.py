@@ -16,7 +16,7 @@ def dim(*args, **kwargs):
 
     call signature:
 
-    dim(datadir='data', proc=-1)
+    dim(datadir='data', proc=-1, ogrid=False, use_cache=True)
 
     Keyword arguments:
 
@@ -27,6 +27,13 @@ def dim(*args, **kwargs):
       Processor to be read. If proc is -1, then read the 'global'
       dimensions. If proc is >=0, then read the dim.dat in the
       corresponding processor directory.
+
+    *ogrid*
+      Read the dimensions of the overlapping grid (ogdim.dat).
+
+    *use_cache*
+      Reuse the dimensions from the metadata cache in data/pc if
+      dim.dat did not change.
     """
 
     dim_tmp = Dim()
@@ -67,13 +74,13 @@ class Dim(object):
         self.mxgrid = self.mygrid = self.mzgrid = 0
 
 
-    def read(self, datadir='data', proc=-1, ogrid=False):
+    def read(self, datadir='data', proc=-1, ogrid=False, use_cache=True):
         """
         Read the dim.dat file.
 
         call signature:
 
-        read(self, datadir='data', proc=-1)
+        read(self, datadir='data', proc=-1, ogrid=False, use_cache=True)
 
         Keyword arguments:
 
@@ -84,9 +91,17 @@ class Dim(object):
           Processor to be read. If proc is -1, then read the 'global'
           dimensions. If proc is >=0, then read the dim.dat in the
           corresponding processor directory.
+
+        *ogrid*
+          Read the dimensions of the overlapping grid (ogdim.dat).
+
+        *use_cache*
+          Reuse the dimensions from the metadata cache in data/pc if
+          dim.dat did not change.
         """
 
         import os
+        from pencilnew.read.metadata_cache import load_cached, store_cached
 
         if not ogrid:
             file_name = 'dim.dat'
@@ -98,8 +113,14 @@ class Dim(object):
         else:
             file_name = os.path.join(datadir, 'proc{0}'.format(proc), file_name)
 
+        file_name = os.path.expanduser(file_name)
+        if use_cache:
+            state = load_cached(datadir, 'dim', [file_name], (proc,))
+            if state is not None:
+                self.__dict__.update(state)
+                return
+
         try:
-            file_name = os.path.expanduser(file_name)
             dim_file = open(file_name, "r")
         except IOError:
             print("? File {0} could not be opened.".format(file_name))
@@ -151,3 +172,6 @@ class Dim(object):
             # local
             self.nxgrid = self.nygrid = self.nzgrid = 0
             self.mxgrid = self.mygrid = self.mzgrid = 0
+
+        if use_cache:
+            store_cached(datadir, 'dim', [file_name], self.__dict__, (proc,))
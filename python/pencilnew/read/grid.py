@@ -36,6 +36,10 @@ def grid(*args, **kwargs):
 
     *trim*
       Cuts off the ghost points.
+
+    *use_cache*
+      Reuse the grid from the metadata cache in data/pc if none of the
+      grid.dat files changed.
     """
 
     grid_tmp = Grid()
@@ -63,7 +67,7 @@ class Grid(object):
 
 
     def read(self, datadir='data', proc=-1, quiet=False,
-             trim=False):
+             trim=False, use_cache=True):
         """
         Read the grid data from the pencil code simulation.
         If proc < 0, then load all data and assemble.
@@ -71,8 +75,8 @@ class Grid(object):
 
         call signature:
 
-        read(self, file_name='time_series.dat', datadir='data',
-             double=0, quiet=0, comment_char='#')
+        read(self, datadir='data', proc=-1, quiet=False, trim=False,
+             use_cache=True)
 
         Keyword arguments:
 
@@ -89,12 +93,17 @@ class Grid(object):
 
         *trim*
           Cuts off the ghost points.
+
+        *use_cache*
+          Reuse the grid from the metadata cache in data/pc if none of the
+          grid.dat files changed.
         """
 
         import numpy as np
         import os
         from scipy.io import FortranFile
         import pencilnew.read as read
+        from pencilnew.read.metadata_cache import load_cached, store_cached
 
         datadir = os.path.expanduser(datadir)
         dim = read.dim(datadir, proc)
@@ -109,6 +118,14 @@ class Grid(object):
         else:
             proc_dirs = ['proc'+str(proc)]
 
+        if use_cache:
+            file_names = [os.path.join(datadir, directory, 'grid.dat')
+                          for directory in sorted(proc_dirs)]
+            state = load_cached(datadir, 'grid', file_names, (proc, trim))
+            if state is not None:
+                self.__dict__.update(state)
+                return
+
         # Define the global arrays.
         x = np.zeros(dim.mx, dtype=precision)
         y = np.zeros(dim.my, dtype=precision)
@@ -235,3 +252,7 @@ class Grid(object):
         self.Lx = Lx
         self.Ly = Ly
         self.Lz = Lz
+
+        if use_cache:
+            store_cached(datadir, 'grid', file_names, self.__dict__,
+                         (proc, trim))
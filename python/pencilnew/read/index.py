@@ -16,7 +16,7 @@ def index(*args, **kwargs):
 
     call signature:
 
-    read(datadir='data', param=None, dim=None)
+    read(datadir='data', param=None, dim=None, use_cache=True)
 
     Keyword arguments:
 
@@ -28,6 +28,10 @@ def index(*args, **kwargs):
 
     *dim*
       Dimension object.
+
+    *use_cache*
+      Reuse the indices from the metadata cache in data/pc if
+      index.pro did not change.
     """
 
     index_tmp = Index()
@@ -48,13 +52,13 @@ class Index(object):
         self.keys = []
 
 
-    def read(self, datadir='data', param=None, dim=None):
+    def read(self, datadir='data', param=None, dim=None, use_cache=True):
         """
         Read Pencil Code index data from index.pro.
 
         call signature:
 
-        read(self, datadir='data/', param=None, dim=None)
+        read(self, datadir='data/', param=None, dim=None, use_cache=True)
 
         Keyword arguments:
 
@@ -66,10 +70,15 @@ class Index(object):
 
         *dim*
           Dimension object.
+
+        *use_cache*
+          Reuse the indices from the metadata cache in data/pc if
+          index.pro did not change.
         """
 
         import os
         import pencilnew.read as read
+        from pencilnew.read.metadata_cache import load_cached, store_cached
 
         if param is None:
             param = read.param(datadir=datadir, quiet=True)
@@ -81,7 +90,17 @@ class Index(object):
         else:
             totalvars = dim.mvar
 
-        index_file = open(os.path.join(datadir, 'index.pro'))
+        file_name = os.path.join(datadir, 'index.pro')
+        if use_cache:
+            key = (bool(param.lwrite_aux),
+                   bool(getattr(param, 'ltemperature_nolog', False)),
+                   dim.mvar, dim.maux)
+            state = load_cached(datadir, 'index', [file_name], key)
+            if state is not None:
+                self.__dict__.update(state)
+                return
+
+        index_file = open(file_name)
         for line in index_file.readlines():
             clean = line.strip()
             name = clean.split('=')[0].strip().replace('[', '').replace(']', '')
@@ -95,3 +114,7 @@ class Index(object):
                 if name == 'lnTT' and param.ltemperature_nolog:
                     name = 'tt'
                 setattr(self, name, val)
+        index_file.close()
+
+        if use_cache:
+            store_cached(datadir, 'index', [file_name], self.__dict__, key)
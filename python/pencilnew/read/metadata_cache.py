@@ -0,0 +1,308 @@
+# metadata_cache.py
+#
+# Cache the small metadata files (dim.dat, param.nml, grid.dat, index.pro)
+# in memory and under data/pc/.
+"""
+Contains the functions for the persistent metadata cache used by the readers
+of dim.dat, param.nml, grid.dat and index.pro.
+
+Every entry is stored together with the modification time and size of its
+source files and a hash of their content. An entry is reused as long as the
+stat information agrees. If it does not, the content hash is compared, so a
+file that was only touched is not parsed again.
+"""
+
+import atexit
+import threading
+
+CACHE_FILE = 'metadata_cache.pkl'
+CACHE_VERSION = 1
+# Minimum time in seconds between two writes of the on-disk cache.
+FLUSH_INTERVAL = 1.
+
+_caches = {}
+_dirty = {}
+_last_flush = {}
+_lock = threading.RLock()
+
+
+def _cache_name(datadir):
+    """
+    Return the file name of the on-disk cache for this data directory.
+    """
+
+    import os
+
+    return os.path.join(datadir, 'pc', CACHE_FILE)
+
+
+def _get_cache(datadir):
+    """
+    Return the in-memory cache of the data directory, loading it from
+    disk on first use.
+    """
+
+    import os
+    import pickle
+
+    datadir = os.path.abspath(os.path.expanduser(datadir))
+    with _lock:
+        if datadir not in _caches:
+            cache = {}
+            try:
+                with open(_cache_name(datadir), 'rb') as cache_file:
+                    stored = pickle.load(cache_file)
+                if stored.get('version') == CACHE_VERSION:
+                    cache = stored['entries']
+            except Exception:
+                pass
+            _caches[datadir] = cache
+            _dirty[datadir] = False
+            _last_flush[datadir] = 0
+        return datadir, _caches[datadir]
+
+
+def _file_stats(file_names):
+    """
+    Return the (mtime, size) signature of the files or None if one of
+    them does not exist.
+    """
+
+    import os
+
+    stats = []
+    for file_name in file_names:
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        stats.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stats)
+
+
+def _file_digest(file_names):
+    """
+    Return the sha1 hash of the content of the files.
+    """
+
+    import hashlib
+
+    digest = hashlib.sha1()
+    for file_name in file_names:
+        with open(file_name, 'rb') as data_file:
+            digest.update(data_file.read())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _entry_key(datadir, kind, file_names, key):
+    """
+    Return the dictionary key of an entry, with the file names relative to
+    the data directory so that the cache survives moving the run.
+    """
+
+    import os
+
+    rel_names = tuple(os.path.relpath(os.path.abspath(f), datadir)
+                      for f in file_names)
+    return (kind, rel_names, tuple(key))
+
+
+def load_cached(datadir, kind, file_names, key=()):
+    """
+    Return a copy of the cached state for the given files or None.
+
+    call signature:
+
+    load_cached(datadir, kind, file_names, key=())
+
+    Keyword arguments:
+
+    *datadir*:
+      Data directory of the run. The cache is stored in datadir/pc.
+
+    *kind*:
+      Name of the reader, e.g. 'dim'.
+
+    *file_names*:
+      List of the files the state was read from.
+
+    *key*:
+      Tuple of further arguments the state depends on.
+    """
+
+    import copy
+
+    file_names = [str(f) for f in file_names]
+    stats = _file_stats(file_names)
+    if stats is None:
+        return None
+
+    datadir, cache = _get_cache(datadir)
+    entry_key = _entry_key(datadir, kind, file_names, key)
+    with _lock:
+        entry = cache.get(entry_key)
+        if entry is None:
+            return None
+        if entry['stats'] != stats:
+            try:
+                digest = _file_digest(file_names)
+            except IOError:
+                return None
+            if digest != entry['digest']:
+                del cache[entry_key]
+                _dirty[datadir] = True
+                return None
+            entry['stats'] = stats
+            _dirty[datadir] = True
+        return copy.deepcopy(entry['state'])
+
+
+def store_cached(datadir, kind, file_names, state, key=()):
+    """
+    Store a copy of the state read from the given files.
+
+    call signature:
+
+    store_cached(datadir, kind, file_names, state, key=())
+
+    Keyword arguments:
+
+    *datadir*:
+      Data directory of the run. The cache is stored in datadir/pc.
+
+    *kind*:
+      Name of the reader, e.g. 'dim'.
+
+    *file_names*:
+      List of the files the state was read from.
+
+    *state*:
+      Dictionary with the attributes of the object that was read.
+
+    *key*:
+      Tuple of further arguments the state depends on.
+    """
+
+    import copy
+    import time
+
+    file_names = [str(f) for f in file_names]
+    stats = _file_stats(file_names)
+    if stats is None:
+        return
+    try:
+        digest = _file_digest(file_names)
+    except IOError:
+        return
+
+    datadir, cache = _get_cache(datadir)
+    entry_key = _entry_key(datadir, kind, file_names, key)
+    with _lock:
+        cache[entry_key] = {'stats': stats, 'digest': digest,
+                            'state': copy.deepcopy(state)}
+        _dirty[datadir] = True
+        if time.time() - _last_flush[datadir] > FLUSH_INTERVAL:
+            _flush(datadir)
+
+
+def _flush(datadir):
+    """
+    Write the in-memory cache of one data directory to disk.
+    """
+
+    import os
+    import pickle
+    import time
+
+    with _lock:
+        _last_flush[datadir] = time.time()
+        if not _dirty.get(datadir):
+            return
+        cache_name = _cache_name(datadir)
+        tmp_name = '{0}.{1}.tmp'.format(cache_name, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(cache_name)):
+                os.makedirs(os.path.dirname(cache_name))
+            with open(tmp_name, 'wb') as cache_file:
+                pickle.dump({'version': CACHE_VERSION,
+                             'entries': _caches[datadir]},
+                            cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, cache_name)
+        except Exception:
+            # Read-only data directories only use the in-memory cache.
+            try:
+                os.remove(tmp_name)
+            except OSError:
+                pass
+        _dirty[datadir] = False
+
+
+def flush_metadata_cache(datadir=None):
+    """
+    Write pending cache entries to datadir/pc/metadata_cache.pkl.
+    This is done automatically at exit.
+
+    call signature:
+
+    flush_metadata_cache(datadir=None)
+
+    Keyword arguments:
+
+    *datadir*:
+      Data directory to flush. If None, flush all of them.
+    """
+
+    import os
+
+    with _lock:
+        if datadir is None:
+            datadirs = list(_caches.keys())
+        else:
+            datadirs = [os.path.abspath(os.path.expanduser(datadir))]
+        for directory in datadirs:
+            if directory in _caches:
+                _flush(directory)
+
+
+def clear_metadata_cache(datadir=None):
+    """
+    Empty the metadata cache in memory and remove it from disk.
+
+    call signature:
+
+    clear_metadata_cache(datadir=None)
+
+    Keyword arguments:
+
+    *datadir*:
+      Data directory to clear. If None, only the in-memory cache of all
+      data directories is emptied.
+    """
+
+    import os
+
+    with _lock:
+        if datadir is None:
+            _caches.clear()
+            _dirty.clear()
+            _last_flush.clear()
+            return
+        datadir = os.path.abspath(os.path.expanduser(datadir))
+        _caches.pop(datadir, None)
+        _dirty.pop(datadir, None)
+        _last_flush.pop(datadir, None)
+        try:
+            os.remove(_cache_name(datadir))
+        except OSError:
+            pass
+
+
+def _flush_at_exit():
+    try:
+        flush_metadata_cache()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
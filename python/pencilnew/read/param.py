@@ -1,7 +1,8 @@
 # param.py
 #
 # Read the parameters for the simulation.
-# Requires: nl2python perl script (based on Wolfgang Dobler's nl2idl script).
+# The namelist is parsed natively. The nl2python perl script (based on
+# Wolfgang Dobler's nl2idl script) can still be used with use_nl2python=True.
 #
 # Authors:
 # J. Oishi (joishi@amnh.org).
@@ -10,15 +11,39 @@
 Contains the parameters of the simulation.
 """
 
+import re
+
+# Floating point or integer number as written by Fortran.
+_NML_NUMBER = r"[-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eEdD][-+]?\d+)?|Infinity|Inf|NaN)"
+
+# One token of a Fortran namelist: group start, group end, comment,
+# 'name =' or a value with optional repeat count.
+_NML_TOKEN = re.compile(r"""\s*(?:
+      (?P<group>&\w+)
+    | (?P<end>/)
+    | (?P<comment>!.*)
+    | (?P<name>[A-Za-z_]\w*)\s*(?:\([^)]*\))?\s*=
+    | (?:(?P<repeat>\d+)\*)?
+      (?:
+          (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+        | \(\s*(?P<real>{0})\s*,\s*(?P<imag>{0})\s*\)
+        | (?P<logical>\.?[TtFf][A-Za-z]*\.?)(?=[\s,/!]|$)
+        | (?P<number>{0})
+      )
+    | (?P<comma>,)
+    )""".format(_NML_NUMBER), re.VERBOSE)
+
+_NML_INTEGER = re.compile(r"[-+]?\d+$")
+
 
 def param(*args, **kwargs):
     """
     Read Pencil Code simulation parameters.
-    Requires: nl2python perl script (based on Wolfgang Dobler's nl2idl script).
 
     call signature:
 
-    read(datadir='data/', param2=False, quiet=True)
+    read(datadir='data/', param2=False, quiet=True, asdict=False,
+         nest_dict=False, use_cache=True, use_nl2python=False)
 
     Keyword arguments:
 
@@ -36,6 +61,13 @@ def param(*args, **kwargs):
 
     *nest_dict*
       Reads parameters as nested dictionary.
+
+    *use_cache*
+      Reuse the parameters from the metadata cache in data/pc if
+      the namelist file did not change.
+
+    *use_nl2python*
+      Use the nl2python perl script instead of the native parser.
     """
 
     param_tmp = Param()
@@ -43,6 +75,125 @@ def param(*args, **kwargs):
     return param_tmp
 
 
+def read_namelist(file_name, nest=False):
+    """
+    Parse a Fortran namelist file into a dictionary in a single pass.
+
+    Values are converted into bool, int, float, complex or str. Names are
+    lower case. As in nl2python, a list of values becomes a list and a
+    list containing repeat counts (3*0.0) becomes a numpy array.
+
+    call signature:
+
+    read_namelist(file_name, nest=False)
+
+    Keyword arguments:
+
+    *file_name*:
+      Name of the namelist file.
+
+    *nest*
+      Return a dictionary of dictionaries, one per namelist group.
+    """
+
+    with open(file_name, 'r') as nml_file:
+        text = nml_file.read()
+    return parse_namelist(text, nest=nest)
+
+
+def parse_namelist(text, nest=False):
+    """
+    Parse the content of a Fortran namelist file into a dictionary.
+
+    call signature:
+
+    parse_namelist(text, nest=False)
+
+    Keyword arguments:
+
+    *text*:
+      Content of the namelist file.
+
+    *nest*
+      Return a dictionary of dictionaries, one per namelist group.
+    """
+
+    params = dict()
+    group = params
+    name = None
+    values = []
+
+    pos = 0
+    while pos < len(text):
+        match = _NML_TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            if not text[pos:].strip():
+                break
+            raise ValueError("Param.read: cannot parse namelist near '{0}'."
+                             .format(text[pos:pos+40].split('\n')[0]))
+        pos = match.end()
+        kind = match.lastgroup
+
+        if kind in ('group', 'end', 'name'):
+            if name is not None:
+                group[name] = _namelist_value(values)
+                name = None
+            if kind == 'group':
+                if match.group('group').lower() == '&end':
+                    continue
+                if nest:
+                    group = params.setdefault(match.group('group')[1:].lower(), dict())
+            elif kind == 'name':
+                name = match.group('name').lower()
+                values = []
+        elif kind in ('comma', 'comment'):
+            continue
+        else:
+            if match.group('string') is not None:
+                string = match.group('string')
+                quote = string[0]
+                value = string[1:-1].replace(2*quote, quote).replace('\n', '').rstrip()
+            elif match.group('real') is not None:
+                value = complex(_namelist_number(match.group('real')),
+                                _namelist_number(match.group('imag')))
+            elif match.group('logical') is not None:
+                value = match.group('logical').lstrip('.')[0] in 'Tt'
+            else:
+                value = _namelist_number(match.group('number'))
+            repeat = match.group('repeat')
+            values.append((int(repeat) if repeat else 1, value))
+
+    if name is not None:
+        group[name] = _namelist_value(values)
+
+    return params
+
+
+def _namelist_number(string):
+    """
+    Convert a Fortran number into int or float.
+    """
+
+    if _NML_INTEGER.match(string):
+        return int(string)
+    return float(string.replace('D', 'E').replace('d', 'e'))
+
+
+def _namelist_value(values):
+    """
+    Convert the list of (repeat, value) pairs of one namelist entry.
+    """
+
+    import numpy as np
+
+    if len(values) == 1 and values[0][0] == 1:
+        return values[0][1]
+    if any(repeat > 1 for repeat, value in values):
+        return np.array([value for repeat, value in values
+                         for i in range(repeat)])
+    return [value for repeat, value in values]
+
+
 class Param(object):
     """
     Param -- holds the simulation parameters.
@@ -57,15 +208,16 @@ class Param(object):
 
 
     def read(self, datadir='data/', param2=False, quiet=True,
-             asdict=False, nest_dict=False):
+             asdict=False, nest_dict=False, use_cache=True,
+             use_nl2python=False):
         """
         Read Pencil Code simulation parameters.
-        Requires: nl2python perl script (based on Wolfgang Dobler's nl2idl script).
 
         call signature:
 
         read(self, datadir='data/', param2=False, quiet=True,
-             asdict=False, nest_dict=False)
+             asdict=False, nest_dict=False, use_cache=True,
+             use_nl2python=False)
 
         Keyword arguments:
 
@@ -83,9 +235,18 @@ class Param(object):
 
         *nest_dict*
           Reads parameters as nested dictionary.
+
+        *use_cache*
+          Reuse the parameters from the metadata cache in data/pc if
+          the namelist file did not change.
+
+        *use_nl2python*
+          Use the nl2python perl script instead of the native parser.
+          Requires $PENCIL_HOME/bin in the path.
         """
 
         import os
+        from pencilnew.read.metadata_cache import load_cached, store_cached
 
         datadir = os.path.expanduser(datadir)
 
@@ -94,24 +255,19 @@ class Param(object):
         else:
             filen = os.path.join(datadir, 'param.nml')
 
-        # Execute output of nl2python script.
         if not os.path.exists(filen):
             print("Param.read: no such file {0}.".format(filen))
             raise ValueError
 
-        # Read the parameters into a dictionary.
-        if asdict:
-            if nest_dict:
-                param_list = self.__read_nml(filen, nest=True)
-            else:
-                param_list = self.__read_nml(filen)
-            if not quiet:
-                print(param_list)
-            key_list = param_list.keys()
-            for key in key_list:
-                setattr(self, key, param_list[key])
-        # Read the parameters as attributes to class Params.
-        else:
+        cache_key = (asdict and nest_dict, use_nl2python)
+        if use_cache:
+            state = load_cached(datadir, 'param', [filen], cache_key)
+            if state is not None:
+                self.__dict__.update(state)
+                return
+
+        # Execute output of nl2python script.
+        if use_nl2python:
             cmd = 'nl2python '+filen
             script = os.popen(cmd).read()
             if not quiet:
@@ -124,110 +280,14 @@ class Param(object):
             else:
                 print("Param.read: nl2python returned nothing! Is $PENCIL_HOME/bin in the path?")
                 return -1
-
-
-    def __param_formatter(self, string_part):
-        """
-        Formats the parameters from the files.
-
-        call signature:
-
-        __param_formatter(self, string_part)
-
-        Keyword arguments:
-
-        *string_part*:
-          Part of the string to be formatted.
-        """
-
-        import re
-
-        string_part = re.sub(" ", "", string_part)
-        if string_part == "T":
-            return True
-        if string_part == "F":
-            return False
-        try:
-            if "." in string_part:
-                return float(string_part)
-            else:
-                return int(string_part)
-        except:
-            return re.sub("'", "", string_part)
-
-
-    def __tuple_catch(self, string):
-        """
-        Catches name - value tuples in a string.
-
-        call signature:
-
-        __tuple_catch(self, string)
-
-        Keyword arguments:
-
-        *string*:
-          String containing the name - value tuple.
-        """
-
-        if "(" in string:
-            string = string.replace("(", "").replace(")", "").split(",")
-            for j in range(len(string)):
-                string[j] = self.__param_formatter(string[j])
-            return tuple(string)
+        # Read the parameters as attributes, or as one dictionary per
+        # namelist group if nested.
         else:
-            return self.__param_formatter(string)
-
-
-    def __read_nml(self, file_name, nest=False):
-        """
-        Reads in F90 namelist as dictionary object
-
-        call signature:
-
-        __read_nml(self, file_name, nest=False)
-
-        Keyword arguments:
-
-        *file_name*:
-          Name of the file.
-
-        *nest*
-          For nested dictionaries.
-        """
+            param_list = read_namelist(filen, nest=asdict and nest_dict)
+            if not quiet:
+                print(param_list)
+            for key in param_list.keys():
+                setattr(self, key, param_list[key])
 
-        import re
-        r = re.compile(r'(?:[^,(]|\([^)]*\))+')
-
-        params = dict()
-        for rawline in open(file_name):
-            line = rawline.rstrip('\n')
-            if line == ' ':
-                continue
-            print(line)
-            if line[0] == "&":
-                super_name = line[1:].lower()
-                if nest:
-                    params[super_name] = dict()
-            else:
-                line = re.sub("^ ", "", line)
-                if line != "/":
-                    split = re.split("=", line)
-                    name = re.sub(" ", "", split[0].lower())
-                    value = split[1]
-                    parts = r.findall(value)
-                    value = []
-                    for i in range(len(parts)):
-                        if "*" in parts[i]:
-                            s = parts[i].split("*")
-                            for i in range(int(s[0])):
-                                value += [self.__tuple_catch(s[1])]
-                        else:
-                            value += [self.__tuple_catch(parts[i])]
-                    if len(value) == 1:
-                        value = value[0]
-                    if nest:
-                        params[super_name][name] = value
-                    else:
-                        params[name] = value
-        return params
+        if use_cache:
+            store_cached(datadir, 'param', [filen], self.__dict__, cache_key)
@@ -1,11 +1,19 @@
 def pstalk(*args, **kwargs):
     """
-    Read PSTALK files from Pencil Code using IDL.
-    Uses IDL<->Python Bridge, this must be activated manually!
+    Read PSTALK files from Pencil Code. By default the particles_stalker.dat
+    files are read natively and cached in <datadir>/pc/pstalk.h5.
+    With use_idl=True the IDL<->Python Bridge is used, this must be
+    activated manually!
 
     Args:
         - datadir      specify datadir, default False
         - sim           specify simulation from which you want to read
+        - tmin, tmax    time range to be read, tmax < 0 reads to the end,
+                        with use_idl=True these are the output indices
+        - ipar          list of particle indices to be read, default None reads all
+        - n_proc        number of processes/threads decoding the processor files
+        - use_cache     read from and write to the HDF5 cache, default True
+        - use_idl       read via IDL, default False
         - swap_endian   change if needed to True, default False
         - quiet         verbosity, default False
     """
@@ -14,21 +22,105 @@ def pstalk(*args, **kwargs):
     return var_tmp
 
 
+def read_pstalk_header(datadir='data'):
+    """
+    Read the names of the stalked variables from
+    particles_stalker_header.dat.
+    """
+
+    import os
+
+    with open(os.path.join(datadir, 'particles_stalker_header.dat')) as header_file:
+        header = header_file.readline().strip()
+
+    return [field for field in header.split(',') if field]
+
+
+def scan_pstalk_file(file_name, nfields, precision='f', offset=0):
+    """
+    Index the records of one particles_stalker.dat file from the byte
+    offset on, which must be the start of an output.
+
+    Each output consists of the Fortran records
+    1. t, npar_stalk_loc
+    2. ipar(npar_stalk_loc)                        (only if npar_stalk_loc > 0)
+    3. values(nfields, npar_stalk_loc)             (only if npar_stalk_loc > 0)
+    All records are multiples of 4 bytes long, so the file is indexed as
+    an int32 memory map. Truncated outputs at the end are ignored.
+
+    Returns the times, the number of particles, the int32 word positions
+    of the ipar and values data and the word position after the end of
+    every output.
+    """
+
+    import numpy as np
+    import os
+
+    isize = np.dtype(precision).itemsize//4
+    n_words = os.path.getsize(file_name)//4
+    if n_words <= offset//4:
+        return (np.zeros(0, dtype=precision), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64))
+
+    words = np.memmap(file_name, dtype=np.int32, mode='r', shape=(n_words,))
+    t_pos = []
+    npar = []
+    ipar_pos = []
+    values_pos = []
+    end_pos = []
+    pos = offset//4
+    while pos + isize + 3 <= n_words:
+        n = int(words[pos+1+isize])
+        end = pos + isize + 3
+        if n > 0:
+            ipar_start = end + 1
+            end += n + 2
+            values_start = end + 1
+            end += n*nfields*isize + 2
+        else:
+            ipar_start = values_start = end
+        if end > n_words:
+            break
+        t_pos.append(pos + 1)
+        npar.append(n)
+        ipar_pos.append(ipar_start)
+        values_pos.append(values_start)
+        end_pos.append(end)
+        pos = end
+
+    t_idx = np.array(t_pos, dtype=np.int64)[:, np.newaxis] + np.arange(isize)
+    t = np.ascontiguousarray(words[t_idx]).view(precision).ravel()
+    del(words)
+
+    return (t, np.array(npar, dtype=np.int64),
+            np.array(ipar_pos, dtype=np.int64),
+            np.array(values_pos, dtype=np.int64),
+            np.array(end_pos, dtype=np.int64))
+
+
 class ParticleStalkData(object):
     """
     ParticleStalkData -- holds Pencil Code PSTALK file data.
     """
 
     def __init__(self, datadir=False, sim=False,
-                 tmin=0, tmax=-1, noutmax='-1',
+                 tmin=0, tmax=-1, noutmax='-1', ipar=None, n_proc=1,
+                 use_cache=True, use_idl=False,
                  swap_endian=False, quiet=False, use_existing_pstalk_sav=False):
         """
-        Read PSTALK files from Pencil Code using IDL.
-        Uses IDL<->Python Bridge, this must be activated manually!
+        Read PSTALK files from Pencil Code.
 
         Args:
             - datadir      specify datadir, default False
             - sim           specify simulation from which you want to read
+            - tmin, tmax    time range to be read, tmax < 0 reads to the end,
+                            with use_idl=True these are the output indices
+            - noutmax       maximal number of outputs to be read
+            - ipar          list of particle indices to be read, default None reads all
+            - n_proc        number of processes/threads decoding the processor files
+            - use_cache     read from and write to <datadir>/pc/pstalk.h5, default True
+            - use_idl       read via IDL<->Python Bridge, default False
             - swap_endian   change if needed to True, default False
             - quiet         verbosity, default False
             - use_existing_pstalk_sav
@@ -37,9 +129,6 @@ class ParticleStalkData(object):
 
         """
 
-        import numpy as np
-        import os
-        from os.path import join
         import pencilnew as pcn
 
         if datadir == False:
@@ -47,6 +136,240 @@ class ParticleStalkData(object):
                 sim = pcn.get_sim()
             datadir = sim.datadir
 
+        if use_idl or use_existing_pstalk_sav:
+            self.__read_idl(datadir, sim, tmin, tmax, noutmax, swap_endian,
+                            quiet, use_existing_pstalk_sav)
+        else:
+            self.__read_native(datadir, tmin, tmax, int(noutmax), ipar,
+                               n_proc, use_cache, quiet)
+
+
+    def __read_native(self, datadir, tmin, tmax, noutmax, ipar, n_proc,
+                      use_cache, quiet):
+        """
+        Read the particles_stalker.dat files of all processors with numpy.
+
+        The data of all processors is assembled in blocks of outputs and
+        streamed into the chunked, time-indexed HDF5 cache
+        <datadir>/pc/pstalk.h5 with one resizable dataset [nt, npar_stalk]
+        for each stalked variable. The cache stores the byte offset up to
+        which each processor file was read and its first record. Outputs
+        appended to the files since are decoded from there and appended
+        to the cache, which is only rebuilt when a file shrank or its
+        first record changed. Queries by time and particle index are
+        sliced directly from the cache.
+        """
+
+        import numpy as np
+        import os
+        from pencilnew import read
+        from pencilnew.math import natural_sort
+
+        datadir = os.path.expanduser(datadir)
+
+        try:
+            import h5py
+        except ImportError:
+            if use_cache:
+                print("? WARNING: no h5py library found, not using the pstalk cache.")
+            use_cache = False
+
+        fields = read_pstalk_header(datadir)
+        npar_stalk = read.pdim(datadir=datadir).npar_stalk
+        if read.dim(datadir).precision == 'D':
+            precision = 'd'
+        else:
+            precision = 'f'
+
+        proc_dirs = natural_sort(filter(lambda s: s.startswith('proc'),
+                                        os.listdir(datadir)))
+        file_names = [os.path.join(datadir, directory, 'particles_stalker.dat')
+                      for directory in proc_dirs]
+        offsets = np.zeros(len(file_names), dtype=np.int64)
+
+        if not use_cache:
+            data = dict()
+            self.__decode(file_names, fields, npar_stalk, precision, offsets,
+                          n_proc, quiet, data)
+            self.__select(data, tmin, tmax, noutmax, ipar)
+            return
+
+        # The first record (markers, t and npar_stalk_loc) of every file.
+        n_head = np.dtype(precision).itemsize//4 + 3
+        heads = np.zeros((len(file_names), n_head), dtype=np.int32)
+        for i_file, file_name in enumerate(file_names):
+            head = np.fromfile(file_name, dtype=np.int32, count=n_head)
+            heads[i_file, :len(head)] = head
+        file_sizes = np.array([os.path.getsize(file_name)
+                               for file_name in file_names])
+
+        cache_name = os.path.join(datadir, 'pc', 'pstalk.h5')
+        append = False
+        if os.path.exists(cache_name):
+            with h5py.File(cache_name, 'r') as cache:
+                if 'offsets' in cache and 'heads' in cache and \
+                   cache['heads'].shape == heads.shape and \
+                   all(field in cache for field in fields) and \
+                   len(cache['ipar']) == npar_stalk and \
+                   cache['t'].dtype == np.dtype(precision):
+                    offsets = cache['offsets'][()]
+                    same_head = (cache['heads'][()] == heads).all(axis=1)
+                    append = np.all((file_sizes >= offsets) &
+                                    (same_head | (offsets == 0)))
+        if not append:
+            offsets[...] = 0
+            from pencilnew.io import mkdir
+            mkdir(os.path.join(datadir, 'pc'))
+            if not quiet:
+                print('~ writing pstalk cache '+cache_name+'..')
+
+        with h5py.File(cache_name, 'a' if append else 'w') as cache:
+            offsets = self.__decode(file_names, fields, npar_stalk, precision,
+                                    offsets, n_proc, quiet, cache)
+            if append:
+                cache['offsets'][...] = offsets
+                cache['heads'][...] = heads
+            else:
+                cache['offsets'] = offsets
+                cache['heads'] = heads
+            self.__select(cache, tmin, tmax, noutmax, ipar)
+
+
+    def __decode(self, file_names, fields, npar_stalk, precision, offsets,
+                 n_proc, quiet, out):
+        """
+        Decode the outputs of the particles_stalker.dat files from the
+        byte offsets on and append them to out, which is either an HDF5
+        file or a dictionary. Returns the offsets after the last output
+        decoded from every file.
+        """
+
+        import numpy as np
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        nfields = len(fields)
+        isize = np.dtype(precision).itemsize//4
+
+        # Index all processor files, the scanning is done in Python
+        # and hence in parallel processes.
+        if n_proc > 1:
+            with ProcessPoolExecutor(max_workers=n_proc) as executor:
+                indices = list(executor.map(scan_pstalk_file, file_names,
+                                            [nfields]*len(file_names),
+                                            [precision]*len(file_names),
+                                            offsets))
+        else:
+            indices = [scan_pstalk_file(file_name, nfields, precision, offset)
+                       for file_name, offset in zip(file_names, offsets)]
+        nt = min(len(index[0]) for index in indices)
+        t = indices[0][0][:nt]
+        nt_old = len(out['t']) if 't' in out else 0
+        if not quiet and nt > 0:
+            print('~ found {0} new outputs of {1} stalked particles on {2} processors..'.format(
+                  nt, npar_stalk, len(file_names)))
+
+        # Outputs per block, such that a block of one variable is ~1 MB.
+        nt_chunk = max(1, 2**20//max(1, npar_stalk*isize*4))
+        nt_block = max(1, min(nt, nt_chunk))
+        if isinstance(out, dict):
+            for field in fields:
+                out[field] = np.zeros((nt, npar_stalk), dtype=precision)
+            out['t'] = t
+        elif 't' not in out:
+            for field in fields:
+                out.create_dataset(field, shape=(nt, npar_stalk),
+                                   maxshape=(None, npar_stalk),
+                                   dtype=precision,
+                                   chunks=(nt_chunk, npar_stalk))
+            out.create_dataset('t', data=t, maxshape=(None,),
+                               chunks=(nt_chunk,))
+        else:
+            for field in fields + ['t']:
+                out[field].resize(nt_old + nt, axis=0)
+            out['t'][nt_old:] = t
+        if 'ipar' not in out:
+            out['ipar'] = np.arange(1, npar_stalk+1)
+
+        for it0 in range(0, nt, nt_block):
+            it1 = min(it0 + nt_block, nt)
+            block = np.zeros((nfields, it1-it0, npar_stalk), dtype=precision)
+
+            def __decode_proc(i_file):
+                t_proc, npar, ipar_pos, values_pos, end_pos = indices[i_file]
+                if npar[it0:it1].sum() == 0:
+                    return
+                n_words = np.max(values_pos[it0:it1] +
+                                 npar[it0:it1]*nfields*isize)
+                words = np.memmap(file_names[i_file], dtype=np.int32,
+                                  mode='r', shape=(n_words,))
+                for it in range(it0, it1):
+                    n = npar[it]
+                    if n == 0:
+                        continue
+                    ipar = words[ipar_pos[it]:ipar_pos[it]+n] - 1
+                    values = np.array(words[values_pos[it]:
+                                            values_pos[it]+n*nfields*isize])
+                    values = values.view(precision).reshape(n, nfields)
+                    block[:, it-it0, ipar] = values.T
+                del(words)
+
+            with ThreadPoolExecutor(max_workers=n_proc) as executor:
+                list(executor.map(__decode_proc, range(len(file_names))))
+
+            for i_field, field in enumerate(fields):
+                out[field][nt_old+it0:nt_old+it1] = block[i_field]
+
+        if nt == 0:
+            return np.array(offsets, dtype=np.int64)
+        return np.array([4*index[4][nt-1] for index in indices],
+                        dtype=np.int64)
+
+
+    def __select(self, data, tmin, tmax, noutmax, ipar):
+        """
+        Set the attributes for the selected time range and particles.
+        The variables have the shape [npar, nt], as with IDL.
+        """
+
+        import numpy as np
+
+        t = data['t'][()]
+        it = np.arange(len(t))
+        it = it[t >= tmin]
+        if tmax >= 0:
+            it = it[t[it] <= tmax]
+        if noutmax > 0:
+            it = it[:noutmax]
+        if len(it) > 0:
+            time_slice = slice(it[0], it[-1]+1)
+        else:
+            time_slice = slice(0, 0)
+
+        ipar_all = data['ipar'][()]
+        if ipar is None:
+            columns = slice(None)
+        else:
+            columns = np.flatnonzero(np.isin(ipar_all, ipar))
+
+        self.t = t[time_slice]
+        self.ipar = ipar_all[columns]
+        for field in data.keys():
+            if field in ['t', 'ipar', 'offsets', 'heads']:
+                continue
+            setattr(self, field.lower(), data[field][time_slice, columns].T)
+
+
+    def __read_idl(self, datadir, sim, tmin, tmax, noutmax, swap_endian,
+                   quiet, use_existing_pstalk_sav):
+        """
+        Read PSTALK files from Pencil Code using IDL.
+        Uses IDL<->Python Bridge, this must be activated manually!
+        """
+
+        import numpy as np
+        import os
+        from os.path import join
+
         if quiet == False:
             quiet = '0'
         else:
@@ -1,9 +1,8 @@
 def pvar(*args, **kwargs):
     """
-    Read PVAR files from Pencil Code using IDL. Does also work with block decomposition.
-    Uses IDL<->Python Bridge, this must be activated manually!
-
-    !! WARNING: SHAPE IS AS IN IDL: (X, Y, Z) !!
+    Read PVAR files from Pencil Code. Does also work with block decomposition.
+    By default the files are read natively with numpy. The IDL<->Python
+    Bridge is only used with use_idl=True and must be activated manually!
 
     Args:
         - varfile       put 'PVARXYZ' or just number here, 'VAR' will be replaced by 'PVAR' autom.
@@ -12,9 +11,17 @@ def pvar(*args, **kwargs):
         - datadir      specify datadir, default False
         - sim           specify simulation from which you want to read
         - proc          read from single proc, set number here
+        - var_list      list of particle variables to be read, e.g. ['xp', 'vpx'],
+                        names as in pvarname.dat without the leading 'i',
+                        default None reads all
+        - sort          sort the particles by their index ipar, default True
+        - n_proc        number of threads reading the processor files, default 1
+        - use_idl       read via IDL, default False
         - swap_endian   change if needed to True, default False
         - quiet         verbosity, default False
 
+    !! WARNING: WITH use_idl=True SHAPE IS AS IN IDL: (X, Y, Z) !!
+
     If needed add manually to this script:
         - rmv, irmv, trmv, oldrmv are used for ???
         - solid_object is used for ???
@@ -27,12 +34,43 @@ def pvar(*args, **kwargs):
     return var_tmp
 
 
-class ParticleData(object):
+def read_pvarnames(datadir='data'):
+    """
+    Read the particle variable names from pvarname.dat.
+
+    Returns the list of names without the leading 'i', e.g. 'xp', ordered
+    as the columns of the fp array.
+    """
+
+    import os
+
+    names = []
+    with open(os.path.join(datadir, 'pvarname.dat')) as name_file:
+        for line in name_file:
+            if not line.strip():
+                continue
+            place, name = line.split()[:2]
+            if name.startswith('i'):
+                name = name[1:]
+            names.append((int(place), name.replace('(', 'P').replace(')', 'P')))
+
+    return [name for place, name in sorted(names)]
+
+
+def read_pvar_header(file_name):
+    """
+    Read the number of particles of one processor PVAR file.
     """
-    Read PVAR files from Pencil Code using IDL.
-    Uses IDL<->Python Bridge, this must be activated manually!
 
-    !! WARNING: SHAPE IS AS IN IDL: (X, Y, Z) !!
+    import numpy as np
+
+    with open(file_name, 'rb') as infile:
+        return int(np.fromfile(infile, dtype=np.int32, count=2)[1])
+
+
+class ParticleData(object):
+    """
+    Read PVAR files from Pencil Code, natively or using IDL.
 
     Args:
         - datadir      specify datadir, default False
@@ -41,6 +79,10 @@ class ParticleData(object):
         - npar_max      maximal number of particles to be read in
 
         - proc          read from single proc, set number here
+        - var_list      list of particle variables to be read, e.g. ['xp', 'vpx']
+        - sort          sort the particles by their index ipar, default True
+        - n_proc        number of threads reading the processor files, default 1
+        - use_idl       read via IDL, default False
         - swap_endian   change if needed to True, default False
         - quiet         verbosity, default False
 
@@ -53,10 +95,11 @@ class ParticleData(object):
     """
 
     def __init__(self, varfile='pvar.dat', npar_max=-1,
-                 datadir=False, sim=False, proc=-1, swap_endian=False, quiet=False, DEBUG=False):
+                 datadir=False, sim=False, proc=-1, var_list=None, sort=True,
+                 n_proc=1, use_idl=False, swap_endian=False, quiet=False,
+                 DEBUG=False):
         """
-        Read PVAR files from Pencil Code using IDL.
-        Uses IDL<->Python Bridge, this must be activated manually!
+        Read PVAR files from Pencil Code.
 
         Args:
             - datadir      specify datadir, default False
@@ -65,15 +108,175 @@ class ParticleData(object):
             - npar_max      maximal number of particles to be read in
 
             - proc          read from single proc, set number here
+            - var_list      list of particle variables to be read, e.g. ['xp', 'vpx']
+            - sort          sort the particles by their index ipar, default True
+            - n_proc        number of threads reading the processor files, default 1
+            - use_idl       read via IDL, default False
             - swap_endian   change if needed to True, default False
             - quiet         verbosity, default False
 
         """
 
-        import numpy as np
-        import os
         import pencilnew as pcn
         from pencilnew.math import is_number
+
+        ####### interprate parameters
+        if datadir == False:
+            if sim == False:
+                sim = pcn.get_sim()
+            datadir = sim.datadir
+
+        # cleanup of varfile string
+        if is_number(varfile): varfile = 'PVAR'+str(varfile)
+        varfile = str(varfile)
+        if varfile=='var.dat': varfile='pvar.dat'
+        if varfile[:3]=='VAR': varfile='P'+varfile
+
+        if use_idl:
+            self.__read_idl(varfile, npar_max, datadir, proc, swap_endian,
+                            quiet, DEBUG)
+        else:
+            self.__read_native(varfile, npar_max, datadir, proc, var_list,
+                               sort, n_proc, quiet)
+
+
+    def __read_native(self, varfile, npar_max, datadir, proc, var_list,
+                      sort, n_proc, quiet):
+        """
+        Read the PVAR files of all processors with numpy.
+
+        Each processor file consists of the Fortran records
+        1. npar_loc
+        2. ipar(npar_loc)                 (only if npar_loc > 0)
+        3. fp(npar_loc, mparray)          (only if npar_loc > 0)
+        4. t, x(mx), y(my), z(mz), dx, dy, dz
+        The fp records are memory mapped, so only the requested columns
+        and particles are read from disk.
+        """
+
+        import numpy as np
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+        from pencilnew import read
+        from pencilnew.math import natural_sort
+
+        datadir = os.path.expanduser(datadir)
+
+        if proc < 0:
+            proc_dirs = natural_sort(filter(lambda s: s.startswith('proc'),
+                                            os.listdir(datadir)))
+        else:
+            proc_dirs = ['proc' + str(proc)]
+        file_names = [os.path.join(datadir, directory, varfile)
+                      for directory in proc_dirs]
+
+        dim = read.dim(datadir)
+        if dim.precision == 'D':
+            precision = 'd'
+        else:
+            precision = 'f'
+        itemsize = np.dtype(precision).itemsize
+
+        try:
+            names = read_pvarnames(datadir)
+        except IOError:
+            names = []
+        if var_list is None:
+            var_list = names
+        columns = []
+        for name in var_list:
+            if name not in names:
+                print('? WARNING: particle variable {0} not found in pvarname.dat.'.format(name))
+                continue
+            columns.append(names.index(name))
+
+        # Number of particles on each processor and, for npar_max,
+        # the number of particles to be read from it.
+        npar_loc = np.array([read_pvar_header(file_name)
+                             for file_name in file_names], dtype=np.int64)
+        npar_found = int(npar_loc.sum())
+        if npar_max > 0 and npar_max < npar_found:
+            npar_red = np.floor(npar_loc*float(npar_max)/npar_found).astype(np.int64)
+            rest = npar_max - npar_red.sum()
+            npar_red[np.argsort(npar_loc - npar_red)[::-1][:rest]] += 1
+        else:
+            npar_red = npar_loc
+        offsets = np.concatenate([[0], np.cumsum(npar_red)])
+        if not quiet:
+            print('~ reading {0} of {1} particles from {2} processors..'.format(
+                  offsets[-1], npar_found, len(file_names)))
+
+        ipar = np.zeros(offsets[-1], dtype=np.int32)
+        fp = np.zeros((len(columns), offsets[-1]), dtype=precision)
+        t = np.zeros(len(file_names), dtype=precision)
+
+        def __read_proc(i_file):
+            file_name = file_names[i_file]
+            n_loc = int(npar_loc[i_file])
+            n_red = int(npar_red[i_file])
+            out = slice(offsets[i_file], offsets[i_file+1])
+
+            etc_offset = 12
+            if n_loc > 0:
+                if n_red < n_loc:
+                    particles = np.linspace(0, n_loc, num=n_red,
+                                            endpoint=False).astype(np.int64)
+                else:
+                    particles = slice(None)
+                ipar_loc = np.memmap(file_name, dtype=np.int32, mode='r',
+                                     offset=16, shape=(n_loc,))
+                ipar[out] = ipar_loc[particles]
+                del(ipar_loc)
+                fp_offset = 16 + 4*n_loc + 4
+                with open(file_name, 'rb') as infile:
+                    infile.seek(fp_offset)
+                    fp_len = int(np.fromfile(infile, dtype=np.int32, count=1)[0])
+                mparray = fp_len//(itemsize*n_loc)
+                fp_loc = np.memmap(file_name, dtype=precision, mode='r',
+                                   offset=fp_offset+4, shape=(mparray, n_loc))
+                for i_col, column in enumerate(columns):
+                    fp[i_col, out] = fp_loc[column][particles]
+                del(fp_loc)
+                etc_offset = fp_offset + 4 + fp_len + 4
+
+            with open(file_name, 'rb') as infile:
+                infile.seek(etc_offset + 4)
+                t[i_file] = np.fromfile(infile, dtype=precision, count=1)[0]
+
+        if n_proc > 1:
+            with ThreadPoolExecutor(max_workers=n_proc) as executor:
+                list(executor.map(__read_proc, range(len(file_names))))
+        else:
+            for i_file in range(len(file_names)):
+                __read_proc(i_file)
+
+        if sort:
+            order = np.argsort(ipar, kind='stable')
+            ipar = ipar[order]
+            fp = fp[:, order]
+
+        self.t = t[0]
+        self.npar = npar_found
+        self.npar_loc = npar_loc
+        self.ipar = ipar
+        self.fp = fp
+        self.var_list = [names[column] for column in columns]
+        for i_col, name in enumerate(self.var_list):
+            setattr(self, name, fp[i_col])
+        if all(hasattr(self, name) for name in ['xp', 'yp', 'zp']):
+            self.xx = np.array([self.xp, self.yp, self.zp])
+        if all(hasattr(self, name) for name in ['vpx', 'vpy', 'vpz']):
+            self.vv = np.array([self.vpx, self.vpy, self.vpz])
+
+
+    def __read_idl(self, varfile, npar_max, datadir, proc, swap_endian,
+                   quiet, DEBUG):
+        """
+        Read PVAR files from Pencil Code using IDL.
+        Uses IDL<->Python Bridge, this must be activated manually!
+        """
+
+        import os
         from sys import byteorder
 
         try:
@@ -91,12 +294,6 @@ class ParticleData(object):
             print('! ')
             return None
 
-        ####### interprate parameters
-        if datadir == False:
-            if sim == False:
-                sim = pcn.get_sim()
-        datadir = sim.datadir
-
         if quiet == False:
             quiet = '0'
         else:
@@ -108,13 +305,6 @@ class ParticleData(object):
         else: print('? WARNING: Couldnt determine endianness!')
 
         ####### preparing IDL call
-        # cleanup of varfile string
-        if is_number(varfile): varfile = 'PVAR'+str(varfile)
-        varfile = str(varfile)
-        if varfile=='var.dat': varfile='pvar.dat'
-        if varfile[:3]=='VAR': varfile='P'+varfile
-
-        #
         idl_call = ', '.join(['pc_read_pvar',
                               'obj=pvar',
                               'varfile="'+varfile+'"',
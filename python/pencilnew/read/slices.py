@@ -39,6 +39,21 @@ def slices(*args, **kwargs):
 
     *verbose*:
       Print progress
+
+    *tmin*, *tmax*:
+      Time range to be read, default all.
+
+    *stride*:
+      Read only every stride-th slice in the time range.
+
+    *n_proc*:
+      Number of threads reading the field and extension files.
+
+    *memmap_limit*:
+      Slice series larger than this number of bytes are returned as
+      read-only memory maps of the files instead of being read.
+
+    datadir may also be an HDF5 file written by pencil.files.hdf5.h5file.
     """
 
     slices_tmp = SliceSeries()
@@ -62,14 +77,16 @@ class SliceSeries(object):
 
 
     def read(self, field='', extension='', datadir='data', proc=-1,
-             old_file=False, precision='f', verbose=False):
+             old_file=False, precision='f', verbose=False, tmin=None,
+             tmax=None, stride=1, n_proc=1, memmap_limit=2**30):
         """
         Read Pencil Code slice data.
 
         call signature:
 
         read(self. field='', extension='', datadir='data', proc=-1,
-             old_file=False, precision='f')
+             old_file=False, precision='f', verbose=False, tmin=None,
+             tmax=None, stride=1, n_proc=1, memmap_limit=2**30)
 
         Keyword arguments:
 
@@ -93,14 +110,35 @@ class SliceSeries(object):
 
         *verbose*:
           Print progress
+
+        *tmin*, *tmax*:
+          Time range to be read, default all.
+
+        *stride*:
+          Read only every stride-th slice in the time range.
+
+        *n_proc*:
+          Number of threads reading the field and extension files.
+
+        *memmap_limit*:
+          Slice series larger than this number of bytes are returned as
+          read-only memory maps of the files instead of being read.
+
+        If datadir is an HDF5 file written by pencil.files.hdf5.h5file,
+        the slices are taken from it. Series larger than memmap_limit are
+        then returned as lazy views of the HDF5 datasets (HDF5Field).
         """
 
         import os
-        import numpy as np
-        from scipy.io import FortranFile
+        from concurrent.futures import ThreadPoolExecutor
         from pencilnew import read
 
         # Define the directory that contains the slice files.
+        datadir = os.path.expanduser(datadir)
+        if os.path.isfile(datadir):
+            self.__read_hdf5(datadir, field, extension, tmin, tmax, stride,
+                             memmap_limit)
+            return
         if proc < 0:
             slice_dir = datadir
         else:
@@ -136,77 +174,178 @@ class SliceSeries(object):
             # Remove duplicates.
             extension_list = list(set(extension_list))
 
+        dim = read.dim(datadir, proc)
+        if dim.precision == 'D':
+            precision = 'd'
+        else:
+            precision = 'f'
+
         class Foo(object):
             pass
 
+        ext_objects = dict()
+        jobs = []
         for extension in extension_list:
-            if verbose:
-                print('Extension: '+str(extension))
             # This one will store the data.
-            ext_object = Foo()
+            ext_objects[extension] = Foo()
+            for field in field_list:
+                jobs.append((extension, field))
+
+        def __read_job(job):
+            extension, field = job
+            if verbose:
+                print('Extension: {0} -> Field: {1}'.format(extension, field))
+            file_name = os.path.join(slice_dir, 'slice_'+field+'.'+extension)
+            t, slice_series = self.__read_slice_file(file_name, extension, dim,
+                                                     precision, old_file,
+                                                     tmin, tmax, stride,
+                                                     memmap_limit)
+            setattr(ext_objects[extension], field, slice_series)
+            return t
+
+        if n_proc > 1:
+            with ThreadPoolExecutor(max_workers=n_proc) as executor:
+                t_list = list(executor.map(__read_job, jobs))
+        else:
+            t_list = [__read_job(job) for job in jobs]
+        if t_list:
+            self.t = t_list[-1]
+
+        for extension in extension_list:
+            setattr(self, extension, ext_objects[extension])
+
+
+    def __read_hdf5(self, file_name, field, extension, tmin, tmax, stride,
+                    memmap_limit):
+        """
+        Read the slices from a file written by pencil.files.hdf5.h5file,
+        where the slices of each extension are stored in one dataset of
+        shape [nt, nfields, vsize, hsize], chunked by plane.
+        """
+
+        import h5py
+        import numpy as np
+        from .var import HDF5Field
+
+        h5 = h5py.File(file_name, 'r')
+        data = h5['data']
+        names = list(data['slices_names'].asstr()[...])
+        if not field:
+            field_list = names
+        elif isinstance(field, list):
+            field_list = field
+        else:
+            field_list = [field]
+        if not extension:
+            extension_list = [key[7:] for key in data.keys()
+                              if key.startswith('slices_') and
+                              key not in ['slices_names', 'slices_time']]
+        elif isinstance(extension, list):
+            extension_list = extension
+        else:
+            extension_list = [extension]
 
+        t_all = data['slices_time'][...]
+        records = _select_records(t_all, tmin, tmax, stride)
+        self.t = t_all[records][:, np.newaxis]
+
+        class Foo(object):
+            pass
+
+        for extension in extension_list:
+            ext_object = Foo()
+            dataset = data['slices_'+extension]
             for field in field_list:
-                if verbose:
-                    print('  -> Field: '+str(field))
-                # Compose the file name according to field and extension.
-                datadir = os.path.expanduser(datadir)
-                if proc < 0:
-                    file_name = os.path.join(datadir, 'slice_'+field+'.'+extension)
-                else:
-                    file_name = os.path.join(datadir, 'proc{0}'.format(proc),
-                                             'slice_'+field+'.'+extension)
-
-                dim = read.dim(datadir, proc)
-                if dim.precision == 'D':
-                    precision = 'd'
-                else:
-                    precision = 'f'
-
-                # Set up slice plane.
-                if extension == 'xy' or extension == 'Xy' or  extension == 'xy2':
-                    hsize = dim.nx
-                    vsize = dim.ny
-                if extension == 'xz':
-                    hsize = dim.nx
-                    vsize = dim.nz
-                if extension == 'yz':
-                    hsize = dim.ny
-                    vsize = dim.nz
-
-                infile = FortranFile(file_name)
-
-                islice = 0
-                self.t = np.zeros(1, dtype=precision)
-                self.t = [0]
-                slice_series = [0]
-
-                while True:
-                    try:
-                        if verbose:
-                            print('  -> Reading... ')
-                        raw_data = infile.read_record(dtype=precision)
-                    except ValueError:
-                        break
-                    except TypeError:
-                        break
-
-                    if old_file:
-                        self.t.append(list(raw_data[-1]))
-                        slice_series.extend(list(raw_data[:-1]))
-                    else:
-                        self.t.append(list(raw_data[-2:-1]))
-                        slice_series.extend(list(raw_data[:-2]))
-                    islice += 1
-                    if verbose:
-                        print('  -> Done')
-
-                # Reshape and remove first entry.
-                if verbose:
-                    print('Reshaping array')
-                self.t = np.array(self.t[1:], dtype=precision)
-                slice_series = np.array(slice_series, dtype=precision)
-                slice_series = slice_series[1:].reshape(islice, vsize, hsize)
+                if field not in names:
+                    print("error: no slice {0} in {1}".format(field, file_name))
+                    raise ValueError
+                slice_series = HDF5Field(dataset, [records, names.index(field),
+                                                   np.arange(dataset.shape[2]),
+                                                   np.arange(dataset.shape[3])])
+                if np.prod(slice_series.shape)*dataset.dtype.itemsize <= memmap_limit:
+                    slice_series = slice_series[...]
                 setattr(ext_object, field, slice_series)
-
             setattr(self, extension, ext_object)
 
+
+    def __read_slice_file(self, file_name, extension, dim, precision,
+                          old_file, tmin, tmax, stride, memmap_limit):
+        """
+        Read one slice file.
+
+        Each record consists of the slice data, the time and, unless
+        old_file, the slice position. All records have the same size, so
+        the number of slices follows from the file size and the data is
+        read into a preallocated [nt, vsize, hsize] array, or mapped for
+        large series.
+        """
+
+        import os
+        import numpy as np
+
+        # Set up slice plane.
+        if extension[:2] in ['xy', 'Xy']:
+            hsize = dim.nx
+            vsize = dim.ny
+        if extension[:2] == 'xz':
+            hsize = dim.nx
+            vsize = dim.nz
+        if extension[:2] == 'yz':
+            hsize = dim.ny
+            vsize = dim.nz
+
+        itemsize = np.dtype(precision).itemsize
+        n_values = vsize*hsize
+        if old_file:
+            n_extra = 1
+        else:
+            n_extra = 2
+        record_len = 4 + (n_values + n_extra)*itemsize + 4
+        n_slices = os.path.getsize(file_name)//record_len
+
+        if n_slices == 0:
+            return (np.zeros((0, 1), dtype=precision),
+                    np.zeros((0, vsize, hsize), dtype=precision))
+
+        raw_file = np.memmap(file_name, dtype=np.uint8, mode='r',
+                             shape=(n_slices*record_len,))
+        t_all = np.ndarray(shape=(n_slices,), dtype=precision,
+                           buffer=raw_file, offset=4 + n_values*itemsize,
+                           strides=(record_len,))
+        slice_all = np.ndarray(shape=(n_slices, vsize, hsize), dtype=precision,
+                               buffer=raw_file, offset=4,
+                               strides=(record_len, hsize*itemsize, itemsize))
+
+        records = _select_records(t_all, tmin, tmax, stride)
+        t = np.array(t_all[records])[:, np.newaxis]
+
+        if len(records) > 1 and np.all(np.diff(records) == stride):
+            slice_view = slice_all[records[0]:records[-1]+1:stride]
+        else:
+            slice_view = slice_all[records]
+        if slice_view.nbytes > memmap_limit:
+            slice_series = slice_view
+        else:
+            slice_series = np.empty(slice_view.shape, dtype=precision)
+            slice_series[...] = slice_view
+            del(slice_view)
+            del(slice_all)
+            del(raw_file)
+
+        return t, slice_series
+
+
+def _select_records(t_all, tmin, tmax, stride):
+    """
+    Return the indices of the slices in the time range [tmin, tmax],
+    taking every stride-th.
+    """
+
+    import numpy as np
+
+    records = np.arange(len(t_all))
+    if tmin is not None:
+        records = records[t_all[records] >= tmin]
+    if tmax is not None and tmax >= 0:
+        records = records[t_all[records] <= tmax]
+    return records[::stride]
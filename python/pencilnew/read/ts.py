@@ -37,6 +37,8 @@ def ts(*args, **kwargs):
 
     *unique_clean*
       set True, np.unique is used to clean up the ts, e.g. remove errors at the end of crashed runs
+
+    datadir may also be an HDF5 file written by pencil.files.hdf5.h5file.
     """
 
     ts_tmp = TimeSeries()
@@ -86,57 +88,207 @@ class TimeSeries(object):
 
         *unique_clean*
           set True, np.unique is used to clean up the ts, e.g. remove errors at the end of crashed runs
+
+        Rows appended to the file later, e.g. by a running simulation,
+        can be read with update().
+
+        If datadir is an HDF5 file written by pencil.files.hdf5.h5file,
+        the time series is taken from it.
         """
 
-        import numpy as np
         import os.path
-        import re
 
         if sim:
             if str(sim.__class__) == "<class 'pencilnew.sim.simulation.__Simulation__'>":
                 datadir = sim.datadir
 
         datadir = os.path.expanduser(datadir)
-        infile = open(os.path.join(datadir, file_name), "r")
-        lines = infile.readlines()
-        infile.close()
-
-        # Need to handle cases where restart AND print.in changes,
-        # but not right away.
-        nlines_init = len(lines)
-        data = np.zeros((nlines_init, len(self.keys)))
-        nlines = 0
+        for key in self.keys:
+            delattr(self, key)
+        self.keys = []
+        if os.path.isfile(datadir):
+            self.file_name = datadir
+            self.hdf5 = True
+        else:
+            self.file_name = os.path.join(datadir, file_name)
+            self.hdf5 = False
+        self.comment_char = comment_char
+        self.unique_clean = unique_clean
+        self.offset = 0
+        self.header_keys = []
+        self._buffers = {}
+        self._nrows = 0
+        self._capacity = 0
+
+        self.update(quiet=quiet)
+
+
+    def update(self, quiet=True):
+        """
+        Read the rows which were appended to the time series file since
+        the last read or update, e.g. for a running simulation.
+
+        The file is read from the byte offset after the last complete
+        line. Blocks of rows between header lines are converted to
+        arrays at once. Columns are matched by their name in the
+        header, columns missing in some block are filled with zeros.
+        For an HDF5 file the rows beyond the ones read are taken.
+
+        call signature:
+
+        update(self, quiet=True)
+
+        Keyword arguments:
+
+        *quiet*
+          Flag for switching of output.
+        """
+
+        import numpy as np
+
+        if self.hdf5:
+            nlines = self.__update_hdf5()
+        else:
+            nlines = self.__update_file()
+
+        if not quiet:
+            print("Read {0} lines".format(nlines))
+
+        # do unique cleanup
+        if self.unique_clean == True and hasattr(self, 't'):
+            clean_t, unique_indices = np.unique(self.t, return_index=True)
+            if np.size(clean_t) != np.size(self.t):
+                for key in self.keys:
+                    self._buffers[key] = getattr(self, key)[unique_indices]
+                    setattr(self, key, self._buffers[key])
+                self._nrows = self._capacity = len(unique_indices)
+
+
+    def __update_file(self):
+        """
+        Append the lines of the time series file after the offset.
+        Returns the number of rows.
+        """
+
+        with open(self.file_name, "rb") as infile:
+            infile.seek(self.offset)
+            text = infile.read()
+        # Leave incomplete lines for the next update.
+        end = text.rfind(b"\n") + 1
+        self.offset += end
+        lines = text[:end].decode().splitlines()
+
+        blocks = []
+        block = []
         for line in lines:
-            if re.search("^%s--" % comment_char, line):
-                # Read header and create keys for dictionary.
-                line = line.strip("%s-\n" % comment_char)
-                keys_new = re.split("-+", line)
-                if keys_new != self.keys:
-                    n_newrows = abs(len(keys_new) - len(self.keys))
-                    data = np.append(data, np.zeros((nlines_init, n_newrows)),
-                                     axis=1)
-                    self.keys = keys_new
-            else:
+            if line.startswith(self.comment_char):
+                if line.startswith(self.comment_char + "--"):
+                    # Read header and create keys for dictionary.
+                    blocks.append(self.__convert_block(block, blocks))
+                    block = []
+                    line = line.strip("%s-\n" % self.comment_char)
+                    self.header_keys = [key for key in line.split("-") if key]
+                continue
+            block.append(line)
+        blocks.append(self.__convert_block(block, blocks))
+
+        return self.__append_blocks(blocks)
+
+
+    def __convert_block(self, block, blocks):
+        """
+        Convert a block of data lines belonging to the current header.
+        Returns the header keys and the array of rows. The blocks
+        converted before are only used to count the rows.
+        """
+
+        import numpy as np
+
+        ncols = len(self.header_keys)
+        if not block or ncols == 0:
+            return self.header_keys, np.zeros([0, ncols])
+
+        # Fast path: the whole block at once.
+        tokens = " ".join(block).split()
+        data = None
+        if len(tokens) == len(block)*ncols:
+            try:
+                data = np.array(tokens, dtype=np.float64).reshape(-1, ncols)
+            except ValueError:
+                data = None
+        # Slow path: line by line, skipping invalid lines.
+        if data is None:
+            nrows = self._nrows + sum(len(rows) for _, rows in blocks)
+            rows = []
+            for line in block:
                 try:
-                    row = np.array(list(map(float, re.split(" +", line.strip(" \n")))))
-                    data[nlines, :] = row
-                    nlines += 1
+                    row = np.array(line.split(), dtype=np.float64)
+                    if len(row) != ncols:
+                        raise ValueError
+                    rows.append(row)
                 except ValueError:
-                    print("Invalid data on line {0}. Skipping.".format(nlines))
+                    print("Invalid data on line {0}. Skipping.".format(
+                          nrows+len(rows)))
+            data = np.array(rows).reshape(-1, ncols)
 
-        # Clean up data.
-        data = np.resize(data, (nlines, len(self.keys)))
+        return self.header_keys, data
 
-        if not quiet:
-            print("Read {0} lines".format(nlines))
 
-        # Assemble into a TimeSeries class.
-        for i in range(0, len(self.keys)):
-            setattr(self, self.keys[i], data[:, i])
+    def __update_hdf5(self):
+        """
+        Append the rows of the time series in the HDF5 file beyond the
+        ones read before. Here the offset is the number of rows read.
+        """
 
-        # do unique cleanup
-        if unique_clean == True:
-           clean_t, unique_indices = np.unique(self.t, return_index=True)
-           if np.size(clean_t) != np.size(self.t):
-               for key in self.keys:
-                   setattr(self, key, getattr(self, key)[unique_indices])
+        import h5py
+
+        with h5py.File(self.file_name, 'r') as h5:
+            self.header_keys = list(h5['data/time_series_names'].asstr()[...])
+            data = h5['data/time_series'][self.offset:]
+        self.offset += len(data)
+
+        return self.__append_blocks([(self.header_keys, data)])
+
+
+    def __append_blocks(self, blocks):
+        """
+        Append the blocks (header keys, array of rows) to the time series.
+        Returns the number of rows.
+
+        The columns are kept in buffers, which grow by at least a factor
+        of two, and the attributes are views of their filled part. Hence
+        repeated updates do not copy the whole time series each time.
+        """
+
+        import numpy as np
+
+        nrows = sum(len(data) for _, data in blocks)
+        if nrows == 0:
+            return 0
+        for keys, data in blocks:
+            for key in keys:
+                if len(data) > 0 and key not in self.keys:
+                    self.keys.append(key)
+                    self._buffers[key] = np.zeros(self._capacity)
+        size = self._nrows + nrows
+        if size > self._capacity:
+            self._capacity = max(size, 2*self._capacity)
+            for key in self.keys:
+                buffer = np.zeros(self._capacity)
+                buffer[:self._nrows] = self._buffers[key][:self._nrows]
+                self._buffers[key] = buffer
+
+        start = self._nrows
+        for keys, data in blocks:
+            stop = start + len(data)
+            for key in self.keys:
+                if key in keys:
+                    self._buffers[key][start:stop] = data[:, keys.index(key)]
+                else:
+                    self._buffers[key][start:stop] = 0
+            start = stop
+        self._nrows = size
+        for key in self.keys:
+            setattr(self, key, self._buffers[key][:size])
+
+        return nrows
@@ -30,7 +30,8 @@ def var(*args, **kwargs):
 
     var(var_file='', datadir='data/', proc=-1, ivar=-1,
         quiet=True, trimall=False,
-        magic=None, sim=None, precision='f')
+        magic=None, sim=None, precision='f', n_proc=1, lazy=False,
+        layout=None)
 
     Keyword arguments:
         var_file:   Name of the VAR file.
@@ -42,6 +43,14 @@ def var(*args, **kwargs):
         datadir:    Directory where the data is stored.
         proc:       Processor to be read. If -1 read all and assemble to one array.
         ivar:       Index of the VAR file, if var_file is not specified.
+        n_proc:     Number of threads used to read the processor files.
+        lazy:       Only read the variables and subvolumes when accessed.
+        layout:     Snapshot layout, 'dist' (procN/ files), 'allprocs'
+                    (io_mpi2, io_collect) or 'hdf5' (io_hdf5).
+                    Detected from the files present if None.
+
+    datadir may also be an HDF5 file written by pencil.files.hdf5.h5file,
+    from which the snapshot var_file is read lazily.
     """
 
     from ..sim import __Simulation__
@@ -71,6 +80,371 @@ def var(*args, **kwargs):
     return var_tmp
 
 
+def read_var_records(file_name, loc_shape, precision='f'):
+    """
+    Memory map the two Fortran records of a processor VAR file.
+
+    call signature:
+
+    read_var_records(file_name, loc_shape, precision='f')
+
+    Keyword arguments:
+        file_name:  Path to the VAR file of one processor.
+        loc_shape:  Spatial shape of the local data, e.g. (mz, my, mx).
+        precision:  'f' for single and 'd' for double precision.
+
+    Returns the data record as read-only memory map of shape
+    (nvar,) + loc_shape and the second record (t, x, y, z, dx, dy, dz
+    and possibly deltay) as array.
+    """
+
+    import numpy as np
+
+    data_len, raw_etc = read_var_etc(file_name, precision)
+    itemsize = np.dtype(precision).itemsize
+    nvar = data_len//(itemsize*int(np.prod(loc_shape)))
+    f_loc = np.memmap(file_name, dtype=precision, mode='r', offset=4,
+                      shape=(nvar,) + tuple(loc_shape))
+
+    return f_loc, raw_etc
+
+
+def read_var_etc(file_name, precision='f'):
+    """
+    Read the second Fortran record (t, x, y, z, dx, dy, dz and possibly
+    deltay) of a processor VAR file, skipping over the data record.
+
+    Returns the length of the data record in bytes and the second record.
+    """
+
+    import numpy as np
+
+    itemsize = np.dtype(precision).itemsize
+    with open(file_name, 'rb') as infile:
+        data_len = int(np.fromfile(infile, dtype=np.int32, count=1)[0])
+        infile.seek(4 + data_len + 4)
+        etc_len = int(np.fromfile(infile, dtype=np.int32, count=1)[0])
+        raw_etc = np.fromfile(infile, dtype=precision, count=etc_len//itemsize)
+
+    return data_len, raw_etc
+
+
+def snapshot_layout(datadir, var_file, proc=-1):
+    """
+    Detect the layout of the snapshot var_file.
+
+    call signature:
+
+    snapshot_layout(datadir, var_file, proc=-1)
+
+    Keyword arguments:
+        datadir:    Directory where the data is stored.
+        var_file:   Name of the VAR file, e.g. 'VAR3' or 'var.dat'.
+        proc:       Processor to be read, which implies the 'dist' layout
+                    if >= 0.
+
+    Returns 'hdf5' for data/allprocs/var_file.h5 (io_hdf5), 'allprocs' for
+    data/allprocs/var_file (io_mpi2, io_collect) and 'dist' for the
+    processor files (io_dist). If several are present, e.g. after a change
+    of the I/O module, the most recently written one is taken.
+    """
+
+    import os
+
+    if proc >= 0:
+        return 'dist'
+
+    h5_file = var_file
+    if not h5_file.endswith('.h5'):
+        h5_file += '.h5'
+    candidates = [('hdf5', os.path.join(datadir, 'allprocs', h5_file)),
+                  ('allprocs', os.path.join(datadir, 'allprocs', var_file)),
+                  ('dist', os.path.join(datadir, 'proc0', var_file))]
+    candidates = [(os.path.getmtime(file_name), layout)
+                  for layout, file_name in candidates
+                  if os.path.isfile(file_name)]
+    if not candidates:
+        return 'dist'
+
+    return max(candidates)[1]
+
+
+def _owned_slices(ip, nproc, n, m, nghost):
+    """
+    Return the global and local slices of the part of a processor's
+    array that it owns in the assembled array along one direction.
+    The outer ghost zones belong to the first and last processor.
+    """
+
+    i0 = ip*n
+    i1 = i0 + m
+    i0loc = 0
+    i1loc = m
+    if ip > 0:
+        i0 += nghost
+        i0loc = nghost
+    if ip < nproc - 1:
+        i1 -= nghost
+        i1loc -= nghost
+
+    return slice(i0, i1), slice(i0loc, i1loc)
+
+
+class LazyField(object):
+    """
+    LazyField -- out-of-core view of the f-array of a VAR file.
+
+    Indexing, e.g. f[iux, 4:8, :, 10], memory maps only the processor
+    files that overlap the requested subvolume and reads the bounding
+    box of the requested variables and points from them.
+    """
+
+    def __init__(self, blocks, shape, precision='f', offset=None):
+        """
+        Set up the view.
+
+        call signature:
+
+        LazyField(blocks, shape, precision='f', offset=None)
+
+        Keyword arguments:
+            blocks:     List of (file_name, loc_shape, global_slices,
+                        local_slices) tuples, one for each processor file.
+                        The global slices must be disjoint.
+            shape:      Shape (nvar, ...) of the global array.
+            precision:  'f' for single and 'd' for double precision.
+            offset:     Offset of the view in the global spatial array,
+                        e.g. the number of ghost zones for trimmed arrays.
+        """
+
+        import numpy as np
+
+        self.blocks = blocks
+        self.shape = tuple(shape)
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(precision)
+        self.precision = precision
+        if offset is None:
+            offset = (0,)*(self.ndim-1)
+        self.offset = tuple(offset)
+
+
+    def __len__(self):
+        return self.shape[0]
+
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self[...]
+        return self[...].astype(dtype)
+
+
+    def window(self, start, shape):
+        """
+        Return a LazyField for the spatial box of the given shape
+        starting at the spatial index start, e.g. the domain without
+        ghost zones.
+        """
+
+        offset = tuple(o + s for o, s in zip(self.offset, start))
+        return LazyField(self.blocks, (self.shape[0],) + tuple(shape),
+                         self.precision, offset)
+
+
+    def _index_arrays(self, key):
+        """
+        Return the index arrays selected by key, one for each axis, and
+        the axes indexed by an integer, which are removed from the result.
+        """
+
+        import numpy as np
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        is_ellipsis = [k is Ellipsis for k in key]
+        if any(is_ellipsis):
+            i = is_ellipsis.index(True)
+            key = key[:i] + (slice(None),)*(self.ndim-len(key)+1) + key[i+1:]
+        if len(key) > self.ndim:
+            raise IndexError("too many indices for LazyField")
+        key = key + (slice(None),)*(self.ndim-len(key))
+
+        indices = []
+        squeeze = []
+        for axis, (k, size) in enumerate(zip(key, self.shape)):
+            if isinstance(k, slice):
+                idx = np.arange(*k.indices(size))
+            else:
+                idx = np.arange(size)[k]
+                if idx.ndim == 0:
+                    idx = idx.reshape(1)
+                    squeeze.append(axis)
+            indices.append(idx)
+
+        return indices, squeeze
+
+
+    def __getitem__(self, key):
+        """
+        Read the data selected by key from the processor files.
+        """
+
+        import numpy as np
+
+        indices, squeeze = self._index_arrays(key)
+        var_idx = indices[0]
+        spatial = [idx + o for idx, o in zip(indices[1:], self.offset)]
+        out = np.empty([len(idx) for idx in indices], dtype=self.dtype)
+        if out.size == 0:
+            return np.squeeze(out, axis=tuple(squeeze))
+
+        for file_name, loc_shape, gslices, lslices in self.blocks:
+            out_pos = [np.arange(len(var_idx))]
+            loc_idx = [var_idx]
+            for idx, gs, ls in zip(spatial, gslices, lslices):
+                mask = (idx >= gs.start) & (idx < gs.stop)
+                if not mask.any():
+                    break
+                out_pos.append(np.nonzero(mask)[0])
+                loc_idx.append(idx[mask] - gs.start + ls.start)
+            else:
+                f_loc = read_var_records(file_name, loc_shape,
+                                         self.precision)[0]
+                bbox = tuple(slice(idx.min(), idx.max()+1) for idx in loc_idx)
+                rel = [idx - idx.min() for idx in loc_idx]
+                out[np.ix_(*out_pos)] = np.asarray(f_loc[bbox])[np.ix_(*rel)]
+                del(f_loc)
+
+        return np.squeeze(out, axis=tuple(squeeze))
+
+
+class HDF5Field(LazyField):
+    """
+    HDF5Field -- out-of-core view of an h5py dataset, e.g. the f-array of
+    a VAR snapshot or the series of one slice in a file written by
+    pencil.files.hdf5.h5file.
+
+    Indexing reads only the chunks of the dataset touched by the
+    selection, like a LazyField does for the processor files.
+    """
+
+    def __init__(self, dataset, axes):
+        """
+        Set up the view.
+
+        call signature:
+
+        HDF5Field(dataset, axes)
+
+        Keyword arguments:
+            dataset:    h5py dataset.
+            axes:       One entry for each axis of the dataset: an integer
+                        to select a single index, which removes the axis
+                        from the view, or the array of the indices of the
+                        dataset in the view.
+        """
+
+        import numpy as np
+
+        self.dataset = dataset
+        self.axes = [a if np.isscalar(a) else np.asarray(a) for a in axes]
+        self.shape = tuple(len(a) for a in self.axes if not np.isscalar(a))
+        self.ndim = len(self.shape)
+        self.dtype = dataset.dtype
+        self.precision = dataset.dtype.char
+
+
+    def window(self, start, shape):
+        """
+        Return an HDF5Field for the spatial box of the given shape
+        starting at the spatial index start, e.g. the domain without
+        ghost zones.
+        """
+
+        import numpy as np
+
+        axes = list(self.axes)
+        view_axes = [i for i, a in enumerate(axes) if not np.isscalar(a)][1:]
+        for i, s, n in zip(view_axes, start, shape):
+            axes[i] = axes[i][s:s+n]
+        return HDF5Field(self.dataset, axes)
+
+
+    def __getitem__(self, key):
+        """
+        Read the data selected by key from the dataset.
+
+        Evenly spaced indices are read as strided hyperslab, other
+        selections as their bounding box.
+        """
+
+        import numpy as np
+
+        indices, squeeze = self._index_arrays(key)
+        if any(len(idx) == 0 for idx in indices):
+            out = np.empty([len(idx) for idx in indices], dtype=self.dtype)
+            return np.squeeze(out, axis=tuple(squeeze))
+
+        selection = []
+        rel = []
+        indices = iter(indices)
+        for a in self.axes:
+            if np.isscalar(a):
+                selection.append(int(a))
+                continue
+            idx = a[next(indices)]
+            step = np.diff(idx)
+            if len(idx) > 1 and step[0] > 0 and np.all(step == step[0]):
+                selection.append(slice(int(idx[0]), int(idx[-1])+1, int(step[0])))
+                rel.append(np.arange(len(idx)))
+            else:
+                selection.append(slice(int(idx.min()), int(idx.max())+1))
+                rel.append(idx - idx.min())
+
+        out = self.dataset[tuple(selection)][np.ix_(*rel)]
+
+        return np.squeeze(out, axis=tuple(squeeze))
+
+
+def read_hdf5_metadata(file_name):
+    """
+    Read the dimensions, parameters and indices stored in a file written
+    by pencil.files.hdf5.h5file.
+
+    call signature:
+
+    read_hdf5_metadata(file_name)
+
+    Keyword arguments:
+        file_name:  Path to the HDF5 file.
+
+    Returns the Dim, Param and Index objects.
+    """
+
+    import h5py
+    import numpy as np
+    from .dim import Dim
+    from .param import Param
+    from .index import Index
+
+    objects = []
+    with h5py.File(file_name, 'r') as h5:
+        for name, cls in (('dim', Dim), ('param', Param), ('index', Index)):
+            if 'param/read/'+name not in h5:
+                print("error: no pencilnew metadata in {0}, sync it with pencil.files.hdf5.h5file".format(file_name))
+                raise ValueError
+            obj = cls()
+            group = h5['param/read/'+name]
+            for key, value in group.attrs.items():
+                setattr(obj, key, value)
+            # String arrays, e.g. param.bcx, are stored as datasets.
+            for key, dataset in group.items():
+                setattr(obj, key, np.array(dataset.asstr()[...], dtype=str))
+            objects.append(obj)
+
+    return objects
+
+
 class DataCube(object):
     """
     DataCube -- holds Pencil Code VAR file data.
@@ -89,7 +463,7 @@ class DataCube(object):
 
     def read(self, var_file='', sim=None, datadir='data', proc=-1, ivar=-1,
              quiet=True, trim_all=True, trimall=True,
-             magic=None, varfile=''):
+             magic=None, varfile='', n_proc=1, lazy=False, layout=None):
         """
         Read VAR files from pencil code. If proc < 0, then load all data
         and assemble. otherwise, load VAR file from specified processor.
@@ -106,7 +480,7 @@ class DataCube(object):
 
         read(var_file='', datadir='data/', proc=-1, ivar=-1,
             quiet=True, trimall=False,
-            magic=None, sim=None)
+            magic=None, sim=None, n_proc=1, lazy=False, layout=None)
 
         Keyword arguments:
             var_file/varfile:
@@ -119,16 +493,47 @@ class DataCube(object):
             datadir:    Directory where the data is stored.
             proc:       Processor to be read. If -1 read all and assemble to one array.
             ivar:       Index of the VAR file, if var_file is not specified.
+            n_proc:     Number of threads used to read the processor files.
+                        If > 1 the files are memory mapped and copied
+                        concurrently into the global array, and the magic
+                        fields bb, jj and vort are computed concurrently
+                        in z-slabs.
+            lazy:       Do not read the data array. Instead f is a LazyField
+                        which only reads the processor files and byte ranges
+                        touched by an index expression like f[0, 4:8, ...].
+                        The variables, e.g. self.lnrho, are read on first
+                        access.
+            layout:     Layout of the snapshot files written by the I/O
+                        module of the run:
+                        'dist':     One file per processor in data/procN
+                                    (io_dist).
+                        'allprocs': One global file data/allprocs/var_file
+                                    of the raw array, followed by the record
+                                    t, x, y, z, dx, dy, dz and with lpersist
+                                    the persistent records (io_mpi2,
+                                    io_collect). The file is memory mapped,
+                                    in lazy mode f is the read-only memory
+                                    map itself.
+                        'hdf5':     One global file
+                                    data/allprocs/var_file.h5 (io_hdf5),
+                                    read with h5py. In lazy mode f is an
+                                    HDF5Field.
+                        If None the layout is detected by snapshot_layout.
+
+        If datadir is an HDF5 file written by pencil.files.hdf5.h5file, the
+        snapshot var_file is taken from it. The data is then always lazy,
+        f is an HDF5Field which reads only the chunks it is indexed with.
         """
 
         import numpy as np
         import os
         from scipy.io import FortranFile
         from pencilnew.math.derivatives import curl, curl2
+        from pencilnew.math.derivatives.stencil import fused_slabs
         from pencilnew import read
         from ..sim import __Simulation__
 
-        dim = None; param = None; index = None
+        dim = None; param = None; index = None; hdf5_file = None
 
         if varfile != '' and var_file == '':
             var_file = varfile
@@ -144,6 +549,10 @@ class DataCube(object):
             index = read.index(datadir=sim.datadir)
         else:
             datadir = os.path.expanduser(datadir)
+            if os.path.isfile(datadir):
+                hdf5_file = datadir
+                dim, param, index = read_hdf5_metadata(hdf5_file)
+                lazy = True
             if dim is None:
                 if(var_file[0:2].lower() == 'og'):
                     dim = read.ogdim(datadir, proc)
@@ -172,7 +581,11 @@ class DataCube(object):
             else:
                 var_file = 'VAR' + str(ivar)
 
-        if proc < 0:
+        if hdf5_file is None and layout is None:
+            layout = snapshot_layout(datadir, var_file, proc)
+        if hdf5_file is not None or layout != 'dist':
+            proc_dirs = []
+        elif proc < 0:
             proc_dirs = self.__natural_sort(filter(lambda s: s.startswith('proc'),
                                                    os.listdir(datadir)))
         else:
@@ -182,128 +595,163 @@ class DataCube(object):
 
         # Set up the global array.
         if not run2D:
-            f = np.zeros((total_vars, dim.mz, dim.my, dim.mx),
-                         dtype=precision)
+            f_shape = (total_vars, dim.mz, dim.my, dim.mx)
         else:
             if dim.ny == 1:
-                f = np.zeros((total_vars, dim.mz, dim.mx), dtype=precision)
+                f_shape = (total_vars, dim.mz, dim.mx)
             else:
-                f = np.zeros((total_vars, dim.my, dim.mx), dtype=precision)
+                f_shape = (total_vars, dim.my, dim.mx)
+        if not lazy and layout == 'dist':
+            f = np.zeros(f_shape, dtype=precision)
 
         x = np.zeros(dim.mx, dtype=precision)
         y = np.zeros(dim.my, dtype=precision)
         z = np.zeros(dim.mz, dtype=precision)
 
-        for directory in proc_dirs:
-            proc = int(directory[4:])
-            if(var_file[0:2].lower() == 'og'):
-                procdim = read.ogdim(datadir, proc)
-            else:
-                procdim = read.dim(datadir, proc)
-            if not quiet:
-                print("Reading data from processor {0} of {1} ...".format( \
-                      proc, len(proc_dirs)))
+        if hdf5_file is not None:
+            f, x, y, z, t, dx, dy, dz, deltay = \
+                self.__read_hdf5(hdf5_file, var_file)
+        elif layout != 'dist':
+            f, x, y, z, t, dx, dy, dz, deltay = \
+                self.__read_allprocs(datadir, var_file, layout, f_shape, dim,
+                                     param, precision, run2D, lazy)
+        elif lazy:
+            f, t, dx, dy, dz, deltay = \
+                self.__read_lazy(f_shape, x, y, z, datadir, proc_dirs,
+                                 var_file, dim, param, precision, run2D)
+        elif n_proc > 1 and len(proc_dirs) > 1:
+            t, dx, dy, dz, deltay = \
+                self.__read_procs_parallel(f, x, y, z, datadir, proc_dirs,
+                                           var_file, dim, param, precision,
+                                           run2D, n_proc, quiet)
+        else:
+            for directory in proc_dirs:
+                proc = int(directory[4:])
+                if(var_file[0:2].lower() == 'og'):
+                    procdim = read.ogdim(datadir, proc)
+                else:
+                    procdim = read.dim(datadir, proc)
+                if not quiet:
+                    print("Reading data from processor {0} of {1} ...".format( \
+                          proc, len(proc_dirs)))
 
-            mxloc = procdim.mx
-            myloc = procdim.my
-            mzloc = procdim.mz
+                mxloc = procdim.mx
+                myloc = procdim.my
+                mzloc = procdim.mz
 
-            # Read the data.
-            file_name = os.path.join(datadir, directory, var_file)
-            infile = FortranFile(file_name)
-            if not run2D:
-                f_loc = infile.read_record(dtype=precision)
-                f_loc = f_loc.reshape((-1, mzloc, myloc, mxloc))
-            else:
-                if dim.ny == 1:
+                # Read the data.
+                file_name = os.path.join(datadir, directory, var_file)
+                infile = FortranFile(file_name)
+                if not run2D:
                     f_loc = infile.read_record(dtype=precision)
-                    f_loc = f_loc.reshape((-1, mzloc, mxloc))
+                    f_loc = f_loc.reshape((-1, mzloc, myloc, mxloc))
                 else:
-                    f_loc = infile.read_record(dtype=precision)
-                    f_loc = f_loc.reshape((-1, myloc, mxloc))
-            raw_etc = infile.read_record(precision)
-            infile.close()
-
-            t = raw_etc[0]
-            x_loc = raw_etc[1:mxloc+1]
-            y_loc = raw_etc[mxloc+1:mxloc+myloc+1]
-            z_loc = raw_etc[mxloc+myloc+1:mxloc+myloc+mzloc+1]
-            if param.lshear:
-                shear_offset = 1
-                deltay = raw_etc[-1]
-            else:
-                shear_offset = 0
-
-            dx = raw_etc[-3-shear_offset]
-            dy = raw_etc[-2-shear_offset]
-            dz = raw_etc[-1-shear_offset]
+                    if dim.ny == 1:
+                        f_loc = infile.read_record(dtype=precision)
+                        f_loc = f_loc.reshape((-1, mzloc, mxloc))
+                    else:
+                        f_loc = infile.read_record(dtype=precision)
+                        f_loc = f_loc.reshape((-1, myloc, mxloc))
+                raw_etc = infile.read_record(precision)
+                infile.close()
 
-            if len(proc_dirs) > 1:
-                # Calculate where the local processor will go in
-                # the global array.
-                #
-                # Don't overwrite ghost zones of processor to the left (and
-                # accordingly in y and z direction -- makes a difference on the
-                # diagonals)
-                #
-                # Recall that in NumPy, slicing is NON-INCLUSIVE on the right end
-                # ie, x[0:4] will slice all of a 4-digit array, not produce
-                # an error like in idl.
-
-                if procdim.ipx == 0:
-                    i0x = 0
-                    i1x = i0x + procdim.mx
-                    i0xloc = 0
-                    i1xloc = procdim.mx
-                else:
-                    i0x = procdim.ipx*procdim.nx + procdim.nghostx
-                    i1x = i0x + procdim.mx - procdim.nghostx
-                    i0xloc = procdim.nghostx
-                    i1xloc = procdim.mx
-
-                if procdim.ipy == 0:
-                    i0y = 0
-                    i1y = i0y + procdim.my
-                    i0yloc = 0
-                    i1yloc = procdim.my
-                else:
-                    i0y = procdim.ipy*procdim.ny + procdim.nghosty
-                    i1y = i0y + procdim.my - procdim.nghosty
-                    i0yloc = procdim.nghosty
-                    i1yloc = procdim.my
-
-                if procdim.ipz == 0:
-                    i0z = 0
-                    i1z = i0z+procdim.mz
-                    i0zloc = 0
-                    i1zloc = procdim.mz
+                t = raw_etc[0]
+                x_loc = raw_etc[1:mxloc+1]
+                y_loc = raw_etc[mxloc+1:mxloc+myloc+1]
+                z_loc = raw_etc[mxloc+myloc+1:mxloc+myloc+mzloc+1]
+                if param.lshear:
+                    shear_offset = 1
+                    deltay = raw_etc[-1]
                 else:
-                    i0z = procdim.ipz*procdim.nz + procdim.nghostz
-                    i1z = i0z + procdim.mz - procdim.nghostz
-                    i0zloc = procdim.nghostz
-                    i1zloc = procdim.mz
+                    shear_offset = 0
 
-                x[i0x:i1x] = x_loc[i0xloc:i1xloc]
-                y[i0y:i1y] = y_loc[i0yloc:i1yloc]
-                z[i0z:i1z] = z_loc[i0zloc:i1zloc]
+                dx = raw_etc[-3-shear_offset]
+                dy = raw_etc[-2-shear_offset]
+                dz = raw_etc[-1-shear_offset]
 
-                if not run2D:
-                    f[:, i0z:i1z, i0y:i1y, i0x:i1x] = \
-                        f_loc[:, i0zloc:i1zloc, i0yloc:i1yloc, i0xloc:i1xloc]
-                else:
-                    if dim.ny == 1:
-                        f[:, i0z:i1z, i0x:i1x] = \
-                              f_loc[:, i0zloc:i1zloc, i0xloc:i1xloc]
+                if len(proc_dirs) > 1:
+                    # Calculate where the local processor will go in
+                    # the global array.
+                    #
+                    # Don't overwrite ghost zones of processor to the left (and
+                    # accordingly in y and z direction -- makes a difference on the
+                    # diagonals)
+                    #
+                    # Recall that in NumPy, slicing is NON-INCLUSIVE on the right end
+                    # ie, x[0:4] will slice all of a 4-digit array, not produce
+                    # an error like in idl.
+
+                    if procdim.ipx == 0:
+                        i0x = 0
+                        i1x = i0x + procdim.mx
+                        i0xloc = 0
+                        i1xloc = procdim.mx
                     else:
-                        f[:, i0y:i1y, i0x:i1x] = \
-                              f_loc[:, i0yloc:i1yloc, i0xloc:i1xloc]
-            else:
-                f = f_loc
-                x = x_loc
-                y = y_loc
-                z = z_loc
+                        i0x = procdim.ipx*procdim.nx + procdim.nghostx
+                        i1x = i0x + procdim.mx - procdim.nghostx
+                        i0xloc = procdim.nghostx
+                        i1xloc = procdim.mx
+
+                    if procdim.ipy == 0:
+                        i0y = 0
+                        i1y = i0y + procdim.my
+                        i0yloc = 0
+                        i1yloc = procdim.my
+                    else:
+                        i0y = procdim.ipy*procdim.ny + procdim.nghosty
+                        i1y = i0y + procdim.my - procdim.nghosty
+                        i0yloc = procdim.nghosty
+                        i1yloc = procdim.my
+
+                    if procdim.ipz == 0:
+                        i0z = 0
+                        i1z = i0z+procdim.mz
+                        i0zloc = 0
+                        i1zloc = procdim.mz
+                    else:
+                        i0z = procdim.ipz*procdim.nz + procdim.nghostz
+                        i1z = i0z + procdim.mz - procdim.nghostz
+                        i0zloc = procdim.nghostz
+                        i1zloc = procdim.mz
+
+                    x[i0x:i1x] = x_loc[i0xloc:i1xloc]
+                    y[i0y:i1y] = y_loc[i0yloc:i1yloc]
+                    z[i0z:i1z] = z_loc[i0zloc:i1zloc]
 
-        if magic is not None:
+                    if not run2D:
+                        f[:, i0z:i1z, i0y:i1y, i0x:i1x] = \
+                            f_loc[:, i0zloc:i1zloc, i0yloc:i1yloc, i0xloc:i1xloc]
+                    else:
+                        if dim.ny == 1:
+                            f[:, i0z:i1z, i0x:i1x] = \
+                                  f_loc[:, i0zloc:i1zloc, i0xloc:i1xloc]
+                        else:
+                            f[:, i0y:i1y, i0x:i1x] = \
+                                  f_loc[:, i0yloc:i1yloc, i0xloc:i1xloc]
+                else:
+                    f = f_loc
+                    x = x_loc
+                    y = y_loc
+                    z = z_loc
+
+        if magic is not None and not run2D:
+            # Compute the derived fields in z-slabs before doing trim_all.
+            # In lazy mode the slabs are read from the processor files.
+            # The components are only looked up for the requested fields,
+            # e.g. index.ax does not exist for runs without magnetic field.
+            curl_op = lambda ff: curl(ff, dx, dy, dz)
+            curl2_op = lambda ff: curl2(ff, dx, dy, dz)
+            operators = {
+                'bb': (curl_op, lambda: slice(index.ax-1, index.az)),
+                'jj': (curl2_op, lambda: slice(index.ax-1, index.az)),
+                'vort': (curl_op, lambda: slice(index.ux-1, index.uz))}
+            for field in ('bb', 'jj', 'vort'):
+                if field in magic:
+                    operator, comps = operators[field]
+                    setattr(self, field,
+                            fused_slabs(operator, f, 3, components=comps(),
+                                        n_proc=n_proc, trim=trim_all))
+        elif magic is not None:
             if 'bb' in magic:
                 # Compute the magnetic field before doing trim_all.
                 aa = f[index.ax-1:index.az, ...]
@@ -340,7 +788,15 @@ class DataCube(object):
             self.x = x[dim.l1:dim.l2+1]
             self.y = y[dim.m1:dim.m2+1]
             self.z = z[dim.n1:dim.n2+1]
-            if not run2D:
+            if isinstance(f, LazyField):
+                if not run2D:
+                    self.f = f.window((dim.n1, dim.m1, dim.l1),
+                                      (dim.nz, dim.ny, dim.nx))
+                elif dim.ny == 1:
+                    self.f = f.window((dim.n1, dim.l1), (dim.nz, dim.nx))
+                else:
+                    self.f = f.window((dim.m1, dim.l1), (dim.ny, dim.nx))
+            elif not run2D:
                 self.f = f[:, dim.n1:dim.n2+1, dim.m1:dim.m2+1, dim.l1:dim.l2+1]
             else:
                 if dim.ny == 1:
@@ -360,16 +816,28 @@ class DataCube(object):
             self.n2 = dim.n2 + 1
 
         # Assign an attribute to self for each variable defined in
-        # 'data/index.pro' so that e.g. self.ux is the x-velocity
+        # 'data/index.pro' so that e.g. self.ux is the x-velocity.
+        # In lazy mode the variables are only read when first accessed.
+        if lazy:
+            self._lazy_vars = dict()
         for key in index.__dict__.keys():
             if key != 'global_gg' and key != 'keys':
                 value = index.__dict__[key]
-                setattr(self, key, self.f[value-1, ...])
+                if lazy:
+                    self._lazy_vars[key] = value-1
+                else:
+                    setattr(self, key, self.f[value-1, ...])
         # Special treatment for vector quantities.
         if hasattr(index, 'uu'):
-            self.uu = self.f[index.ux-1:index.uz, ...]
+            if lazy:
+                self._lazy_vars['uu'] = slice(index.ux-1, index.uz)
+            else:
+                self.uu = self.f[index.ux-1:index.uz, ...]
         if hasattr(index, 'aa'):
-            self.aa = self.f[index.ax-1:index.az, ...]
+            if lazy:
+                self._lazy_vars['aa'] = slice(index.ax-1, index.az)
+            else:
+                self.aa = self.f[index.ax-1:index.az, ...]
 
         self.t = t
         self.dx = dx
@@ -384,6 +852,260 @@ class DataCube(object):
             self.magic_attributes(param)
 
 
+    def __getattr__(self, name):
+        """
+        Read the variables of a lazy data cube on first access.
+        """
+
+        lazy_vars = self.__dict__.get('_lazy_vars', {})
+        if name in lazy_vars:
+            value = self.f[lazy_vars[name], ...]
+            setattr(self, name, value)
+            return value
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(
+                             type(self).__name__, name))
+
+
+    def __read_lazy(self, f_shape, x, y, z, datadir, proc_dirs, var_file,
+                    dim, param, precision, run2D):
+        """
+        Read the coordinates of all processors and set up a LazyField
+        for the data, which is only read when it is indexed.
+        """
+
+        import os
+        from pencilnew import read
+
+        blocks = []
+        for directory in proc_dirs:
+            proc = int(directory[4:])
+            if var_file[0:2].lower() == 'og':
+                procdim = read.ogdim(datadir, proc)
+            else:
+                procdim = read.dim(datadir, proc)
+
+            if len(proc_dirs) > 1:
+                sx, sx_loc = _owned_slices(procdim.ipx, dim.nprocx, procdim.nx,
+                                           procdim.mx, procdim.nghostx)
+                sy, sy_loc = _owned_slices(procdim.ipy, dim.nprocy, procdim.ny,
+                                           procdim.my, procdim.nghosty)
+                sz, sz_loc = _owned_slices(procdim.ipz, dim.nprocz, procdim.nz,
+                                           procdim.mz, procdim.nghostz)
+            else:
+                sx = sx_loc = slice(0, procdim.mx)
+                sy = sy_loc = slice(0, procdim.my)
+                sz = sz_loc = slice(0, procdim.mz)
+
+            file_name = os.path.join(datadir, directory, var_file)
+            raw_etc = read_var_etc(file_name, precision)[1]
+            x[sx] = raw_etc[1:procdim.mx+1][sx_loc]
+            y[sy] = raw_etc[procdim.mx+1:procdim.mx+procdim.my+1][sy_loc]
+            z[sz] = raw_etc[procdim.mx+procdim.my+1:
+                            procdim.mx+procdim.my+procdim.mz+1][sz_loc]
+
+            if not run2D:
+                blocks.append((file_name, (procdim.mz, procdim.my, procdim.mx),
+                               (sz, sy, sx), (sz_loc, sy_loc, sx_loc)))
+            elif dim.ny == 1:
+                blocks.append((file_name, (procdim.mz, procdim.mx),
+                               (sz, sx), (sz_loc, sx_loc)))
+            else:
+                blocks.append((file_name, (procdim.my, procdim.mx),
+                               (sy, sx), (sy_loc, sx_loc)))
+
+        if param.lshear:
+            shear_offset = 1
+            deltay = raw_etc[-1]
+        else:
+            shear_offset = 0
+            deltay = None
+
+        t = raw_etc[0]
+        dx = raw_etc[-3-shear_offset]
+        dy = raw_etc[-2-shear_offset]
+        dz = raw_etc[-1-shear_offset]
+
+        f = LazyField(blocks, f_shape, precision)
+
+        return f, t, dx, dy, dz, deltay
+
+
+    def __read_hdf5(self, file_name, var_file):
+        """
+        Set up an HDF5Field for the snapshot var_file in a file written by
+        pencil.files.hdf5.h5file and read its coordinates.
+        """
+
+        import h5py
+        import numpy as np
+
+        h5 = h5py.File(file_name, 'r')
+        if 'data/var/'+var_file not in h5:
+            h5.close()
+            print("error: no snapshot {0} in {1}".format(var_file, file_name))
+            raise ValueError
+        snap = h5['data/var/'+var_file]
+
+        f = HDF5Field(snap['f'], [np.arange(n) for n in snap['f'].shape])
+        x = snap['x'][...]
+        y = snap['y'][...]
+        z = snap['z'][...]
+        deltay = snap.attrs.get('deltay', None)
+
+        return f, x, y, z, snap.attrs['t'], snap.attrs['dx'], \
+               snap.attrs['dy'], snap.attrs['dz'], deltay
+
+
+    def __read_allprocs(self, datadir, var_file, layout, f_shape, dim,
+                        param, precision, run2D, lazy):
+        """
+        Read a snapshot written into one global file in data/allprocs.
+
+        The raw array of the 'allprocs' layout is memory mapped, the time
+        and grid record follows at the end of the array, trailing records
+        like the persistent data are ignored. The 'hdf5' layout
+        is read as hyperslab of the dataset f, of which 2D runs take the
+        written plane.
+        """
+
+        import os
+        import numpy as np
+
+        if layout == 'hdf5':
+            import h5py
+
+            if not var_file.endswith('.h5'):
+                var_file += '.h5'
+            h5 = h5py.File(os.path.join(datadir, 'allprocs', var_file), 'r')
+            axes = [np.arange(n) for n in h5['f'].shape]
+            if run2D:
+                if dim.ny == 1:
+                    axes[2] = dim.m1
+                else:
+                    axes[1] = dim.n1
+            f = HDF5Field(h5['f'], axes)
+            if not lazy:
+                f = f[...]
+            x = h5['grid/x'][...]
+            y = h5['grid/y'][...]
+            z = h5['grid/z'][...]
+            t = h5['t'][()]
+            dx = h5['grid/dx'][()]
+            dy = h5['grid/dy'][()]
+            dz = h5['grid/dz'][()]
+            if not lazy:
+                h5.close()
+            return f, x, y, z, t, dx, dy, dz, None
+
+        if layout != 'allprocs':
+            print("error: unknown snapshot layout '{0}'".format(layout))
+            raise ValueError
+
+        # The time and grid record directly follows the raw array. With
+        # lpersist the persistent records are appended after it.
+        file_name = os.path.join(datadir, 'allprocs', var_file)
+        itemsize = np.dtype(precision).itemsize
+        data_len = int(np.prod(f_shape))*itemsize
+        with open(file_name, 'rb') as infile:
+            infile.seek(data_len)
+            etc_len = int(np.fromfile(infile, dtype=np.int32, count=1)[0])
+            raw_etc = np.fromfile(infile, dtype=precision, count=etc_len//itemsize)
+            end_len = np.fromfile(infile, dtype=np.int32, count=1)
+        if len(end_len) != 1 or int(end_len[0]) != etc_len:
+            print("error: no time and grid record after the data in {0}".format(file_name))
+            raise ValueError
+        f = np.memmap(file_name, dtype=precision, mode='r', shape=f_shape)
+        if not lazy:
+            f = np.array(f)
+
+        t = raw_etc[0]
+        x = raw_etc[1:dim.mx+1]
+        y = raw_etc[dim.mx+1:dim.mx+dim.my+1]
+        z = raw_etc[dim.mx+dim.my+1:dim.mx+dim.my+dim.mz+1]
+        dx, dy, dz = raw_etc[dim.mx+dim.my+dim.mz+1:dim.mx+dim.my+dim.mz+4]
+
+        return f, x, y, z, t, dx, dy, dz, None
+
+
+    def __read_procs_parallel(self, f, x, y, z, datadir, proc_dirs, var_file,
+                              dim, param, precision, run2D, n_proc, quiet):
+        """
+        Memory map the VAR files of all processors and copy them
+        concurrently into the preallocated global arrays.
+
+        Every processor writes only the part of the global array it owns,
+        i.e. its inner points plus the outer ghost zones of the domain.
+        The blocks are thus disjoint and the result is identical to the
+        serial read, where later processors overwrite the ghost zones
+        of earlier ones.
+        """
+
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+        from pencilnew import read
+
+        def __read_proc(directory):
+            proc = int(directory[4:])
+            if var_file[0:2].lower() == 'og':
+                procdim = read.ogdim(datadir, proc)
+            else:
+                procdim = read.dim(datadir, proc)
+            if not quiet:
+                print("Reading data from processor {0} of {1} ...".format( \
+                      proc, len(proc_dirs)))
+
+            if not run2D:
+                loc_shape = (procdim.mz, procdim.my, procdim.mx)
+            else:
+                if dim.ny == 1:
+                    loc_shape = (procdim.mz, procdim.mx)
+                else:
+                    loc_shape = (procdim.my, procdim.mx)
+
+            file_name = os.path.join(datadir, directory, var_file)
+            f_loc, raw_etc = read_var_records(file_name, loc_shape, precision)
+
+            sx, sx_loc = _owned_slices(procdim.ipx, dim.nprocx, procdim.nx,
+                                       procdim.mx, procdim.nghostx)
+            sy, sy_loc = _owned_slices(procdim.ipy, dim.nprocy, procdim.ny,
+                                       procdim.my, procdim.nghosty)
+            sz, sz_loc = _owned_slices(procdim.ipz, dim.nprocz, procdim.nz,
+                                       procdim.mz, procdim.nghostz)
+
+            x[sx] = raw_etc[1:procdim.mx+1][sx_loc]
+            y[sy] = raw_etc[procdim.mx+1:procdim.mx+procdim.my+1][sy_loc]
+            z[sz] = raw_etc[procdim.mx+procdim.my+1:
+                            procdim.mx+procdim.my+procdim.mz+1][sz_loc]
+
+            if not run2D:
+                f[:, sz, sy, sx] = f_loc[:, sz_loc, sy_loc, sx_loc]
+            else:
+                if dim.ny == 1:
+                    f[:, sz, sx] = f_loc[:, sz_loc, sx_loc]
+                else:
+                    f[:, sy, sx] = f_loc[:, sy_loc, sx_loc]
+            del(f_loc)
+
+            return raw_etc
+
+        with ThreadPoolExecutor(max_workers=n_proc) as executor:
+            raw_etc = list(executor.map(__read_proc, proc_dirs))[-1]
+
+        if param.lshear:
+            shear_offset = 1
+            deltay = raw_etc[-1]
+        else:
+            shear_offset = 0
+            deltay = None
+
+        t = raw_etc[0]
+        dx = raw_etc[-3-shear_offset]
+        dy = raw_etc[-2-shear_offset]
+        dz = raw_etc[-1-shear_offset]
+
+        return t, dx, dy, dz, deltay
+
+
     def __natural_sort(self, procs_list):
         """
         Sort array in a more natural way, e.g. 9VAR < 10VAR
@@ -584,6 +584,9 @@ class __Simulation__(object):
         if particle == True: key = 'PVAR'
 
         varlist = natural_sort([basename(i) for i in glob.glob(join(self.datadir, 'proc0')+'/'+key+'*')])
+        if varlist == []:
+            # single file snapshots of io_mpi2, io_collect and io_hdf5
+            varlist = natural_sort([basename(i).split('.h5')[0] for i in glob.glob(join(self.datadir, 'allprocs')+'/'+key+'*')])
         #if particle: varlist = ['P'+i for i in varlist]
 
         if pos == False: return varlist
@@ -645,8 +648,13 @@ class __Simulation__(object):
             unique_clean:       set True, np.unique is used to clean up the ts, e.g. remove errors at the end of crashed runs"""
         from pencilnew.read import ts
 
-        # check if already loaded
-        if 'ts' in self.tmp_dict.keys() and self.tmp_dict['ts'].t[-1] == self.get_T_last(): return self.tmp_dict['ts']
+        # check if already loaded, then only read the newly appended rows
+        if 'ts' in self.tmp_dict.keys() and hasattr(self.tmp_dict['ts'], 'offset'):
+            ts = self.tmp_dict['ts']
+            ts.unique_clean = unique_clean
+            if len(getattr(ts, 't', [])) == 0 or ts.t[-1] != self.get_T_last():
+                ts.update(quiet=True)
+            return ts
 
         if self.started():
             ts = ts(sim=self, quiet=True, unique_clean=unique_clean)
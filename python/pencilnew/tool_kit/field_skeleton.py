@@ -10,7 +10,8 @@ Haynes-Parnell-2010-17-9-PhysPlasm (http://dx.doi.org/10.1063/1.3467499).
 
 import numpy as np
 import os as os
-from pencilnew.math.interpolation import vec_int
+from pencilnew.math.interpolation import vec_int, interpolate, prepare_field
+from pencilnew.diag.shared_pool import SharedPool
 try:
     import vtk as vtk
     from vtk.util import numpy_support as VN
@@ -22,6 +23,186 @@ except:
     print("Warning: no h5py library found.")
 
 
+class _GridParams(object):
+    """
+    Grid information needed for the interpolation and the domain check,
+    small enough to be sent to the worker processes.
+    """
+
+    def __init__(self, var):
+        self.x, self.y, self.z = var.x, var.y, var.z
+        self.Ox, self.Oy, self.Oz = var.x[0], var.y[0], var.z[0]
+        self.dx, self.dy, self.dz = var.dx, var.dy, var.dz
+        self.nx, self.ny, self.nz = len(var.x), len(var.y), len(var.z)
+        self.lower = np.array([var.x[0], var.y[0], var.z[0]])
+        self.upper = np.array([var.x[-1], var.y[-1], var.z[-1]])
+
+
+def _inside_domain(points, grid):
+    """ Check which of the points [..., 3] lie inside the domain. """
+    return np.all((points > grid.lower) & (points < grid.upper), axis=-1)
+
+
+def _separatrix_chunk(arrays, start, stop, grid, delta, iter_max):
+    """
+    Trace the fan surfaces of the nulls start to stop with the shared
+    arrays of Separatrix.find_separatrices.
+    """
+
+    results = []
+    for idx in range(start, stop):
+        ring = arrays['rings'][idx] if arrays['has_ring'][idx] else None
+        results.append(_trace_separatrix(arrays['field'], grid,
+                                         arrays['nulls'][idx], ring,
+                                         arrays['sign_trace'][idx],
+                                         delta, iter_max))
+    return results
+
+
+def _spine_chunk(arrays, start, stop, grid, delta, iter_max):
+    """
+    Trace the spines of the nulls start to stop together with the shared
+    arrays of Spine.find_spines.
+    """
+
+    return _trace_spines(arrays['field'], grid, arrays['nulls'][start:stop],
+                         arrays['normals'][start:stop],
+                         arrays['sign_trace'][start:stop], delta, iter_max)
+
+
+def _trace_separatrix(field, grid, null, ring, sign_trace, delta, iter_max):
+    """
+    Trace the fan surface of one null, starting from the first ring of
+    points around it. The field has the layout [nz, ny, nx, 3] of
+    prepare_field.
+
+    Returns the points, starting with the null, and the connectivity of
+    the lines between them with indices local to this null.
+    """
+
+    separatrices = [null]
+    connectivity = []
+    if ring is None:
+        return np.array(separatrices), np.zeros((0, 2), dtype=int)
+
+    ring_density = len(ring)
+    ring = list(ring)
+    separatrices.extend(ring)
+    # Set the connectivity with the null point and within the ring.
+    for idx in range(ring_density):
+        connectivity.append([0, idx+1])
+    for idx in range(ring_density-1):
+        connectivity.append([idx+1, idx+2])
+    connectivity.append([1, ring_density])
+
+    # Trace the rings around the null.
+    iteration = 0
+    while iteration < iter_max:
+        n_old = len(ring)
+
+        # Trace field lines on ring.
+        ring = np.array(ring)
+        field_norm = interpolate(ring, field, grid, layout='zyxc')*sign_trace
+        field_norm = field_norm/np.sqrt(np.sum(field_norm**2, axis=1))[:, np.newaxis]
+        ring = ring + field_norm*delta
+
+        # Connectivity array between old and new ring.
+        connectivity_rings = np.ones((2, len(ring)), dtype='int')*np.arange(len(ring))
+
+        # Add points if distance becomes too large.
+        distance = np.sqrt(np.sum((ring[1:] - ring[:-1])**2, axis=1))
+        ring_new = []
+        ring_new.append(ring[0])
+        for point_idx in range(len(ring)-1):
+            if distance[point_idx] > delta:
+                ring_new.append((ring[point_idx]+ring[point_idx+1])/2)
+                connectivity_rings[1, point_idx+1:] += 1
+            ring_new.append(ring[point_idx+1])
+        if np.sqrt(np.sum((ring[0]-ring[-1])**2)) > delta:
+            ring_new.append((ring[0]+ring[-1])/2)
+        ring = ring_new
+
+        # Remove points which lie outside.
+        inside = _inside_domain(np.array(ring), grid)
+        ring_new = []
+        not_connect_to_next = []
+        left_shift = np.zeros(connectivity_rings.shape[1], dtype='int')
+        for point_idx in range(len(ring)):
+            if inside[point_idx]:
+                ring_new.append(ring[point_idx])
+                separatrices.append(ring[point_idx])
+            else:
+                not_connect_to_next.append(len(ring_new)-1)
+                mask = connectivity_rings[1, :] == point_idx
+                connectivity_rings[1, mask] = -1
+                mask = connectivity_rings[1, :] > point_idx
+                left_shift += mask
+        connectivity_rings[1, :] -= left_shift
+        ring = ring_new
+
+        # Stop the tracing routine if there are no points in the ring.
+        if not ring:
+            break
+
+        # Set the connectivity within the ring.
+        offset = len(separatrices)-len(ring_new)
+        for point_idx in range(len(ring_new)-1):
+            if not point_idx in not_connect_to_next:
+                connectivity.append([offset+point_idx, offset+point_idx+1])
+        if not len(ring_new) in not_connect_to_next \
+        and not -1 in not_connect_to_next:
+            connectivity.append([offset, offset+len(ring_new)-1])
+
+        # Set the connectivity between the old and new ring.
+        for point_old_idx in range(n_old):
+            if connectivity_rings[1, point_old_idx] >= 0:
+                connectivity.append([connectivity_rings[0, point_old_idx] +
+                                     len(separatrices)-n_old-len(ring),
+                                     connectivity_rings[1, point_old_idx] +
+                                     len(separatrices)-len(ring)])
+
+        iteration += 1
+
+    return np.array(separatrices), np.array(connectivity, dtype=int)
+
+
+def _trace_spines(field, grid, nulls, normals, sign_trace, delta, iter_max):
+    """
+    Trace the two spines, above and below the fan plane, of a group of
+    nulls. All spines are advanced together. The field has the layout
+    [nz, ny, nx, 3] of prepare_field.
+
+    Returns the list of spines, two per null.
+    """
+
+    nulls = np.reshape(nulls, (-1, 3))
+    normals = np.reshape(normals, (-1, 3))
+    sign = -np.repeat(np.reshape(sign_trace, -1), 2)[:, np.newaxis]
+    n_spines = 2*len(nulls)
+
+    # Spine 2*i goes along the normal of null i, spine 2*i+1 against it.
+    spines = np.full((iter_max+2, n_spines, 3), np.nan)
+    spines[0] = np.repeat(nulls, 2, axis=0)
+    point = spines[0] + np.array([1, -1]*len(nulls))[:, np.newaxis] * \
+            np.repeat(normals, 2, axis=0)*delta
+    length = np.full(n_spines, iter_max+1)
+    tracing = np.ones(n_spines, dtype=bool)
+    for iteration in range(iter_max):
+        if not tracing.any():
+            break
+        spines[iteration+1, tracing] = point[tracing]
+        field_norm = sign[tracing]*interpolate(point[tracing], field, grid,
+                                                 layout='zyxc')
+        field_norm = field_norm/np.sqrt(np.sum(field_norm**2, axis=1))[:, np.newaxis]
+        point[tracing] = point[tracing] + field_norm*delta
+        # Stop the spines which left the domain.
+        stopped = np.where(tracing)[0][~_inside_domain(point[tracing], grid)]
+        length[stopped] = iteration + 2
+        tracing[stopped] = False
+
+    return [spines[:length[idx], idx] for idx in range(n_spines)]
+
+
 class NullPoint(object):
     """
     Contains the position of the null points.
@@ -73,309 +254,64 @@ class NullPoint(object):
 
         # Find null points in these cells.
         self.nulls = []
-        nulls_list = []
         delta = min((var.dx, var.dy, var.dz))/500
-        for cell_idx in range(np.sum(reduced_cells)):
-            # 2) Analysis step.
-
-            # Find the indices of the cell where to look for the null point.
-            idx_x = np.where(reduced_cells == True)[2][cell_idx]
-            idx_y = np.where(reduced_cells == True)[1][cell_idx]
-            idx_z = np.where(reduced_cells == True)[0][cell_idx]
-            x = var.x
-            y = var.y
-            z = var.z
-
-            # Compute the coefficients for the trilinear interpolation.
-            coefTri = np.zeros((8, 3))
-            coefTri[0] = field[:, idx_z, idx_y, idx_x]
-            coefTri[1] = field[:, idx_z, idx_y, idx_x+1] - \
-                         field[:, idx_z, idx_y, idx_x]
-            coefTri[2] = field[:, idx_z, idx_y+1, idx_x] - \
-                         field[:, idx_z, idx_y, idx_x]
-            coefTri[3] = field[:, idx_z, idx_y+1, idx_x+1] - \
-                         field[:, idx_z, idx_y, idx_x+1] - \
-                         field[:, idx_z, idx_y+1, idx_x] + \
-                         field[:, idx_z, idx_y, idx_x]
-            coefTri[4] = field[:, idx_z+1, idx_y, idx_x] - \
-                         field[:, idx_z, idx_y, idx_x]
-            coefTri[5] = field[:, idx_z+1, idx_y, idx_x+1] - \
-                         field[:, idx_z, idx_y, idx_x+1] - \
-                         field[:, idx_z+1, idx_y, idx_x] + \
-                         field[:, idx_z, idx_y, idx_x]
-            coefTri[6] = field[:, idx_z+1, idx_y+1, idx_x] - \
-                         field[:, idx_z, idx_y+1, idx_x] - \
-                         field[:, idx_z+1, idx_y, idx_x] + \
-                         field[:, idx_z, idx_y, idx_x]
-            coefTri[7] = field[:, idx_z+1, idx_y+1, idx_x+1] - \
-                         field[:, idx_z, idx_y+1, idx_x+1] - \
-                         field[:, idx_z+1, idx_y, idx_x+1] - \
-                         field[:, idx_z+1, idx_y+1, idx_x] + \
-                         field[:, idx_z, idx_y, idx_x+1] + \
-                         field[:, idx_z, idx_y+1, idx_x] + \
-                         field[:, idx_z+1, idx_y, idx_x] - \
-                         field[:, idx_z, idx_y, idx_x]
-
-            # Contains the nulls obtained from each face.
-            null_cell = []
-
-            # Find the intersection of the curves field_i = field_j = 0.
-            # The units are first normalized to the unit cube from 000 to 111.
-
-            # face 1
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[4]*0
-            coefBi[1] = coefTri[1] + coefTri[5]*0
-            coefBi[2] = coefTri[2] + coefTri[6]*0
-            coefBi[3] = coefTri[3] + coefTri[7]*0
-            # Find the roots for x0 and y0.
-            polynomial = np.array([coefBi[1, 0]*coefBi[3, 1] -
-                                   coefBi[1, 1]*coefBi[3, 0],
-                                   coefBi[0, 0]*coefBi[3, 1] +
-                                   coefBi[1, 0]*coefBi[2, 1] -
-                                   coefBi[0, 1]*coefBi[3, 0] -
-                                   coefBi[2, 0]*coefBi[1, 1],
-                                   coefBi[0, 0]*coefBi[2, 1] -
-                                   coefBi[0, 1]*coefBi[2, 0]])
-            roots_x = np.roots(polynomial)
-            if len(roots_x) == 0:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_y = -(coefBi[0, 0]+coefBi[1, 0]*roots_x)/ \
-                       (coefBi[2, 0]+coefBi[3, 0]*roots_x)
-            if np.real(roots_x[0]) >= 0 and np.real(roots_x[0]) <= 1 and \
-            np.real(roots_y[0]) >= 0 and np.real(roots_y[0]) <= 1:
-                intersection = True
-                root_idx = 0
-            if np.real(roots_x[1]) >= 0 and np.real(roots_x[1]) <= 1 and \
-            np.real(roots_y[1]) >= 0 and np.real(roots_y[1]) <= 1:
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], roots_y[root_idx], 0]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append([xyz[0]*var.dx + x[idx_x],
-                                      xyz[1]*var.dy + y[idx_y],
-                                      xyz[2]*var.dz + z[idx_z]])
-
-            # face 2
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[4]*1
-            coefBi[1] = coefTri[1] + coefTri[5]*1
-            coefBi[2] = coefTri[2] + coefTri[6]*1
-            coefBi[3] = coefTri[3] + coefTri[7]*1
-            # Find the roots for x0 and y0.
-            polynomial = np.array([coefBi[1, 0]*coefBi[3, 1] -
-                                   coefBi[1, 1]*coefBi[3, 0],
-                                   coefBi[0, 0]*coefBi[3, 1] +
-                                   coefBi[1, 0]*coefBi[2, 1] -
-                                   coefBi[0, 1]*coefBi[3, 0] -
-                                   coefBi[2, 0]*coefBi[1, 1],
-                                   coefBi[0, 0]*coefBi[2, 1] -
-                                   coefBi[0, 1]*coefBi[2, 0]])
-            roots_x = np.roots(polynomial)
-            if len(roots_x) == 0:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_y = -(coefBi[0, 0]+coefBi[1, 0]*roots_x)/ \
-                       (coefBi[2, 0]+coefBi[3, 0]*roots_x)
-            if np.real(roots_x[0]) >= 0 and np.real(roots_x[0]) <= 1 and \
-            np.real(roots_y[0]) >= 0 and np.real(roots_y[0]) <= 1:
-                intersection = True
-                root_idx = 0
-            if np.real(roots_x[1]) >= 0 and np.real(roots_x[1]) <= 1 and \
-            np.real(roots_y[1]) >= 0 and np.real(roots_y[1]) <= 1:
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], roots_y[root_idx], 1]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append([xyz[0]*var.dx + x[idx_x],
-                                      xyz[1]*var.dy + y[idx_y],
-                                      xyz[2]*var.dz + z[idx_z]])
-
-            # face 3
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[2]*0
-            coefBi[1] = coefTri[1] + coefTri[3]*0
-            coefBi[2] = coefTri[4] + coefTri[6]*0
-            coefBi[3] = coefTri[5] + coefTri[7]*0
-            # Find the roots for x0 and z0.
-            polynomial = np.array([coefBi[1, 0]*coefBi[3, 2] -
-                                   coefBi[1, 2]*coefBi[3, 0],
-                                   coefBi[0, 0]*coefBi[3, 2] +
-                                   coefBi[1, 0]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[3, 0] -
-                                   coefBi[2, 0]*coefBi[1, 2],
-                                   coefBi[0, 0]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[2, 0]])
-            roots_x = np.roots(polynomial)
-            if len(roots_x) == 0:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_z = -(coefBi[0, 0]+coefBi[1, 0]*roots_x)/ \
-                       (coefBi[2, 0]+coefBi[3, 0]*roots_x)
-            if np.real(roots_x[0]) >= 0 and np.real(roots_x[0]) <= 1 and \
-            np.real(roots_z[0]) >= 0 and np.real(roots_z[0]) <= 1:
-                intersection = True
-                root_idx = 0
-            if np.real(roots_x[1]) >= 0 and np.real(roots_x[1]) <= 1 and \
-            np.real(roots_z[1]) >= 0 and np.real(roots_z[1]) <= 1:
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], 0, roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append([xyz[0]*var.dx + x[idx_x],
-                                      xyz[1]*var.dy + y[idx_y],
-                                      xyz[2]*var.dz + z[idx_z]])
-
-            # face 4
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[2]*1
-            coefBi[1] = coefTri[1] + coefTri[3]*1
-            coefBi[2] = coefTri[4] + coefTri[6]*1
-            coefBi[3] = coefTri[5] + coefTri[7]*1
-            # Find the roots for x0 and z0.
-            polynomial = np.array([coefBi[1, 0]*coefBi[3, 2] -
-                                   coefBi[1, 2]*coefBi[3, 0],
-                                   coefBi[0, 0]*coefBi[3, 2] +
-                                   coefBi[1, 0]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[3, 0] -
-                                   coefBi[2, 0]*coefBi[1, 2],
-                                   coefBi[0, 0]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[2, 0]])
-            roots_x = np.roots(polynomial)
-            if len(roots_x) == 0:
-                roots_x = -np.ones(2)
-            if len(roots_x) == 1:
-                roots_x = np.array([roots_x, roots_x])
-            roots_z = -(coefBi[0, 0]+coefBi[1, 0]*roots_x)/ \
-                       (coefBi[2, 0]+coefBi[3, 0]*roots_x)
-            if np.real(roots_x[0]) >= 0 and np.real(roots_x[0]) <= 1 and \
-            np.real(roots_z[0]) >= 0 and np.real(roots_z[0]) <= 1:
-                intersection = True
-                root_idx = 0
-            if np.real(roots_x[1]) >= 0 and np.real(roots_x[1]) <= 1 and \
-            np.real(roots_z[1]) >= 0 and np.real(roots_z[1]) <= 1:
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [roots_x[root_idx], 1, roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append([xyz[0]*var.dx + x[idx_x],
-                                      xyz[1]*var.dy + y[idx_y],
-                                      xyz[2]*var.dz + z[idx_z]])
-
-            # face 5
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[1]*0
-            coefBi[1] = coefTri[2] + coefTri[3]*0
-            coefBi[2] = coefTri[4] + coefTri[5]*0
-            coefBi[3] = coefTri[6] + coefTri[7]*0
-            # Find the roots for y0 and z0.
-            polynomial = np.array([coefBi[1, 1]*coefBi[3, 2] -
-                                   coefBi[1, 2]*coefBi[3, 1],
-                                   coefBi[0, 1]*coefBi[3, 2] +
-                                   coefBi[1, 1]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[3, 1] -
-                                   coefBi[2, 1]*coefBi[1, 2],
-                                   coefBi[0, 1]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[2, 1]])
-            roots_y = np.roots(polynomial)
-            if len(roots_y) == 0:
-                roots_y = -np.ones(2)
-            if len(roots_y) == 1:
-                roots_y = np.array([roots_y, roots_y])
-            roots_z = -(coefBi[0, 1]+coefBi[1, 1]*roots_y)/ \
-                       (coefBi[2, 1]+coefBi[3, 1]*roots_y)
-            if np.real(roots_y[0]) >= 0 and np.real(roots_y[0]) <= 1 and\
-            np.real(roots_z[0]) >= 0 and np.real(roots_z[0]) <= 1:
-                intersection = True
-                root_idx = 0
-            if (np.real(roots_y[1]) >= 0 and np.real(roots_y[1]) <= 1) and \
-            (np.real(roots_z[1]) >= 0 and np.real(roots_z[1]) <= 1):
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [0, roots_y[root_idx], roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append([xyz[0]*var.dx + x[idx_x],
-                                      xyz[1]*var.dy + y[idx_y],
-                                      xyz[2]*var.dz + z[idx_z]])
-
-            # face 6
-            intersection = False
-            coefBi = np.zeros((4, 3))
-            coefBi[0] = coefTri[0] + coefTri[1]*1
-            coefBi[1] = coefTri[2] + coefTri[3]*1
-            coefBi[2] = coefTri[4] + coefTri[5]*1
-            coefBi[3] = coefTri[6] + coefTri[7]*1
-            # Find the roots for y0 and z0.
-            polynomial = np.array([coefBi[1, 1]*coefBi[3, 2] -
-                                   coefBi[1, 2]*coefBi[3, 1],
-                                   coefBi[0, 1]*coefBi[3, 2] +
-                                   coefBi[1, 1]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[3, 1] -
-                                   coefBi[2, 1]*coefBi[1, 2],
-                                   coefBi[0, 1]*coefBi[2, 2] -
-                                   coefBi[0, 2]*coefBi[2, 1]])
-            roots_y = np.roots(polynomial)
-            if len(roots_y) == 0:
-                roots_y = -np.ones(2)
-            if len(roots_y) == 1:
-                roots_y = np.array([roots_y, roots_y])
-            roots_z = -(coefBi[0, 1]+coefBi[1, 1]*roots_y)/ \
-                       (coefBi[2, 1]+coefBi[3, 1]*roots_y)
-            if np.real(roots_y[0]) >= 0 and np.real(roots_y[0]) <= 1 and \
-            np.real(roots_z[0]) >= 0 and np.real(roots_z[0]) <= 1:
-                intersection = True
-                root_idx = 0
-            if np.real(roots_y[1]) >= 0 and np.real(roots_y[1]) <= 1 and \
-            np.real(roots_z[1]) >= 0 and np.real(roots_z[1]) <= 1:
-                intersection = True
-                root_idx = 1
-            if intersection:
-                xyz0 = [1, roots_y[root_idx], roots_z[root_idx]]
-                xyz = np.real(self.__newton_raphson(xyz0, coefTri, dd=delta))
-                # Check if the null point lies inside the cell.
-                if np.all(xyz >= 0) and np.all(xyz <= 1):
-                    null_cell.append([xyz[0]*var.dx + x[idx_x],
-                                      xyz[1]*var.dy + y[idx_y],
-                                      xyz[2]*var.dz + z[idx_z]])
-
-            # Compute the average of the null found from different faces.
-            if null_cell:
-                nulls_list.append(np.mean(null_cell, axis=0))
+        cells = np.argwhere(reduced_cells)
+        idx_z, idx_y, idx_x = cells.T
+
+        # 2) Analysis step.
+        # Compute the coefficients for the trilinear interpolation of all
+        # cells at once.
+        f000 = field[:, idx_z, idx_y, idx_x].T
+        f001 = field[:, idx_z, idx_y, idx_x+1].T
+        f010 = field[:, idx_z, idx_y+1, idx_x].T
+        f011 = field[:, idx_z, idx_y+1, idx_x+1].T
+        f100 = field[:, idx_z+1, idx_y, idx_x].T
+        f101 = field[:, idx_z+1, idx_y, idx_x+1].T
+        f110 = field[:, idx_z+1, idx_y+1, idx_x].T
+        f111 = field[:, idx_z+1, idx_y+1, idx_x+1].T
+        coefTri = np.zeros((len(cells), 8, 3))
+        coefTri[:, 0] = f000
+        coefTri[:, 1] = f001 - f000
+        coefTri[:, 2] = f010 - f000
+        coefTri[:, 3] = f011 - f001 - f010 + f000
+        coefTri[:, 4] = f100 - f000
+        coefTri[:, 5] = f101 - f001 - f100 + f000
+        coefTri[:, 6] = f110 - f010 - f100 + f000
+        coefTri[:, 7] = f111 - f011 - f101 - f110 + f001 + f010 + f100 - f000
+
+        # Find the intersection of the curves field_i = field_j = 0 on the
+        # six faces of each cell and use it as starting point for the
+        # Newton-Raphson method.
+        # The units are first normalized to the unit cube from 000 to 111.
+        null_sum = np.zeros((len(cells), 3))
+        null_count = np.zeros(len(cells), dtype=int)
+        origin = np.array([var.x[idx_x], var.y[idx_y], var.z[idx_z]]).T
+        spacing = np.array([var.dx, var.dy, var.dz])
+        for face in self.__faces:
+            xyz0, intersection = self.__face_intersections(coefTri, *face)
+            xyz = self.__newton_raphson(xyz0[intersection],
+                                        coefTri[intersection], dd=delta)
+            # Check if the null point lies inside the cell.
+            inside = np.all((xyz >= 0) & (xyz <= 1), axis=1)
+            cell_idx = np.where(intersection)[0][inside]
+            null_sum[cell_idx] += xyz[inside]*spacing + origin[cell_idx]
+            null_count[cell_idx] += 1
+
+        # Compute the average of the null found from different faces.
+        found = null_count > 0
+        nulls_list = null_sum[found]/null_count[found, np.newaxis]
 
         # Discard nulls which are too close to each other.
-        nulls_list = np.array(nulls_list)
         keep_null = np.ones(len(nulls_list), dtype=bool)
-        for idx_null_1 in range(len(nulls_list)):
-            for idx_null_2 in range(idx_null_1+1, len(nulls_list)):
-                diff_nulls = abs(nulls_list[idx_null_1]-nulls_list[idx_null_2])
-                if diff_nulls[0] < var.dx and diff_nulls[1] < var.dy and \
-                diff_nulls[2] < var.dz:
-                    keep_null[idx_null_2] = False
-        nulls_list = nulls_list[keep_null == True]
+        if len(nulls_list) > 1:
+            from scipy.spatial import cKDTree
+
+            tree = cKDTree(nulls_list/spacing)
+            pairs = tree.query_pairs(1, p=np.inf, output_type='ndarray')
+            diff_nulls = abs(nulls_list[pairs[:, 0]] - nulls_list[pairs[:, 1]])
+            close = np.all(diff_nulls < spacing, axis=1)
+            keep_null[pairs[close, 1]] = False
+        nulls_list = nulls_list[keep_null]
 
         # Compute the field's characteristics around each null.
         for null in nulls_list:
@@ -563,11 +499,67 @@ class NullPoint(object):
         self.normals = np.array(normals)
 
 
-    def __triLinear_interpolation(self, x, y, z, coefTri):
-        """ Compute the interpolated field at (normalized) x, y, z. """
-        return coefTri[0] + coefTri[1]*x + coefTri[2]*y + coefTri[3]*x*y +\
-               coefTri[4]*z + coefTri[5]*x*z + coefTri[6]*y*z + \
-               coefTri[7]*x*y*z
+    # Faces of the unit cell: the normalized coordinate which is fixed,
+    # its value, the pairs of trilinear coefficients combined into the
+    # bilinear ones and the field components whose zero curves are
+    # intersected.
+    __faces = ((2, 0, ((0, 4), (1, 5), (2, 6), (3, 7)), (0, 1)),
+               (2, 1, ((0, 4), (1, 5), (2, 6), (3, 7)), (0, 1)),
+               (1, 0, ((0, 2), (1, 3), (4, 6), (5, 7)), (0, 2)),
+               (1, 1, ((0, 2), (1, 3), (4, 6), (5, 7)), (0, 2)),
+               (0, 0, ((0, 1), (2, 3), (4, 5), (6, 7)), (1, 2)),
+               (0, 1, ((0, 1), (2, 3), (4, 5), (6, 7)), (1, 2)))
+
+
+    def __face_intersections(self, coefTri, axis, value, pairs, comps):
+        """
+        Find the intersection of the zero curves of two field components
+        on one face for all cells.
+
+        Returns the starting points of shape [N, 3] and the mask of the
+        cells where the intersection lies on the face.
+        """
+
+        coefBi = np.array([coefTri[:, i] + coefTri[:, j]*value for i, j in pairs])
+        p, q = comps
+        # Coefficients of the quadratic polynomial for the first free
+        # coordinate.
+        a = coefBi[1, :, p]*coefBi[3, :, q] - coefBi[1, :, q]*coefBi[3, :, p]
+        b = coefBi[0, :, p]*coefBi[3, :, q] + coefBi[1, :, p]*coefBi[2, :, q] - \
+            coefBi[0, :, q]*coefBi[3, :, p] - coefBi[2, :, p]*coefBi[1, :, q]
+        c = coefBi[0, :, p]*coefBi[2, :, q] - coefBi[0, :, q]*coefBi[2, :, p]
+
+        # Roots as returned by np.roots, including the degenerate cases.
+        roots = -np.ones((2, len(a)), dtype=complex)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quadratic = a != 0
+            sqrt_disc = np.sqrt((b**2 - 4*a*c).astype(complex))
+            roots[0, quadratic] = ((-b - sqrt_disc)/(2*a))[quadratic]
+            roots[1, quadratic] = ((-b + sqrt_disc)/(2*a))[quadratic]
+            linear = ~quadratic & (b != 0)
+            roots[:, linear] = (-c/b)[linear]
+            roots_2 = -(coefBi[0, :, p] + coefBi[1, :, p]*roots)/ \
+                       (coefBi[2, :, p] + coefBi[3, :, p]*roots)
+        valid = (np.real(roots) >= 0) & (np.real(roots) <= 1) & \
+                (np.real(roots_2) >= 0) & (np.real(roots_2) <= 1)
+        # Take the second root if both lie on the face.
+        root_idx = np.where(valid[1], 1, 0)
+        cells = np.arange(len(a))
+
+        xyz0 = np.empty((len(a), 3))
+        free = [i for i in range(3) if i != axis]
+        xyz0[:, axis] = value
+        xyz0[:, free[0]] = np.real(roots[root_idx, cells])
+        xyz0[:, free[1]] = np.real(roots_2[root_idx, cells])
+        return xyz0, valid.any(axis=0)
+
+
+    def __triLinear_interpolation(self, xyz, coefTri):
+        """ Compute the interpolated field at the (normalized) points xyz. """
+        x, y, z = [xyz[:, i, np.newaxis] for i in range(3)]
+        return coefTri[:, 0] + coefTri[:, 1]*x + coefTri[:, 2]*y + \
+               coefTri[:, 3]*x*y + coefTri[:, 4]*z + coefTri[:, 5]*x*z + \
+               coefTri[:, 6]*y*z + coefTri[:, 7]*x*y*z
 
 
     def __grad_field(self, xyz, var, field, dd):
@@ -583,38 +575,47 @@ class NullPoint(object):
         return np.matrix(gf)
 
 
-    def __grad_field_1(self, x, y, z, coefTri, dd):
-        """ Compute the inverse of the gradient of the field. """
-        gf1 = np.zeros((3, 3))
-        gf1[0, :] = (self.__triLinear_interpolation(x+dd, y, z, coefTri) - \
-                     self.__triLinear_interpolation(x-dd, y, z, coefTri))/(2*dd)
-        gf1[1, :] = (self.__triLinear_interpolation(x, y+dd, z, coefTri) - \
-                     self.__triLinear_interpolation(x, y-dd, z, coefTri))/(2*dd)
-        gf1[2, :] = (self.__triLinear_interpolation(x, y, z+dd, coefTri) - \
-                     self.__triLinear_interpolation(x, y, z-dd, coefTri))/(2*dd)
-        # Invert the matrix.
-        if np.linalg.det(gf1) != 0 and not np.max(np.isnan(gf1)):
-            gf1 = np.matrix(gf1).I
-        else:
-            gf1 *= 0
+    def __grad_field_1(self, xyz, coefTri, dd):
+        """
+        Compute the gradient of the trilinear field at the points xyz.
+        Row i holds the derivative in direction i.
+        """
+        gf1 = np.zeros((len(xyz), 3, 3))
+        for i in range(3):
+            shift = np.zeros(3)
+            shift[i] = dd
+            gf1[:, i, :] = (self.__triLinear_interpolation(xyz+shift, coefTri) -
+                            self.__triLinear_interpolation(xyz-shift, coefTri))/(2*dd)
         return gf1
 
 
     def __newton_raphson(self, xyz0, coefTri, dd):
-        """ Newton-Raphson method for finding null-points. """
-        xyz = np.array(xyz0)
+        """
+        Newton-Raphson method for finding null-points, run for all
+        starting points at once. Points stop when a step is smaller than
+        the tolerance in one direction or larger than one cell.
+        """
+        xyz = np.array(xyz0, dtype=float)
         iterMax = 10
         tol = dd/10
 
+        active = np.ones(len(xyz), dtype=bool)
         for i in range(iterMax):
-            diff = self.__triLinear_interpolation(xyz[0], xyz[1],
-                                                  xyz[2], coefTri) * \
-                   self.__grad_field_1(xyz[0], xyz[1], xyz[2], coefTri, dd)
-            diff = np.array(diff)[0]
-            xyz = xyz - diff
-            if any(abs(diff) < tol) or any(abs(diff) > 1):
-                return xyz
-        return np.array(xyz)
+            if not active.any():
+                break
+            gf1 = self.__grad_field_1(xyz[active], coefTri[active], dd)
+            values = self.__triLinear_interpolation(xyz[active], coefTri[active])
+            # Solve diff*gf1 = values, with diff = 0 for singular matrices.
+            det = np.linalg.det(gf1)
+            regular = (det != 0) & ~np.isnan(gf1).any(axis=(1, 2))
+            gf1[~regular] = np.eye(3)
+            diff = np.linalg.solve(np.swapaxes(gf1, 1, 2),
+                                   values[:, :, np.newaxis])[:, :, 0]
+            diff[~regular] = 0
+            xyz[active] -= diff
+            done = np.any(abs(diff) < tol, axis=1) | np.any(abs(diff) > 1, axis=1)
+            active[np.where(active)[0][done]] = False
+        return xyz
 
 
 class Separatrix(object):
@@ -635,17 +636,19 @@ class Separatrix(object):
         self.normals = []
         self.separatrices = []
         self.connectivity = []
+        self.offsets = []
 
 
     def find_separatrices(self, var, field, null_point, delta=0.1,
-                          iter_max=100, ring_density=8):
+                          iter_max=100, ring_density=8, n_proc=1, pool=None):
         """
         Find the separatrices to the field 'field' with information from 'var'.
 
         call signature:
 
             find_separatrices(var, field, null_point, delta=0.1,
-                              iter_max=100, density=8)
+                              iter_max=100, ring_density=8, n_proc=1,
+                              pool=None)
 
         Arguments:
 
@@ -666,114 +669,65 @@ class Separatrix(object):
 
         *ring_density*:
             Density of the tracer rings.
-        """
 
+        *n_proc*:
+            Number of processes. The nulls are distributed over the
+            processes, which read the field from shared memory.
+
+        *pool*:
+            SharedPool to be used instead of starting one with n_proc
+            processes, e.g. to keep the processes for find_spines and
+            further snapshots.
+
+        The points of all separatrices are stored in self.separatrices,
+        the lines between them in self.connectivity. The points of null i
+        are self.separatrices[self.offsets[i]:self.offsets[i+1]].
+        """
 
-        separatrices = []
-        connectivity = []
-        for null_idx in range(len(null_point.nulls)):
+        grid = _GridParams(var)
+        n_nulls = len(null_point.nulls)
+        rings = np.zeros([n_nulls, ring_density, 3])
+        has_ring = np.zeros(n_nulls, dtype=bool)
+        for null_idx in range(n_nulls):
             null = null_point.nulls[null_idx]
             normal = null_point.normals[null_idx]
             fan_vectors = null_point.fan_vectors[null_idx]
-            sign_trace = null_point.sign_trace[null_idx]
 
-            tracing = True
-            separatrices.append(null)
-            
             # Only trace separatrices for x-point lilke nulls.
-            if abs(np.linalg.det(null_point.eigen_vectors[null_idx])) < delta*1e-8:
-                continue
-            
-            # Create the first ring of points.
-            ring = []
-            offset = len(separatrices)-1
-            for theta in np.linspace(0, 2*np.pi*(1-1./ring_density), ring_density):
-                ring.append(null + self.__rotate_vector(normal, fan_vectors[0],
-                                                        theta) * delta)
-                separatrices.append(ring[-1])
-                # Set the connectivity with the null point.
-                connectivity.append(np.array([0, len(ring)])+offset)
-
-            # Set the connectivity within the ring.
-            for idx in range(ring_density-1):
-                connectivity.append(np.array([idx+1, idx+2])+offset)
-            connectivity.append(np.array([1, ring_density])+offset)
-
-            # Trace the rings around the null.
-            iteration = 0
-            while tracing and iteration < iter_max:
-                ring_old = ring
-
-                # Trace field lines on ring.
-                point_idx = 0
-                for point in ring:
-                    field_norm = vec_int(point, var, field)*sign_trace
-                    field_norm = field_norm/np.sqrt(np.sum(field_norm**2))
-                    point = point + field_norm*delta
-                    ring[point_idx] = point
-                    point_idx += 1
-
-                # Connectivity array between old and new ring.
-                connectivity_rings = np.ones((2, len(ring)), dtype = 'int')*range(len(ring))
-                
-                # Add points if distance becomes too large.
-                ring_new = []
-                ring_new.append(ring[0])
-                for point_idx in range(len(ring)-1):
-                    if self.__distance(ring[point_idx],
-                                       ring[point_idx+1]) > delta:
-                        ring_new.append((ring[point_idx]+ring[point_idx+1])/2)
-                        connectivity_rings[1, point_idx+1:] += 1
-                    ring_new.append(ring[point_idx+1])
-                if self.__distance(ring[0], ring[-1]) > delta:
-                    ring_new.append((ring[0]+ring[-1])/2)
-                ring = ring_new
-
-                # Remove points which lie outside.
-                ring_new = []
-                not_connect_to_next = []
-                left_shift = np.zeros(connectivity_rings.shape[1])
-                for point_idx in range(len(ring)):
-                    if self.__inside_domain(ring[point_idx], var):
-                        ring_new.append(ring[point_idx])
-                        separatrices.append(ring[point_idx])
-                    else:
-                        not_connect_to_next.append(len(ring_new)-1)
-                        mask = connectivity_rings[1, :] == point_idx
-                        connectivity_rings[1, mask] = -1
-                        mask = connectivity_rings[1, :] > point_idx
-                        left_shift += mask
-                connectivity_rings[1, :] -= left_shift
-                ring = ring_new
-                
-                # Stop the tracing routine if there are no points in the ring.
-                if not ring:
-                    tracing = False
-                    continue
-
-                # Set the connectivity within the ring.
-                offset = len(separatrices)-len(ring_new)
-                for point_idx in range(len(ring_new)-1):
-                    if not np.any(np.array(not_connect_to_next) == point_idx):
-                        connectivity.append(np.array([offset+point_idx,
-                                                      offset+point_idx+1]))
-                if not np.any(np.array(not_connect_to_next) == len(ring_new)) \
-                and not np.any(np.array(not_connect_to_next) == -1):
-                    connectivity.append(np.array([offset,
-                                                  offset+len(ring_new)-1]))
-
-                # Set the connectivity between the old and new ring.
-                for point_old_idx in range(len(ring_old)):
-                    if connectivity_rings[1, point_old_idx] >= 0:
-                        connectivity_rings[0, point_old_idx] += len(separatrices)-len(ring_old)-len(ring)
-                        connectivity_rings[1, point_old_idx] += len(separatrices)-len(ring)
-                        connectivity.append(np.array([connectivity_rings[0, point_old_idx],
-                                                      connectivity_rings[1, point_old_idx]]))
-                
-                iteration += 1
-
-        self.separatrices = np.array(separatrices)
-        self.connectivity = np.array(connectivity)
+            if abs(np.linalg.det(null_point.eigen_vectors[null_idx])) >= delta*1e-8:
+                # Create the first ring of points.
+                rings[null_idx] = [null + self.__rotate_vector(normal, fan_vectors[0],
+                                                               theta) * delta
+                                   for theta in np.linspace(0, 2*np.pi*(1-1./ring_density),
+                                                            ring_density)]
+                has_ring[null_idx] = True
+
+        own_pool = pool is None
+        if own_pool:
+            pool = SharedPool(n_proc)
+        try:
+            pool.share('field', prepare_field(field))
+            pool.share('nulls', np.reshape(null_point.nulls, (n_nulls, 3)))
+            pool.share('sign_trace', np.reshape(null_point.sign_trace, n_nulls))
+            pool.share('rings', rings)
+            pool.share('has_ring', has_ring)
+            results = pool.map(_separatrix_chunk, n_nulls,
+                               args=(grid, delta, iter_max), chunk_size=1)
+        finally:
+            if own_pool:
+                pool.close()
+        results = [result for chunk in results for result in chunk]
+
+        # Pack the points and lines of all nulls.
+        self.offsets = np.zeros(len(results)+1, dtype=int)
+        self.offsets[1:] = np.cumsum([len(points) for points, lines in results])
+        if results:
+            self.separatrices = np.concatenate([points for points, lines in results])
+            self.connectivity = np.concatenate([lines + offset for (points, lines), offset
+                                                in zip(results, self.offsets)])
+        else:
+            self.separatrices = np.zeros((0, 3))
+            self.connectivity = np.zeros((0, 2), dtype=int)
 
 
     def write_vtk(self, datadir='./data', file_name='separatrices.vtk',
@@ -805,15 +759,18 @@ class Separatrix(object):
             writer.SetFileTypeToASCII()
         writer.SetFileName(os.path.join(datadir, file_name))
         grid_data = vtk.vtkUnstructuredGrid()
+
+        # Pass the packed arrays to vtk in one piece.
         points = vtk.vtkPoints()
+        points.SetData(VN.numpy_to_vtk(np.ascontiguousarray(self.separatrices,
+                                                            dtype=np.float64),
+                                       deep=True))
+        cells = np.empty((len(self.connectivity), 3), dtype=VN.ID_TYPE_CODE)
+        cells[:, 0] = 2
+        cells[:, 1:] = self.connectivity
         cell_array = vtk.vtkCellArray()
-#        for idx in range(len(self.separatrices)):
-        for point_idx in range(len(self.separatrices)):
-            points.InsertNextPoint(self.separatrices[point_idx, :])
-        for cell_idx in range(len(self.connectivity)):
-            cell_array.InsertNextCell(2)
-            cell_array.InsertCellPoint(self.connectivity[cell_idx, 0])
-            cell_array.InsertCellPoint(self.connectivity[cell_idx, 1])
+        cell_array.SetCells(len(self.connectivity),
+                            VN.numpy_to_vtkIdTypeArray(cells.ravel(), deep=True))
 
         grid_data.SetPoints(points)
         grid_data.SetCells(vtk.VTK_LINE, cell_array)
@@ -861,17 +818,6 @@ class Separatrix(object):
         self.connectivity = self.connectivity.swapaxes(0, 1)
 
 
-    def __distance(self, point_a, point_b):
-        """ Compute the distance of two points (Euclidian geometry). """
-        return np.sqrt(np.sum((point_a-point_b)**2))
-
-
-    def __inside_domain(self, point, var):
-        return (point[0] > var.x[0]) * (point[0] < var.x[-1]) * \
-               (point[1] > var.y[0]) * (point[1] < var.y[-1]) * \
-               (point[2] > var.z[0]) * (point[2] < var.z[-1])
-
-
     def __rotate_vector(self, rot_normal, vector, theta):
         """ Rotate vector around rot_normal by theta. """
         # Compute the rotation matrix.
@@ -901,17 +847,19 @@ class Spine(object):
         """
 
         self.spines = []
+        self.points = []
+        self.offsets = []
 
 
     def find_spines(self, var, field, null_point, delta=0.1,
-                    iter_max=100):
+                    iter_max=100, n_proc=1, pool=None):
         """
         Find the spines to the field 'field' with information from 'var'.
 
         call signature:
 
             find_spines(var, field, null_point, delta=0.1,
-                        iter_max=100)
+                        iter_max=100, n_proc=1, pool=None)
 
         Arguments:
 
@@ -929,47 +877,54 @@ class Spine(object):
 
         *iter_max*:
             Maximum iteration steps for the fiel line tracing.
+
+        *n_proc*:
+            Number of processes. The nulls are distributed over the
+            processes, which read the field from shared memory.
+
+        *pool*:
+            SharedPool to be used instead of starting one with n_proc
+            processes.
+
+        The points of all spines are stored in self.points, spine i being
+        self.points[self.offsets[i]:self.offsets[i+1]]. self.spines is the
+        list of these spines, two per null.
         """
 
-        spines = []
-        for null_idx in range(len(null_point.nulls)):
-            field_sgn = -field*null_point.sign_trace[null_idx]
-            null = null_point.nulls[null_idx]
-            spine_up = []
-            spine_down = []
-            spine_up.append(null)
-            spine_down.append(null)
-
-            # Trace spine above the null.
-            iteration = 0
-            point = null + null_point.normals[null_idx]*delta
-            tracing = True
-            iteration = 0
-            while tracing and iteration < iter_max:
-                spine_up.append(point)
-                field_norm = vec_int(point, var, field_sgn)
-                field_norm = field_norm/np.sqrt(np.sum(field_norm**2))
-                point = point + field_norm*delta
-                if not self.__inside_domain(point, var):
-                    tracing = False
-                iteration += 1
-            spines.append(np.array(spine_up))
-
-            # Trace spine below the null.
-            iteration = 0
-            point = null - null_point.normals[null_idx]*delta
-            tracing = True
-            iteration = 0
-            while tracing and iteration < iter_max:
-                spine_down.append(point)
-                field_norm = vec_int(point, var, field_sgn)
-                field_norm = field_norm/np.sqrt(np.sum(field_norm**2))
-                point = point + field_norm*delta
-                if not self.__inside_domain(point, var):
-                    tracing = False
-                iteration += 1
-            spines.append(np.array(spine_down))
-        self.spines = np.array(spines)
+        grid = _GridParams(var)
+        n_nulls = len(null_point.nulls)
+        own_pool = pool is None
+        if own_pool:
+            pool = SharedPool(n_proc)
+        try:
+            pool.share('field', prepare_field(field))
+            pool.share('nulls', np.reshape(null_point.nulls, (n_nulls, 3)))
+            pool.share('normals', np.reshape(null_point.normals, (n_nulls, 3)))
+            pool.share('sign_trace', np.reshape(null_point.sign_trace, n_nulls))
+            # Groups of nulls traced together, a few per process.
+            if pool.n_proc > 1:
+                group_size = -(-n_nulls//(4*pool.n_proc))
+            else:
+                group_size = n_nulls
+            results = pool.map(_spine_chunk, n_nulls,
+                               args=(grid, delta, iter_max),
+                               chunk_size=group_size)
+        finally:
+            if own_pool:
+                pool.close()
+        self.__pack([spine for spines in results for spine in spines])
+
+
+    def __pack(self, spines):
+        """ Store the spines in one array with offsets. """
+        self.offsets = np.zeros(len(spines)+1, dtype=int)
+        self.offsets[1:] = np.cumsum([len(spine) for spine in spines])
+        if spines:
+            self.points = np.concatenate(spines)
+        else:
+            self.points = np.zeros((0, 3))
+        self.spines = [self.points[self.offsets[i]:self.offsets[i+1]]
+                       for i in range(len(spines))]
 
 
     def write_vtk(self, datadir='./data', file_name='spines.vtk', binary=False):
@@ -999,24 +954,21 @@ class Spine(object):
             writer.SetFileTypeToASCII()
         writer.SetFileName(os.path.join(datadir, file_name))
         poly_data = vtk.vtkPolyData()
+
+        # Pass the packed arrays to vtk in one piece. Each line is stored
+        # as its number of points followed by the point ids.
         points = vtk.vtkPoints()
-        # Create the cell to store the lines in.
-        cells = vtk.vtkCellArray()
-        poly_lines = []
-        offset = 0
-        for line_idx in range(len(self.spines)):
-            n_points = self.spines[line_idx].shape[0]
-            poly_lines.append(vtk.vtkPolyLine())
-            poly_lines[-1].GetPointIds().SetNumberOfIds(n_points)
-            for point_idx in range(n_points):
-                points.InsertNextPoint(self.spines[line_idx][point_idx])
-                poly_lines[-1].GetPointIds().SetId(point_idx,
-                                                   point_idx + offset)
-            cells.InsertNextCell(poly_lines[-1])
-            offset += n_points
+        points.SetData(VN.numpy_to_vtk(np.ascontiguousarray(self.points,
+                                                            dtype=np.float64),
+                                       deep=True))
+        n_lines = len(self.offsets) - 1
+        cells = np.insert(np.arange(len(self.points), dtype=VN.ID_TYPE_CODE),
+                          self.offsets[:-1], np.diff(self.offsets))
+        lines = vtk.vtkCellArray()
+        lines.SetCells(n_lines, VN.numpy_to_vtkIdTypeArray(cells, deep=True))
 
         poly_data.SetPoints(points)
-        poly_data.SetLines(cells)
+        poly_data.SetLines(lines)
 
         # Insure compatability between vtk 5 and 6.
         try:
@@ -1052,7 +1004,7 @@ class Spine(object):
         points = output.GetPoints()
         cells = output.GetLines()
         id_list = vtk.vtkIdList()
-        self.spines = []
+        spines = []
         offset = 0
         for cell_idx in range(cells.GetNumberOfCells()):
             cells.GetNextCell(id_list)
@@ -1061,13 +1013,5 @@ class Spine(object):
             for point_idx in range(n_points):
                 point_array[point_idx] = points.GetPoint(point_idx + offset)
             offset += n_points
-            self.spines.append(point_array)
-        self.spines = np.array(self.spines)
-
-
-    def __inside_domain(self, point, var):
-        return (point[0] > var.x[0]) * (point[0] < var.x[-1]) * \
-               (point[1] > var.y[0]) * (point[1] < var.y[-1]) * \
-               (point[2] > var.z[0]) * (point[2] < var.z[-1])
-
-                
+            spines.append(point_array)
+        self.__pack(spines)
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Convert a run with pencil.files.hdf5.h5file, sync it after the run has
+written more data and read the file back with pencilnew.read.
+
+The header of time_series.dat changes between the syncs.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencil modules.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+from pencilnew.read.var import read_hdf5_metadata
+import synthetic
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    outputdir = os.path.abspath(os.path.dirname(sys.argv[0]))
+    try:
+        write_summary(os.path.join(outputdir, 'sync.out'), tmpdir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, workdir):
+    from pencil.files.hdf5 import h5file
+
+    output = open(filename, 'w')
+    datadir = os.path.join(workdir, 'data')
+    snapshots, grid = synthetic.write_run(datadir, nvar=8)
+    with open(os.path.join(workdir, 'video.in'), 'w') as f:
+        f.write('uu1\nlnrho\n')
+    synthetic.write_time_series(datadir, ['it', 't', 'urms'],
+                                [(i, 0.1*i, i*i) for i in range(3)])
+    rng = np.random.RandomState(3)
+    slices = dict(((field, extension), rng.standard_normal(
+        (6,) + shape).astype('f')) for field in ('uu1', 'lnrho')
+        for extension, shape in (('xy', (6, 8)), ('yz', (4, 6))))
+    synthetic.write_slices(datadir, slices, 4)
+
+    os.chdir(workdir)
+    h5 = h5file(workdir=workdir, datafile='data.hdf5', varfiles='all')
+
+    # The run goes on with one more diagnostic, an incomplete line is left
+    # for the next sync.
+    synthetic.write_time_series(datadir, ['it', 't', 'urms', 'umax'],
+                                [(i, 0.1*i, i*i, 10*i) for i in range(3, 5)],
+                                mode='a')
+    with open(os.path.join(datadir, 'time_series.dat'), 'a') as f:
+        f.write('  5  0.5')
+    synthetic.write_slices(datadir, slices, 2, start=4, mode='ab')
+    h5.sync()
+    h5.close()
+
+    file_name = os.path.join(workdir, 'data.hdf5')
+    ts = pcn.read.ts(datadir=file_name, quiet=True)
+    output.write('nrows_first: %d\n' % len(ts.t))
+
+    # Complete the line and sync again, the columns of the last header apply.
+    with open(os.path.join(datadir, 'time_series.dat'), 'a') as f:
+        f.write('  25  50\n')
+    h5 = h5file(datafile='data.hdf5')
+    h5.sync()
+    h5.close()
+    ts.update()
+    for key in ['it', 't', 'urms', 'umax']:
+        output.write('%s: %s\n' % (key, ' '.join('%g' % value
+                                                 for value in getattr(ts, key))))
+
+    param = pcn.read.param(datadir=datadir, quiet=True)
+    param_h5 = read_hdf5_metadata(file_name)[1]
+    output.write('bcx_equal: %d\n' % (list(param_h5.bcx) == list(param.bcx)))
+
+    for var_file, f_glob in zip(['VAR0', 'VAR1'], snapshots):
+        var = pcn.read.var(datadir=file_name, var_file=var_file, quiet=True,
+                           trimall=False, trim_all=False)
+        output.write('maxdiff_f(%s): %g\n'
+                     % (var_file, np.abs(np.asarray(var.f) - f_glob).max()))
+
+    sl = pcn.read.slices(datadir=file_name)
+    for (field, extension), data in sorted(slices.items()):
+        values = np.asarray(getattr(getattr(sl, extension), field))
+        output.write('nrec(%s_%s): %d\n' % (field, extension, len(values)))
+        output.write('maxdiff(%s_%s): %g\n'
+                     % (field, extension, np.abs(values - data).max()))
+    output.write('t_slices: %s\n' % ' '.join('%g' % t for t in np.ravel(sl.t)))
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Save dictionaries, objects and arrays into the array store of
+pencilnew.io and load them back, whole, memory mapped and by key.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+
+
+class Result(object):
+    """An object with array and non-array attributes."""
+
+    def __init__(self, rng, n):
+        self.name = 'gas velocities'
+        self.scheme = ('tsc', 'tsc', 'tsc')
+        self.ipar = np.arange(1, n + 1)
+        self.uu = rng.standard_normal((3, n))
+        self.t = np.float64(1.5)
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('array-store.out', tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, folder):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    rng = np.random.RandomState(9)
+    formats = ['npy']
+    try:
+        import h5py
+        formats.append('hdf5')
+    except ImportError:
+        pass
+
+    for fmt in formats:
+        result = Result(rng, 100)
+        pcn.io.store_save(result, 'result', folder=folder, format=fmt)
+        output.write('exists(%s): %d\n'
+                     % (fmt, bool(pcn.io.store_exists('result', folder))))
+        loaded = pcn.io.store_load('result', folder=folder)
+        output.write('object(%s): %d\n' % (fmt, isinstance(loaded, Result)
+                                           and loaded.name == result.name
+                                           and loaded.scheme == result.scheme))
+        output.write('maxdiff(%s): %g\n' % (fmt, max(
+            np.abs(loaded.uu - result.uu).max(),
+            np.abs(loaded.ipar - result.ipar).max(),
+            abs(loaded.t - result.t))))
+
+        loaded = pcn.io.store_load('result', folder=folder, keys=['uu'],
+                                   mmap_mode='r')
+        output.write('keys(%s): %d\n' % (fmt, not hasattr(loaded, 'ipar')))
+        output.write('mapped(%s): %d\n'
+                     % (fmt, not isinstance(loaded.uu, np.ndarray)
+                        or isinstance(loaded.uu, np.memmap)))
+        output.write('maxdiff_mapped(%s): %g\n'
+                     % (fmt, np.abs(loaded.uu[1, 10:20]
+                                    - result.uu[1, 10:20]).max()))
+
+        columns = {'t': np.linspace(0, 1, 11), 'it': np.arange(11),
+                   'label': 'run 1'}
+        pcn.io.store_save(columns, 'columns', folder=folder, format=fmt)
+        loaded = pcn.io.store_load('columns', folder=folder)
+        output.write('dict(%s): %d\n' % (fmt, loaded['label'] == 'run 1'
+                                         and loaded['it'].dtype == columns['it'].dtype
+                                         and np.array_equal(loaded['t'], columns['t'])))
+        array = rng.standard_normal((4, 5, 6)).astype(np.float32)
+        pcn.io.store_save(array, 'array', folder=folder, format=fmt)
+        loaded = pcn.io.store_load('array', folder=folder)
+        output.write('array(%s): %d\n' % (fmt, loaded.dtype == np.float32
+                                          and np.array_equal(loaded, array)))
+
+    # pencilnew.io.save puts objects with at least 1 MiB of arrays into
+    # the store, where load and exists find them.
+    result = Result(rng, 2**16)
+    pcn.io.save(result, 'big', folder=folder)
+    output.write('saved_to_store: %d\n' % (
+        os.path.isdir(os.path.join(folder, 'big.store'))
+        and not os.path.exists(os.path.join(folder, 'big.dill'))))
+    output.write('exists_big: %d\n' % bool(pcn.io.exists('big', folder=folder)))
+    loaded = pcn.io.load('big', folder=folder, mmap_mode='r')
+    output.write('mapped_big: %d\n' % isinstance(loaded.uu, np.memmap))
+    output.write('maxdiff_big: %g\n' % np.abs(loaded.uu - result.uu).max())
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
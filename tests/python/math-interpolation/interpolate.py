@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Interpolate polynomial fields on a stretched grid with
+pencilnew.math.interpolation, for which the schemes are exact.
+"""
+
+import os
+import sys
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+from pencilnew.math.interpolation import interpolate, prepare_field, \
+     vec_int_points
+
+
+class Grid(object):
+    """Stretched grid, denser towards the lower boundaries."""
+
+    def __init__(self):
+        self.x = -1 + 2*np.linspace(0, 1, 13)**1.5
+        self.y = 0.5 + np.sinh(np.linspace(0, 2, 11))/np.sinh(2)
+        self.z = 3*np.linspace(0, 1, 9)**2
+
+
+class Params(object):
+    """Equidistant grid as described by the tracer parameters."""
+
+    def __init__(self):
+        self.Ox, self.Oy, self.Oz = -1., 0.5, 0.
+        self.dx, self.dy, self.dz = 0.2, 0.1, 0.25
+        self.nx, self.ny, self.nz = 11, 16, 9
+
+
+def polynomial(x, y, z, degree):
+    """Vector field whose components are products of polynomials of the
+    given degree in each coordinate."""
+    return np.array([(x**degree - 2*x)*(y**degree + y)*(z**degree - 1),
+                     (x**degree + 1)*(y - 3)*(z**degree + z),
+                     x*(y**degree - 0.5*y)*(z**degree + 2)])
+
+
+def main(args):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, 'interpolate.out'), 'w')
+
+    rng = np.random.RandomState(10)
+    grid = Grid()
+    zz, yy, xx = np.meshgrid(grid.z, grid.y, grid.x, indexing='ij')
+    xyz = np.array([rng.uniform(grid.x[0], grid.x[-1], 400),
+                    rng.uniform(grid.y[0], grid.y[-1], 400),
+                    rng.uniform(grid.z[0], grid.z[-1], 400)]).T
+    # Points at the boundaries, where the stencils are shifted inwards.
+    xyz[:3] = [[grid.x[0], grid.y[0], grid.z[0]],
+               [grid.x[-1], grid.y[-1], grid.z[-1]],
+               [grid.x[1], grid.y[-2], grid.z[0]]]
+
+    for scheme, degree in [('trilinear', 1), ('tricubic', 3), ('quintic', 5)]:
+        field = polynomial(xx, yy, zz, degree)
+        exact = polynomial(xyz[:, 0], xyz[:, 1], xyz[:, 2], degree).T
+        result = interpolate(xyz, field, grid, scheme=scheme)
+        output.write('maxdiff(%s): %g\n' % (scheme, np.abs(result - exact).max()))
+        result = interpolate(xyz, prepare_field(field), grid, scheme=scheme,
+                             layout='zyxc')
+        output.write('maxdiff_zyxc(%s): %g\n'
+                     % (scheme, np.abs(result - exact).max()))
+        result = interpolate(xyz, field[1], grid, scheme=scheme)
+        output.write('maxdiff_scalar(%s): %g\n'
+                     % (scheme, np.abs(result - exact[:, 1]).max()))
+
+    # The tricubic scheme is not exact for degree 5.
+    field = polynomial(xx, yy, zz, 5)
+    exact = polynomial(xyz[:, 0], xyz[:, 1], xyz[:, 2], 5).T
+    output.write('inexact(tricubic): %d\n' % (
+        np.abs(interpolate(xyz, field, grid, scheme='tricubic') - exact).max() > 1e-3))
+
+    # Positions outside the grid are moved onto its boundary.
+    outside = np.array([[grid.x[0] - 1, grid.y[-1] + 1, grid.z[-1] + 1],
+                        [np.nan, 1., 1.]])
+    result = interpolate(outside, field, grid, scheme='quintic')
+    output.write('maxdiff_outside: %g\n' % np.abs(
+        result[0] - polynomial(grid.x[0], grid.y[-1], grid.z[-1], 5)).max())
+    output.write('nan: %d\n' % np.isnan(result[1]).all())
+
+    # vec_int_points interpolates on the equidistant grid of the params,
+    # also from a non-contiguous field.
+    params = Params()
+    x = params.Ox + params.dx*np.arange(params.nx)
+    y = params.Oy + params.dy*np.arange(params.ny)
+    z = params.Oz + params.dz*np.arange(params.nz)
+    zz, yy, xx = np.meshgrid(z, y, x, indexing='ij')
+    field = np.asfortranarray(polynomial(xx, yy, zz, 3))
+    xyz = np.array([rng.uniform(x[0], x[-1], 200), rng.uniform(y[0], y[-1], 200),
+                    rng.uniform(z[0], z[-1], 200)]).T
+    exact = polynomial(xyz[:, 0], xyz[:, 1], xyz[:, 2], 3).T
+    for scheme in ['tricubic', 'quintic']:
+        result = vec_int_points(xyz, field, params, interpolation=scheme)
+        output.write('maxdiff_params(%s): %g\n'
+                     % (scheme, np.abs(result - exact).max()))
+    field = polynomial(xx, yy, zz, 1)
+    exact = polynomial(xyz[:, 0], xyz[:, 1], xyz[:, 2], 1).T
+    output.write('maxdiff_params_linear: %g\n'
+                 % np.abs(vec_int_points(xyz, field, params) - exact).max())
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Interpolate the gas velocity to the particles of a synthetic run with
+pencilnew.diag.particle.gas_velo_at_particle_pos.
+
+Cloud in cell weights equal trilinear interpolation, which is computed
+independently with scipy on the untrimmed grid.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+import synthetic
+from scipy.interpolate import RegularGridInterpolator
+
+NAMES = ['xp', 'yp', 'zp', 'vpx', 'vpy', 'vpz']
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('gas-velo.out', tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def make_sim(path):
+    """Write a simulation with two VAR/PVAR pairs. Returns the particle
+    positions and the snapshots."""
+    datadir = os.path.join(path, 'data')
+    snapshots, grid = synthetic.write_run(datadir, nsnap=2)
+    rng = np.random.RandomState(5)
+    npar = 300
+    positions = []
+    for snap in range(2):
+        fp = rng.standard_normal((len(NAMES), npar))
+        for i, coord in enumerate(grid):
+            # inside the domain without ghost zones
+            fp[i] = rng.uniform(coord[3], coord[-4], npar)
+        synthetic.write_pvar(datadir, 'PVAR%d' % snap, np.arange(1, npar + 1),
+                             fp, NAMES, synthetic.snap_time(snap), grid)
+        positions.append(fp[:3])
+    return positions, snapshots, grid
+
+
+def sim_object(path):
+    """Simulation object of path with the attributes
+    gas_velo_at_particle_pos uses. Unlike pcn.get_sim this does not export
+    the object, which needs dill."""
+    from pencilnew.sim.simulation import __Simulation__
+
+    sim = __Simulation__.__new__(__Simulation__)
+    sim.name = os.path.basename(path)
+    sim.path = os.path.abspath(path)
+    sim.datadir = os.path.join(sim.path, 'data')
+    sim.pc_datadir = os.path.join(sim.datadir, 'pc')
+    return sim
+
+
+def write_summary(filename, path):
+    from pencilnew.diag.particle import gas_velo_at_particle_pos
+
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    positions, snapshots, grid = make_sim(path)
+    sim = sim_object(path)
+    folder = os.path.join(sim.pc_datadir, 'gas_velo_at_particle_pos')
+
+    results = {}
+    for scheme, n_proc in [('cic', 1), ('tsc', 1), ('tsc', 2)]:
+        gas_velo_at_particle_pos(varfiles='last2', sim=sim, scheme=scheme,
+                                 OVERWRITE=True, n_proc=n_proc)
+        for snap in range(2):
+            results[(scheme, n_proc, snap)] = pcn.io.store_load(
+                'gas_velo_at_particle_pos_%s_%d' % (scheme, snap), folder)
+
+    x, y, z = grid
+    for snap in range(2):
+        data = results[('cic', 1, snap)]
+        xp, yp, zp = positions[snap][:, data['ipar'] - 1]
+        expected = [RegularGridInterpolator((z, y, x), snapshots[snap][i])(
+            np.array([zp, yp, xp]).T) for i in range(3)]
+        output.write('time(%d): %g\n' % (snap, data['time']))
+        output.write('npar(%d): %d\n' % (snap, len(data['ipar'])))
+        output.write('maxdiff_par_pos(%d): %g\n' % (snap, np.abs(
+            data['par_pos'] - np.array([xp, yp, zp])).max()))
+        output.write('maxdiff_cic(%d): %g\n' % (snap, np.abs(
+            data['gas_velo'] - np.array(expected)).max()))
+        ncells = len(set(map(tuple, data['par_idx'].T)))
+        output.write('ncells(%d): %d\n'
+                     % (snap, round(np.sum(1./data['npar'])) == ncells))
+
+        serial, threads = results[('tsc', 1, snap)], results[('tsc', 2, snap)]
+        output.write('maxdiff_tsc_threads(%d): %g\n' % (snap, np.abs(
+            serial['gas_velo'] - threads['gas_velo']).max()))
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read synthetic xy and xz averages in the fixed Fortran format and in
+free format with pencilnew.read.aver and pencilnew.read.iter_aver.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+from pencilnew.read.averages import Aver2DFile
+import synthetic
+
+VARIABLES = ['uxmz', 'uymz', 'bxmz']
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('aver-2d.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    synthetic.write_run(datadir, nsnap=1)
+    rng = np.random.RandomState(6)
+    nt = 6
+    t = 0.2*np.arange(nt)
+    # xy averages depend on z (nz=4), xz averages on y (ny=6); 12 and 18
+    # values per output fill incomplete lines of 8 values. The xy averages
+    # have three digit exponents.
+    exponent = rng.randint(-120, 120, (nt, len(VARIABLES), 4))
+    xy = rng.standard_normal((nt, len(VARIABLES), 4))*10.**exponent
+    xz = rng.standard_normal((nt, len(VARIABLES), 6))
+    synthetic.write_aver_2d(datadir, 'xy', VARIABLES, t, xy)
+    synthetic.write_aver_2d(datadir, 'xz', VARIABLES, t, xz, fixed=False)
+
+    for plane in ('xy', 'xz'):
+        aver_file = Aver2DFile(os.path.join(datadir, plane + 'averages.dat'),
+                               plane, len(VARIABLES), datadir=datadir)
+        output.write('fixed(%s): %d\n' % (plane, aver_file.mode == 'fixed'))
+
+    aver = pcn.read.aver(datadir=datadir, plane_list=['xy'])
+    output.write('t(fixed): %s\n' % ' '.join('%g' % time for time in aver.t))
+    output.write('maxreldiff(fixed): %g\n' % max(
+        np.abs(getattr(aver.xy, name)/xy[:, i] - 1).max()
+        for i, name in enumerate(VARIABLES)))
+    aver = pcn.read.aver(datadir=datadir, plane_list=['xz'])
+    output.write('t(free): %s\n' % ' '.join('%g' % time for time in aver.t))
+    output.write('maxdiff(free): %g\n' % max(
+        np.abs(getattr(aver.xz, name) - xz[:, i]).max()
+        for i, name in enumerate(VARIABLES)))
+
+    aver = pcn.read.aver(datadir=datadir, plane_list=['xy'],
+                         var_names=['bxmz'], time_range=[0.3, 0.9])
+    output.write('t_window: %s\n' % ' '.join('%g' % time for time in aver.t))
+    output.write('selected: %d\n' % (not hasattr(aver.xy, 'uxmz')))
+    output.write('maxreldiff_window: %g\n'
+                 % np.abs(aver.xy.bxmz/xy[2:5, 2] - 1).max())
+
+    times = []
+    maxreldiff = 0
+    for time, averages in pcn.read.iter_aver(plane='xy', datadir=datadir,
+                                              var_names=['uymz'], tmin=0.3,
+                                              block_size=2):
+        it = int(round(time/0.2))
+        times.append(time)
+        maxreldiff = max(maxreldiff,
+                         np.abs(averages['uymz']/xy[it, 1] - 1).max())
+    output.write('t_iter: %s\n' % ' '.join('%g' % time for time in times))
+    output.write('maxreldiff_iter: %g\n' % maxreldiff)
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read synthetic z averages of 6 processors with pencilnew.read.aver
+through their record index, also after outputs were appended and after
+the files were rewritten.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+import synthetic
+
+VARIABLES = ['uxmxy', 'uymxy', 'bzmxy']
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('aver-z.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    synthetic.write_run(datadir, nsnap=1)
+    rng = np.random.RandomState(7)
+    nt = 8
+    t = 0.1*np.arange(nt + 3)
+    data = rng.standard_normal((nt + 3, len(VARIABLES), 6, 8))
+    synthetic.write_zaverages(datadir, VARIABLES, t[:nt], data[:nt])
+    # The averages are [nt, nx, ny].
+    expected = np.swapaxes(data, 2, 3)
+
+    for name, n_proc in [('serial', 1), ('threads', 3)]:
+        aver = pcn.read.aver(datadir=datadir, plane_list=['z'], n_proc=n_proc)
+        output.write('nt(%s): %d\n' % (name, len(aver.t)))
+        output.write('shape(%s): %s\n'
+                     % (name, ' '.join(str(n) for n in aver.z.bzmxy.shape)))
+        output.write('maxdiff(%s): %g\n' % (name, max(
+            np.abs(getattr(aver.z, var) - expected[:nt, i]).max()
+            for i, var in enumerate(VARIABLES))))
+    output.write('index_written: %d\n' % os.path.isfile(
+        os.path.join(datadir, 'proc0', 'zaverages.dat.idx.npz')))
+
+    aver = pcn.read.aver(datadir=datadir, plane_list=['z'], var_names=['uymxy'],
+                         tmin=0.25, tmax=0.55, n_proc=2)
+    output.write('t_window: %s\n' % ' '.join('%g' % time for time in aver.t))
+    output.write('selected: %d\n' % (not hasattr(aver.z, 'uxmxy')))
+    output.write('maxdiff_window: %g\n'
+                 % np.abs(aver.z.uymxy - expected[3:6, 1]).max())
+
+    # Outputs appended by the running simulation extend the cached index,
+    # the output only partly written to the last processor is not read.
+    synthetic.write_zaverages(datadir, VARIABLES, t[nt:], data[nt:],
+                              mode='ab')
+    with open(os.path.join(datadir, 'proc5', 'zaverages.dat'), 'ab') as fh:
+        synthetic.write_record(fh, np.array([1.5], dtype=np.float32))
+    aver = pcn.read.aver(datadir=datadir, plane_list=['z'])
+    output.write('nt_appended: %d\n' % len(aver.t))
+    output.write('maxdiff_appended: %g\n' % max(
+        np.abs(getattr(aver.z, var) - expected[:, i]).max()
+        for i, var in enumerate(VARIABLES)))
+
+    # A run restarted from scratch rewrites the files, which grow beyond
+    # the indexed size again. The stale cached index must not be used.
+    t_new = 10 + 0.2*np.arange(nt + 5)
+    data_new = rng.standard_normal((nt + 5, len(VARIABLES), 6, 8))
+    synthetic.write_zaverages(datadir, VARIABLES, t_new, data_new)
+    aver = pcn.read.aver(datadir=datadir, plane_list=['z'], time_range=[10, 11])
+    output.write('t_restarted: %s\n' % ' '.join('%g' % time for time in aver.t))
+    output.write('maxdiff_restarted: %g\n'
+                 % np.abs(aver.z.bzmxy - np.swapaxes(data_new, 2, 3)[:6, 2]).max())
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
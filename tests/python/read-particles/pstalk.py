@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read synthetic particles_stalker.dat files of 12 processors with
+pencilnew.read.pstalk, with and without the HDF5 cache, which is extended
+by appended outputs and rebuilt for rewritten files.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import h5py
+import numpy as np
+import pencilnew as pcn
+import synthetic
+
+FIELDS = ['xp', 'yp', 'zp', 'vpx', 'vpy', 'vpz']
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('pstalk.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    synthetic.write_run(datadir, nsnap=1)
+    rng = np.random.RandomState(5)
+    nt, npar_stalk = 7, 30
+    t = 0.25*np.arange(nt + 2)
+    values = rng.standard_normal((nt + 2, len(FIELDS), npar_stalk))
+    synthetic.write_pstalk(datadir, FIELDS, t[:nt], values[:nt])
+    # An output truncated after its header record, as left by a running
+    # simulation, is not read.
+    with open(os.path.join(datadir, 'proc3', 'particles_stalker.dat'),
+              'ab') as fh:
+        synthetic.write_record(fh, np.frombuffer(
+            np.float32(2.).tobytes() + np.int32(5).tobytes(), dtype=np.uint8))
+
+    for name, kwargs in [('nocache', {'use_cache': False}),
+                         ('cache', {'use_cache': True}),
+                         ('cached', {'use_cache': True}),
+                         ('processes', {'use_cache': False, 'n_proc': 3})]:
+        pstalk = pcn.read.pstalk(datadir=datadir, quiet=True, **kwargs)
+        output.write('nt(%s): %d\n' % (name, len(pstalk.t)))
+        output.write('maxdiff_t(%s): %g\n'
+                     % (name, np.abs(pstalk.t - t[:nt]).max()))
+        output.write('maxdiff_values(%s): %g\n' % (name, max(
+            np.abs(getattr(pstalk, field) - values[:nt, i].T).max()
+            for i, field in enumerate(FIELDS))))
+    output.write('cache_written: %d\n'
+                 % os.path.isfile(os.path.join(datadir, 'pc', 'pstalk.h5')))
+
+    pstalk = pcn.read.pstalk(datadir=datadir, quiet=True, tmin=0.4, tmax=1.1,
+                             ipar=[3, 17, 30])
+    output.write('t_window: %s\n' % ' '.join('%g' % time for time in pstalk.t))
+    output.write('ipar: %s\n' % ' '.join(str(i) for i in pstalk.ipar))
+    output.write('maxdiff_selected: %g\n'
+                 % np.abs(pstalk.vpy - values[2:5, 4][:, [2, 16, 29]].T).max())
+
+    # The truncated header record is dropped and two outputs are appended
+    # to all files. Only these are decoded and appended to the cache, which
+    # is marked to see that it is not rewritten.
+    cache_name = os.path.join(datadir, 'pc', 'pstalk.h5')
+    with h5py.File(cache_name, 'a') as cache:
+        cache.attrs['marker'] = 1
+    proc3 = os.path.join(datadir, 'proc3', 'particles_stalker.dat')
+    with open(proc3, 'rb+') as fh:
+        fh.truncate(os.path.getsize(proc3) - 16)
+    synthetic.write_pstalk(datadir, FIELDS, t[nt:], values[nt:], mode='ab',
+                           seed=3)
+    write_read('appended', datadir, t, values, output)
+    with h5py.File(cache_name, 'r') as cache:
+        output.write('cache_kept: %d\n' % ('marker' in cache.attrs))
+
+    # Files rewritten with other times are larger, but their first record
+    # differs, and rewritten shorter files shrank; both rebuild the cache.
+    for name, nt_new in [('rewritten', 4*nt), ('shrunk', 3)]:
+        t = 10 + 0.5*np.arange(nt_new)
+        values = rng.standard_normal((nt_new, len(FIELDS), npar_stalk))
+        synthetic.write_pstalk(datadir, FIELDS, t, values, seed=4)
+        write_read(name, datadir, t, values, output)
+    output.close()
+
+
+def write_read(name, datadir, t, values, output):
+    """Write the number of outputs and the differences to the times and
+    values read with the cache."""
+    pstalk = pcn.read.pstalk(datadir=datadir, quiet=True)
+    output.write('nt_%s: %d\n' % (name, len(pstalk.t)))
+    output.write('maxdiff_t_%s: %g\n' % (name, np.abs(pstalk.t - t).max()))
+    output.write('maxdiff_values_%s: %g\n' % (name, max(
+        np.abs(getattr(pstalk, field) - values[:, i].T).max()
+        for i, field in enumerate(FIELDS))))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
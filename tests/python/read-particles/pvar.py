@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read the PVAR files of a synthetic double precision run with
+pencilnew.read.pvar.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+import synthetic
+
+NAMES = ['xp', 'yp', 'zp', 'vpx', 'vpy', 'vpz']
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('pvar.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    snapshots, grid = synthetic.write_run(datadir, precision='d', nsnap=1)
+    rng = np.random.RandomState(4)
+    npar = 200
+    ipar = np.arange(1, npar + 1)
+    fp = rng.standard_normal((len(NAMES), npar))
+    synthetic.write_pvar(datadir, 'PVAR0', ipar, fp, NAMES, 1.5, grid,
+                         precision='d')
+
+    for name, kwargs in [('serial', {}), ('threads', {'n_proc': 3})]:
+        pvar = pcn.read.pvar(datadir=datadir, varfile='PVAR0', quiet=True,
+                             **kwargs)
+        output.write('t(%s): %g\n' % (name, pvar.t))
+        output.write('npar(%s): %d\n' % (name, pvar.npar))
+        output.write('ipar_sorted(%s): %d\n'
+                     % (name, np.array_equal(pvar.ipar, ipar)))
+        output.write('maxdiff_fp(%s): %g\n' % (name, np.abs(pvar.fp - fp).max()))
+        output.write('dtype_double(%s): %d\n' % (name, pvar.fp.dtype == np.float64))
+
+    pvar = pcn.read.pvar(datadir=datadir, varfile='PVAR0', quiet=True,
+                         var_list=['vpx', 'xp'], npar_max=50)
+    output.write('var_list: %s\n' % ' '.join(str(NAMES.index(name))
+                                             for name in pvar.var_list))
+    output.write('npar_read: %d\n' % len(pvar.ipar))
+    output.write('maxdiff_vpx: %g\n'
+                 % np.abs(pvar.vpx - fp[3, pvar.ipar - 1]).max())
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
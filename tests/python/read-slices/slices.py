@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read synthetic slice files with pencilnew.read.slices, whole, by time
+window and stride, memory mapped and from a single processor.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+import synthetic
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('slices.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    synthetic.write_run(datadir, nsnap=1)
+    rng = np.random.RandomState(8)
+    nt = 10
+    # The global slices are [nt, ny, nx] for xy and [nt, nz, ny] for yz.
+    slices = {('uu1', 'xy'): rng.standard_normal((nt, 6, 8)),
+              ('uu1', 'yz'): rng.standard_normal((nt, 4, 6)),
+              ('lnrho', 'xy'): rng.standard_normal((nt, 6, 8)),
+              ('lnrho', 'yz'): rng.standard_normal((nt, 4, 6))}
+    synthetic.write_slices(datadir, slices, nt)
+    # The global slice files as collected by pc_collectallmovies.
+    for (field, extension), data in slices.items():
+        with open(os.path.join(datadir, 'slice_%s.%s' % (field, extension)),
+                  'wb') as fh:
+            for it in range(nt):
+                synthetic.write_record(fh, np.concatenate(
+                    [data[it].ravel(), [0.5*it, 0.]]).astype(np.float32))
+
+    def maxdiff(series, records):
+        return max(np.abs(np.asarray(getattr(getattr(series, extension), field))
+                          - data[records]).max()
+                   for (field, extension), data in slices.items())
+
+    for name, n_proc in [('serial', 1), ('threads', 3)]:
+        series = pcn.read.slices(datadir=datadir, n_proc=n_proc)
+        output.write('t(%s): %s\n' % (name, ' '.join('%g' % t for t in series.t.ravel())))
+        output.write('maxdiff(%s): %g\n' % (name, maxdiff(series, slice(None))))
+
+    series = pcn.read.slices(datadir=datadir, tmin=1.0, tmax=3.5)
+    output.write('t_window: %s\n' % ' '.join('%g' % t for t in series.t.ravel()))
+    output.write('maxdiff_window: %g\n' % maxdiff(series, slice(2, 8)))
+    series = pcn.read.slices(datadir=datadir, tmin=0.5, stride=3)
+    output.write('t_stride: %s\n' % ' '.join('%g' % t for t in series.t.ravel()))
+    output.write('maxdiff_stride: %g\n' % maxdiff(series, slice(1, None, 3)))
+
+    series = pcn.read.slices(datadir=datadir, field='uu1', extension='yz',
+                             stride=2, memmap_limit=0)
+    output.write('mapped: %d\n' % (not series.yz.uu1.flags.owndata))
+    output.write('maxdiff_mapped: %g\n'
+                 % np.abs(series.yz.uu1 - slices[('uu1', 'yz')][::2]).max())
+
+    # Processor 1 is at ipx=1, ipy=0, ipz=0 and holds nx=4, ny=2.
+    series = pcn.read.slices(datadir=datadir, field='lnrho', extension='xy',
+                             proc=1, tmax=2.0)
+    output.write('shape_proc: %s\n'
+                 % ' '.join(str(n) for n in series.xy.lnrho.shape))
+    output.write('maxdiff_proc: %g\n'
+                 % np.abs(series.xy.lnrho
+                          - slices[('lnrho', 'xy')][:5, 0:2, 4:8]).max())
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read snapshots in the data/allprocs layouts with pencilnew.read.var.
+
+The io_collect file carries persistent records after the time and grid
+record, which must not be taken for the grid.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+from pencilnew.read.var import snapshot_layout
+import synthetic
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('allprocs.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    snapshots, grid = synthetic.write_run(datadir, nvar=8)
+    synthetic.write_allprocs(datadir, 'VAR1', snapshots[1], grid,
+                             synthetic.snap_time(1), persist=True)
+    layouts = [('allprocs', 'VAR1')]
+    try:
+        import h5py
+        with h5py.File(os.path.join(datadir, 'allprocs', 'VAR0.h5'), 'w') as h5:
+            h5['f'] = snapshots[0]
+            h5['t'] = np.float32(synthetic.snap_time(0))
+            for name, coord in zip('xyz', grid):
+                h5['grid/' + name] = coord
+                h5['grid/d' + name] = coord[1] - coord[0]
+        layouts.append(('hdf5', 'VAR0'))
+    except ImportError:
+        pass
+
+    for layout, var_file in layouts:
+        ref = pcn.read.var(datadir=datadir, var_file=var_file, layout='dist',
+                           quiet=True, trimall=False, trim_all=False,
+                           magic=['bb'])
+        output.write('detected(%s): %d\n'
+                     % (layout, snapshot_layout(datadir, var_file) == layout))
+        for lazy in (False, True):
+            var = pcn.read.var(datadir=datadir, var_file=var_file,
+                               layout=layout, lazy=lazy, quiet=True,
+                               trimall=False, trim_all=False, magic=['bb'])
+            tag = '%s_%s' % (layout, 'lazy' if lazy else 'eager')
+            output.write('t(%s): %g\n' % (tag, var.t))
+            output.write('maxdiff_f(%s): %g\n'
+                         % (tag, np.abs(np.asarray(var.f) - ref.f).max()))
+            output.write('maxdiff_bb(%s): %g\n'
+                         % (tag, np.abs(var.bb - ref.bb).max()))
+            output.write('maxdiff_xyz(%s): %g\n' % (tag, max(
+                np.abs(var.x - ref.x).max(), np.abs(var.y - ref.y).max(),
+                np.abs(var.z - ref.z).max())))
+            output.write('maxdiff_dxyz(%s): %g\n' % (tag, max(
+                abs(var.dx - ref.dx), abs(var.dy - ref.dy),
+                abs(var.dz - ref.dz))))
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read subvolumes and single variables of a synthetic snapshot lazily
+with pencilnew.read.var.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+import synthetic
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('lazy.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    snapshots, grid = synthetic.write_run(datadir, nvar=4)
+    f = snapshots[1]
+    var = pcn.read.var(datadir=datadir, var_file='VAR1', lazy=True,
+                       quiet=True, trimall=False, trim_all=False)
+    output.write('lazy: %d\n' % (not isinstance(var.f, np.ndarray)))
+    output.write('shape: %s\n' % ' '.join(str(n) for n in var.f.shape))
+    output.write('t: %g\n' % var.t)
+    # Subvolumes crossing processor boundaries, with steps and integers.
+    for name, index in [('box', np.s_[1:3, 2:9, 4:10, 5:11]),
+                        ('step', np.s_[:, ::3, 1::2, ::-4]),
+                        ('point', np.s_[3, 7, 8, 9]),
+                        ('pencil', np.s_[0, 5, :, 10])]:
+        output.write('maxdiff_%s: %g\n'
+                     % (name, np.abs(np.asarray(var.f[index]) - f[index]).max()))
+    output.write('maxdiff_all: %g\n' % np.abs(np.asarray(var.f) - f).max())
+    output.write('maxdiff_uy: %g\n' % np.abs(var.uy - f[1]).max())
+
+    var = pcn.read.var(datadir=datadir, var_file='VAR1', lazy=True,
+                       quiet=True)
+    trimmed = f[:, 3:-3, 3:-3, 3:-3]
+    output.write('shape_trimmed: %s\n' % ' '.join(str(n) for n in var.f.shape))
+    output.write('maxdiff_trimmed: %g\n'
+                 % np.abs(np.asarray(var.f[:, 1:3, 2:5, 3:7])
+                          - trimmed[:, 1:3, 2:5, 3:7]).max())
+    output.write('maxdiff_lnrho: %g\n' % np.abs(var.lnrho - trimmed[3]).max())
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Compute the vorticity of the hydro run serial-1 with pencilnew.read.var.
+
+The run has no magnetic field, so the magic fields must not need index.ax.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+from pencilnew.math.derivatives import curl
+
+input_dir = 'input'
+
+
+def main(args):
+    # Work on a copy, as pencilnew caches the metadata in the data directory.
+    tmpdir = tempfile.mkdtemp()
+    try:
+        datadir = os.path.join(tmpdir, 'serial-1')
+        shutil.copytree(os.path.join(input_dir, 'serial-1'), datadir)
+        write_summary('magic-hydro.out', datadir)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    full = pcn.read.var(datadir=datadir, quiet=True,
+                        trimall=False, trim_all=False)
+    vort = curl(full.uu, full.dx, full.dy, full.dz)[:, full.n1:full.n2,
+                                                    full.m1:full.m2,
+                                                    full.l1:full.l2]
+    for name, kwargs in [('native', {}), ('threads', {'n_proc': 2}),
+                         ('lazy', {'lazy': True})]:
+        var = pcn.read.var(datadir=datadir, magic=['vort'], quiet=True,
+                           **kwargs)
+        output.write('shape(vort_%s): %s\n' % (name, ' '.join(
+            str(n) for n in var.vort.shape)))
+        output.write('maxdiff(vort_%s): %g\n'
+                     % (name, np.abs(var.vort - vort).max()))
+    output.write('\n')
+    for i, comp in enumerate('xyz'):
+        values = vort[i]
+        output.write('min(vort%s): %g\n' % (comp, values.min()))
+        output.write('max(vort%s): %g\n' % (comp, values.max()))
+        output.write('std(vort%s): %g\n' % (comp, values.std()))
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
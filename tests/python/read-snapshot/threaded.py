@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read a synthetic snapshot distributed over 12 processors with
+pencilnew.read.var, serially and on a thread pool.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+import synthetic
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('threaded.out', os.path.join(tmpdir, 'data'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    snapshots, grid = synthetic.write_run(datadir, nvar=4, precision='d')
+    for name, n_proc in [('serial', 1), ('threads', 4)]:
+        var = pcn.read.var(datadir=datadir, var_file='VAR1', n_proc=n_proc,
+                           quiet=True, trimall=False, trim_all=False)
+        output.write('t(%s): %g\n' % (name, var.t))
+        output.write('shape(%s): %s\n'
+                     % (name, ' '.join(str(n) for n in var.f.shape)))
+        output.write('maxdiff_f(%s): %g\n'
+                     % (name, np.abs(var.f - snapshots[1]).max()))
+        output.write('maxdiff_xyz(%s): %g\n' % (name, max(
+            np.abs(var.x - grid[0]).max(), np.abs(var.y - grid[1]).max(),
+            np.abs(var.z - grid[2]).max())))
+        output.write('dtype_double(%s): %d\n' % (name, var.f.dtype == np.float64))
+
+        var = pcn.read.var(datadir=datadir, var_file='VAR1', n_proc=n_proc,
+                           quiet=True)
+        output.write('maxdiff_trimmed(%s): %g\n'
+                     % (name, np.abs(var.f - snapshots[1][:, 3:-3, 3:-3, 3:-3]).max()))
+        output.write('maxdiff_lnrho(%s): %g\n'
+                     % (name, np.abs(var.lnrho - var.f[3]).max()))
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Read a synthetic time_series.dat whose header changes, with
+pencilnew.read.ts, and append rows to it with update().
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+# Set up Python load path and configure a matplotlib backend that does not
+# need X11. This needs to happen before importing the pencilnew module.
+sys.path.append('../python')
+sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+import matplotlib
+matplotlib.use('agg')
+import numpy as np
+import pencilnew as pcn
+import synthetic
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        write_summary('header-change.out', tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def write_summary(filename, datadir):
+    outputdir = os.path.dirname(sys.argv[0])
+    output = open(os.path.join(outputdir, filename), 'w')
+
+    rows = [[it, 0.1*it, 1. + it] for it in range(5)]
+    synthetic.write_time_series(datadir, ['it', 't', 'urms'], rows)
+    rows = [[it, 0.1*it, 1. + it, 2.*it] for it in range(5, 8)]
+    synthetic.write_time_series(datadir, ['it', 't', 'urms', 'brms'], rows,
+                                mode='a')
+
+    ts = pcn.read.ts(datadir=datadir, quiet=True)
+    output.write('keys: %s\n' % ' '.join(str(len(key)) for key in ts.keys))
+    output.write('nrows: %d\n' % len(ts.t))
+    output.write('t: %s\n' % ' '.join('%g' % t for t in ts.t))
+    output.write('urms: %s\n' % ' '.join('%g' % u for u in ts.urms))
+    output.write('brms: %s\n' % ' '.join('%g' % b for b in ts.brms))
+
+    # A running simulation appends rows, the last one not yet complete.
+    t_before = ts.t
+    with open(os.path.join(datadir, 'time_series.dat'), 'a') as f:
+        for it in range(8, 11):
+            f.write(' %d %g %g %g\n' % (it, 0.1*it, 1. + it, 2.*it))
+        f.write(' 11 1.1')
+    ts.update()
+    output.write('nrows_update: %d\n' % len(ts.t))
+    output.write('brms_update: %s\n' % ' '.join('%g' % b for b in ts.brms[-4:]))
+    output.write('unchanged: %d\n' % (len(t_before) == 8
+                                      and np.allclose(t_before, ts.t[:8])))
+    with open(os.path.join(datadir, 'time_series.dat'), 'a') as f:
+        f.write(' 12 22\n')
+    ts.update()
+    output.write('nrows_complete: %d\n' % len(ts.t))
+    output.write('brms_last: %g\n' % ts.brms[-1])
+    output.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
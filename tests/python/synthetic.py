@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-   vim: set fileencoding=utf-8 :
+
+"""Write small synthetic Pencil Code data directories for the Python tests.
+
+This module is not executable and hence not run as a test itself. The test
+scripts import it with
+
+  sys.path.append(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+  import synthetic
+"""
+
+import os
+
+import numpy as np
+
+
+VAR_NAMES = ['ux', 'uy', 'uz', 'lnrho', 'ax', 'ay', 'az', 'ss']
+
+
+def write_record(fh, array):
+    """Write array as one unformatted Fortran record."""
+    array = np.ascontiguousarray(array)
+    marker = np.array([array.nbytes], dtype=np.int32)
+    marker.tofile(fh)
+    array.tofile(fh)
+    marker.tofile(fh)
+
+
+def write_run(datadir, n=(8, 6, 4), nproc=(2, 3, 2), nvar=4, precision='f',
+              nsnap=2, nghost=3, seed=0):
+    """Write dim.dat, index.pro, param.nml, params.log and the snapshots
+    VAR0, VAR1, ... and var.dat (equal to the last VAR) distributed over
+    nproc processors.
+
+    Returns the list of global f-arrays [nvar, mz, my, mx] of the snapshots
+    and the grid (x, y, z).
+    """
+    rng = np.random.RandomState(seed)
+    nx, ny, nz = n
+    px, py, pz = nproc
+    mx, my, mz = nx + 2*nghost, ny + 2*nghost, nz + 2*nghost
+    prec = 'S' if precision == 'f' else 'D'
+    if not os.path.isdir(datadir):
+        os.makedirs(datadir)
+
+    with open(os.path.join(datadir, 'dim.dat'), 'w') as f:
+        f.write('%d %d %d %d 0 0\n%s\n%d %d %d\n%d %d %d 1\n'
+                % (mx, my, mz, nvar, prec, nghost, nghost, nghost, px, py, pz))
+    with open(os.path.join(datadir, 'index.pro'), 'w') as f:
+        for i, name in enumerate(VAR_NAMES[:nvar]):
+            f.write('i%s=%d\n' % (name, i + 1))
+    with open(os.path.join(datadir, 'param.nml'), 'w') as f:
+        f.write("&INIT_PARS\n LWRITE_2D=F,\n LWRITE_AUX=F,\n LSHEAR=F,\n"
+                " LPERI=  3*T,\n COORD_SYSTEM='cartesian',\n"
+                " BCX= 2*'p','a','s',\n/\n")
+    with open(os.path.join(datadir, 'params.log'), 'w') as f:
+        f.write('! Initializing\n! Date: 2018\n&init_pars\n'
+                ' lperi=3*T,\n coord_system="cartesian",\n/\n'
+                '! Running\n! Date: 2018\n! t=  0.0\n&run_pars\n'
+                ' nt=10,\n/\n')
+
+    x = np.linspace(-1, 1, mx).astype(precision)
+    y = np.linspace(0, 2, my).astype(precision)
+    z = np.linspace(3, 5, mz).astype(precision)
+    snapshots = [rng.standard_normal((nvar, mz, my, mx)).astype(precision)
+                 for snap in range(nsnap)]
+
+    lnx, lny, lnz = nx//px, ny//py, nz//pz
+    iproc = 0
+    for ipz in range(pz):
+        for ipy in range(py):
+            for ipx in range(px):
+                procdir = os.path.join(datadir, 'proc%d' % iproc)
+                if not os.path.isdir(procdir):
+                    os.makedirs(procdir)
+                with open(os.path.join(procdir, 'dim.dat'), 'w') as f:
+                    f.write('%d %d %d %d 0 0\n%s\n%d %d %d\n%d %d %d\n'
+                            % (lnx + 2*nghost, lny + 2*nghost, lnz + 2*nghost,
+                               nvar, prec, nghost, nghost, nghost,
+                               ipx, ipy, ipz))
+                sx = slice(ipx*lnx, (ipx + 1)*lnx + 2*nghost)
+                sy = slice(ipy*lny, (ipy + 1)*lny + 2*nghost)
+                sz = slice(ipz*lnz, (ipz + 1)*lnz + 2*nghost)
+                for snap, f_glob in enumerate(snapshots):
+                    names = ['VAR%d' % snap]
+                    if snap == nsnap - 1:
+                        names.append('var.dat')
+                    for name in names:
+                        with open(os.path.join(procdir, name), 'wb') as fh:
+                            write_record(fh, f_glob[:, sz, sy, sx])
+                            write_record(fh, grid_record(
+                                snap_time(snap), x[sx], y[sy], z[sz],
+                                x, y, z, precision))
+                iproc += 1
+
+    return snapshots, (x, y, z)
+
+
+def snap_time(snap):
+    """Time of the snapshot VAR<snap> written by write_run."""
+    return 0.5*snap
+
+
+def grid_record(t, x_loc, y_loc, z_loc, x, y, z, precision='f'):
+    """The record t, x, y, z, dx, dy, dz following the data of a VAR file."""
+    return np.concatenate([[t], x_loc, y_loc, z_loc,
+                           [x[1] - x[0], y[1] - y[0], z[1] - z[0]]]
+                          ).astype(precision)
+
+
+def write_allprocs(datadir, var_file, f, grid, t, precision='f',
+                   persist=True):
+    """Write the snapshot f into data/allprocs/var_file like io_collect:
+    the raw array, the record t, x, y, z, dx, dy, dz and, with persist,
+    some persistent records.
+    """
+    x, y, z = grid
+    directory = os.path.join(datadir, 'allprocs')
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(os.path.join(directory, var_file), 'wb') as fh:
+        np.ascontiguousarray(f, dtype=precision).tofile(fh)
+        write_record(fh, grid_record(t, x, y, z, x, y, z, precision))
+        if persist:
+            write_record(fh, np.array([2000], dtype=np.int32))
+            write_record(fh, np.array([5], dtype=np.int32))
+            write_record(fh, np.array([11.0, 12.0, 13.0], dtype=precision))
+
+
+def write_time_series(datadir, columns, rows, mode='w'):
+    """Write a header with the columns and the rows to time_series.dat,
+    mode='a' appends them, e.g. after a change of print.in.
+    """
+    with open(os.path.join(datadir, 'time_series.dat'), mode) as f:
+        f.write('#--' + '--'.join(columns) + '--\n')
+        for row in rows:
+            f.write(' '.join(' %.6g' % value for value in row) + '\n')
+
+
+def write_slices(datadir, slices, nrec, start=0, nproc=(2, 3, 2),
+                 n=(8, 6, 4), mode='wb', precision='f'):
+    """Write the records start to start+nrec of the global slices, a dict
+    {(field, extension): array[nt, nv, nh]} for the extensions 'xy' and
+    'yz', into the slice files of the processors. The time of record it is
+    0.5*it.
+    """
+    nx, ny, nz = n
+    px, py, pz = nproc
+    lnx, lny, lnz = nx//px, ny//py, nz//pz
+    iproc = 0
+    for ipz in range(pz):
+        for ipy in range(py):
+            for ipx in range(px):
+                for (field, extension), data in slices.items():
+                    if extension == 'xy':
+                        if ipz != 0:
+                            continue
+                        local = data[:, ipy*lny:(ipy + 1)*lny,
+                                     ipx*lnx:(ipx + 1)*lnx]
+                    else:
+                        if ipx != 0:
+                            continue
+                        local = data[:, ipz*lnz:(ipz + 1)*lnz,
+                                     ipy*lny:(ipy + 1)*lny]
+                    file_name = os.path.join(datadir, 'proc%d' % iproc,
+                                             'slice_%s.%s' % (field, extension))
+                    with open(file_name, mode) as fh:
+                        for it in range(start, start + nrec):
+                            write_record(fh, np.concatenate(
+                                [local[it].ravel(), [0.5*it, 0.]]
+                                ).astype(precision))
+                iproc += 1
+
+
+def write_pvar(datadir, varfile, ipar, fp, names, t, grid, nproc=12,
+               precision='f', seed=1):
+    """Write the particles ipar and fp[nvar, npar] with the variable names,
+    e.g. ['xp', 'yp', 'zp', 'vpx', 'vpy', 'vpz'], into the PVAR files of
+    nproc processors, of which the first one holds no particles. The
+    processor files end with the record t, x, y, z, dx, dy, dz of the
+    global grid.
+    """
+    rng = np.random.RandomState(seed)
+    x, y, z = grid
+    with open(os.path.join(datadir, 'pvarname.dat'), 'w') as f:
+        for i, name in enumerate(names):
+            f.write('%d i%s\n' % (i + 1, name))
+    npar = len(ipar)
+    split = np.sort(rng.choice(np.arange(1, npar), nproc - 2, replace=False))
+    parts = np.split(rng.permutation(npar), np.concatenate([[0], split]))
+    for iproc, part in enumerate(parts):
+        with open(os.path.join(datadir, 'proc%d' % iproc, varfile), 'wb') as fh:
+            write_record(fh, np.array([len(part)], dtype=np.int32))
+            if len(part) > 0:
+                write_record(fh, np.asarray(ipar, dtype=np.int32)[part])
+                write_record(fh, np.asarray(fp, dtype=precision)[:, part])
+            write_record(fh, grid_record(t, x, y, z, x, y, z, precision))
+
+
+def write_pstalk(datadir, fields, t, values, nproc=12, precision='f',
+                 mode='wb', seed=2):
+    """Write the stalked particle values[nt, nfields, npar_stalk] at the
+    times t into particles_stalker.dat of nproc processors, with the
+    particles moving between random processors at each output, together
+    with pdim.dat and particles_stalker_header.dat. mode='ab' appends
+    the outputs to existing files.
+    """
+    rng = np.random.RandomState(seed)
+    nt, nfields, npar_stalk = values.shape
+    with open(os.path.join(datadir, 'pdim.dat'), 'w') as f:
+        f.write('%d %d %d 0\n' % (2*npar_stalk, nfields, npar_stalk))
+    with open(os.path.join(datadir, 'particles_stalker_header.dat'), 'w') as f:
+        f.write(','.join(fields) + ',\n')
+    owner = rng.randint(0, nproc, size=(nt, npar_stalk))
+    for iproc in range(nproc):
+        file_name = os.path.join(datadir, 'proc%d' % iproc,
+                                 'particles_stalker.dat')
+        with open(file_name, mode) as fh:
+            for it in range(nt):
+                ipar = np.flatnonzero(owner[it] == iproc)
+                header = (np.array([t[it]], dtype=precision).tobytes()
+                          + np.array([len(ipar)], dtype=np.int32).tobytes())
+                write_record(fh, np.frombuffer(header, dtype=np.uint8))
+                if len(ipar) > 0:
+                    write_record(fh, (ipar + 1).astype(np.int32))
+                    write_record(fh, values[it][:, ipar].T.astype(precision))
+
+
+def fortran_e(value, width, digits=5, exp_digits=2):
+    """Format value like the Fortran edit descriptor 1pe<width>.<digits>
+    with exp_digits digits of the exponent."""
+    mantissa, exponent = ('%.*E' % (digits, value)).split('E')
+    return ('%sE%+0*d' % (mantissa, exp_digits + 1, int(exponent))).rjust(width)
+
+
+def write_aver_2d(datadir, plane, variables, t, data, fixed=True):
+    """Write the averages data[nt, nvar, nw] at the times t to
+    <plane>averages.dat and the names of the variables to <plane>aver.in
+    in the run directory. With fixed the Fortran formats (1pe12.5) and
+    (1p,8e14.5e3) are used, otherwise values of varying width.
+    """
+    rundir = os.path.dirname(os.path.abspath(datadir))
+    with open(os.path.join(rundir, plane + 'aver.in'), 'w') as f:
+        f.write('\n'.join(variables) + '\n')
+    with open(os.path.join(datadir, plane + 'averages.dat'), 'w') as f:
+        for time, values in zip(t, data):
+            values = values.ravel()
+            if fixed:
+                f.write(fortran_e(time, 12) + '\n')
+                for i in range(0, len(values), 8):
+                    f.write(''.join(fortran_e(value, 14, exp_digits=3)
+                                    for value in values[i:i + 8]) + '\n')
+            else:
+                f.write('%g\n' % time)
+                f.write(' '.join('%.7g' % value for value in values) + '\n')
+
+
+def write_zaverages(datadir, variables, t, data, nproc=(2, 3, 2),
+                    n=(8, 6, 4), mode='wb', precision='f'):
+    """Write the z averages data[nt, nvar, ny, nx] at the times t as
+    Fortran records into zaverages.dat of the processors at ipz=0 and the
+    names of the variables to zaver.in in the run directory. mode='ab'
+    appends the outputs to existing files.
+    """
+    nx, ny, nz = n
+    px, py, pz = nproc
+    lnx, lny = nx//px, ny//py
+    rundir = os.path.dirname(os.path.abspath(datadir))
+    with open(os.path.join(rundir, 'zaver.in'), 'w') as f:
+        f.write('\n'.join(variables) + '\n')
+    for ipy in range(py):
+        for ipx in range(px):
+            iproc = ipx + px*ipy
+            file_name = os.path.join(datadir, 'proc%d' % iproc,
+                                     'zaverages.dat')
+            with open(file_name, mode) as fh:
+                for time, values in zip(t, data):
+                    write_record(fh, np.array([time], dtype=precision))
+                    write_record(fh, values[:, ipy*lny:(ipy + 1)*lny,
+                                            ipx*lnx:(ipx + 1)*lnx
+                                            ].astype(precision))